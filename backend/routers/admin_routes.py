@@ -1,21 +1,32 @@
 # routers/admin_routes.py
 
 import os
-from typing import Any, Dict, Optional
+from datetime import date
+from typing import Any, Dict, List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
 
 # 🔒 Direct service imports (no package aggregator)
+import services.analytics_rollup_service as analytics_rollup_service
 import services.analytics_service as analytics_service
+import services.cohort_service as cohort_service
 import services.config_service as config_service
+import services.dashboard_service as dashboard_service
+import services.event_store_service as event_store_service
+import services.export_service as export_service
+import services.game_rules_service as game_rules_service
 import services.leaderboard_service as leaderboard_service
 import services.marketplace_service as marketplace_service
 import services.news_service as news_service
+import services.query_audit_service as query_audit_service
 import services.reward_service as reward_service
 import services.subscription_service as subscription_service
 import services.swap_service as swap_service
 import services.treasury_service as treasury_service
+import services.trivia_service as trivia_service
+import services.user_search_service as user_search_service
+import services.user_service as user_service
 
 # ===========================
 # ROUTER
@@ -54,25 +65,102 @@ def _get_chain(request: Request):
 # DASHBOARD
 # ===========================
 @admin_router.get("/dashboard")
-async def dashboard(request: Request, _: None = Depends(verify_admin)):
+async def dashboard(
+    request: Request,
+    mode: str = "fresh",
+    refresh: bool = False,
+    _: None = Depends(verify_admin),
+):
+    """
+    Sections load concurrently and are cached per section; slow ones come
+    back as partial results (see "meta"). mode=swr serves cached sections
+    immediately and reloads expired ones in the background.
+    """
     db = _get_db(request)
     w3, zwap_contract = _get_chain(request)
 
-    treasury = await treasury_service.get_status(db, w3, zwap_contract)
-    analytics = await analytics_service.get_overview(db)
+    sections = [
+        dashboard_service.Section("treasury", lambda: treasury_service.get_treasury_status(db, w3, zwap_contract), ttl=60),
+        dashboard_service.Section("analytics", lambda: analytics_service.get_overview(db), ttl=300),
+        dashboard_service.Section(
+            "leaderboard", lambda: leaderboard_service.get_global_stats_and_top(db, category="earned", limit=50), ttl=60
+        ),
+        dashboard_service.Section("news", lambda: news_service.list_news(db, limit=25), ttl=30),
+    ]
+    try:
+        return await dashboard_service.get_composer().compose(sections, mode=mode, refresh=refresh)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    leaderboard = await leaderboard_service.get_global_stats_and_top(
-        db, category="earned", limit=50
-    )
 
-    news = await news_service.list_news(db, limit=25)
+# ===========================
+# DEBUG – QUERY AUDIT
+# ===========================
+@admin_router.get("/debug/query-audit")
+async def query_audit_report(drain: bool = False, _: None = Depends(verify_admin)):
+    """
+    COLLSCANs and high scan ratios seen so far (server started with QUERY_AUDIT=true).
+    """
+    auditor = query_audit_service.get_auditor()
+    if auditor is None:
+        raise HTTPException(status_code=404, detail="Query audit is not enabled")
+    if drain:
+        await auditor.drain()
+    return auditor.report()
+
+
+# ===========================
+# USERS – SEARCH
+# ===========================
+@admin_router.get("/users")
+async def search_users(
+    request: Request,
+    search: Optional[str] = None,
+    status: Optional[str] = None,
+    tier: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    _: None = Depends(verify_admin),
+):
+    """
+    search: "0x..." wallet prefix, 1-2 character username prefix, or a
+    substring of a username/wallet. Pass next_cursor back for the next page.
+    """
+    db = _get_db(request)
+    try:
+        return await user_search_service.search_users(
+            db, search=search, status=status, tier=tier, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# ===========================
+# USERS – BULK IMPORT
+# ===========================
+class OnboardWallet(BaseModel):
+    wallet_address: str
+    username: Optional[str] = None
+
 
-    return {
-        "treasury": treasury,
-        "analytics": analytics,
-        "leaderboard": leaderboard,
-        "news": news,
-    }
+class OnboardRequest(BaseModel):
+    wallets: List[OnboardWallet]
+    source: str = "partner_import"
+
+
+@admin_router.post("/users/import")
+async def import_users(
+    payload: OnboardRequest,
+    request: Request,
+    _: None = Depends(verify_admin),
+):
+    db = _get_db(request)
+    try:
+        return await user_service.onboard_users(
+            db, [w.dict() for w in payload.wallets], source=payload.source
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 # ===========================
@@ -138,7 +226,10 @@ async def update_game_config(
     _: None = Depends(verify_admin),
 ):
     db = _get_db(request)
-    return await config_service.update_game_config(db, game_id, config)
+    try:
+        return await game_rules_service.update_game_config(db, game_id, config)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 # ===========================
@@ -214,6 +305,186 @@ async def analytics_overview(
     return await analytics_service.get_overview(db, days=days)
 
 
+@admin_router.get("/analytics/active-users")
+async def analytics_active_users(request: Request, _: None = Depends(verify_admin)):
+    db = _get_db(request)
+    return await analytics_service.get_active_users(db)
+
+
+@admin_router.get("/analytics/retention")
+async def analytics_retention(
+    request: Request,
+    cohort_day: date,
+    days: int = 30,
+    _: None = Depends(verify_admin),
+):
+    db = _get_db(request)
+    return await analytics_service.get_retention(db, cohort_day, days=max(1, min(days, 365)))
+
+
+@admin_router.get("/analytics/abuse")
+async def analytics_abuse_suspects(
+    request: Request,
+    threshold: float = 10000,
+    limit: int = 100,
+    _: None = Depends(verify_admin),
+):
+    """
+    Top reward-abuse suspects from the streaming detector (this worker's view).
+    """
+    db = _get_db(request)
+    return {"suspects": await analytics_service.detect_abuse(db, threshold=threshold, limit=min(limit, 500))}
+
+
+@admin_router.get("/analytics/whales")
+async def analytics_whales(request: Request, limit: int = 100, _: None = Depends(verify_admin)):
+    """
+    Largest ZWAP balances from the maintained whale board (no Mongo reads).
+    """
+    db = _get_db(request)
+    return await analytics_service.get_whales(db, limit=limit)
+
+
+@admin_router.get("/analytics/cohorts")
+async def analytics_cohorts(
+    request: Request,
+    weeks: int = 12,
+    cohorts: int = 12,
+    tier: Optional[str] = None,
+    region: Optional[str] = None,
+    _: None = Depends(verify_admin),
+):
+    """
+    Signup-week x active-week retention. tier and region take
+    comma-separated lists; cohorts missing a region are "unknown".
+    """
+    db = _get_db(request)
+    tiers = [t.strip() for t in tier.split(",") if t.strip()] if tier else None
+    regions = [r.strip() for r in region.split(",") if r.strip()] if region else None
+    return await analytics_service.get_cohort_retention(db, weeks=weeks, cohorts=cohorts, tiers=tiers, regions=regions)
+
+
+@admin_router.post("/analytics/cohorts/recompute")
+async def recompute_cohorts(request: Request, apply: bool = False, _: None = Depends(verify_admin)):
+    """
+    Rebuilds the cohort matrix from the member/activity logs and reports
+    cells where the incremental counts differ; apply=true overwrites them.
+    """
+    db = _get_db(request)
+    try:
+        return await cohort_service.recompute(db, apply=apply)
+    except PermissionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@admin_router.post("/analytics/cohorts/backfill")
+async def backfill_cohort_members(request: Request, _: None = Depends(verify_admin)):
+    """
+    Seeds cohort membership and sizes from existing users (activity
+    history starts when the cohort engine first runs).
+    """
+    db = _get_db(request)
+    try:
+        return await cohort_service.backfill_members(db)
+    except PermissionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@admin_router.get("/analytics/events")
+async def analytics_event_series(
+    request: Request,
+    kind: str = "rewards",
+    days: int = 30,
+    unit: str = "day",
+    wallet: Optional[str] = None,
+    split: bool = False,
+    _: None = Depends(verify_admin),
+):
+    """
+    kind: steps | games | rewards. split=true breaks games down by game
+    type and rewards by source. Requires EVENT_STORE=timeseries.
+    """
+    db = _get_db(request)
+    try:
+        return await analytics_service.get_event_series(db, kind, days=days, unit=unit, wallet=wallet, split=split)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@admin_router.post("/analytics/events/backfill")
+async def backfill_event_store(
+    request: Request,
+    kinds: Optional[str] = None,
+    _: None = Depends(verify_admin),
+):
+    """
+    Copies game and reward history into the time-series collections
+    (resumable). Large histories are better run with
+    `python -m services.event_store_service`.
+    """
+    db = _get_db(request)
+    names = [k.strip() for k in kinds.split(",") if k.strip()] if kinds else None
+    try:
+        result = await event_store_service.backfill(db, names)
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**result, "storage": await event_store_service.storage_stats(db)}
+
+
+@admin_router.post("/analytics/rollups/compact")
+async def compact_analytics_rollups(
+    request: Request,
+    days: int = 7,
+    _: None = Depends(verify_admin),
+):
+    """
+    Rebuilds the last `days` finished days from raw collections (backfills,
+    or after an outage). The nightly job only covers recent uncompacted days.
+    """
+    db = _get_db(request)
+    compacted = await analytics_rollup_service.compact_recent(db, days)
+    if not compacted:
+        raise HTTPException(status_code=409, detail="Compaction already running")
+    return {"compacted": compacted}
+
+
+# ===========================
+# ANALYTICS EXPORT (PARQUET)
+# ===========================
+@admin_router.post("/exports/run")
+async def run_analytics_export(
+    request: Request,
+    collections: Optional[str] = None,
+    _: None = Depends(verify_admin),
+):
+    """
+    Exports new rows since the last run (users: full snapshot) to
+    day-partitioned Parquet under EXPORT_DIR. collections is comma-separated
+    (default: all). Large backfills are better run with
+    `python -m services.export_service`.
+    """
+    db = _get_db(request)
+    names = [c.strip() for c in collections.split(",") if c.strip()] if collections else None
+    try:
+        return await export_service.run_export(db, names)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PermissionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+
+@admin_router.get("/exports")
+async def get_analytics_exports(request: Request, _: None = Depends(verify_admin)):
+    db = _get_db(request)
+    return {"exports": await export_service.get_export_state(db)}
+
+
 # ===========================
 # TREASURY
 # ===========================
@@ -257,3 +528,52 @@ async def admin_list_subscriptions(
 ):
     db = _get_db(request)
     return await subscription_service.list_subscriptions(db, skip=skip, limit=limit)
+
+
+# ===========================
+# TRIVIA
+# Edits bump the bank version; every worker reloads its in-memory copy.
+# ===========================
+@admin_router.get("/trivia/questions")
+async def admin_list_trivia(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    _: None = Depends(verify_admin),
+):
+    db = _get_db(request)
+    return await trivia_service.list_questions(db, skip=skip, limit=limit)
+
+
+@admin_router.post("/trivia/questions")
+async def admin_create_trivia(item: Dict[str, Any], request: Request, _: None = Depends(verify_admin)):
+    db = _get_db(request)
+    try:
+        return await trivia_service.create_question(db, item)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@admin_router.put("/trivia/questions/{question_id}")
+async def admin_update_trivia(
+    question_id: str,
+    updates: Dict[str, Any],
+    request: Request,
+    _: None = Depends(verify_admin),
+):
+    db = _get_db(request)
+    try:
+        return await trivia_service.update_question(db, question_id, updates)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@admin_router.delete("/trivia/questions/{question_id}")
+async def admin_delete_trivia(question_id: str, request: Request, _: None = Depends(verify_admin)):
+    db = _get_db(request)
+    try:
+        return await trivia_service.delete_question(db, question_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
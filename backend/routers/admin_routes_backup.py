@@ -9,10 +9,21 @@ Security: Admin routes require admin authentication via X-Admin-Key header.
 from fastapi import APIRouter, HTTPException, Header, Depends, Query
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from enum import Enum
+import asyncio
 import os
 
+import services.analytics_rollup_service as analytics_rollup_service
+import services.analytics_service as analytics_service
+import services.anti_cheat_service as anti_cheat_service
+import services.dashboard_service as dashboard_service
+import services.game_rules_service as game_rules_service
+import services.outbox_service as outbox_service
+import services.totals_service as totals_service
+import services.user_search_service as user_search_service
+import services.user_service as user_service
+
 # Admin API Router
 admin_router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -68,12 +79,17 @@ class GameConfig(BaseModel):
     difficulty_multiplier: float = 1.0
     cooldown_minutes: int = 0
     daily_play_limit: int = 0
+    tier_required: Optional[str] = None
+    zwap_cap: Optional[float] = None
+    zpts_cap: Optional[int] = None
 
 class WalkConfig(BaseModel):
     daily_step_cap: int = 10000
     steps_per_zwap: int = 1000
     steps_per_zpt: int = 100
     anti_cheat_spike_threshold: int = 5000  # Max steps in 5 minutes
+    anti_cheat_action: str = "clamp"  # "clamp" or "flag"
+    anti_cheat_enabled: bool = True
     enabled: bool = True
 
 class MarketplaceItem(BaseModel):
@@ -98,6 +114,14 @@ class TreasuryAction(BaseModel):
     value: Optional[Any] = None
     reason: str
 
+class OnboardWallet(BaseModel):
+    wallet_address: str
+    username: Optional[str] = None
+
+class OnboardRequest(BaseModel):
+    wallets: List[OnboardWallet]
+    source: str = "partner_import"
+
 class SystemConfig(BaseModel):
     claims_paused: bool = False
     daily_claim_limit: float = 1000000
@@ -107,93 +131,96 @@ class SystemConfig(BaseModel):
 # ============ ADMIN ENDPOINTS ============
 
 # --- Dashboard Stats ---
-@admin_router.get("/dashboard", dependencies=[Depends(verify_admin)])
-async def get_admin_dashboard(db=None):
-    """Get admin dashboard overview stats"""
-    from server import db as database
-    db = database
-    
-    now = datetime.now(timezone.utc)
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    week_ago = now - timedelta(days=7)
-    month_ago = now - timedelta(days=30)
-    
-    # User stats
-    total_users = await db.users.count_documents({})
-    active_today = await db.users.count_documents({"last_active": {"$gte": today_start}})
-    active_week = await db.users.count_documents({"last_active": {"$gte": week_ago}})
-    plus_users = await db.users.count_documents({"tier": "plus"})
-    suspended_users = await db.users.count_documents({"status": "suspended"})
-    
-    # Rewards stats (from ledger)
-    rewards_today = await db.rewards_ledger.aggregate([
-        {"$match": {"timestamp": {"$gte": today_start}, "status": "earned"}},
-        {"$group": {"_id": None, "total_zwap": {"$sum": "$zwap_amount"}, "total_zpts": {"$sum": "$zpts_amount"}}}
-    ]).to_list(1)
-    
-    claims_today = await db.rewards_ledger.aggregate([
-        {"$match": {"timestamp": {"$gte": today_start}, "status": "claimed"}},
-        {"$group": {"_id": None, "total": {"$sum": "$zwap_amount"}}}
-    ]).to_list(1)
-    
-    # Game stats
-    games_played_today = await db.game_sessions.count_documents({"timestamp": {"$gte": today_start}})
-    
-    # Get system config
+async def _dashboard_users(db) -> Dict[str, Any]:
+    total_users, plus_users, suspended_users, active = await asyncio.gather(
+        db.users.count_documents({}),
+        db.users.count_documents({"tier": "plus"}),
+        db.users.count_documents({"status": "suspended"}),
+        # HyperLogLog estimates (~0.8% error) instead of scans over last_active
+        analytics_service.get_active_users(db),
+    )
+    return {
+        "total": total_users,
+        "active_today": active["dau"]["estimate"],
+        "active_week": active["wau"]["estimate"],
+        "active_month": active["mau"]["estimate"],
+        "plus_subscribers": plus_users,
+        "suspended": suspended_users,
+    }
+
+
+async def _dashboard_rewards(db) -> Dict[str, Any]:
+    today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    rewards_today, claims_today = await asyncio.gather(
+        db.rewards_ledger.aggregate([
+            {"$match": {"timestamp": {"$gte": today_start}, "status": "earned"}},
+            {"$group": {"_id": None, "total_zwap": {"$sum": "$zwap_amount"}, "total_zpts": {"$sum": "$zpts_amount"}}}
+        ]).to_list(1),
+        db.rewards_ledger.aggregate([
+            {"$match": {"timestamp": {"$gte": today_start}, "status": "claimed"}},
+            {"$group": {"_id": None, "total": {"$sum": "$zwap_amount"}}}
+        ]).to_list(1),
+    )
+    return {
+        "issued_today_zwap": rewards_today[0]["total_zwap"] if rewards_today else 0,
+        "issued_today_zpts": rewards_today[0]["total_zpts"] if rewards_today else 0,
+        "claimed_today": claims_today[0]["total"] if claims_today else 0,
+    }
+
+
+async def _dashboard_activity(db) -> Dict[str, Any]:
+    today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return {"games_played_today": await db.game_sessions.count_documents({"timestamp": {"$gte": today_start}})}
+
+
+async def _dashboard_system(db) -> Dict[str, Any]:
     config = await db.system_config.find_one({"_id": "main"}) or {}
-    
     return {
-        "users": {
-            "total": total_users,
-            "active_today": active_today,
-            "active_week": active_week,
-            "plus_subscribers": plus_users,
-            "suspended": suspended_users,
-        },
-        "rewards": {
-            "issued_today_zwap": rewards_today[0]["total_zwap"] if rewards_today else 0,
-            "issued_today_zpts": rewards_today[0]["total_zpts"] if rewards_today else 0,
-            "claimed_today": claims_today[0]["total"] if claims_today else 0,
-        },
-        "activity": {
-            "games_played_today": games_played_today,
-        },
-        "system": {
-            "claims_paused": config.get("claims_paused", False),
-            "maintenance_mode": config.get("maintenance_mode", False),
-            "announcement": config.get("announcement"),
-        },
-        "timestamp": now.isoformat(),
+        "claims_paused": config.get("claims_paused", False),
+        "maintenance_mode": config.get("maintenance_mode", False),
+        "announcement": config.get("announcement"),
     }
 
 
+@admin_router.get("/dashboard", dependencies=[Depends(verify_admin)])
+async def get_admin_dashboard(mode: str = "fresh", refresh: bool = False):
+    """Get admin dashboard overview stats (sections load concurrently and are cached; mode=swr never waits on Mongo for cached sections)"""
+    from server import db
+    
+    sections = [
+        dashboard_service.Section("users", lambda: _dashboard_users(db), ttl=60),
+        dashboard_service.Section("rewards", lambda: _dashboard_rewards(db), ttl=30),
+        dashboard_service.Section("activity", lambda: _dashboard_activity(db), ttl=30),
+        dashboard_service.Section("system", lambda: _dashboard_system(db), ttl=5),
+    ]
+    try:
+        result = await dashboard_service.get_composer().compose(sections, mode=mode, refresh=refresh)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**result, "timestamp": datetime.now(timezone.utc).isoformat()}
+
+
 # --- User Management ---
 @admin_router.get("/users", dependencies=[Depends(verify_admin)])
 async def list_users(
-    skip: int = 0,
     limit: int = 50,
     status: Optional[str] = None,
     tier: Optional[str] = None,
     search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    exact: bool = False,
 ):
-    """List all users with filtering"""
+    """List users with filtering (index-backed search, keyset pages via next_cursor, estimated totals)"""
     from server import db
     
-    query = {}
-    if status:
-        query["status"] = status
-    if tier:
-        query["tier"] = tier
-    if search:
-        query["$or"] = [
-            {"wallet_address": {"$regex": search, "$options": "i"}},
-            {"username": {"$regex": search, "$options": "i"}},
-        ]
-    
-    users = await db.users.find(query, {"_id": 0}).skip(skip).limit(limit).to_list(limit)
-    total = await db.users.count_documents(query)
+    try:
+        result = await user_search_service.search_users(
+            db, search=search, status=status, tier=tier, limit=limit, cursor=cursor, exact=exact
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return {"users": users, "total": total, "skip": skip, "limit": limit}
+    return {**result, "limit": limit}
 
 
 @admin_router.get("/users/{wallet_address}", dependencies=[Depends(verify_admin)])
@@ -239,21 +266,22 @@ async def update_user(wallet_address: str, update: AdminUserUpdate):
     
     update_data["updated_at"] = datetime.now(timezone.utc)
     
-    result = await db.users.update_one(
-        {"wallet_address": wallet_address},
-        {"$set": update_data}
-    )
-    
-    if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="User not found")
+    async def apply(session):
+        result = await db.users.update_one(
+            {"wallet_address": wallet_address},
+            {"$set": update_data},
+            session=session,
+        )
+        if result.modified_count == 0:
+            raise HTTPException(status_code=404, detail="User not found")
     
-    # Log admin action
-    await db.admin_logs.insert_one({
+    # Log admin action (queued; written by the outbox drainer)
+    await outbox_service.get_outbox().run_with_audit(apply, {
         "action": "user_update",
         "target": wallet_address,
         "changes": update_data,
-        "timestamp": datetime.now(timezone.utc),
     })
+    totals_service.get_totals().bump("users")
     
     return {"success": True, "message": f"User {wallet_address} updated"}
 
@@ -263,17 +291,19 @@ async def suspend_user(wallet_address: str, reason: str = ""):
     """Suspend a user account"""
     from server import db
     
-    result = await db.users.update_one(
-        {"wallet_address": wallet_address},
-        {"$set": {"status": "suspended", "suspended_at": datetime.now(timezone.utc), "suspend_reason": reason}}
-    )
+    async def apply(session):
+        await db.users.update_one(
+            {"wallet_address": wallet_address},
+            {"$set": {"status": "suspended", "suspended_at": datetime.now(timezone.utc), "suspend_reason": reason}},
+            session=session,
+        )
     
-    await db.admin_logs.insert_one({
+    await outbox_service.get_outbox().run_with_audit(apply, {
         "action": "user_suspended",
         "target": wallet_address,
         "reason": reason,
-        "timestamp": datetime.now(timezone.utc),
     })
+    totals_service.get_totals().bump("users")
     
     return {"success": True, "message": f"User {wallet_address} suspended"}
 
@@ -287,10 +317,27 @@ async def unsuspend_user(wallet_address: str):
         {"wallet_address": wallet_address},
         {"$set": {"status": "active"}, "$unset": {"suspended_at": "", "suspend_reason": ""}}
     )
+    totals_service.get_totals().bump("users")
     
     return {"success": True, "message": f"User {wallet_address} unsuspended"}
 
 
+@admin_router.post("/users/import", dependencies=[Depends(verify_admin)])
+async def import_users(payload: OnboardRequest):
+    """Bulk-create users for a partner import (existing wallets are left untouched)"""
+    from server import db
+    
+    try:
+        result = await user_service.onboard_users(db, [w.dict() for w in payload.wallets], source=payload.source)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    outbox_service.log_admin_action(
+        "users_import", source=payload.source, created=result["created"], existing=result["existing"]
+    )
+    
+    return result
+
+
 # --- Rewards Ledger ---
 @admin_router.get("/rewards/ledger", dependencies=[Depends(verify_admin)])
 async def get_rewards_ledger(
@@ -301,8 +348,9 @@ async def get_rewards_ledger(
     status: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    exact: bool = False,
 ):
-    """Get rewards ledger with filtering - append-only audit trail"""
+    """Get rewards ledger with filtering - append-only audit trail (exact=true forces a fresh count)"""
     from server import db
     
     query = {}
@@ -318,22 +366,28 @@ async def get_rewards_ledger(
         query.setdefault("timestamp", {})["$lte"] = datetime.fromisoformat(end_date)
     
     ledger = await db.rewards_ledger.find(query, {"_id": 0}).sort("timestamp", -1).skip(skip).limit(limit).to_list(limit)
-    total = await db.rewards_ledger.count_documents(query)
-    
-    # Aggregates
-    agg = await db.rewards_ledger.aggregate([
-        {"$match": query},
-        {"$group": {
-            "_id": None,
-            "total_zwap": {"$sum": "$zwap_amount"},
-            "total_zpts": {"$sum": "$zpts_amount"},
-        }}
-    ]).to_list(1)
+    
+    # Count and sums in one cached aggregate over the same filter
+    async def summarize():
+        agg = await db.rewards_ledger.aggregate([
+            {"$match": query},
+            {"$group": {
+                "_id": None,
+                "entries": {"$sum": 1},
+                "total_zwap": {"$sum": "$zwap_amount"},
+                "total_zpts": {"$sum": "$zpts_amount"},
+            }}
+        ]).to_list(1)
+        return agg[0] if agg else {"entries": 0, "total_zwap": 0, "total_zpts": 0}
+    
+    summary, cached = await totals_service.get_totals().load(db, "rewards_ledger", query, summarize, exact=exact, tag="ledger_summary")
     
     return {
         "ledger": ledger,
-        "total_entries": total,
-        "totals": agg[0] if agg else {"total_zwap": 0, "total_zpts": 0},
+        "total_entries": summary["entries"],
+        "exact": not cached,
+        "cached": cached,
+        "totals": {"total_zwap": summary["total_zwap"], "total_zpts": summary["total_zpts"]},
         "skip": skip,
         "limit": limit,
     }
@@ -350,31 +404,34 @@ async def adjust_rewards(adjustment: RewardAdjustment):
     
     amount = -adjustment.amount if adjustment.is_deduction else adjustment.amount
     
-    # Update user balance
-    await db.users.update_one(
-        {"wallet_address": adjustment.user_id},
-        {"$inc": {"zwap_balance": amount}}
-    )
-    
-    # Record in ledger (immutable)
-    await db.rewards_ledger.insert_one({
-        "user_id": adjustment.user_id,
-        "zwap_amount": amount,
-        "zpts_amount": 0,
-        "source": "admin_adjustment",
-        "status": "earned",
-        "reason": adjustment.reason,
-        "timestamp": datetime.now(timezone.utc),
-        "is_adjustment": True,
-    })
-    
-    await db.admin_logs.insert_one({
+    async def apply(session):
+        # Update user balance
+        await db.users.update_one(
+            {"wallet_address": adjustment.user_id},
+            {"$inc": {"zwap_balance": amount}},
+            session=session,
+        )
+        
+        # Record in ledger (immutable)
+        await db.rewards_ledger.insert_one({
+            "user_id": adjustment.user_id,
+            "zwap_amount": amount,
+            "zpts_amount": 0,
+            "source": "admin_adjustment",
+            "status": "earned",
+            "reason": adjustment.reason,
+            "timestamp": datetime.now(timezone.utc),
+            "is_adjustment": True,
+        }, session=session)
+    
+    await outbox_service.get_outbox().run_with_audit(apply, {
         "action": "reward_adjustment",
         "target": adjustment.user_id,
         "amount": amount,
         "reason": adjustment.reason,
-        "timestamp": datetime.now(timezone.utc),
     })
+    # No wallet: an admin adjustment does not make the user active
+    analytics_rollup_service.get_rollups().record_reward(None, "admin_adjustment", zwap=amount)
     
     return {"success": True, "new_balance": user["zwap_balance"] + amount}
 
@@ -405,11 +462,10 @@ async def update_walk_config(config: WalkConfig):
         upsert=True
     )
     
-    await db.admin_logs.insert_one({
-        "action": "walk_config_update",
-        "changes": config.dict(),
-        "timestamp": datetime.now(timezone.utc),
-    })
+    # Apply on this worker now; other workers pick it up on their next refresh
+    anti_cheat_service.get_detector().configure(config.dict())
+    
+    outbox_service.log_admin_action("walk_config_update", changes=config.dict())
     
     return {"success": True, "config": config.dict()}
 
@@ -439,13 +495,14 @@ async def update_game_config(game_id: str, config: GameConfig):
     """Update a game's configuration"""
     from server import db
     
-    await db.game_configs.update_one(
-        {"game_id": game_id},
-        {"$set": config.dict()},
-        upsert=True
-    )
+    # Rebuilds the compiled rules table here and, via its version, on other workers
+    try:
+        result = await game_rules_service.update_game_config(db, game_id, config.dict())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    outbox_service.log_admin_action("game_config_update", target_id=game_id, changes=config.dict(exclude_none=True))
     
-    return {"success": True, "game_id": game_id}
+    return result
 
 
 @admin_router.post("/config/games/{game_id}/toggle", dependencies=[Depends(verify_admin)])
@@ -453,13 +510,9 @@ async def toggle_game(game_id: str, enabled: bool):
     """Enable or disable a game instantly"""
     from server import db
     
-    await db.game_configs.update_one(
-        {"game_id": game_id},
-        {"$set": {"enabled": enabled}},
-        upsert=True
-    )
+    result = await game_rules_service.update_game_config(db, game_id, {"enabled": enabled})
     
-    return {"success": True, "game_id": game_id, "enabled": enabled}
+    return {**result, "enabled": enabled}
 
 
 # --- Marketplace Admin ---
@@ -513,14 +566,14 @@ async def delete_marketplace_item(item_id: str):
 
 
 @admin_router.get("/marketplace/purchases", dependencies=[Depends(verify_admin)])
-async def get_purchase_logs(skip: int = 0, limit: int = 100):
+async def get_purchase_logs(skip: int = 0, limit: int = 100, exact: bool = False):
     """Get purchase logs"""
     from server import db
     
     purchases = await db.purchases.find({}, {"_id": 0}).sort("timestamp", -1).skip(skip).limit(limit).to_list(limit)
-    total = await db.purchases.count_documents({})
+    totals = await totals_service.get_totals().count(db, "purchases", exact=exact)
     
-    return {"purchases": purchases, "total": total}
+    return {"purchases": purchases, **totals}
 
 
 # --- Swap Config ---
@@ -608,31 +661,26 @@ async def treasury_action(action: TreasuryAction):
     from server import db
     
     if action.action == "pause_claims":
-        await db.system_config.update_one(
-            {"_id": "main"},
-            {"$set": {"claims_paused": True}},
-            upsert=True
-        )
+        update = {"claims_paused": True}
     elif action.action == "resume_claims":
-        await db.system_config.update_one(
-            {"_id": "main"},
-            {"$set": {"claims_paused": False}},
-            upsert=True
-        )
+        update = {"claims_paused": False}
     elif action.action == "set_daily_limit":
+        update = {"daily_claim_limit": action.value}
+    else:
+        raise HTTPException(status_code=400, detail="Unknown action")
+    
+    async def apply(session):
         await db.system_config.update_one(
             {"_id": "main"},
-            {"$set": {"daily_claim_limit": action.value}},
-            upsert=True
+            {"$set": update},
+            upsert=True,
+            session=session,
         )
-    else:
-        raise HTTPException(status_code=400, detail="Unknown action")
     
-    await db.admin_logs.insert_one({
+    await outbox_service.get_outbox().run_with_audit(apply, {
         "action": f"treasury_{action.action}",
         "value": action.value,
         "reason": action.reason,
-        "timestamp": datetime.now(timezone.utc),
     })
     
     return {"success": True, "action": action.action}
@@ -666,68 +714,28 @@ async def update_system_config(config: SystemConfig):
 
 # --- Admin Logs ---
 @admin_router.get("/logs", dependencies=[Depends(verify_admin)])
-async def get_admin_logs(skip: int = 0, limit: int = 100):
+async def get_admin_logs(skip: int = 0, limit: int = 100, exact: bool = False):
     """Get admin action logs"""
     from server import db
     
     logs = await db.admin_logs.find({}, {"_id": 0}).sort("timestamp", -1).skip(skip).limit(limit).to_list(limit)
-    total = await db.admin_logs.count_documents({})
+    totals = await totals_service.get_totals().count(db, "admin_logs", exact=exact)
     
-    return {"logs": logs, "total": total}
+    return {"logs": logs, **totals}
 
 
 # --- Analytics ---
 @admin_router.get("/analytics/overview", dependencies=[Depends(verify_admin)])
 async def get_analytics_overview(days: int = 30):
-    """Get analytics overview"""
+    """Get analytics overview (from the analytics_daily rollups)"""
     from server import db
     
-    now = datetime.now(timezone.utc)
-    start_date = now - timedelta(days=days)
-    
-    # Daily active users over time
-    dau_pipeline = [
-        {"$match": {"last_active": {"$gte": start_date}}},
-        {"$group": {
-            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$last_active"}},
-            "count": {"$sum": 1}
-        }},
-        {"$sort": {"_id": 1}}
-    ]
-    dau_data = await db.users.aggregate(dau_pipeline).to_list(days)
-    
-    # Rewards issued over time
-    rewards_pipeline = [
-        {"$match": {"timestamp": {"$gte": start_date}}},
-        {"$group": {
-            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
-            "zwap": {"$sum": "$zwap_amount"},
-            "zpts": {"$sum": "$zpts_amount"}
-        }},
-        {"$sort": {"_id": 1}}
-    ]
-    rewards_data = await db.rewards_ledger.aggregate(rewards_pipeline).to_list(days)
-    
-    # Top earners (potential whale risk)
-    top_earners = await db.users.find(
-        {}, {"_id": 0, "wallet_address": 1, "username": 1, "zwap_balance": 1, "total_earned": 1}
-    ).sort("zwap_balance", -1).limit(10).to_list(10)
-    
-    # Abuse flags
-    flagged_users = await db.users.count_documents({"fraud_flags": {"$exists": True, "$ne": []}})
-    
-    return {
-        "period_days": days,
-        "dau_trend": dau_data,
-        "rewards_trend": rewards_data,
-        "top_earners": top_earners,
-        "flagged_users": flagged_users,
-    }
+    return await analytics_service.get_overview(db, days=days)
 
 
 # --- Subscriptions ---
 @admin_router.get("/subscriptions", dependencies=[Depends(verify_admin)])
-async def get_subscriptions(skip: int = 0, limit: int = 50):
+async def get_subscriptions(skip: int = 0, limit: int = 50, exact: bool = False):
     """Get subscription data"""
     from server import db
     
@@ -736,6 +744,6 @@ async def get_subscriptions(skip: int = 0, limit: int = 50):
         {"_id": 0, "wallet_address": 1, "username": 1, "tier": 1, "subscription_started": 1}
     ).skip(skip).limit(limit).to_list(limit)
     
-    total = await db.users.count_documents({"tier": "plus"})
+    totals = await totals_service.get_totals().count(db, "users", {"tier": "plus"}, exact=exact)
     
-    return {"subscriptions": plus_users, "total": total}
+    return {"subscriptions": plus_users, **totals}
@@ -1,28 +1,147 @@
-from fastapi import APIRouter, Request
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 
+import services.analytics_rollup_service as analytics_rollup_service
+import services.game_rules_service as game_rules_service
+import services.game_session_service as game_session_service
+import services.play_limit_service as play_limit_service
+import services.reward_service as reward_service
+import services.trivia_seen_service as trivia_seen_service
+import services.trivia_service as trivia_service
+from services.reward_engine import get_user_tier_config
+
 router = APIRouter(prefix="/games", tags=["Play"])
 
 class TriviaAnswerRequest(BaseModel):
     questionId: str
     answer: str
     timeTaken: float
+    walletAddress: Optional[str] = None
+
+class GameResultRequest(BaseModel):
+    game_type: str
+    score: int
+    level: int = 1
+    blocks_destroyed: int = 0
+
+class SessionOpenRequest(BaseModel):
+    game_type: str
+
+class RoundResult(BaseModel):
+    round: int
+    score: int
+    level: int = 1
+    blocks_destroyed: int = 0
+    duration_seconds: float = Field(ge=0)
+
+class RoundBatch(BaseModel):
+    rounds: List[RoundResult]
+
+
+def _get_db(request: Request):
+    db = getattr(request.app.state, "db", None)
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database not initialized")
+    return db
+
+
+def _raise_for(e: Exception):
+    if isinstance(e, play_limit_service.PlayLimitExceeded):
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    if isinstance(e, PermissionError):
+        raise HTTPException(status_code=403, detail=str(e))
+    raise HTTPException(status_code=404, detail=str(e))
+
 
 @router.get("/trivia/questions")
-async def get_trivia_questions(count: int = 5, difficulty: str = "medium"):
-    # TODO: wire to real trivia source/service
-    # For now this just confirms the route exists and matches frontend calls.
-    return {"questions": [], "count": count, "difficulty": difficulty}
+async def get_trivia_questions(
+    count: int = 5,
+    difficulty: str = "medium",
+    exact: bool = False,
+    wallet_address: Optional[str] = None,
+):
+    # difficulty accepts 1-5 or easy/medium/hard; wallet_address skips already-answered questions
+    seen = await trivia_seen_service.get_cache().get(wallet_address.lower()) if wallet_address else 0
+    questions = trivia_service.get_questions(count, difficulty, exact=exact, seen=seen)
+    return {"questions": questions, "count": len(questions), "difficulty": difficulty}
 
 @router.post("/trivia/answer")
 async def check_trivia_answer(payload: TriviaAnswerRequest):
-    # TODO: wire to real trivia checking logic/service
-    return {"correct": False, "explanation": None}
+    ordinal = trivia_service.ordinal_of(payload.questionId)
+    if payload.walletAddress and ordinal is not None:
+        await trivia_seen_service.get_cache().mark_seen(payload.walletAddress.lower(), ordinal)
+    return trivia_service.check_answer(payload.questionId, payload.answer, payload.timeTaken)
 
 @router.post("/result/{wallet_address}")
-async def submit_game_result(wallet_address: str, request: Request):
-    # TODO: wire to real reward + zPts logic/service using request.app.state.db
-    body = await request.json()
-    return {"ok": True, "wallet": wallet_address, "received": body}
+async def submit_game_result(wallet_address: str, payload: GameResultRequest, request: Request):
+    """
+    One-shot result (single round). Fast games should use sessions instead.
+    """
+    db = _get_db(request)
+    rewards_by_tier = game_rules_service.get_rules().rewards_by_tier(
+        payload.game_type, payload.score, payload.level, payload.blocks_destroyed
+    )
+    base_zpts = rewards_by_tier["starter"]["zpts"]
+    limiter = play_limit_service.get_limiter()
+    try:
+        token = await limiter.acquire(wallet_address.lower(), payload.game_type)
+        try:
+            updated = await reward_service.credit_game_rewards(
+                db,
+                wallet_address.lower(),
+                payload.game_type,
+                {tier: r["zwap"] for tier, r in rewards_by_tier.items()},
+                base_zpts,
+            )
+        except (LookupError, PermissionError):
+            await limiter.release(token)
+            raise
+    except (LookupError, PermissionError) as e:
+        _raise_for(e)
+
+    credited = updated["last_game_reward"]
+    tier_config = get_user_tier_config(updated.get("tier", "starter"))
+    rollups = analytics_rollup_service.get_rollups()
+    rollups.record_game(wallet_address.lower(), payload.game_type)
+    rollups.record_reward(wallet_address.lower(), "game", zwap=credited["zwap"], zpts=credited["zpts"])
+    return {
+        "game": payload.game_type,
+        "score": payload.score,
+        "level": payload.level,
+        "zwap_earned": credited["zwap"],
+        "zpts_earned": credited["zpts"],
+        "zpts_capped": credited["zpts"] < base_zpts,
+        "daily_zpts_remaining": tier_config["daily_zpts_cap"] - updated.get("daily_zpts_earned", 0),
+        "new_zwap_balance": updated["zwap_balance"],
+        "new_zpts_balance": updated["zpts_balance"],
+    }
+
+
+# ===========================
+# SESSIONS
+# Open -> stream/batch rounds -> close. Rounds are validated and held in
+# memory; closing writes one game_sessions doc and one balance update.
+# ===========================
+@router.post("/sessions/{wallet_address}")
+async def open_game_session(wallet_address: str, payload: SessionOpenRequest, request: Request):
+    db = _get_db(request)
+    try:
+        return await game_session_service.open_session(db, wallet_address, payload.game_type)
+    except (LookupError, PermissionError) as e:
+        _raise_for(e)
+
+@router.post("/sessions/{session_id}/rounds")
+async def add_session_rounds(session_id: str, payload: RoundBatch):
+    try:
+        return game_session_service.add_rounds(session_id, [r.dict() for r in payload.rounds])
+    except LookupError as e:
+        _raise_for(e)
 
+@router.post("/sessions/{session_id}/close")
+async def close_game_session(session_id: str, request: Request):
+    db = _get_db(request)
+    try:
+        return await game_session_service.close_session(db, session_id)
+    except LookupError as e:
+        _raise_for(e)
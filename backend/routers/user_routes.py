@@ -1,6 +1,41 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel
+
+import services.activity_sketch_service as activity_sketch_service
+import services.analytics_rollup_service as analytics_rollup_service
+import services.user_service as user_service
 
 user_router = APIRouter(prefix="/user", tags=["User"])
 
 # Export canonical name expected by server.py
 router = user_router
+
+
+class ConnectRequest(BaseModel):
+    wallet_address: str
+
+
+def _get_db(request: Request):
+    db = getattr(request.app.state, "db", None)
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database not initialized")
+    return db
+
+
+@user_router.post("/connect")
+async def connect_wallet(payload: ConnectRequest, request: Request):
+    """
+    Returns the wallet's user, creating it on first connect (one upsert).
+    """
+    db = _get_db(request)
+    user, created = await user_service.connect_user(db, payload.wallet_address)
+    user.pop("_id", None)
+    wallet = user["wallet_address"]
+    # Rollups mark the wallet active, which also feeds the activity sketches
+    rollups = analytics_rollup_service.get_rollups()
+    if created:
+        rollups.record_reward(wallet, "signup", zwap=user_service.SIGNUP_BONUS_ZWAP)
+        activity_sketch_service.get_sketches().record(wallet, kind="new")
+    else:
+        rollups.record_active(wallet)
+    return {**user, "created": created}
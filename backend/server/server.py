@@ -27,11 +27,20 @@ SUBSCRIPTION_CURRENCY = os.environ.get("SUBSCRIPTION_CURRENCY", "usd")
 
 LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
 
+# Dev/benchmark only: explain every distinct query shape (see /api/admin/debug/query-audit)
+QUERY_AUDIT = os.environ.get("QUERY_AUDIT", "false").lower() == "true"
+
+# "timeseries" also writes step/game/reward events to time-series collections
+EVENT_STORE = os.environ.get("EVENT_STORE", "off").lower()
+
 # ===========================
 # DATABASE (MongoDB) SETUP
 # ===========================
 client = AsyncIOMotorClient(MONGO_URL)
 db = client[DB_NAME]
+if QUERY_AUDIT:
+    import services.query_audit_service as query_audit_service
+    db = query_audit_service.wrap(db)
 
 # ===========================
 # FASTAPI APP
@@ -39,6 +48,9 @@ db = client[DB_NAME]
 app = FastAPI(title="ZWAP! API", version="2.0.0")
 api_router = APIRouter(prefix="/api")
 
+# Routers read the database from app.state (see _get_db helpers)
+app.state.db = db
+
 @app.get("/favicon.ico", include_in_schema=False)
 async def favicon():
     return FileResponse("static/favicon.ico")
@@ -104,8 +116,53 @@ async def health():
 
 
 # ===========================
-# SHUTDOWN
+# STARTUP / SHUTDOWN
 # ===========================
+import services.abuse_detection_service as abuse_detection_service
+import services.activity_sketch_service as activity_sketch_service
+import services.analytics_rollup_service as analytics_rollup_service
+import services.cohort_service as cohort_service
+import services.event_store_service as event_store_service
+import services.game_rules_service as game_rules_service
+import services.game_session_service as game_session_service
+import services.index_service as index_service
+import services.play_limit_service as play_limit_service
+import services.trivia_seen_service as trivia_seen_service
+import services.trivia_service as trivia_service
+import services.whale_service as whale_service
+
+@app.on_event("startup")
+async def start_background_services():
+    await index_service.bootstrap_database(db)
+    await game_rules_service.load_rules(db)
+    game_rules_service.start_refresher(db)
+    await trivia_service.load_bank(db)
+    trivia_service.start_refresher(db)
+    trivia_seen_service.start_cache(db)
+    await play_limit_service.start_limiter(db)
+    analytics_rollup_service.start_rollups(db)
+    await abuse_detection_service.start_detector(db)
+    if EVENT_STORE == "timeseries":
+        await event_store_service.start_event_store(db)
+    activity_sketch_service.start_sketches(db)
+    await whale_service.start_whales(db)
+    cohort_service.start_cohorts(db)
+    game_session_service.start_reaper(db)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await cohort_service.stop_cohorts()
+    await game_session_service.stop_reaper(db)
+    await whale_service.stop_whales()
+    await activity_sketch_service.stop_sketches()
+    await event_store_service.stop_event_store()
+    await abuse_detection_service.stop_detector()
+    await analytics_rollup_service.stop_rollups()
+    await play_limit_service.stop_limiter()
+    await trivia_seen_service.stop_cache()
+    await trivia_service.stop_refresher()
+    await game_rules_service.stop_refresher()
+    if QUERY_AUDIT:
+        await query_audit_service.get_auditor().drain()
+        query_audit_service.get_auditor().log_report()
     client.close()
@@ -10,11 +10,32 @@ from typing import List, Optional, Dict
 import uuid
 from datetime import datetime, timezone, timedelta
 import httpx
-import random
 from web3 import Web3
 import asyncio
 from functools import lru_cache
 
+import services.abuse_detection_service as abuse_detection_service
+import services.activity_sketch_service as activity_sketch_service
+import services.analytics_rollup_service as analytics_rollup_service
+import services.anti_cheat_service as anti_cheat_service
+import services.cohort_service as cohort_service
+import services.event_store_service as event_store_service
+import services.game_rules_service as game_rules_service
+import services.index_service as index_service
+import services.outbox_service as outbox_service
+import services.play_limit_service as play_limit_service
+import services.reward_service as reward_service
+import services.scratch_service as scratch_service
+import services.step_sync_service as step_sync_service
+import services.totals_service as totals_service
+import services.trivia_seen_service as trivia_seen_service
+import services.trivia_service as trivia_service
+import services.user_cache_service as user_cache_service
+import services.user_search_service as user_search_service
+import services.user_service as user_service
+import services.whale_service as whale_service
+from services.reward_engine import TIERS, calculate_step_rewards, get_user_tier_config
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
@@ -86,27 +107,6 @@ if w3 and w3.is_connected():
     )
     logging.info(f"Connected to Polygon. ZWAP contract loaded at {ZWAP_CONTRACT_ADDRESS}")
 
-TIERS = {
-    "starter": {
-        "name": "Starter",
-        "price": 0,
-        "zwap_multiplier": 1.0,
-        "daily_zpts_cap": 75,
-        "monthly_zwap_cap": 146250,
-        "games": ["zbrickles", "ztrivia"],
-        "features": ["zWALK", "ads"]
-    },
-    "plus": {
-        "name": "Plus",
-        "price": 12.99,
-        "zwap_multiplier": 1.5,
-        "daily_zpts_cap": 150,
-        "monthly_zwap_cap": 219375,
-        "games": ["zbrickles", "ztrivia", "ztetris", "zslots"],
-        "features": ["zWALK", "no_ads", "zDance", "zWorkout"]
-    }
-}
-
 ZPTS_TO_ZWAP_RATE = 1000  # 1000 Z Points = 1 ZWAP
 
 # ============ MODELS ============
@@ -134,6 +134,17 @@ class UserResponse(BaseModel):
 class StepsUpdate(BaseModel):
     steps: int
 
+class StepSample(BaseModel):
+    timestamp: datetime  # end of the pedometer sampling interval
+    steps: int = Field(ge=0)
+
+class WalletStepSamples(BaseModel):
+    wallet_address: str
+    samples: List[StepSample]
+
+class StepSyncRequest(BaseModel):
+    wallets: List[WalletStepSamples]
+
 class GameResult(BaseModel):
     game_type: str
     score: int
@@ -144,6 +155,7 @@ class TriviaAnswer(BaseModel):
     question_id: str
     answer: str
     time_taken: float  # seconds
+    wallet_address: Optional[str] = None  # enables no-repeat tracking
 
 class ConvertZPtsRequest(BaseModel):
     zpts_amount: int
@@ -211,69 +223,6 @@ async def get_crypto_prices():
         logging.error(f"Error fetching prices: {e}")
     return {"BTC": 65000, "ETH": 3500, "POL": 0.85, "SOL": 150, "ZWAP": 0.01}
 
-def calculate_step_rewards(steps: int, multiplier: float = 1.0) -> float:
-    """Tiered earning system for steps"""
-    if steps < 1000:
-        base = steps * 0.01
-    elif steps < 5000:
-        base = 10 + (steps - 1000) * 0.02
-    elif steps < 10000:
-        base = 90 + (steps - 5000) * 0.03
-    else:
-        base = 240 + (steps - 10000) * 0.05
-    return base * multiplier
-
-def calculate_game_rewards(game_type: str, score: int, level: int, blocks: int = 0, multiplier: float = 1.0) -> dict:
-    """Calculate ZWAP and Z Points rewards for games with progressive difficulty"""
-    # Base rewards scale with level difficulty
-    difficulty_multiplier = 1 + (level - 1) * 0.1  # Harder levels = slightly more reward
-    
-    if game_type == "zbrickles":
-        base_zwap = min(blocks * 0.5 + (score / 100), 50)  # Cap per game
-        base_zpts = min(blocks + (score // 50), 10)  # Cap Z Points
-    elif game_type == "ztrivia":
-        base_zwap = min(score * 0.5, 30)  # Per correct answer
-        base_zpts = min(score * 2, 8)
-    elif game_type == "ztetris":
-        base_zwap = min((score / 100) + (level * 2), 75)
-        base_zpts = min((score // 100) + level, 12)
-    elif game_type == "zslots":
-        base_zwap = min(score * 0.3, 40)
-        base_zpts = min(score // 10, 8)
-    else:
-        base_zwap = 0
-        base_zpts = 0
-    
-    return {
-        "zwap": round(base_zwap * difficulty_multiplier * multiplier, 2),
-        "zpts": int(base_zpts * difficulty_multiplier)
-    }
-
-async def check_and_reset_daily_zpts(user: dict) -> dict:
-    """Check if daily Z Points should be reset"""
-    now = datetime.now(timezone.utc)
-    last_reset = user.get("last_zpts_reset")
-    
-    if last_reset:
-        last_reset_dt = datetime.fromisoformat(last_reset.replace('Z', '+00:00'))
-        if last_reset_dt.date() < now.date():
-            # Reset daily Z Points
-            await db.users.update_one(
-                {"id": user["id"]},
-                {"$set": {"daily_zpts_earned": 0, "last_zpts_reset": now.isoformat()}}
-            )
-            user["daily_zpts_earned"] = 0
-    else:
-        await db.users.update_one(
-            {"id": user["id"]},
-            {"$set": {"last_zpts_reset": now.isoformat()}}
-        )
-    
-    return user
-
-def get_user_tier_config(tier: str) -> dict:
-    return TIERS.get(tier, TIERS["starter"])
-
 async def get_onchain_zwap_balance(wallet_address: str) -> Optional[float]:
     """Get ZWAP balance from Polygon blockchain"""
     if not zwap_contract or not w3:
@@ -304,36 +253,30 @@ async def get_onchain_zwap_balance(wallet_address: str) -> Optional[float]:
 async def connect_wallet(user_data: UserCreate):
     """Connect wallet and create/get user"""
     wallet = user_data.wallet_address.lower()
-    existing = await db.users.find_one({"wallet_address": wallet}, {"_id": 0})
+    cache = user_cache_service.get_cache()
+    existing = cache.peek(wallet)
+    rollups = analytics_rollup_service.get_rollups()
     
     if existing:
+        rollups.record_active(wallet)
         return UserResponse(**existing)
     
-    new_user = {
-        "id": str(uuid.uuid4()),
-        "wallet_address": wallet,
-        "zwap_balance": 100.0,
-        "zpts_balance": 0,
-        "tier": "starter",
-        "subscription_id": None,
-        "subscription_status": None,
-        "total_steps": 0,
-        "daily_steps": 0,
-        "daily_zpts_earned": 0,
-        "last_zpts_reset": datetime.now(timezone.utc).isoformat(),
-        "games_played": 0,
-        "total_earned": 100.0,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    
-    await db.users.insert_one(new_user)
-    return UserResponse(**{k: v for k, v in new_user.items() if k != "_id"})
+    # Not cached: the upsert is the read. Idempotent under concurrent
+    # connects thanks to the unique wallet index
+    user, created = await user_service.connect_user(db, wallet)
+    cache.put(user)
+    if created:
+        rollups.record_reward(wallet, "signup", zwap=user_service.SIGNUP_BONUS_ZWAP)
+        activity_sketch_service.get_sketches().record(wallet, kind="new")
+    else:
+        rollups.record_active(wallet)
+    return UserResponse(**{k: v for k, v in user.items() if k != "_id"})
 
 @api_router.get("/users/{wallet_address}", response_model=UserResponse)
 async def get_user(wallet_address: str):
     """Get user by wallet address"""
     wallet = wallet_address.lower()
-    user = await db.users.find_one({"wallet_address": wallet}, {"_id": 0})
+    user = await user_cache_service.get_cache().get(wallet)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return UserResponse(**user)
@@ -346,23 +289,22 @@ class ProfileUpdate(BaseModel):
 async def update_profile(wallet_address: str, profile: ProfileUpdate):
     """Update user profile (username and avatar)"""
     wallet = wallet_address.lower()
-    user = await db.users.find_one({"wallet_address": wallet})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    cache = user_cache_service.get_cache()
     
     update_data = {}
     if profile.username:
         update_data["custom_username"] = profile.username
+        update_data.update(user_search_service.search_fields(wallet, profile.username))
     if profile.avatar_url:
         update_data["avatar_url"] = profile.avatar_url
     
     if update_data:
-        await db.users.update_one(
-            {"wallet_address": wallet},
-            {"$set": update_data}
-        )
-    
-    updated = await db.users.find_one({"wallet_address": wallet}, {"_id": 0})
+        updated = await cache.update(wallet, {"$set": update_data})
+        totals_service.get_totals().bump("users")
+    else:
+        updated = await cache.get(wallet)
+    if not updated:
+        raise HTTPException(status_code=404, detail="User not found")
     return updated
 
 @api_router.get("/tiers")
@@ -433,31 +375,67 @@ async def get_contract_info():
 
 # ============ FAUCET ENDPOINTS (MOVE) ============
 
+@api_router.post("/faucet/steps/batch")
+async def sync_steps_batch(sync_data: StepSyncRequest):
+    """Bulk step sync for many wallets (partner backfills, offline clients)"""
+    try:
+        return await step_sync_service.sync_step_samples(db, [(b.wallet_address, b.samples) for b in sync_data.wallets])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.post("/faucet/steps/{wallet_address}/batch")
+async def sync_wallet_steps(wallet_address: str, samples: List[StepSample]):
+    """Sync a wallet's time-stamped pedometer samples in one request"""
+    try:
+        result = await step_sync_service.sync_step_samples(db, [(wallet_address, samples)])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result["not_found"]:
+        raise HTTPException(status_code=404, detail="User not found")
+    if result["conflicts"]:
+        raise HTTPException(status_code=409, detail="Concurrent step sync, please retry")
+    summary = result["results"][0]
+    return {
+        **summary,
+        "message": f"Earned {summary['rewards_earned']:.2f} ZWAP for {summary['steps_counted']} steps!"
+    }
+
 @api_router.post("/faucet/steps/{wallet_address}")
 async def claim_step_rewards(wallet_address: str, steps_data: StepsUpdate):
     """Claim ZWAP rewards for steps (no Z Points from walking)"""
     wallet = wallet_address.lower()
-    user = await db.users.find_one({"wallet_address": wallet})
+    cache = user_cache_service.get_cache()
+    user = await cache.get(wallet)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
+    # Spike check against the walk config's 5-minute threshold (in memory, no extra reads)
+    detector = anti_cheat_service.get_detector()
+    screen = detector.check(wallet, steps_data.steps)
+    steps = screen["credited"]
+    
     tier_config = get_user_tier_config(user.get("tier", "starter"))
-    rewards = calculate_step_rewards(steps_data.steps, tier_config["zwap_multiplier"])
+    rewards = calculate_step_rewards(steps, tier_config["zwap_multiplier"])
     
-    await db.users.update_one(
-        {"wallet_address": wallet},
+    updated_user = await cache.update(
+        wallet,
         {
-            "$inc": {"zwap_balance": rewards, "total_steps": steps_data.steps, "total_earned": rewards},
-            "$set": {"daily_steps": steps_data.steps}
+            "$inc": {"zwap_balance": rewards, "total_steps": steps, "total_earned": rewards},
+            "$set": {"daily_steps": steps}
         }
     )
-    
-    updated_user = await db.users.find_one({"wallet_address": wallet}, {"_id": 0})
+    if not updated_user:
+        detector.release(wallet, screen)
+        raise HTTPException(status_code=404, detail="User not found")
+    rollups = analytics_rollup_service.get_rollups()
+    rollups.record_steps(wallet, steps)
+    rollups.record_reward(wallet, "steps", zwap=rewards)
     return {
-        "steps_counted": steps_data.steps,
+        "steps_counted": steps,
+        "steps_flagged": screen["flagged"],
         "rewards_earned": rewards,
         "new_balance": updated_user["zwap_balance"],
-        "message": f"Earned {rewards:.2f} ZWAP for {steps_data.steps} steps!"
+        "message": f"Earned {rewards:.2f} ZWAP for {steps} steps!"
     }
 
 # ============ GAME ENDPOINTS ============
@@ -466,139 +444,107 @@ async def claim_step_rewards(wallet_address: str, steps_data: StepsUpdate):
 async def submit_game_result(wallet_address: str, game_data: GameResult):
     """Submit game result and claim rewards (ZWAP + Z Points)"""
     wallet = wallet_address.lower()
-    user = await db.users.find_one({"wallet_address": wallet})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    tier_config = get_user_tier_config(user.get("tier", "starter"))
-    
-    # Check if game is available for user's tier
-    if game_data.game_type not in tier_config["games"]:
-        raise HTTPException(status_code=403, detail=f"Game not available in {tier_config['name']} tier")
-    
-    # Check daily Z Points cap
-    user = await check_and_reset_daily_zpts(user)
-    daily_zpts = user.get("daily_zpts_earned", 0)
-    zpts_cap = tier_config["daily_zpts_cap"]
-    
-    # Calculate rewards
-    rewards = calculate_game_rewards(
-        game_data.game_type, 
-        game_data.score, 
-        game_data.level,
-        game_data.blocks_destroyed,
-        tier_config["zwap_multiplier"]
+    # Per-game coefficients, caps and access come from the compiled game_configs table
+    rewards_by_tier = game_rules_service.get_rules().rewards_by_tier(
+        game_data.game_type, game_data.score, game_data.level, game_data.blocks_destroyed
     )
+    base_zpts = rewards_by_tier["starter"]["zpts"]  # zPts do not scale with tier
     
-    # Cap Z Points to daily limit
-    zpts_to_add = min(rewards["zpts"], zpts_cap - daily_zpts)
-    if zpts_to_add < 0:
-        zpts_to_add = 0
-    
-    await db.users.update_one(
-        {"wallet_address": wallet},
-        {
-            "$inc": {
-                "zwap_balance": rewards["zwap"],
-                "zpts_balance": zpts_to_add,
-                "games_played": 1,
-                "total_earned": rewards["zwap"],
-                "daily_zpts_earned": zpts_to_add
-            }
-        }
-    )
-    
-    updated_user = await db.users.find_one({"wallet_address": wallet}, {"_id": 0})
+    # Cooldown / daily play limit from in-memory counters, then one pipeline
+    # update: tier check, daily zPts reset + cap, balance increments
+    limiter = play_limit_service.get_limiter()
+    try:
+        token = await limiter.acquire(wallet, game_data.game_type)
+        try:
+            updated_user = await reward_service.credit_game_rewards(
+                db,
+                wallet,
+                game_data.game_type,
+                {tier: r["zwap"] for tier, r in rewards_by_tier.items()},
+                base_zpts,
+            )
+        except (LookupError, PermissionError):
+            await limiter.release(token)
+            raise
+    except play_limit_service.PlayLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    
+    user_cache_service.get_cache().put(updated_user)
+    tier_config = get_user_tier_config(updated_user.get("tier", "starter"))
+    credited = updated_user["last_game_reward"]
+    rollups = analytics_rollup_service.get_rollups()
+    rollups.record_game(wallet, game_data.game_type)
+    rollups.record_reward(wallet, "game", zwap=credited["zwap"], zpts=credited["zpts"])
     
     return {
         "game": game_data.game_type,
         "score": game_data.score,
         "level": game_data.level,
-        "zwap_earned": rewards["zwap"],
-        "zpts_earned": zpts_to_add,
-        "zpts_capped": zpts_to_add < rewards["zpts"],
-        "daily_zpts_remaining": zpts_cap - updated_user.get("daily_zpts_earned", 0),
+        "zwap_earned": credited["zwap"],
+        "zpts_earned": credited["zpts"],
+        "zpts_capped": credited["zpts"] < base_zpts,
+        "daily_zpts_remaining": tier_config["daily_zpts_cap"] - updated_user.get("daily_zpts_earned", 0),
         "new_zwap_balance": updated_user["zwap_balance"],
         "new_zpts_balance": updated_user["zpts_balance"],
-        "message": f"Earned {rewards['zwap']:.2f} ZWAP + {zpts_to_add} zPts!"
+        "message": f"Earned {credited['zwap']:.2f} ZWAP + {credited['zpts']} zPts!"
     }
 
 @api_router.get("/games/trivia/questions")
-async def get_trivia_questions(count: int = 5, difficulty: int = 1):
-    """Get trivia questions for the game"""
-    # Sample trivia questions (in production, fetch from DB)
-    all_questions = [
-        {"id": "q1", "question": "What is the largest cryptocurrency by market cap?", "options": ["Bitcoin", "Ethereum", "Solana", "Cardano"], "answer": "Bitcoin", "difficulty": 1},
-        {"id": "q2", "question": "Who created Bitcoin?", "options": ["Vitalik Buterin", "Satoshi Nakamoto", "Charles Hoskinson", "Gavin Wood"], "answer": "Satoshi Nakamoto", "difficulty": 1},
-        {"id": "q3", "question": "What does NFT stand for?", "options": ["New Financial Token", "Non-Fungible Token", "Network File Transfer", "Node Full Transaction"], "answer": "Non-Fungible Token", "difficulty": 1},
-        {"id": "q4", "question": "What blockchain does Ethereum use?", "options": ["Proof of Work", "Proof of Stake", "Delegated PoS", "Proof of Authority"], "answer": "Proof of Stake", "difficulty": 2},
-        {"id": "q5", "question": "What is a smart contract?", "options": ["Legal document", "Self-executing code", "Paper contract", "Bank agreement"], "answer": "Self-executing code", "difficulty": 2},
-        {"id": "q6", "question": "What year was Bitcoin created?", "options": ["2007", "2008", "2009", "2010"], "answer": "2009", "difficulty": 2},
-        {"id": "q7", "question": "What is DeFi short for?", "options": ["Decentralized Finance", "Digital Finance", "Distributed Files", "Default Interest"], "answer": "Decentralized Finance", "difficulty": 2},
-        {"id": "q8", "question": "What is gas in Ethereum?", "options": ["Fuel for cars", "Transaction fees", "Mining reward", "Token type"], "answer": "Transaction fees", "difficulty": 3},
-        {"id": "q9", "question": "What is a DAO?", "options": ["Digital Asset Order", "Decentralized Autonomous Organization", "Data Access Object", "Distributed App Operator"], "answer": "Decentralized Autonomous Organization", "difficulty": 3},
-        {"id": "q10", "question": "What is the max supply of Bitcoin?", "options": ["10 million", "21 million", "100 million", "Unlimited"], "answer": "21 million", "difficulty": 3},
-    ]
-    
-    # Filter by difficulty and randomize
-    filtered = [q for q in all_questions if q["difficulty"] <= difficulty + 1]
-    selected = random.sample(filtered, min(count, len(filtered)))
-    
-    # Remove answers from response
-    return [{"id": q["id"], "question": q["question"], "options": q["options"], "difficulty": q["difficulty"]} for q in selected]
+async def get_trivia_questions(count: int = 5, difficulty: int = 1, wallet_address: Optional[str] = None):
+    """Get trivia questions for the game (sampled from the in-memory bank, answers excluded)"""
+    seen = await trivia_seen_service.get_cache().get(wallet_address.lower()) if wallet_address else 0
+    return trivia_service.get_questions(count, difficulty, seen=seen)
 
 @api_router.post("/games/trivia/answer")
 async def check_trivia_answer(answer: TriviaAnswer):
     """Check trivia answer"""
-    answers = {
-        "q1": "Bitcoin", "q2": "Satoshi Nakamoto", "q3": "Non-Fungible Token",
-        "q4": "Proof of Stake", "q5": "Self-executing code", "q6": "2009",
-        "q7": "Decentralized Finance", "q8": "Transaction fees",
-        "q9": "Decentralized Autonomous Organization", "q10": "21 million"
-    }
-    
-    correct = answers.get(answer.question_id) == answer.answer
-    # Bonus for fast answers
-    time_bonus = max(0, 1 - (answer.time_taken / 30)) if correct else 0
-    
+    result = trivia_service.check_answer(answer.question_id, answer.answer, answer.time_taken)
+    ordinal = trivia_service.ordinal_of(answer.question_id)
+    if answer.wallet_address and ordinal is not None:
+        await trivia_seen_service.get_cache().mark_seen(answer.wallet_address.lower(), ordinal)
     return {
-        "correct": correct,
-        "correct_answer": answers.get(answer.question_id),
-        "time_bonus": round(time_bonus, 2)
+        "correct": result["correct"],
+        "correct_answer": result["correct_answer"],
+        "time_bonus": result["time_bonus"]
     }
 
 @api_router.post("/faucet/scratch/{wallet_address}")
 async def scratch_to_win(wallet_address: str):
-    """Scratch card bonus"""
+    """Scratch card bonus (pre-generated, provably fair card; see /faucet/scratch/batches)"""
     wallet = wallet_address.lower()
-    user = await db.users.find_one({"wallet_address": wallet})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    won = random.random() < 0.3
-    amount = random.choice([5, 10, 25, 50, 100]) if won else 0
-    
-    if won:
-        await db.users.update_one(
-            {"wallet_address": wallet},
-            {"$inc": {"zwap_balance": amount, "total_earned": amount}}
-        )
+    try:
+        result = await scratch_service.get_engine().play(wallet)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    await user_cache_service.get_cache().invalidate(wallet)
+    analytics_rollup_service.get_rollups().record_reward(wallet, "scratch", zwap=result["amount"])
     
-    updated_user = await db.users.find_one({"wallet_address": wallet}, {"_id": 0})
+    amount = result["amount"]
     return {
-        "won": won,
-        "amount": amount,
-        "new_balance": updated_user["zwap_balance"],
-        "message": f"You won {amount} ZWAP!" if won else "Better luck next time!"
+        **result,
+        "message": f"You won {amount} ZWAP!" if result["won"] else "Better luck next time!"
     }
 
+@api_router.get("/faucet/scratch/batches/{batch_id}")
+async def get_scratch_batch(batch_id: str):
+    """Commitment of a scratch card batch, plus its seed once revealed"""
+    try:
+        return await scratch_service.get_batch(db, batch_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
 # ============ Z POINTS CONVERSION ============
 
 @api_router.post("/zpts/convert/{wallet_address}")
 async def convert_zpts_to_zwap(wallet_address: str, convert_data: ConvertZPtsRequest):
     """Convert Z Points to ZWAP (1000 zPts = 1 ZWAP)"""
     wallet = wallet_address.lower()
-    user = await db.users.find_one({"wallet_address": wallet})
+    cache = user_cache_service.get_cache()
+    user = await cache.get(wallet)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -610,14 +556,14 @@ async def convert_zpts_to_zwap(wallet_address: str, convert_data: ConvertZPtsReq
     
     zwap_amount = convert_data.zpts_amount / ZPTS_TO_ZWAP_RATE
     
-    await db.users.update_one(
-        {"wallet_address": wallet},
-        {
-            "$inc": {"zpts_balance": -convert_data.zpts_amount, "zwap_balance": zwap_amount}
-        }
+    # The cached balance may be stale, so the debit re-checks it atomically
+    updated_user = await cache.update(
+        wallet,
+        {"$inc": {"zpts_balance": -convert_data.zpts_amount, "zwap_balance": zwap_amount}},
+        {"zpts_balance": {"$gte": convert_data.zpts_amount}}
     )
-    
-    updated_user = await db.users.find_one({"wallet_address": wallet}, {"_id": 0})
+    if not updated_user:
+        raise HTTPException(status_code=400, detail="Insufficient Z Points")
     return {
         "zpts_converted": convert_data.zpts_amount,
         "zwap_received": zwap_amount,
@@ -701,8 +647,8 @@ async def activate_subscription(wallet_address: str, session_id: str):
         raise HTTPException(status_code=400, detail="Already activated")
     
     # Update user tier
-    await db.users.update_one(
-        {"wallet_address": wallet},
+    await user_cache_service.get_cache().update(
+        wallet,
         {
             "$set": {
                 "tier": "plus",
@@ -711,6 +657,7 @@ async def activate_subscription(wallet_address: str, session_id: str):
             }
         }
     )
+    totals_service.get_totals().bump("users")
     
     # Mark as activated
     await db.payment_transactions.update_one(
@@ -770,7 +717,8 @@ async def get_shop_items():
 async def purchase_item(wallet_address: str, purchase: PurchaseRequest):
     """Purchase item with ZWAP or Z Points"""
     wallet = wallet_address.lower()
-    user = await db.users.find_one({"wallet_address": wallet})
+    cache = user_cache_service.get_cache()
+    user = await cache.get(wallet)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -788,19 +736,25 @@ async def purchase_item(wallet_address: str, purchase: PurchaseRequest):
             raise HTTPException(status_code=400, detail="Item not available for Z Points")
         if user.get("zpts_balance", 0) < item["price_zpts"]:
             raise HTTPException(status_code=400, detail="Insufficient Z Points")
-        await db.users.update_one(
-            {"wallet_address": wallet},
-            {"$inc": {"zpts_balance": -item["price_zpts"]}}
+        updated_user = await cache.update(
+            wallet,
+            {"$inc": {"zpts_balance": -item["price_zpts"]}},
+            {"zpts_balance": {"$gte": item["price_zpts"]}}
         )
+        if not updated_user:
+            raise HTTPException(status_code=400, detail="Insufficient Z Points")
         price_paid = item["price_zpts"]
         currency = "zpts"
     else:
         if user["zwap_balance"] < item["price_zwap"]:
             raise HTTPException(status_code=400, detail="Insufficient ZWAP balance")
-        await db.users.update_one(
-            {"wallet_address": wallet},
-            {"$inc": {"zwap_balance": -item["price_zwap"]}}
+        updated_user = await cache.update(
+            wallet,
+            {"$inc": {"zwap_balance": -item["price_zwap"]}},
+            {"zwap_balance": {"$gte": item["price_zwap"]}}
         )
+        if not updated_user:
+            raise HTTPException(status_code=400, detail="Insufficient ZWAP balance")
         price_paid = item["price_zwap"]
         currency = "zwap"
     
@@ -814,8 +768,7 @@ async def purchase_item(wallet_address: str, purchase: PurchaseRequest):
         "currency": currency,
         "purchased_at": datetime.now(timezone.utc).isoformat()
     })
-    
-    updated_user = await db.users.find_one({"wallet_address": wallet}, {"_id": 0})
+    analytics_rollup_service.get_rollups().record_purchase(wallet, currency, price_paid)
     
     return {
         "success": True,
@@ -836,7 +789,8 @@ async def get_prices():
 @api_router.post("/swap/execute/{wallet_address}", response_model=SwapResponse)
 async def execute_swap(wallet_address: str, swap: SwapRequest):
     wallet = wallet_address.lower()
-    user = await db.users.find_one({"wallet_address": wallet})
+    cache = user_cache_service.get_cache()
+    user = await cache.get(wallet)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -857,9 +811,11 @@ async def execute_swap(wallet_address: str, swap: SwapRequest):
     rate = from_price / to_price
     
     if swap.from_token == "ZWAP":
-        await db.users.update_one({"wallet_address": wallet}, {"$inc": {"zwap_balance": -swap.amount}})
+        debited = await cache.update(wallet, {"$inc": {"zwap_balance": -swap.amount}}, {"zwap_balance": {"$gte": swap.amount}})
+        if not debited:
+            raise HTTPException(status_code=400, detail="Insufficient ZWAP balance")
     elif swap.to_token == "ZWAP":
-        await db.users.update_one({"wallet_address": wallet}, {"$inc": {"zwap_balance": to_amount}})
+        await cache.update(wallet, {"$inc": {"zwap_balance": to_amount}})
     
     swap_record = {
         "id": str(uuid.uuid4()),
@@ -873,6 +829,7 @@ async def execute_swap(wallet_address: str, swap: SwapRequest):
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
     await db.swaps.insert_one(swap_record)
+    analytics_rollup_service.get_rollups().record_swap(wallet, fee)
     
     return SwapResponse(
         from_token=swap.from_token, to_token=swap.to_token, from_amount=swap.amount,
@@ -967,7 +924,7 @@ async def get_user_rank(wallet_address: str, category: str):
     else:
         raise HTTPException(status_code=400, detail="Invalid category")
     
-    user = await db.users.find_one({"wallet_address": wallet})
+    user = await user_cache_service.get_cache().get(wallet)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -1044,6 +1001,45 @@ app.add_middleware(
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+@app.on_event("startup")
+async def start_background_services():
+    # Migrations, index registry and COLLSCAN check before serving traffic
+    await index_service.bootstrap_database(db)
+    outbox_service.start_outbox(
+        db,
+        durable=os.environ.get("ADMIN_AUDIT_DURABLE", "false").lower() == "true",
+    )
+    await anti_cheat_service.start_detector(db)
+    await game_rules_service.load_rules(db)
+    game_rules_service.start_refresher(db)
+    await trivia_service.load_bank(db)
+    trivia_service.start_refresher(db)
+    trivia_seen_service.start_cache(db)
+    await play_limit_service.start_limiter(db)
+    scratch_service.start_engine(db)
+    user_cache_service.start_cache(db)
+    analytics_rollup_service.start_rollups(db)
+    await abuse_detection_service.start_detector(db)
+    if os.environ.get("EVENT_STORE", "off").lower() == "timeseries":
+        await event_store_service.start_event_store(db)
+    activity_sketch_service.start_sketches(db)
+    await whale_service.start_whales(db)
+    cohort_service.start_cohorts(db)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await cohort_service.stop_cohorts()
+    await whale_service.stop_whales()
+    await activity_sketch_service.stop_sketches()
+    await event_store_service.stop_event_store()
+    await abuse_detection_service.stop_detector()
+    await analytics_rollup_service.stop_rollups()
+    await user_cache_service.stop_cache()
+    await scratch_service.stop_engine()
+    await play_limit_service.stop_limiter()
+    await trivia_seen_service.stop_cache()
+    await trivia_service.stop_refresher()
+    await game_rules_service.stop_refresher()
+    await anti_cheat_service.stop_detector()
+    await outbox_service.stop_outbox()
     client.close()
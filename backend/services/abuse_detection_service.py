@@ -0,0 +1,444 @@
+"""
+Streaming abuse detection over reward events.
+
+Every reward recorded through the analytics rollups is also fed to
+`AbuseDetector.observe`, which keeps, per worker and in memory only:
+
+  - per-wallet exponentially decayed reward and event rates (short burst
+    window), evicted once a wallet goes quiet;
+  - a Count-Min sketch per hour of ZWAP by wallet, summed over the last 24
+    hours for volume checks without per-wallet history. Estimates only
+    err upwards, by up to e/width of the hour's total, so a wallet is
+    flagged only when its estimate minus that bound is over the threshold.
+    Each hour's width is sized from recent traffic to keep the bound a
+    small fraction of the threshold;
+  - a Space-Saving summary of decayed ZWAP by wallet (forward decay), which
+    is the "top suspects" list.
+
+Crossing a threshold raises a flag: logged, buffered and written to
+`fraud_flags` and `users.fraud_flags` by the background task, the same way
+the step spike detector does. Thresholds live in system_config
+"abuse_config" and are refreshed periodically. Counts are per worker, so
+with N workers each one sees roughly 1/N of a wallet's traffic; thresholds
+should be set with that in mind.
+"""
+import asyncio
+import hashlib
+import heapq
+import logging
+import math
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from pymongo.errors import PyMongoError
+
+import services.analytics_rollup_service as analytics_rollup_service
+from services.anti_cheat_service import persist_flags
+
+logger = logging.getLogger(__name__)
+
+REWARD_BURST_FLAG = "reward_burst"
+REWARD_VOLUME_FLAG = "reward_volume"
+
+DEFAULT_BURST_HALF_LIFE = 300.0          # seconds; short-window rate decay
+DEFAULT_BURST_ZWAP_PER_HOUR = 2000.0
+DEFAULT_BURST_EVENTS_PER_MINUTE = 30.0
+BURST_MIN_EVENTS = 3.0                   # one large reward alone is not a burst
+DEFAULT_DAILY_ZWAP = 10000.0             # matches the old detect_abuse threshold
+DEFAULT_SUSPECT_HALF_LIFE = 3600.0       # seconds; top-suspects decay
+DEFAULT_TOP_K = 500                      # Space-Saving counters
+DEFAULT_FLAG_COOLDOWN = 3600.0           # seconds before the same wallet/flag fires again
+DEFAULT_FLUSH_INTERVAL = 5.0
+DEFAULT_CONFIG_REFRESH = 60.0
+DEFAULT_MAX_PENDING_FLAGS = 10000
+
+CMS_WIDTH = 2048                         # minimum width
+CMS_MAX_WIDTH = 1 << 16                  # 2 MB per hourly sketch at depth 4 (float64)
+CMS_DEPTH = 4
+CMS_HOURS = 24
+CMS_ERROR_BUDGET = 0.05                  # target 24h error bound, as a fraction of daily_zwap
+
+# Sources that are not user-driven and never count towards abuse
+IGNORED_SOURCES = ("admin_adjustment", "signup")
+
+
+# -------------------------
+# Sketches
+# -------------------------
+
+def _hash_pair(key: str) -> Tuple[int, int]:
+    digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+
+
+class CountMinSketch:
+    """
+    Over-estimates per-key totals by at most e/width of the sketch total
+    with probability 1 - exp(-depth).
+    """
+
+    def __init__(self, width: int = CMS_WIDTH, depth: int = CMS_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.float64)
+        self.total = 0.0
+
+    @staticmethod
+    def width_for(expected_total: float, max_error: float) -> int:
+        """
+        Power-of-two width keeping e/width * expected_total under
+        max_error, within [CMS_WIDTH, CMS_MAX_WIDTH].
+        """
+        if max_error <= 0 or expected_total <= 0:
+            return CMS_WIDTH
+        needed = math.e * expected_total / max_error
+        width = CMS_WIDTH
+        while width < needed and width < CMS_MAX_WIDTH:
+            width <<= 1
+        return width
+
+    def _cells(self, hashed: Tuple[int, int]):
+        h1, h2 = hashed
+        return [(i, (h1 + i * h2) % self.width) for i in range(self.depth)]
+
+    def add(self, key: str, amount: float, hashed: Optional[Tuple[int, int]] = None) -> None:
+        for cell in self._cells(hashed or _hash_pair(key)):
+            self.table[cell] += amount
+        self.total += amount
+
+    def estimate(self, key: str, hashed: Optional[Tuple[int, int]] = None) -> float:
+        return float(min(self.table[cell] for cell in self._cells(hashed or _hash_pair(key))))
+
+    @property
+    def error_bound(self) -> float:
+        return math.e / self.width * self.total
+
+
+class SpaceSaving:
+    """
+    Top-k heavy hitters by weight: keeps k counters, and a new key replaces
+    the smallest one, inheriting its count as the error bound.
+    """
+
+    def __init__(self, k: int = DEFAULT_TOP_K):
+        self.k = k
+        self.counts: Dict[str, float] = {}
+        self.errors: Dict[str, float] = {}
+
+    def add(self, key: str, weight: float) -> None:
+        if key in self.counts:
+            self.counts[key] += weight
+            return
+        if len(self.counts) < self.k:
+            self.counts[key] = weight
+            self.errors[key] = 0.0
+            return
+        victim = min(self.counts, key=self.counts.__getitem__)
+        floor = self.counts.pop(victim)
+        self.errors.pop(victim, None)
+        self.counts[key] = floor + weight
+        self.errors[key] = floor
+
+    def scale(self, factor: float) -> None:
+        for key in self.counts:
+            self.counts[key] *= factor
+            self.errors[key] *= factor
+
+    def top(self, n: int) -> List[Tuple[str, float, float]]:
+        return [(k, c, self.errors[k]) for k, c in heapq.nlargest(n, self.counts.items(), key=lambda kv: kv[1])]
+
+
+class _Rate:
+    """
+    Exponentially decayed sums of ZWAP and events for one wallet.
+    """
+    __slots__ = ("zwap", "events", "at")
+
+    def __init__(self, at: float):
+        self.zwap = 0.0
+        self.events = 0.0
+        self.at = at
+
+    def decay_to(self, now: float, decay: float) -> None:
+        if now > self.at:
+            factor = math.exp(-decay * (now - self.at))
+            self.zwap *= factor
+            self.events *= factor
+            self.at = now
+
+
+# -------------------------
+# Detector
+# -------------------------
+
+class AbuseDetector:
+    def __init__(
+        self,
+        db,
+        *,
+        burst_half_life: float = DEFAULT_BURST_HALF_LIFE,
+        burst_zwap_per_hour: float = DEFAULT_BURST_ZWAP_PER_HOUR,
+        burst_events_per_minute: float = DEFAULT_BURST_EVENTS_PER_MINUTE,
+        daily_zwap: float = DEFAULT_DAILY_ZWAP,
+        suspect_half_life: float = DEFAULT_SUSPECT_HALF_LIFE,
+        top_k: int = DEFAULT_TOP_K,
+        flag_cooldown: float = DEFAULT_FLAG_COOLDOWN,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        config_refresh: float = DEFAULT_CONFIG_REFRESH,
+    ):
+        self.db = db
+        self.burst_decay = math.log(2) / burst_half_life
+        self.burst_zwap_per_hour = burst_zwap_per_hour
+        self.burst_events_per_minute = burst_events_per_minute
+        self.daily_zwap = daily_zwap
+        self.suspect_decay = math.log(2) / suspect_half_life
+        self.flag_cooldown = flag_cooldown
+        self.flush_interval = flush_interval
+        self.config_refresh = config_refresh
+        self.enabled = True
+
+        self._rates: Dict[str, _Rate] = {}
+        self._hourly: Dict[int, CountMinSketch] = {}     # epoch hour -> sketch
+        self._hourly_total = 0.0                         # ZWAP across all kept sketches
+        self._suspects = SpaceSaving(top_k)
+        self._landmark = time.time()                     # forward-decay reference time
+        self._last_flagged: Dict[Tuple[str, str], float] = {}
+        self._pending_flags: List[Dict[str, Any]] = []
+        self._task: Optional[asyncio.Task] = None
+        self.events_seen = 0
+
+    # -------------------------
+    # Config
+    # -------------------------
+
+    def configure(self, config: Dict[str, Any]) -> None:
+        self.burst_zwap_per_hour = float(config.get("burst_zwap_per_hour", self.burst_zwap_per_hour))
+        self.burst_events_per_minute = float(config.get("burst_events_per_minute", self.burst_events_per_minute))
+        self.daily_zwap = float(config.get("daily_zwap", self.daily_zwap))
+        self.enabled = bool(config.get("enabled", True))
+
+    async def load_config(self) -> None:
+        try:
+            config = await self.db.system_config.find_one({"_id": "abuse_config"})
+        except PyMongoError as e:
+            logger.warning(f"Abuse detection config refresh failed: {e}")
+            return
+        if config:
+            self.configure(config)
+
+    # -------------------------
+    # Hot path
+    # -------------------------
+
+    def observe(self, wallet: Optional[str], source: str, zwap: float = 0, zpts: float = 0, now: Optional[float] = None) -> None:
+        """
+        Consumes one reward event. O(1) apart from a Space-Saving eviction.
+        """
+        if not self.enabled or not wallet or source in IGNORED_SOURCES:
+            return
+        now = now or time.time()
+        zwap = max(0.0, float(zwap))
+        self.events_seen += 1
+
+        rate = self._rates.get(wallet)
+        if rate is None:
+            rate = self._rates[wallet] = _Rate(now)
+        rate.decay_to(now, self.burst_decay)
+        rate.zwap += zwap
+        rate.events += 1
+
+        hour = int(now // 3600)
+        sketch = self._hourly.get(hour)
+        if sketch is None:
+            for old in [h for h in self._hourly if h <= hour - CMS_HOURS]:
+                self._hourly_total -= self._hourly.pop(old).total
+            sketch = self._hourly[hour] = CountMinSketch(width=self._next_width())
+        hashed = _hash_pair(wallet)
+        sketch.add(wallet, zwap, hashed)
+        self._hourly_total += zwap
+
+        if self.suspect_decay * (now - self._landmark) > 20:
+            # Move the forward-decay landmark before weights overflow
+            self._suspects.scale(math.exp(-self.suspect_decay * (now - self._landmark)))
+            self._landmark = now
+        self._suspects.add(wallet, zwap * math.exp(self.suspect_decay * (now - self._landmark)))
+
+        # A decayed sum S approximates rate / decay, so rate = S * decay
+        zwap_per_hour = rate.zwap * self.burst_decay * 3600
+        events_per_minute = rate.events * self.burst_decay * 60
+        bursting = zwap_per_hour > self.burst_zwap_per_hour or events_per_minute > self.burst_events_per_minute
+        if bursting and rate.events >= BURST_MIN_EVENTS:
+            self._flag(wallet, REWARD_BURST_FLAG, now, {
+                "source": source,
+                "zwap_per_hour": round(zwap_per_hour, 2),
+                "events_per_minute": round(events_per_minute, 2),
+            })
+        # No wallet can be over the daily threshold unless all wallets together are
+        if zwap and self._hourly_total > self.daily_zwap:
+            daily = self.daily_volume(wallet, hashed)
+            error = self.daily_error()
+            if daily - error > self.daily_zwap:
+                self._flag(wallet, REWARD_VOLUME_FLAG, now, {
+                    "source": source,
+                    "zwap_24h": round(daily, 2),
+                    "zwap_24h_min": round(daily - error, 2),
+                })
+
+    def _next_width(self) -> int:
+        # Size for the busiest recent hour so a steady day stays within budget
+        busiest = max((sketch.total for sketch in self._hourly.values()), default=0.0)
+        return CountMinSketch.width_for(busiest, CMS_ERROR_BUDGET * self.daily_zwap / CMS_HOURS)
+
+    def daily_volume(self, wallet: str, hashed: Optional[Tuple[int, int]] = None) -> float:
+        """
+        Estimated ZWAP rewarded to `wallet` over the last 24 hours (never under).
+        """
+        hashed = hashed or _hash_pair(wallet)
+        return sum(sketch.estimate(wallet, hashed) for sketch in self._hourly.values())
+
+    def daily_error(self) -> float:
+        """
+        How far any daily_volume may be over the truth (e/width of each
+        hour's total, summed).
+        """
+        return sum(sketch.error_bound for sketch in self._hourly.values())
+
+    def _flag(self, wallet: str, flag: str, now: float, details: Dict[str, Any]) -> None:
+        key = (wallet, flag)
+        if now - self._last_flagged.get(key, 0.0) < self.flag_cooldown:
+            return
+        self._last_flagged[key] = now
+        logger.warning(f"Abuse alert {flag} for {wallet}: {details}")
+        if len(self._pending_flags) >= DEFAULT_MAX_PENDING_FLAGS:
+            return
+        self._pending_flags.append({
+            "_id": uuid.uuid4().hex,  # stable across retries, so a re-insert is a no-op
+            "wallet_address": wallet,
+            "type": flag,
+            **details,
+            "timestamp": datetime.fromtimestamp(now, timezone.utc),
+        })
+
+    # -------------------------
+    # Reads (memory only)
+    # -------------------------
+
+    def top_suspects(self, limit: int = 20, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        now = now or time.time()
+        to_now = math.exp(-self.suspect_decay * (now - self._landmark))
+        suspects = []
+        for wallet, weight, error in self._suspects.top(limit):
+            rate = self._rates.get(wallet)
+            if rate is not None:
+                rate.decay_to(now, self.burst_decay)
+            suspects.append({
+                "wallet_address": wallet,
+                "score": round(weight * to_now, 2),           # decayed ZWAP, suspect half-life
+                "score_error": round(error * to_now, 2),
+                "zwap_24h": round(self.daily_volume(wallet), 2),
+                "zwap_24h_min": round(max(0.0, self.daily_volume(wallet) - self.daily_error()), 2),
+                "zwap_per_hour": round(rate.zwap * self.burst_decay * 3600, 2) if rate else 0.0,
+                "events_per_minute": round(rate.events * self.burst_decay * 60, 2) if rate else 0.0,
+                "flags": sorted(f for (w, f), at in self._last_flagged.items() if w == wallet and now - at < self.flag_cooldown),
+            })
+        return suspects
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "events_seen": self.events_seen,
+            "tracked_wallets": len(self._rates),
+            "pending_flags": len(self._pending_flags),
+            "daily_error": round(self.daily_error(), 2),
+            "thresholds": {
+                "burst_zwap_per_hour": self.burst_zwap_per_hour,
+                "burst_events_per_minute": self.burst_events_per_minute,
+                "daily_zwap": self.daily_zwap,
+            },
+        }
+
+    # -------------------------
+    # Background
+    # -------------------------
+
+    def maintain(self, now: Optional[float] = None) -> None:
+        """
+        Evicts quiet wallets and expired cooldowns.
+        """
+        now = now or time.time()
+        for wallet in [w for w, r in self._rates.items() if now - r.at > 10 / self.burst_decay]:
+            del self._rates[wallet]
+        for key in [k for k, at in self._last_flagged.items() if now - at >= self.flag_cooldown]:
+            del self._last_flagged[key]
+
+    async def flush(self) -> None:
+        if not self._pending_flags:
+            return
+        flags, self._pending_flags = self._pending_flags, []
+        retry = await persist_flags(self.db, flags)
+        self._pending_flags = retry + self._pending_flags
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_refresh = loop.time() + self.config_refresh
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                self.maintain()
+                if loop.time() >= next_refresh:
+                    await self.load_config()
+                    next_refresh = loop.time() + self.config_refresh
+            except Exception as e:  # keep the task alive
+                logger.error(f"Abuse detection background task failed: {e}")
+
+
+# -------------------------
+# Module-level singleton
+# -------------------------
+
+_detector: Optional[AbuseDetector] = None
+
+
+async def start_detector(db, **kwargs) -> AbuseDetector:
+    """
+    Creates the process-wide detector, loads its config and starts
+    flushing. Subscribes to reward events, so start the rollups first.
+    """
+    global _detector
+    if _detector is None:
+        _detector = AbuseDetector(db, **kwargs)
+        await _detector.load_config()
+        _detector.start()
+        analytics_rollup_service.get_rollups().subscribe(_detector.observe)
+    return _detector
+
+
+async def stop_detector() -> None:
+    global _detector
+    if _detector is not None:
+        analytics_rollup_service.get_rollups().unsubscribe(_detector.observe)
+        await _detector.stop()
+        _detector = None
+
+
+def get_detector() -> AbuseDetector:
+    if _detector is None:
+        raise RuntimeError("Abuse detector not started")
+    return _detector
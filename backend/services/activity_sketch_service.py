@@ -0,0 +1,309 @@
+"""
+HyperLogLog sketches of active and new wallets per UTC day.
+
+A wallet counts as active when it acts itself: every wallet the analytics
+rollups record (rewards, games, steps, purchases, swaps) plus wallet
+connects. Each worker folds wallets into in-memory sketches and merges
+them into `activity_sketches` (one zlib-compressed register array per
+kind and day) every few seconds. Any window is the register-wise max of its days, so
+DAU/WAU/MAU cost at most 30 small reads regardless of user count, with a
+standard error of 1.04 / sqrt(2 ** PRECISION) (~0.8%).
+
+Retention uses inclusion-exclusion on the sketches
+(|A ∩ B| = |A| + |B| - |A ∪ B|), so its absolute error is a few percent of
+the larger of the two sets; small cohorts against large active sets are
+noisy and reported with their error bound.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from bson import Binary
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+import services.analytics_rollup_service as analytics_rollup_service
+
+logger = logging.getLogger(__name__)
+
+SKETCH_COLLECTION = "activity_sketches"
+PRECISION = 14                           # 2**14 registers, 16 KB raw per sketch
+DEFAULT_FLUSH_INTERVAL = 10.0            # seconds between merges into Mongo
+MAX_MERGE_ATTEMPTS = 5                   # optimistic-concurrency retries per sketch
+PAST_CACHE_DAYS = 400                    # finished days kept decoded in memory
+KINDS = ("active", "new")
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# -------------------------
+# Sketch
+# -------------------------
+
+class HyperLogLog:
+    def __init__(self, precision: int = PRECISION, registers: Optional[np.ndarray] = None):
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = registers if registers is not None else np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, item: str) -> None:
+        h = int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), "big")
+        rest_bits = 64 - self.p
+        index = h >> rest_bits
+        rest = h & ((1 << rest_bits) - 1)
+        rank = rest_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> float:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int32))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)   # linear counting for small sets
+        return estimate
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(self.m)
+
+    def is_empty(self) -> bool:
+        return not self.registers.any()
+
+    def copy(self) -> "HyperLogLog":
+        return HyperLogLog(self.p, self.registers.copy())
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(self.registers.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes, precision: int = PRECISION) -> "HyperLogLog":
+        return cls(precision, np.frombuffer(zlib.decompress(data), dtype=np.uint8).copy())
+
+    @classmethod
+    def union(cls, sketches: Iterable["HyperLogLog"], precision: int = PRECISION) -> "HyperLogLog":
+        merged = cls(precision)
+        for sketch in sketches:
+            merged.merge(sketch)
+        return merged
+
+
+def _sketch_id(kind: str, day: str) -> str:
+    return f"{kind}:{day}"
+
+
+# -------------------------
+# Per-worker recorder
+# -------------------------
+
+class ActivitySketches:
+    """
+    Buffers wallets into per-(kind, day) sketches and merges them into Mongo
+    with a version compare-and-set, so concurrent workers never lose
+    registers.
+    """
+
+    def __init__(self, db, *, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.db = db
+        self.flush_interval = flush_interval
+        self._dirty: Dict[Tuple[str, str], HyperLogLog] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, wallet: str, kind: str = "active", now: Optional[datetime] = None) -> None:
+        if not wallet:
+            return
+        day = (now or _utc_now()).astimezone(timezone.utc).date().isoformat()
+        sketch = self._dirty.get((kind, day))
+        if sketch is None:
+            sketch = self._dirty[(kind, day)] = HyperLogLog()
+        sketch.add(wallet)
+
+    async def _merge_into(self, kind: str, day: str, sketch: HyperLogLog) -> bool:
+        collection = self.db[SKETCH_COLLECTION]
+        _id = _sketch_id(kind, day)
+        for _ in range(MAX_MERGE_ATTEMPTS):
+            doc = await collection.find_one({"_id": _id})
+            merged = sketch.copy()
+            if doc is None:
+                try:
+                    await collection.insert_one({
+                        "_id": _id, "kind": kind, "day": day, "precision": PRECISION,
+                        "registers": Binary(merged.to_bytes()), "version": 1, "updated_at": _utc_now(),
+                    })
+                    return True
+                except DuplicateKeyError:
+                    continue  # another worker created it first; merge into theirs
+            merged.merge(HyperLogLog.from_bytes(doc["registers"], doc.get("precision", PRECISION)))
+            result = await collection.update_one(
+                {"_id": _id, "version": doc["version"]},
+                {"$set": {"registers": Binary(merged.to_bytes()), "updated_at": _utc_now()}, "$inc": {"version": 1}},
+            )
+            if result.modified_count:
+                return True
+        return False
+
+    async def flush(self) -> None:
+        dirty, self._dirty = self._dirty, {}
+        for (kind, day), sketch in dirty.items():
+            try:
+                merged = await self._merge_into(kind, day, sketch)
+            except PyMongoError as e:
+                logger.warning(f"Failed to merge {kind} sketch for {day}, will retry: {e}")
+                merged = False
+            if not merged:
+                pending = self._dirty.get((kind, day))
+                self._dirty[(kind, day)] = sketch.merge(pending) if pending is not None else sketch
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:  # keep the task alive
+                logger.error(f"Activity sketch flush failed: {e}")
+
+
+# -------------------------
+# Reads
+# -------------------------
+
+# Finished days no longer change (bar a late flush within seconds of midnight)
+_past: Dict[str, HyperLogLog] = {}
+
+
+async def load_sketches(db, kind: str, days: List[date]) -> Dict[str, HyperLogLog]:
+    """
+    Sketches for the given days (empty ones for days with no activity).
+    Days before yesterday are cached in memory once read.
+    """
+    keys = [d.isoformat() for d in days]
+    out = {k: _past[_sketch_id(kind, k)] for k in keys if _sketch_id(kind, k) in _past}
+    missing = [k for k in keys if k not in out]
+    if missing:
+        docs = await db[SKETCH_COLLECTION].find(
+            {"_id": {"$in": [_sketch_id(kind, k) for k in missing]}}
+        ).to_list(length=len(missing))
+        loaded = {d["day"]: HyperLogLog.from_bytes(d["registers"], d.get("precision", PRECISION)) for d in docs}
+        cutoff = (_utc_now().date() - timedelta(days=1)).isoformat()
+        for k in missing:
+            sketch = loaded.get(k, HyperLogLog())
+            out[k] = sketch
+            if k < cutoff and len(_past) < PAST_CACHE_DAYS * len(KINDS):
+                _past[_sketch_id(kind, k)] = sketch
+    return out
+
+
+def _window(end: date, days: int) -> List[date]:
+    return [end - timedelta(days=n) for n in range(days)]
+
+
+def _estimate(sketch: HyperLogLog) -> Dict[str, Any]:
+    count = sketch.count()
+    return {"estimate": int(round(count)), "error": int(math.ceil(count * sketch.relative_error))}
+
+
+async def count_window(db, end: date, days: int, kind: str = "active") -> Dict[str, Any]:
+    """
+    Distinct wallets over the `days` days ending on `end` (inclusive), with
+    a one-standard-error bound.
+    """
+    sketches = await load_sketches(db, kind, _window(end, days))
+    return _estimate(HyperLogLog.union(sketches.values()))
+
+
+async def active_users(db, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    DAU/WAU/MAU as of today, from one read of the last 30 days' sketches.
+    """
+    today = (now or _utc_now()).date()
+    sketches = await load_sketches(db, "active", _window(today, 30))
+    ordered = [sketches[d.isoformat()] for d in _window(today, 30)]
+    return {
+        "dau": _estimate(ordered[0]),
+        "wau": _estimate(HyperLogLog.union(ordered[:7])),
+        "mau": _estimate(HyperLogLog.union(ordered)),
+        "relative_error": round(ordered[0].relative_error, 4),
+    }
+
+
+async def retention_curve(db, cohort_day: date, days: int = 30) -> Dict[str, Any]:
+    """
+    Share of wallets first seen on `cohort_day` that were active N days
+    later, for N in 1..days (days still in the future are omitted).
+    """
+    last = min(cohort_day + timedelta(days=days), _utc_now().date())
+    new = (await load_sketches(db, "new", [cohort_day]))[cohort_day.isoformat()]
+    active = await load_sketches(db, "active", [cohort_day + timedelta(days=n) for n in range(1, (last - cohort_day).days + 1)])
+    cohort = new.count()
+    curve = []
+    for n in range(1, (last - cohort_day).days + 1):
+        day_sketch = active[(cohort_day + timedelta(days=n)).isoformat()]
+        union = new.copy().merge(day_sketch).count()
+        retained = max(0.0, cohort + day_sketch.count() - union)
+        curve.append({
+            "day": n,
+            "retained": int(round(retained)),
+            "rate": round(retained / cohort, 4) if cohort else 0.0,
+            "error": int(math.ceil((union + max(cohort, day_sketch.count())) * new.relative_error)),
+        })
+    return {"cohort_day": cohort_day.isoformat(), "cohort_size": _estimate(new), "curve": curve}
+
+
+# -------------------------
+# Module-level singleton
+# -------------------------
+
+_sketches: Optional[ActivitySketches] = None
+
+
+def start_sketches(db, **kwargs) -> ActivitySketches:
+    """
+    Starts merging and subscribes to the rollups' activity (wallets that
+    earned, played, stepped, bought, swapped or connected). Start after
+    the rollups.
+    """
+    global _sketches
+    if _sketches is None:
+        _sketches = ActivitySketches(db, **kwargs)
+        analytics_rollup_service.get_rollups().subscribe_active(_sketches.record)
+        _sketches.start()
+    return _sketches
+
+
+async def stop_sketches() -> None:
+    global _sketches
+    if _sketches is not None:
+        analytics_rollup_service.get_rollups().unsubscribe_active(_sketches.record)
+        await _sketches.stop()
+        _sketches = None
+
+
+def get_sketches() -> ActivitySketches:
+    if _sketches is None:
+        raise RuntimeError("Activity sketches not started")
+    return _sketches
@@ -0,0 +1,475 @@
+"""
+Daily analytics rollups.
+
+One `analytics_daily` document per UTC day (`_id` "YYYY-MM-DD") holds DAU,
+rewards issued by source, games played per game, purchases and swaps, so
+overview queries read one small document per day instead of grouping raw
+collections.
+
+Write paths call `get_rollups().record_*()`. Increments are buffered per
+worker and flushed as `$inc` upserts every few seconds. Reward events are
+also passed to subscribers (the abuse detector), and reward, game and
+step events to event subscribers (the time-series event store). DAU is
+exact across workers: the first activity of a wallet on a day upserts an
+`analytics_active` marker and only newly inserted markers bump the counter.
+
+A nightly compaction (one worker, under a system_config lock) rebuilds the
+fields of recent days that have a durable raw record (game sessions,
+scratch plays, admin adjustments, purchases, swaps, activity markers),
+correcting increments lost in a crash. Sources without a raw log (one-shot
+game results, steps, signup bonuses) keep their incremental values.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+DAILY_COLLECTION = "analytics_daily"
+ACTIVE_COLLECTION = "analytics_active"    # one marker per (day, wallet), TTL'd
+ACTIVE_RETENTION = timedelta(days=8)
+LOCK_ID = "analytics_compaction_lock"     # system_config _id
+LOCK_TTL = timedelta(minutes=15)
+
+DEFAULT_FLUSH_INTERVAL = 5.0              # seconds between $inc flushes
+DEFAULT_COMPACT_CHECK_INTERVAL = 600.0    # seconds between "is compaction due" checks
+COMPACT_AFTER = timedelta(minutes=30)     # past midnight UTC, once late flushes have landed
+COMPACT_LOOKBACK_DAYS = 7                 # uncompacted days older than this are left alone
+MAX_OVERVIEW_DAYS = 366
+DUPLICATE_KEY = 11000
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def day_key(ts: datetime) -> str:
+    return ts.astimezone(timezone.utc).date().isoformat() if ts.tzinfo else ts.date().isoformat()
+
+
+def _day_bounds(day: date):
+    start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+# -------------------------
+# Incremental rollups
+# -------------------------
+
+class DailyRollups:
+    """
+    Per-worker buffer of rollup increments, flushed to `analytics_daily`.
+
+    Document shape:
+        {"_id": "2026-01-31", "date": <day start>, "dau": int,
+         "rewards": {source: {"zwap", "zpts", "count"}},
+         "games": {"result": {game: n}, "session": {game: n}},
+         "purchases": {"count", "zwap", "zpts"},
+         "swaps": {"count", "fees_usd"},
+         "steps": {"total"},
+         "updated_at", "compacted_at"}
+    """
+
+    def __init__(
+        self,
+        db,
+        *,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        compact_check_interval: float = DEFAULT_COMPACT_CHECK_INTERVAL,
+    ):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.compact_check_interval = compact_check_interval
+
+        self._incs: Dict[str, Dict[str, float]] = {}       # day -> {dotted path: delta}
+        self._marked: Dict[str, Set[str]] = {}             # day -> wallets this worker already marked
+        self._new_active: Dict[str, Set[str]] = {}         # day -> markers to upsert on the next flush
+        self._listeners: List[Callable[..., None]] = []
+        self._event_listeners: List[Callable[..., None]] = []
+        self._active_listeners: List[Callable[..., None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    # -------------------------
+    # Recording (synchronous, memory only)
+    # -------------------------
+
+    def _inc(self, day: str, path: str, amount: float) -> None:
+        if amount:
+            incs = self._incs.setdefault(day, {})
+            incs[path] = incs.get(path, 0) + amount
+
+    def record_active(self, wallet: Optional[str], now: Optional[datetime] = None) -> str:
+        day = day_key(now or _utc_now())
+        marked = self._marked.setdefault(day, set())
+        if wallet and wallet not in marked:
+            marked.add(wallet)
+            self._new_active.setdefault(day, set()).add(wallet)
+            for listener in self._active_listeners:
+                try:
+                    listener(wallet, now=now)
+                except Exception as e:  # never fail the write path
+                    logger.error(f"Activity listener failed: {e}")
+        return day
+
+    def record_reward(self, wallet: Optional[str], source: str, zwap: float = 0, zpts: float = 0, now: Optional[datetime] = None) -> None:
+        day = self.record_active(wallet, now)
+        self._inc(day, f"rewards.{source}.zwap", zwap)
+        self._inc(day, f"rewards.{source}.zpts", zpts)
+        self._inc(day, f"rewards.{source}.count", 1)
+        for listener in self._listeners:
+            try:
+                listener(wallet, source, zwap, zpts)
+            except Exception as e:  # never fail the write path
+                logger.error(f"Reward event listener failed: {e}")
+        self._emit("rewards", wallet, {"source": source, "zwap": zwap, "zpts": zpts}, now)
+
+    def _emit(self, kind: str, wallet: Optional[str], fields: Dict[str, Any], now: Optional[datetime]) -> None:
+        for listener in self._event_listeners:
+            try:
+                listener(kind, wallet, fields, now or _utc_now())
+            except Exception as e:  # never fail the write path
+                logger.error(f"Activity event listener failed: {e}")
+
+    def subscribe(self, listener: Callable[..., None]) -> None:
+        """
+        Calls listener(wallet, source, zwap, zpts) on every recorded reward.
+        """
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[..., None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def subscribe_events(self, listener: Callable[..., None]) -> None:
+        """
+        Calls listener(kind, wallet, fields, ts) for every "rewards", "games"
+        and "steps" event.
+        """
+        self._event_listeners.append(listener)
+
+    def unsubscribe_events(self, listener: Callable[..., None]) -> None:
+        if listener in self._event_listeners:
+            self._event_listeners.remove(listener)
+
+    def subscribe_active(self, listener: Callable[..., None]) -> None:
+        """
+        Calls listener(wallet, now=ts) the first time this worker sees a
+        wallet active on a day.
+        """
+        self._active_listeners.append(listener)
+
+    def unsubscribe_active(self, listener: Callable[..., None]) -> None:
+        if listener in self._active_listeners:
+            self._active_listeners.remove(listener)
+
+    def record_game(self, wallet: str, game_type: str, origin: str = "result", games: int = 1, now: Optional[datetime] = None) -> None:
+        """
+        origin: "result" (one-shot submit) or "session" (closed game session).
+        """
+        day = self.record_active(wallet, now)
+        self._inc(day, f"games.{origin}.{game_type}", games)
+        self._emit("games", wallet, {"game_type": game_type, "origin": origin, "games": games}, now)
+
+    def record_steps(self, wallet: str, steps: int, now: Optional[datetime] = None) -> None:
+        day = self.record_active(wallet, now)
+        self._inc(day, "steps.total", steps)
+        self._emit("steps", wallet, {"steps": steps}, now)
+
+    def record_purchase(self, wallet: str, currency: str, price: float, now: Optional[datetime] = None) -> None:
+        day = self.record_active(wallet, now)
+        self._inc(day, "purchases.count", 1)
+        self._inc(day, f"purchases.{currency}", price)
+
+    def record_swap(self, wallet: str, fee_usd: float, now: Optional[datetime] = None) -> None:
+        day = self.record_active(wallet, now)
+        self._inc(day, "swaps.count", 1)
+        self._inc(day, "swaps.fees_usd", fee_usd)
+
+    # -------------------------
+    # Flush
+    # -------------------------
+
+    async def _upsert_markers(self, day: str, wallets: Set[str]) -> int:
+        """
+        Inserts activity markers and returns how many were new. Failed
+        markers (other than lost insert races) go back into the buffer.
+        """
+        expires_at = _day_bounds(date.fromisoformat(day))[0] + ACTIVE_RETENTION
+        ordered = sorted(wallets)
+        ops = [
+            UpdateOne(
+                {"_id": f"{day}:{w}"},
+                {"$setOnInsert": {"day": day, "wallet_address": w, "expires_at": expires_at}},
+                upsert=True,
+            )
+            for w in ordered
+        ]
+        try:
+            result = await self.db[ACTIVE_COLLECTION].bulk_write(ops, ordered=False)
+            return result.upserted_count
+        except BulkWriteError as e:
+            retry = {ordered[err["index"]] for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY}
+            if retry:
+                self._new_active.setdefault(day, set()).update(retry)
+            return e.details.get("nUpserted", 0)
+
+    async def flush(self) -> None:
+        now = _utc_now()
+        # Only today's and yesterday's markers can still be hit
+        keep = {day_key(now), day_key(now - timedelta(days=1))}
+        for day in [d for d in self._marked if d not in keep]:
+            del self._marked[day]
+
+        markers, self._new_active = self._new_active, {}
+        try:
+            for day, wallets in markers.items():
+                self._inc(day, "dau", await self._upsert_markers(day, wallets))
+        except PyMongoError as e:
+            # Re-upserting markers that did land is harmless: they are no longer new
+            logger.warning(f"Failed to record activity markers, will retry: {e}")
+            for day, wallets in markers.items():
+                self._new_active.setdefault(day, set()).update(wallets)
+
+        if not self._incs:
+            return
+        incs, self._incs = self._incs, {}
+        ops = [
+            UpdateOne(
+                {"_id": day},
+                {"$inc": deltas, "$set": {"updated_at": now}, "$setOnInsert": {"date": _day_bounds(date.fromisoformat(day))[0]}},
+                upsert=True,
+            )
+            for day, deltas in incs.items()
+        ]
+        try:
+            await self.db[DAILY_COLLECTION].bulk_write(ops, ordered=False)
+        except PyMongoError as e:
+            logger.warning(f"Failed to flush analytics rollups for {len(incs)} days, will retry: {e}")
+            for day, deltas in incs.items():
+                for path, amount in deltas.items():
+                    self._inc(day, path, amount)
+
+    # -------------------------
+    # Lifecycle
+    # -------------------------
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        since_check = self.compact_check_interval  # check once soon after startup
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                since_check += self.flush_interval
+                if since_check >= self.compact_check_interval:
+                    since_check = 0.0
+                    await compact_due_days(self.db)
+            except Exception as e:  # keep the task alive
+                logger.error(f"Analytics rollup background task failed: {e}")
+
+
+# -------------------------
+# Compaction
+# -------------------------
+
+async def _group(db, collection: str, match: Dict[str, Any], group: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return await db[collection].aggregate([{"$match": match}, {"$group": group}]).to_list(length=None)
+
+
+async def compact_day(db, day: date) -> Dict[str, Any]:
+    """
+    Recomputes one day's rebuildable fields from the raw collections and
+    $sets them, leaving incremental-only sources untouched. Returns the
+    fields written.
+    """
+    start, end = _day_bounds(day)
+    start_iso, end_iso = start.date().isoformat(), end.date().isoformat()   # purchases/swaps store ISO strings
+    fields: Dict[str, Any] = {}
+
+    # Only credited sessions count, matching what close_session records
+    sessions = await _group(db, "game_sessions", {
+        "timestamp": {"$gte": start, "$lt": end}, "status": {"$ne": "rejected"}, "rounds": {"$gt": 0},
+    }, {
+        "_id": "$game_type",
+        "games": {"$sum": "$rounds"},
+        "closed": {"$sum": 1},
+        "zwap": {"$sum": "$zwap_earned"},
+        "zpts": {"$sum": "$zpts_earned"},
+    })
+    fields["games.session"] = {s["_id"]: s["games"] for s in sessions if s["_id"]}
+    fields["rewards.game_session"] = {
+        "zwap": round(sum(s["zwap"] for s in sessions), 2),
+        "zpts": sum(s["zpts"] for s in sessions),
+        "count": sum(s["closed"] for s in sessions),
+    }
+
+    scratch = await _group(db, "scratch_plays", {"timestamp": {"$gte": start, "$lt": end}}, {
+        "_id": None, "count": {"$sum": 1}, "zwap": {"$sum": "$amount"},
+    })
+    fields["rewards.scratch"] = {
+        "zwap": scratch[0]["zwap"] if scratch else 0,
+        "zpts": 0,
+        "count": scratch[0]["count"] if scratch else 0,
+    }
+
+    adjustments = await _group(db, "rewards_ledger", {"source": "admin_adjustment", "timestamp": {"$gte": start, "$lt": end}}, {
+        "_id": None, "count": {"$sum": 1}, "zwap": {"$sum": "$zwap_amount"}, "zpts": {"$sum": "$zpts_amount"},
+    })
+    fields["rewards.admin_adjustment"] = {
+        "zwap": adjustments[0]["zwap"] if adjustments else 0,
+        "zpts": adjustments[0]["zpts"] if adjustments else 0,
+        "count": adjustments[0]["count"] if adjustments else 0,
+    }
+
+    purchases = await _group(db, "purchases", {"purchased_at": {"$gte": start_iso, "$lt": end_iso}}, {
+        "_id": "$currency", "count": {"$sum": 1}, "amount": {"$sum": "$price"},
+    })
+    fields["purchases"] = {
+        "count": sum(p["count"] for p in purchases),
+        **{p["_id"]: p["amount"] for p in purchases if p["_id"] in ("zwap", "zpts")},
+    }
+
+    swaps = await _group(db, "swaps", {"timestamp": {"$gte": start_iso, "$lt": end_iso}}, {
+        "_id": None, "count": {"$sum": 1}, "fees_usd": {"$sum": "$fee"},
+    })
+    fields["swaps"] = {
+        "count": swaps[0]["count"] if swaps else 0,
+        "fees_usd": swaps[0]["fees_usd"] if swaps else 0,
+    }
+
+    # Markers expire; past the retention window the incremental DAU is all there is
+    if _utc_now() - start < ACTIVE_RETENTION:
+        fields["dau"] = await db[ACTIVE_COLLECTION].count_documents({"day": start_iso})
+
+    now = _utc_now()
+    await db[DAILY_COLLECTION].update_one(
+        {"_id": start_iso},
+        {"$set": {**fields, "compacted_at": now, "updated_at": now}, "$setOnInsert": {"date": start}},
+        upsert=True,
+    )
+    return fields
+
+
+async def _acquire_lock(db, owner: str) -> bool:
+    now = _utc_now()
+    try:
+        # Matches only an expired lock; otherwise the upsert collides on _id
+        await db.system_config.update_one(
+            {"_id": LOCK_ID, "expires_at": {"$lt": now}},
+            {"$set": {"owner": owner, "expires_at": now + LOCK_TTL}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def _release_lock(db, owner: str) -> None:
+    await db.system_config.delete_one({"_id": LOCK_ID, "owner": owner})
+
+
+async def compact_days(db, days: List[date]) -> List[str]:
+    """
+    Compacts the given days under the cross-worker lock. Returns the days
+    compacted (empty if another worker holds the lock).
+    """
+    owner = uuid.uuid4().hex
+    if not days or not await _acquire_lock(db, owner):
+        return []
+    done = []
+    try:
+        for day in sorted(days):
+            await compact_day(db, day)
+            done.append(day.isoformat())
+    finally:
+        await _release_lock(db, owner)
+    if done:
+        logger.info(f"Compacted analytics rollups for {', '.join(done)}")
+    return done
+
+
+async def compact_recent(db, days: int) -> List[str]:
+    """
+    Recompacts the last `days` finished days, whether or not they were
+    compacted before (backfills, or after an outage).
+    """
+    today = _utc_now().date()
+    days = max(1, min(int(days), MAX_OVERVIEW_DAYS))
+    return await compact_days(db, [today - timedelta(days=n) for n in range(1, days + 1)])
+
+
+async def compact_due_days(db, now: Optional[datetime] = None) -> List[str]:
+    """
+    Compacts finished days within the lookback window that have not been
+    compacted yet. Yesterday only becomes due COMPACT_AFTER past midnight.
+    """
+    now = now or _utc_now()
+    today = (now - COMPACT_AFTER).date()
+    candidates = [today - timedelta(days=n) for n in range(1, COMPACT_LOOKBACK_DAYS + 1)]
+    done = {
+        d["_id"]
+        for d in await db[DAILY_COLLECTION].find(
+            {"_id": {"$in": [c.isoformat() for c in candidates]}, "compacted_at": {"$exists": True}}, {"_id": 1}
+        ).to_list(length=None)
+    }
+    return await compact_days(db, [c for c in candidates if c.isoformat() not in done])
+
+
+# -------------------------
+# Reads
+# -------------------------
+
+async def get_daily(db, days: int = 30, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Rollup documents for the last `days` UTC days (today included), oldest
+    first. Reads at most `days` documents.
+    """
+    days = max(1, min(int(days), MAX_OVERVIEW_DAYS))
+    first = ((now or _utc_now()).date() - timedelta(days=days - 1)).isoformat()
+    return await db[DAILY_COLLECTION].find({"_id": {"$gte": first}}).sort("_id", 1).to_list(length=days)
+
+
+# -------------------------
+# Module-level singleton
+# -------------------------
+
+_rollups: Optional[DailyRollups] = None
+
+
+def start_rollups(db, **kwargs) -> DailyRollups:
+    global _rollups
+    if _rollups is None:
+        _rollups = DailyRollups(db, **kwargs)
+        _rollups.start()
+    return _rollups
+
+
+async def stop_rollups() -> None:
+    global _rollups
+    if _rollups is not None:
+        await _rollups.stop()
+        _rollups = None
+
+
+def get_rollups() -> DailyRollups:
+    if _rollups is None:
+        raise RuntimeError("Analytics rollups not started")
+    return _rollups
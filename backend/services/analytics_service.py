@@ -1,29 +1,134 @@
-from typing import List, Dict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import List, Dict, Optional
+
+import services.abuse_detection_service as abuse_detection_service
+import services.activity_sketch_service as activity_sketch_service
+import services.analytics_rollup_service as analytics_rollup_service
+import services.cohort_service as cohort_service
+import services.event_store_service as event_store_service
+import services.whale_service as whale_service
 
 async def get_dau(db) -> int:
     """
-    Returns daily active users.
+    Returns daily active users (from today's rollup).
+    """
+    rows = await analytics_rollup_service.get_daily(db, days=1)
+    return rows[0].get("dau", 0) if rows else 0
+
+async def get_active_users(db) -> Dict:
+    """
+    DAU/WAU/MAU estimates from the daily HyperLogLog sketches.
+    """
+    return await activity_sketch_service.active_users(db)
+
+async def get_retention(db, cohort_day: date, days: int = 30) -> Dict:
     """
-    pipeline = [
-        {"$match": {"last_active": {"$gte": datetime.utcnow().date()}}},
-        {"$group": {"_id": None, "dau": {"$sum": 1}}}
-    ]
-    result = await db.users.aggregate(pipeline).to_list(length=1)
-    return result[0]["dau"] if result else 0
+    Day-N retention of the wallets first seen on `cohort_day` (estimated).
+    """
+    return await activity_sketch_service.retention_curve(db, cohort_day, days)
+
+async def get_overview(db, days: int = 30) -> Dict:
+    """
+    Daily trends for the last `days` days, read from analytics_daily (one
+    small document per day), plus top earners and the flagged-user count.
+    """
+    rows = await analytics_rollup_service.get_daily(db, days)
+    rewards_trend, games_trend, rewards_by_source = [], [], {}
+    for row in rows:
+        rewards = row.get("rewards", {})
+        rewards_trend.append({
+            "_id": row["_id"],
+            "zwap": round(sum(r.get("zwap", 0) for r in rewards.values()), 2),
+            "zpts": sum(r.get("zpts", 0) for r in rewards.values()),
+        })
+        games_trend.append({
+            "_id": row["_id"],
+            "count": sum(n for by_game in row.get("games", {}).values() for n in by_game.values()),
+        })
+        for source, r in rewards.items():
+            total = rewards_by_source.setdefault(source, {"zwap": 0, "zpts": 0, "count": 0})
+            for key in total:
+                total[key] += r.get(key, 0)
+
+    top_earners = await get_top_earners(db, limit=10)
+    flagged_users = await db.users.count_documents({"fraud_flags": {"$exists": True, "$ne": []}})
+
+    return {
+        "period_days": days,
+        "dau_trend": [{"_id": row["_id"], "count": row.get("dau", 0)} for row in rows],
+        "rewards_trend": rewards_trend,
+        "games_trend": games_trend,
+        "purchases_trend": [{"_id": row["_id"], **row.get("purchases", {})} for row in rows],
+        "swaps_trend": [{"_id": row["_id"], **row.get("swaps", {})} for row in rows],
+        "rewards_by_source": rewards_by_source,
+        "top_earners": top_earners,
+        "flagged_users": flagged_users,
+    }
+
+async def get_event_series(
+    db,
+    kind: str,
+    days: int = 30,
+    unit: str = "day",
+    wallet: Optional[str] = None,
+    split: bool = False,
+) -> Dict:
+    """
+    Step/game/reward activity per hour/day/week/month over the last `days`
+    days from the time-series event store, optionally for one wallet.
+    Raises LookupError when the store is not enabled.
+    """
+    if event_store_service.get_event_store() is None:
+        raise LookupError("Event store is not enabled (EVENT_STORE=timeseries)")
+    days = max(1, min(days, 366))
+    end = datetime.combine(datetime.now(timezone.utc).date() + timedelta(days=1), time.min, tzinfo=timezone.utc)
+    start = end - timedelta(days=days)
+    series = await event_store_service.event_series(
+        db, kind, start, end, unit=unit, wallet=wallet.lower() if wallet else None, split=split
+    )
+    return {"kind": kind, "unit": unit, "period_days": days, "wallet": wallet, "series": series}
+
+async def get_cohort_retention(
+    db,
+    weeks: int = 12,
+    cohorts: int = 12,
+    tiers: Optional[List[str]] = None,
+    regions: Optional[List[str]] = None,
+) -> Dict:
+    """
+    Weekly retention for the last `cohorts` signup weeks from the cohort
+    matrix, optionally limited to some tiers/regions.
+    """
+    return await cohort_service.retention(db, weeks=weeks, cohorts=min(max(cohorts, 1), 104), tiers=tiers, regions=regions)
 
 async def get_top_earners(db, limit: int = 10) -> List[Dict]:
     """
-    Returns top users by earned ZWAP.
+    Top users by ZWAP balance from the whale board (memory only), as
+    {"rank", "wallet_address", "custom_username", "username",
+    "zwap_balance", "total_earned", "tier", "status", "fraud_flags"}.
+    """
+    return whale_service.get_whales().top(limit)
+
+async def get_whales(db, limit: int = 100) -> Dict:
+    """
+    Whale risk view: the top balances with their tier/status/flags, the
+    ZWAP they hold between them, and whether the board is exact.
     """
-    cursor = db.users.find().sort("zwap_balance", -1).limit(limit)
-    return [user async for user in cursor]
+    board = whale_service.get_whales()
+    whales = board.top(limit)
+    held = sum(w.get("zwap_balance") or 0 for w in whales)
+    return {
+        "whales": whales,
+        "held_zwap": round(held, 2),
+        "flagged": [w["wallet_address"] for w in whales if w.get("fraud_flags")],
+        **board.stats(),
+    }
 
-async def detect_abuse(db, threshold: float = 10000) -> List[Dict]:
+async def detect_abuse(db, threshold: float = 10000, limit: int = 100) -> List[Dict]:
     """
-    Finds users exceeding a reward threshold for potential abuse.
+    Current top suspects from the streaming abuse detector (memory only),
+    keeping those certainly rewarded more than `threshold` ZWAP in the last
+    24 hours (sketch error subtracted) or with an active flag.
     """
-    pipeline = [
-        {"$group": {"_id": "$user_id", "total_rewards": {"$sum": "$amount"}}},
-        {"$match": {"total_rewards": {"$gt": threshold}}}
-    ]
-    return await db.rewards.aggregate(pipeline).to_list(length=None)
+    suspects = abuse_detection_service.get_detector().top_suspects(limit)
+    return [s for s in suspects if s["zwap_24h_min"] > threshold or s["flags"]]
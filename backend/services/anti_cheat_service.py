@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+FRAUD_FLAGS_COLLECTION = "fraud_flags"
+STEP_SPIKE_FLAG = "step_spike"
+
+DEFAULT_WINDOW_MINUTES = 5          # WalkConfig: "max steps in 5 minutes"
+DEFAULT_SPIKE_THRESHOLD = 5000
+DEFAULT_ACTION = "clamp"            # "clamp" credits up to the threshold, "flag" credits everything
+DEFAULT_FLUSH_INTERVAL = 5.0        # seconds
+DEFAULT_CONFIG_REFRESH = 60.0       # seconds; picks up walk config edits from other workers
+DEFAULT_MAX_PENDING_FLAGS = 10000
+
+ACTIONS = ("clamp", "flag")
+DUPLICATE_KEY = 11000
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _minute(ts: datetime) -> int:
+    return int(ts.timestamp() // 60)
+
+
+class _StepWindow:
+    """
+    Ring buffer of per-minute step counts for one wallet.
+    """
+    __slots__ = ("buckets", "last_minute", "total")
+
+    def __init__(self, size: int):
+        self.buckets = [0] * size
+        self.last_minute = 0
+        self.total = 0
+
+    def advance(self, minute: int) -> None:
+        size = len(self.buckets)
+        gap = minute - self.last_minute
+        if gap <= 0:
+            return
+        if gap >= size:
+            self.buckets = [0] * size
+            self.total = 0
+        else:
+            # At most `size` buckets expire, so this stays O(window)
+            for m in range(self.last_minute + 1, minute + 1):
+                i = m % size
+                self.total -= self.buckets[i]
+                self.buckets[i] = 0
+        self.last_minute = minute
+
+
+class StepSpikeDetector:
+    """
+    Per-wallet sliding-window step counter enforcing
+    `WalkConfig.anti_cheat_spike_threshold` without Mongo reads.
+
+    State is per worker. Flags are buffered and written to `fraud_flags`
+    (and `users.fraud_flags`) in batches by a background task, which also
+    evicts idle wallets and refreshes the threshold from `system_config`.
+    """
+
+    def __init__(
+        self,
+        db,
+        *,
+        threshold: int = DEFAULT_SPIKE_THRESHOLD,
+        action: str = DEFAULT_ACTION,
+        window_minutes: int = DEFAULT_WINDOW_MINUTES,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        config_refresh: float = DEFAULT_CONFIG_REFRESH,
+    ):
+        self.db = db
+        self.window_minutes = max(1, int(window_minutes))
+        self.flush_interval = flush_interval
+        self.config_refresh = config_refresh
+        self.threshold = int(threshold)
+        self.action = action if action in ACTIONS else DEFAULT_ACTION
+        self.enabled = True
+
+        self._windows: Dict[str, _StepWindow] = {}
+        self._pending_flags: List[Dict[str, Any]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    # -------------------------
+    # Config
+    # -------------------------
+
+    def configure(self, walk_config: Dict[str, Any]) -> None:
+        """
+        Applies a WalkConfig dict (as stored under system_config "walk_config").
+        """
+        self.threshold = int(walk_config.get("anti_cheat_spike_threshold", self.threshold))
+        action = walk_config.get("anti_cheat_action", self.action)
+        self.action = action if action in ACTIONS else DEFAULT_ACTION
+        self.enabled = bool(walk_config.get("anti_cheat_enabled", True))
+
+    async def load_config(self) -> None:
+        try:
+            config = await self.db.system_config.find_one({"_id": "walk_config"})
+        except PyMongoError as e:
+            logger.warning(f"Anti-cheat config refresh failed: {e}")
+            return
+        if config:
+            self.configure(config)
+
+    # -------------------------
+    # Hot path
+    # -------------------------
+
+    def check(self, wallet: str, steps: int, ts: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Records a step submission and returns how many steps to credit.
+
+        Returns {"credited", "flagged", "window_steps", "minute"}. With
+        action "clamp" only the remaining allowance in the window is
+        credited; with "flag" the full amount is credited and the wallet is
+        flagged for review. Samples older than the window (late offline
+        syncs, or backdated ones) are screened against the current window
+        and kept in its oldest bucket, so backdating earns no extra
+        allowance.
+        """
+        steps = max(0, int(steps))
+        if not self.enabled or self.threshold <= 0:
+            return {"credited": steps, "flagged": False, "window_steps": 0, "minute": None}
+
+        ts = ts or _utc_now()
+        minute = _minute(ts)
+        window = self._windows.get(wallet)
+        if window is None:
+            window = self._windows[wallet] = _StepWindow(self.window_minutes)
+            window.last_minute = minute
+        elif minute < window.last_minute - self.window_minutes + 1:
+            minute = window.last_minute - self.window_minutes + 1
+        else:
+            window.advance(minute)
+
+        allowance = max(0, self.threshold - window.total)
+        flagged = steps > allowance
+        credited = min(steps, allowance) if flagged and self.action == "clamp" else steps
+
+        window.buckets[minute % self.window_minutes] += credited
+        window.total += credited
+
+        if flagged:
+            self._record_flag(wallet, steps, credited, window.total, ts)
+
+        return {"credited": credited, "flagged": flagged, "window_steps": window.total, "minute": minute}
+
+    def release(self, wallet: str, screen: Dict[str, Any]) -> None:
+        """
+        Takes back the steps a `check` result counted when its write did
+        not happen (e.g. a conflicting sync the client will retry).
+        """
+        window = self._windows.get(wallet)
+        minute, credited = screen.get("minute"), screen.get("credited", 0)
+        if window is None or minute is None or credited <= 0:
+            return
+        if not window.last_minute - self.window_minutes < minute <= window.last_minute:
+            return  # bucket already expired
+        i = minute % self.window_minutes
+        taken = min(int(credited), window.buckets[i])
+        window.buckets[i] -= taken
+        window.total -= taken
+
+    def _record_flag(self, wallet: str, submitted: int, credited: int, window_steps: int, ts: datetime) -> None:
+        if len(self._pending_flags) >= DEFAULT_MAX_PENDING_FLAGS:
+            return  # Mongo is down; the window already enforces the clamp
+        self._pending_flags.append({
+            "_id": uuid.uuid4().hex,  # stable across retries, so a re-insert is a no-op
+            "wallet_address": wallet,
+            "type": STEP_SPIKE_FLAG,
+            "submitted_steps": submitted,
+            "credited_steps": credited,
+            "window_steps": window_steps,
+            "window_minutes": self.window_minutes,
+            "threshold": self.threshold,
+            "action": self.action,
+            "timestamp": ts,
+        })
+
+    # -------------------------
+    # Background
+    # -------------------------
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_refresh = loop.time() + self.config_refresh
+        while not self._stopping:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                self.evict_idle()
+                if loop.time() >= next_refresh:
+                    await self.load_config()
+                    next_refresh = loop.time() + self.config_refresh
+            except Exception as e:  # keep the task alive
+                logger.error(f"Anti-cheat background task failed: {e}")
+
+    async def flush(self) -> None:
+        """
+        Writes buffered flags: one insert_many into `fraud_flags` and one
+        bulk_write tagging `users.fraud_flags`.
+        """
+        if not self._pending_flags:
+            return
+        flags, self._pending_flags = self._pending_flags, []
+        retry = await persist_flags(self.db, flags)
+        self._pending_flags = retry + self._pending_flags
+
+    def evict_idle(self, now: Optional[datetime] = None) -> int:
+        """
+        Drops windows with no activity in the last window; returns how many.
+        """
+        cutoff = _minute(now or _utc_now()) - self.window_minutes
+        idle = [w for w, win in self._windows.items() if win.last_minute <= cutoff]
+        for w in idle:
+            del self._windows[w]
+        return len(idle)
+
+
+async def persist_flags(db, flags: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Inserts flags (each with a stable _id) into `fraud_flags` and adds
+    their types to `users.fraud_flags`. Returns the flags to retry. Both
+    writes are idempotent, so retrying a flag that was partly written
+    creates no duplicates.
+    """
+    retry: List[Dict[str, Any]] = []
+    try:
+        await db[FRAUD_FLAGS_COLLECTION].insert_many(flags, ordered=False)
+    except BulkWriteError as e:
+        failed = {err["index"] for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY}
+        retry = [f for i, f in enumerate(flags) if i in failed]
+    except PyMongoError as e:
+        logger.warning(f"Failed to persist {len(flags)} fraud flags, will retry: {e}")
+        return flags
+    by_wallet: Dict[str, set] = {}
+    for f in flags:
+        by_wallet.setdefault(f["wallet_address"], set()).add(f["type"])
+    try:
+        await db.users.bulk_write(
+            [
+                UpdateOne({"wallet_address": w}, {"$addToSet": {"fraud_flags": {"$each": sorted(types)}}})
+                for w, types in by_wallet.items()
+            ],
+            ordered=False,
+        )
+    except PyMongoError as e:
+        logger.warning(f"Failed to tag {len(by_wallet)} users with fraud flags, will retry: {e}")
+        return flags
+    if retry:
+        logger.warning(f"Failed to persist {len(retry)} fraud flags, will retry")
+    return retry
+
+
+# -------------------------
+# Module-level singleton
+# -------------------------
+
+_detector: Optional[StepSpikeDetector] = None
+
+
+async def start_detector(db, **kwargs) -> StepSpikeDetector:
+    """
+    Creates the process-wide detector, loads walk config and starts flushing.
+    """
+    global _detector
+    if _detector is None:
+        _detector = StepSpikeDetector(db, **kwargs)
+        await _detector.load_config()
+        _detector.start()
+    return _detector
+
+
+async def stop_detector() -> None:
+    global _detector
+    if _detector is not None:
+        await _detector.stop()
+        _detector = None
+
+
+def get_detector() -> StepSpikeDetector:
+    if _detector is None:
+        raise RuntimeError("Step spike detector not started")
+    return _detector
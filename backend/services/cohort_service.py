@@ -0,0 +1,485 @@
+"""
+Signup-week x active-week retention cohorts.
+
+A background task (one worker at a time, under a system_config lock) folds
+each finished day into three collections:
+
+  - cohort_members   one doc per wallet: signup_week, tier, region at the
+                     time it was first folded (cohorts don't move when a
+                     user upgrades later)
+  - cohort_activity  one doc per (active week, wallet), inserted the first
+                     time the wallet shows up in that week's daily
+                     `analytics_active` markers
+  - cohort_matrix    one doc per (signup_week, tier, region) holding the
+                     cohort size and `active`, an array of distinct active
+                     wallets per week offset (index 0 = signup week)
+
+Only newly inserted members and activity docs increment the matrix, so a
+day folded twice is not double counted. Retention queries sum the few
+matching matrix rows (weeks x tiers x regions) and never touch users.
+
+The activity markers expire after a week, so days must be folded while
+they are recent; folding resumes from `folded_through` and catches up on
+the days still available. `recompute` rebuilds the matrix by grouping the
+member and activity logs and reports any cells where the incremental
+arrays drifted (e.g. a crash between the inserts and the increments).
+Activity history starts when this engine is first run; `backfill_members`
+seeds cohort sizes from existing users.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+
+import services.analytics_rollup_service as analytics_rollup_service
+
+logger = logging.getLogger(__name__)
+
+MEMBERS_COLLECTION = "cohort_members"
+ACTIVITY_COLLECTION = "cohort_activity"
+MATRIX_COLLECTION = "cohort_matrix"
+STATE_ID = "cohort_state"                 # system_config _id
+LOCK_ID = "cohort_lock"                   # system_config _id
+LOCK_TTL = timedelta(minutes=30)
+MAX_WEEKS = 104                           # week offsets tracked per cohort
+FOLD_AFTER = timedelta(minutes=45)        # past midnight UTC, after the rollup compaction
+DEFAULT_CHECK_INTERVAL = 600.0            # seconds between "is a day due" checks
+BATCH_SIZE = 5000
+UNKNOWN = "unknown"
+DUPLICATE_KEY = 11000
+
+CohortKey = Tuple[str, str, str]          # (signup_week, tier, region)
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def _signup_day(created_at: Any) -> Optional[date]:
+    if isinstance(created_at, datetime):
+        return created_at.date()
+    if isinstance(created_at, str):
+        try:
+            return datetime.fromisoformat(created_at).date()
+        except ValueError:
+            return None
+    return None
+
+
+def _member(user: Dict[str, Any], fallback_day: date) -> Dict[str, Any]:
+    signup = _signup_day(user.get("created_at")) or fallback_day
+    return {
+        "_id": user["wallet_address"],
+        "signup_week": week_start(signup).isoformat(),
+        "tier": user.get("tier") or UNKNOWN,
+        "region": user.get("region") or UNKNOWN,
+    }
+
+
+def _matrix_id(key: CohortKey) -> str:
+    return "|".join(key)
+
+
+# -------------------------
+# Folding
+# -------------------------
+
+async def _acquire_lock(db, owner: str) -> bool:
+    now = _utc_now()
+    try:
+        # Matches only an expired lock; otherwise the upsert collides on _id
+        await db.system_config.update_one(
+            {"_id": LOCK_ID, "expires_at": {"$lt": now}},
+            {"$set": {"owner": owner, "expires_at": now + LOCK_TTL}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def _release_lock(db, owner: str) -> None:
+    await db.system_config.delete_one({"_id": LOCK_ID, "owner": owner})
+
+
+async def _insert_new(db, collection: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Upserts docs by _id and returns the ones that did not exist yet.
+    """
+    if not docs:
+        return []
+    ops = [UpdateOne({"_id": d["_id"]}, {"$setOnInsert": d}, upsert=True) for d in docs]
+    try:
+        result = await db[collection].bulk_write(ops, ordered=False)
+        upserted = result.upserted_ids
+    except BulkWriteError as e:
+        # Lost races on the same _id are fine; anything else must surface
+        if any(err.get("code") != DUPLICATE_KEY for err in e.details.get("writeErrors", [])):
+            raise
+        upserted = {u["index"]: u["_id"] for u in e.details.get("upserted", [])}
+    return [docs[i] for i in upserted]
+
+
+async def _apply(db, sizes: Dict[CohortKey, int], active: Dict[Tuple[CohortKey, int], int]) -> None:
+    keys = set(sizes) | {key for key, _ in active}
+    if not keys:
+        return
+    now = _utc_now()
+    # Arrays are created full-length first so $inc on "active.N" always hits a number
+    await db[MATRIX_COLLECTION].bulk_write([
+        UpdateOne(
+            {"_id": _matrix_id(key)},
+            {"$setOnInsert": {"signup_week": key[0], "tier": key[1], "region": key[2], "size": 0, "active": [0] * (MAX_WEEKS + 1)}},
+            upsert=True,
+        )
+        for key in keys
+    ], ordered=False)
+    incs: Dict[CohortKey, Dict[str, int]] = {}
+    for key, n in sizes.items():
+        incs.setdefault(key, {})["size"] = n
+    for (key, offset), n in active.items():
+        incs.setdefault(key, {})[f"active.{offset}"] = n
+    await db[MATRIX_COLLECTION].bulk_write([
+        UpdateOne({"_id": _matrix_id(key)}, {"$inc": inc, "$set": {"updated_at": now}})
+        for key, inc in incs.items()
+    ], ordered=False)
+
+
+async def _ensure_members(db, wallets: List[str], day: date, sizes: Dict[CohortKey, int]) -> Dict[str, Dict[str, Any]]:
+    """
+    Cohort membership for the wallets, creating it from `users` where
+    missing. New members are counted into `sizes`.
+    """
+    members = {
+        m["_id"]: m
+        for m in await db[MEMBERS_COLLECTION].find({"_id": {"$in": wallets}}).to_list(length=None)
+    }
+    missing = [w for w in wallets if w not in members]
+    if missing:
+        users = await db.users.find(
+            {"wallet_address": {"$in": missing}},
+            {"_id": 0, "wallet_address": 1, "created_at": 1, "tier": 1, "region": 1},
+        ).to_list(length=None)
+        candidates = [_member(u, day) for u in users]
+        for m in await _insert_new(db, MEMBERS_COLLECTION, candidates):
+            key = (m["signup_week"], m["tier"], m["region"])
+            sizes[key] = sizes.get(key, 0) + 1
+        # Members created concurrently or earlier in this fold
+        members.update({
+            m["_id"]: m
+            for m in await db[MEMBERS_COLLECTION].find({"_id": {"$in": missing}}).to_list(length=None)
+        })
+    return members
+
+
+async def fold_day(db, day: date, batch_size: int = BATCH_SIZE) -> Dict[str, int]:
+    """
+    Folds one finished day: that day's signups become members, and wallets
+    active that day count once towards their cohort's week offset.
+    """
+    start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+    sizes: Dict[CohortKey, int] = {}
+    active: Dict[Tuple[CohortKey, int], int] = {}
+    signups = await db.users.find(
+        {"created_at": {"$gte": start.isoformat(), "$lt": (start + timedelta(days=1)).isoformat()}},
+        {"_id": 0, "wallet_address": 1},
+    ).to_list(length=None)
+    for i in range(0, len(signups), batch_size):
+        await _ensure_members(db, [u["wallet_address"] for u in signups[i:i + batch_size]], day, sizes)
+
+    week = week_start(day)
+    marked = 0
+    last = None
+    while True:
+        query: Dict[str, Any] = {"day": day.isoformat()}
+        if last is not None:
+            query["_id"] = {"$gt": last}
+        markers = await db[analytics_rollup_service.ACTIVE_COLLECTION].find(
+            query, {"_id": 1, "wallet_address": 1}
+        ).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not markers:
+            break
+        last = markers[-1]["_id"]
+        wallets = [m["wallet_address"] for m in markers if m.get("wallet_address")]
+        members = await _ensure_members(db, wallets, day, sizes)
+        docs = []
+        for wallet in wallets:
+            m = members.get(wallet)
+            if m is None:
+                continue  # marker for a wallet without a user (deleted)
+            docs.append({
+                "_id": f"{week.isoformat()}:{wallet}",
+                "week": week.isoformat(),
+                "wallet_address": wallet,
+                "signup_week": m["signup_week"],
+                "tier": m["tier"],
+                "region": m["region"],
+            })
+        for doc in await _insert_new(db, ACTIVITY_COLLECTION, docs):
+            offset = (week - date.fromisoformat(doc["signup_week"])).days // 7
+            if 0 <= offset <= MAX_WEEKS:
+                cell = ((doc["signup_week"], doc["tier"], doc["region"]), offset)
+                active[cell] = active.get(cell, 0) + 1
+                marked += 1
+
+    await _apply(db, sizes, active)
+    return {"new_members": sum(sizes.values()), "new_active": marked}
+
+
+async def fold_due_days(db, now: Optional[datetime] = None) -> List[str]:
+    """
+    Folds finished days after `folded_through` whose activity markers are
+    still available. Returns the days folded (empty if another worker
+    holds the lock or nothing is due).
+    """
+    now = now or _utc_now()
+    last_due = (now - FOLD_AFTER).date() - timedelta(days=1)
+    earliest = now.date() - timedelta(days=analytics_rollup_service.ACTIVE_RETENTION.days - 1)
+    state = await db.system_config.find_one({"_id": STATE_ID}) or {}
+    first = date.fromisoformat(state["folded_through"]) + timedelta(days=1) if state.get("folded_through") else last_due
+    if first < earliest:
+        logger.warning(f"Cohort folding fell behind; days {first} to {earliest - timedelta(days=1)} have expired markers and are skipped")
+        first = earliest
+    days = [first + timedelta(days=n) for n in range((last_due - first).days + 1)]
+    if not days:
+        return []
+
+    owner = uuid.uuid4().hex
+    if not await _acquire_lock(db, owner):
+        return []
+    done = []
+    try:
+        for day in days:
+            summary = await fold_day(db, day)
+            await db.system_config.update_one(
+                {"_id": STATE_ID}, {"$set": {"folded_through": day.isoformat(), "updated_at": _utc_now()}}, upsert=True
+            )
+            logger.info(f"Folded cohorts for {day}: {summary}")
+            done.append(day.isoformat())
+    finally:
+        await _release_lock(db, owner)
+    return done
+
+
+async def backfill_members(db, batch_size: int = BATCH_SIZE) -> Dict[str, int]:
+    """
+    Creates memberships (and cohort sizes) for existing users that have
+    none yet. Safe to re-run.
+    """
+    owner = uuid.uuid4().hex
+    if not await _acquire_lock(db, owner):
+        raise PermissionError("Cohort job already running")
+    created = 0
+    try:
+        last = None
+        today = _utc_now().date()
+        while True:
+            query = {"_id": {"$gt": last}} if last is not None else {}
+            users = await db.users.find(
+                query, {"wallet_address": 1, "created_at": 1, "tier": 1, "region": 1}
+            ).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+            if not users:
+                break
+            last = users[-1]["_id"]
+            sizes: Dict[CohortKey, int] = {}
+            for m in await _insert_new(db, MEMBERS_COLLECTION, [_member(u, today) for u in users if u.get("wallet_address")]):
+                key = (m["signup_week"], m["tier"], m["region"])
+                sizes[key] = sizes.get(key, 0) + 1
+            await _apply(db, sizes, {})
+            created += sum(sizes.values())
+    finally:
+        await _release_lock(db, owner)
+    return {"created": created}
+
+
+# -------------------------
+# Recompute / cross-check
+# -------------------------
+
+async def _recomputed(db) -> Dict[CohortKey, Dict[str, Any]]:
+    cohorts: Dict[CohortKey, Dict[str, Any]] = {}
+
+    def cohort(key: CohortKey) -> Dict[str, Any]:
+        return cohorts.setdefault(key, {"size": 0, "active": np.zeros(MAX_WEEKS + 1, dtype=np.int64)})
+
+    async for row in db[MEMBERS_COLLECTION].aggregate([
+        {"$group": {"_id": {"w": "$signup_week", "t": "$tier", "r": "$region"}, "n": {"$sum": 1}}},
+    ], allowDiskUse=True):
+        cohort((row["_id"]["w"], row["_id"]["t"], row["_id"]["r"]))["size"] = row["n"]
+    async for row in db[ACTIVITY_COLLECTION].aggregate([
+        {"$group": {"_id": {"w": "$signup_week", "t": "$tier", "r": "$region", "a": "$week"}, "n": {"$sum": 1}}},
+    ], allowDiskUse=True):
+        key = (row["_id"]["w"], row["_id"]["t"], row["_id"]["r"])
+        offset = (date.fromisoformat(row["_id"]["a"]) - date.fromisoformat(key[0])).days // 7
+        if 0 <= offset <= MAX_WEEKS:
+            cohort(key)["active"][offset] = row["n"]
+    return cohorts
+
+
+async def recompute(db, apply: bool = False) -> Dict[str, Any]:
+    """
+    Rebuilds every cohort from the member and activity logs and diffs it
+    against the incrementally maintained matrix. With apply=True the
+    matrix is replaced by the recomputed values.
+    """
+    owner = uuid.uuid4().hex
+    if not await _acquire_lock(db, owner):
+        raise PermissionError("Cohort job already running")
+    try:
+        fresh = await _recomputed(db)
+        stored = {
+            (d["signup_week"], d["tier"], d["region"]): d
+            for d in await db[MATRIX_COLLECTION].find({}).to_list(length=None)
+        }
+        mismatches = []
+        for key in sorted(set(fresh) | set(stored)):
+            want = fresh.get(key, {"size": 0, "active": np.zeros(MAX_WEEKS + 1, dtype=np.int64)})
+            have = stored.get(key, {})
+            have_active = np.asarray(have.get("active") or [0] * (MAX_WEEKS + 1), dtype=np.int64)
+            diff_weeks = np.nonzero(have_active != want["active"])[0].tolist()
+            if have.get("size", 0) != want["size"] or diff_weeks:
+                mismatches.append({
+                    "cohort": _matrix_id(key),
+                    "size": {"stored": have.get("size", 0), "recomputed": want["size"]},
+                    "weeks": {int(w): {"stored": int(have_active[w]), "recomputed": int(want["active"][w])} for w in diff_weeks},
+                })
+        if apply and mismatches:
+            now = _utc_now()
+            await db[MATRIX_COLLECTION].bulk_write([
+                UpdateOne(
+                    {"_id": _matrix_id(key)},
+                    {"$set": {
+                        "signup_week": key[0], "tier": key[1], "region": key[2],
+                        "size": fresh.get(key, {}).get("size", 0),
+                        "active": fresh[key]["active"].tolist() if key in fresh else [0] * (MAX_WEEKS + 1),
+                        "updated_at": now, "recomputed_at": now,
+                    }},
+                    upsert=True,
+                )
+                for key in (tuple(m["cohort"].split("|")) for m in mismatches)
+            ], ordered=False)
+        return {"cohorts": len(fresh), "mismatches": mismatches, "applied": bool(apply and mismatches)}
+    finally:
+        await _release_lock(db, owner)
+
+
+# -------------------------
+# Queries
+# -------------------------
+
+async def retention(
+    db,
+    weeks: int = 12,
+    tiers: Optional[Iterable[str]] = None,
+    regions: Optional[Iterable[str]] = None,
+    cohorts: int = 12,
+    now: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """
+    Retention matrix for the last `cohorts` signup weeks: per cohort its
+    size and, for week offsets 0..weeks that have started, distinct
+    active wallets and the rate. Cohorts are summed over the selected
+    tiers/regions (default: all).
+    """
+    weeks = max(1, min(int(weeks), MAX_WEEKS))
+    this_week = week_start((now or _utc_now()).date())
+    first = this_week - timedelta(weeks=max(1, int(cohorts)) - 1)
+    query: Dict[str, Any] = {"signup_week": {"$gte": first.isoformat()}}
+    if tiers:
+        query["tier"] = {"$in": list(tiers)}
+    if regions:
+        query["region"] = {"$in": list(regions)}
+    docs = await db[MATRIX_COLLECTION].find(
+        query, {"_id": 0, "signup_week": 1, "size": 1, "active": {"$slice": weeks + 1}}
+    ).to_list(length=None)
+
+    rows: Dict[str, Dict[str, Any]] = {}
+    for d in docs:
+        row = rows.setdefault(d["signup_week"], {"size": 0, "active": np.zeros(weeks + 1, dtype=np.int64)})
+        row["size"] += d.get("size", 0)
+        active = np.asarray(d.get("active") or [], dtype=np.int64)[:weeks + 1]
+        row["active"][:len(active)] += active
+
+    matrix = []
+    for signup_week in sorted(rows):
+        row = rows[signup_week]
+        elapsed = min(weeks, (this_week - date.fromisoformat(signup_week)).days // 7)
+        active = row["active"][:elapsed + 1]
+        matrix.append({
+            "signup_week": signup_week,
+            "size": int(row["size"]),
+            "active": active.tolist(),
+            "rate": [round(float(a) / row["size"], 4) if row["size"] else 0.0 for a in active],
+        })
+    return {"weeks": weeks, "tiers": list(tiers or []), "regions": list(regions or []), "cohorts": matrix}
+
+
+# -------------------------
+# Background folding
+# -------------------------
+
+class CohortEngine:
+    def __init__(self, db, *, check_interval: float = DEFAULT_CHECK_INTERVAL):
+        self.db = db
+        self.check_interval = check_interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await fold_due_days(self.db)
+            except PyMongoError as e:
+                logger.warning(f"Cohort folding failed, will retry: {e}")
+            except Exception as e:  # keep the task alive
+                logger.error(f"Cohort folding failed: {e}")
+            await asyncio.sleep(self.check_interval)
+
+
+# -------------------------
+# Module-level singleton
+# -------------------------
+
+_engine: Optional[CohortEngine] = None
+
+
+def start_cohorts(db, **kwargs) -> CohortEngine:
+    global _engine
+    if _engine is None:
+        _engine = CohortEngine(db, **kwargs)
+        _engine.start()
+    return _engine
+
+
+async def stop_cohorts() -> None:
+    global _engine
+    if _engine is not None:
+        await _engine.stop()
+        _engine = None
+
+
+def get_cohorts() -> CohortEngine:
+    if _engine is None:
+        raise RuntimeError("Cohort engine not started")
+    return _engine
@@ -0,0 +1,142 @@
+"""
+Composes admin dashboards from independent sections.
+
+Each section has its own loader and TTL. `compose` runs every section that
+needs loading concurrently, waits at most `timeout` seconds, and returns
+whatever is ready with per-section status and timings. A section that is
+still loading keeps running in the background and fills the cache for the
+next request. Concurrent requests share one in-flight load per section.
+
+Modes:
+  - "fresh": expired sections are reloaded (up to the timeout).
+  - "swr" (stale-while-revalidate): expired sections are served from cache
+    immediately and reloaded in the background; only sections never loaded
+    before are waited on.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 2.0     # seconds a request waits for sections being loaded
+MODES = ("fresh", "swr")
+
+
+class Section(NamedTuple):
+    name: str
+    loader: Callable[[], Awaitable[Any]]
+    ttl: float            # seconds a loaded value is served without reloading
+
+
+class _Entry(NamedTuple):
+    value: Any
+    loaded_at: float      # monotonic
+    millis: float
+
+
+class DashboardComposer:
+    def __init__(self):
+        self._cache: Dict[str, _Entry] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def _load(self, section: Section) -> asyncio.Task:
+        task = self._inflight.get(section.name)
+        if task is None:
+            task = asyncio.create_task(self._run_loader(section))
+            self._inflight[section.name] = task
+            task.add_done_callback(lambda t: self._finished(section.name, t))
+        return task
+
+    def _finished(self, name: str, task: asyncio.Task) -> None:
+        self._inflight.pop(name, None)
+        if not task.cancelled():
+            task.exception()  # background reloads may fail with nobody awaiting them
+
+    async def _run_loader(self, section: Section) -> _Entry:
+        started = time.monotonic()
+        try:
+            value = await section.loader()
+        except Exception as e:
+            logger.warning(f"Dashboard section {section.name} failed: {e}")
+            raise
+        entry = _Entry(value, time.monotonic(), round((time.monotonic() - started) * 1000, 1))
+        self._cache[section.name] = entry
+        return entry
+
+    async def compose(
+        self,
+        sections: List[Section],
+        *,
+        mode: str = "fresh",
+        timeout: float = DEFAULT_TIMEOUT,
+        refresh: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Returns {<section>: value, ..., "meta": {<section>: {...}}, "partial": bool}.
+
+        Section status is "cached", "loaded", "stale" (served past its TTL),
+        "timeout" or "error". With refresh=True every section is reloaded.
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        now = time.monotonic()
+        result: Dict[str, Any] = {}
+        meta: Dict[str, Dict[str, Any]] = {}
+        waiting: Dict[str, asyncio.Task] = {}
+
+        for section in sections:
+            entry = self._cache.get(section.name)
+            if entry is not None and not refresh and now - entry.loaded_at < section.ttl:
+                result[section.name] = entry.value
+                meta[section.name] = {"status": "cached", "age_s": round(now - entry.loaded_at, 1), "ms": entry.millis}
+            elif entry is not None and mode == "swr" and not refresh:
+                self._load(section)
+                result[section.name] = entry.value
+                meta[section.name] = {"status": "stale", "age_s": round(now - entry.loaded_at, 1), "ms": entry.millis}
+            else:
+                waiting[section.name] = self._load(section)
+
+        if waiting:
+            # wait() never cancels: a load that times out keeps going and fills the cache
+            await asyncio.wait(list(waiting.values()), timeout=timeout)
+        for name, task in waiting.items():
+            if task.done() and not task.cancelled() and task.exception() is None:
+                entry = task.result()
+                result[name] = entry.value
+                meta[name] = {"status": "loaded", "age_s": 0.0, "ms": entry.millis}
+                continue
+            stale = self._cache.get(name)
+            result[name] = stale.value if stale is not None else None
+            if task.done():
+                error = "cancelled" if task.cancelled() else str(task.exception())
+                meta[name] = {"status": "error", "error": error}
+            else:
+                meta[name] = {"status": "timeout", "waited_ms": round(timeout * 1000)}
+            if stale is not None:
+                meta[name]["stale_age_s"] = round(time.monotonic() - stale.loaded_at, 1)
+
+        return {
+            **result,
+            "meta": meta,
+            "partial": any(m["status"] in ("timeout", "error") for m in meta.values()),
+        }
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        if name is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(name, None)
+
+
+# -------------------------
+# Module-level singleton
+# -------------------------
+# No background task of its own, so no start/stop.
+
+_composer = DashboardComposer()
+
+
+def get_composer() -> DashboardComposer:
+    return _composer
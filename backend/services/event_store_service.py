@@ -0,0 +1,386 @@
+"""
+Time-series event store for step, game and reward events (optional).
+
+With EVENT_STORE=timeseries, every event recorded through the analytics
+rollups is also appended to a MongoDB time-series collection
+(timeField "ts", metaField "wallet"):
+
+    ts_steps    {"ts", "wallet", "steps"}
+    ts_games    {"ts", "wallet", "game_type", "origin", "games", ...}
+    ts_rewards  {"ts", "wallet", "source", "zwap", "zpts"}
+
+Mongo stores these as per-wallet buckets of compressed columns, so they
+take a fraction of the space of the raw collections, and a time-range
+query only opens the buckets whose control min/max overlap it. Events are
+buffered per worker and written with one insert_many per collection
+every few seconds.
+
+`backfill` copies history from the raw collections behind each live event:
+games from game_sessions, rewards from game_sessions, scratch_plays and
+the admin adjustments in rewards_ledger (there is no raw step log, so
+step history starts when the store is enabled). It stops at `live_since`,
+the first time any worker started the store, so history and live events
+don't overlap, and it resumes from an _id watermark per source collection
+(a crash between a batch's insert and its watermark update re-copies that
+one batch).
+
+Requires MongoDB 5.0+ (6.3+ for the automatic wallet/ts index).
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+
+import services.analytics_rollup_service as analytics_rollup_service
+
+logger = logging.getLogger(__name__)
+
+COLLECTIONS = {"steps": "ts_steps", "games": "ts_games", "rewards": "ts_rewards"}
+STATE_ID = "event_store"                 # system_config _id
+GRANULARITY = "hours"                    # a wallet produces a few events per hour at most
+DEFAULT_FLUSH_INTERVAL = 5.0             # seconds between inserts
+MAX_PENDING = 100_000                    # events held while Mongo is unreachable
+BACKFILL_BATCH_SIZE = 5000
+UNITS = ("hour", "day", "week", "month")
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _retention_seconds() -> Optional[int]:
+    days = int(os.environ.get("EVENT_RETENTION_DAYS", "0"))
+    return days * 86400 if days > 0 else None
+
+
+async def ensure_collections(db) -> List[str]:
+    """
+    Creates the missing time-series collections. Returns the names created.
+    Raises RuntimeError when the server has no time-series support.
+    """
+    existing = set(await db.list_collection_names(filter={"name": {"$in": list(COLLECTIONS.values())}}))
+    created = []
+    options: Dict[str, Any] = {"timeseries": {"timeField": "ts", "metaField": "wallet", "granularity": GRANULARITY}}
+    if _retention_seconds():
+        options["expireAfterSeconds"] = _retention_seconds()
+    for name in COLLECTIONS.values():
+        if name in existing:
+            continue
+        try:
+            await db.create_collection(name, **options)
+        except OperationFailure as e:
+            if e.code == 48:  # NamespaceExists: another worker won the race
+                continue
+            raise RuntimeError(f"Cannot create time-series collection {name} (MongoDB 5.0+ required): {e}") from e
+        # 6.3+ builds this automatically; older servers need it for per-wallet reads
+        await db[name].create_index([("wallet", 1), ("ts", 1)])
+        created.append(name)
+    return created
+
+
+# -------------------------
+# Writer
+# -------------------------
+
+class EventStore:
+    def __init__(self, db, *, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.db = db
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, List[Dict[str, Any]]] = {kind: [] for kind in COLLECTIONS}
+        self._dropped = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, kind: str, wallet: Optional[str], fields: Dict[str, Any], ts: datetime) -> None:
+        pending = self._pending.get(kind)
+        if pending is None:
+            return
+        if len(pending) >= MAX_PENDING:
+            self._dropped += 1
+            return
+        pending.append({"ts": ts, "wallet": wallet, **fields})
+
+    async def flush(self) -> None:
+        for kind, name in COLLECTIONS.items():
+            events, self._pending[kind] = self._pending[kind], []
+            if not events:
+                continue
+            try:
+                await self.db[name].insert_many(events, ordered=False)
+            except BulkWriteError as e:
+                failed = {err["index"] for err in e.details.get("writeErrors", [])}
+                logger.warning(f"Failed to write {len(failed)} {kind} events, will retry: {e}")
+                self._requeue(kind, [event for i, event in enumerate(events) if i in failed])
+            except PyMongoError as e:
+                logger.warning(f"Failed to write {len(events)} {kind} events, will retry: {e}")
+                self._requeue(kind, events)
+        if self._dropped:
+            logger.error(f"Event store buffer full, dropped {self._dropped} events")
+            self._dropped = 0
+
+    def _requeue(self, kind: str, events: List[Dict[str, Any]]) -> None:
+        for event in events:
+            event.pop("_id", None)
+        self._pending[kind] = events + self._pending[kind]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pending": {kind: len(events) for kind, events in self._pending.items()}}
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:  # keep the task alive
+                logger.error(f"Event store flush failed: {e}")
+
+
+# -------------------------
+# Backfill
+# -------------------------
+
+def _game_event(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "ts": doc.get("ended_at") or doc.get("timestamp"),
+        "wallet": doc.get("wallet_address"),
+        "game_type": doc.get("game_type"),
+        "origin": "session",
+        "games": doc.get("rounds", 0),
+        "score": doc.get("total_score", 0),
+    }
+
+
+def _session_reward_event(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "ts": doc.get("ended_at") or doc.get("timestamp"),
+        "wallet": doc.get("wallet_address"),
+        "source": "game_session",
+        "zwap": doc.get("zwap_earned", 0),
+        "zpts": doc.get("zpts_earned", 0),
+    }
+
+
+def _scratch_event(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "ts": doc.get("timestamp"),
+        "wallet": doc.get("wallet_address"),
+        "source": "scratch",
+        "zwap": doc.get("amount", 0),
+        "zpts": 0,
+    }
+
+
+def _adjustment_event(doc: Dict[str, Any]) -> Dict[str, Any]:
+    # No wallet, as recorded live: an admin adjustment is not user activity
+    return {
+        "ts": doc.get("timestamp"),
+        "wallet": None,
+        "source": "admin_adjustment",
+        "zwap": doc.get("zwap_amount", 0),
+        "zpts": doc.get("zpts_amount", 0),
+    }
+
+
+_CREDITED_SESSIONS = {"status": {"$ne": "rejected"}, "rounds": {"$gt": 0}}
+
+# kind -> [(source collection, filter, converter)], mirroring what the live
+# paths record. A kind's first source owns a watermark stored before
+# watermarks were kept per source.
+BACKFILL_SOURCES = {
+    "games": [("game_sessions", _CREDITED_SESSIONS, _game_event)],
+    "rewards": [
+        ("rewards_ledger", {"source": "admin_adjustment"}, _adjustment_event),
+        ("game_sessions", _CREDITED_SESSIONS, _session_reward_event),
+        ("scratch_plays", {"status": {"$ne": "voided"}}, _scratch_event),
+    ],
+}
+
+
+async def backfill(db, kinds: Optional[List[str]] = None, batch_size: int = BACKFILL_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Copies history up to `live_since` into the time-series collections.
+    Resumable: progress is an _id watermark per kind and source collection
+    in system_config.
+    Raises ValueError for unknown kinds and LookupError if the store has
+    never been started.
+    """
+    kinds = list(kinds or BACKFILL_SOURCES)
+    unknown = [k for k in kinds if k not in BACKFILL_SOURCES]
+    if unknown:
+        raise ValueError(f"Cannot backfill {unknown}; history exists for {list(BACKFILL_SOURCES)}")
+    state = await db.system_config.find_one({"_id": STATE_ID})
+    if not state or not state.get("live_since"):
+        raise LookupError("Event store has not been started; start it before backfilling")
+    live_since = state["live_since"]
+    await ensure_collections(db)
+
+    results = {}
+    for kind in kinds:
+        sources = BACKFILL_SOURCES[kind]
+        marks = (state.get("backfill") or {}).get(kind)
+        if marks is not None and not isinstance(marks, dict):
+            marks = {sources[0][0]: marks}
+        marks = dict(marks or {})
+        copied = skipped = 0
+        for source, match, convert in sources:
+            source_copied = source_skipped = 0
+            while True:
+                query = {**match, "timestamp": {"$lt": live_since}}
+                if marks.get(source) is not None:
+                    query["_id"] = {"$gt": marks[source]}
+                docs = await db[source].find(query).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+                if not docs:
+                    break
+                events = [e for e in map(convert, docs) if isinstance(e["ts"], datetime)]
+                source_skipped += len(docs) - len(events)
+                if events:
+                    await db[COLLECTIONS[kind]].insert_many(events, ordered=False)
+                source_copied += len(events)
+                marks[source] = docs[-1]["_id"]
+                await db.system_config.update_one({"_id": STATE_ID}, {"$set": {f"backfill.{kind}": marks}})
+            logger.info(f"Backfilled {source_copied} {kind} events from {source} into {COLLECTIONS[kind]} ({source_skipped} without a timestamp)")
+            copied += source_copied
+            skipped += source_skipped
+        results[kind] = {"copied": copied, "skipped": skipped}
+    return {"live_since": live_since, "kinds": results}
+
+
+# -------------------------
+# Reads
+# -------------------------
+
+_SUMS = {
+    "steps": {"steps": {"$sum": "$steps"}},
+    "games": {"games": {"$sum": "$games"}},
+    "rewards": {"zwap": {"$sum": "$zwap"}, "zpts": {"$sum": "$zpts"}},
+}
+_GROUP_FIELDS = {"games": "game_type", "rewards": "source"}
+
+
+async def event_series(
+    db,
+    kind: str,
+    start: datetime,
+    end: datetime,
+    unit: str = "day",
+    wallet: Optional[str] = None,
+    split: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Per-`unit` event counts and sums over [start, end), optionally for one
+    wallet and split by game type / reward source. The $match on the time
+    and meta fields is pushed down to the bucket level, so only
+    overlapping buckets are unpacked.
+    """
+    if kind not in COLLECTIONS:
+        raise ValueError(f"kind must be one of {list(COLLECTIONS)}")
+    if unit not in UNITS:
+        raise ValueError(f"unit must be one of {list(UNITS)}")
+    match: Dict[str, Any] = {"ts": {"$gte": start, "$lt": end}}
+    if wallet:
+        match["wallet"] = wallet
+    key: Dict[str, Any] = {"t": {"$dateTrunc": {"date": "$ts", "unit": unit}}}
+    if split and kind in _GROUP_FIELDS:
+        key["group"] = f"${_GROUP_FIELDS[kind]}"
+    rows = await db[COLLECTIONS[kind]].aggregate([
+        {"$match": match},
+        {"$group": {"_id": key, "events": {"$sum": 1}, **_SUMS[kind]}},
+        {"$sort": {"_id.t": 1}},
+    ]).to_list(length=None)
+    out = []
+    for row in rows:
+        key_values = row.pop("_id")
+        out.append({"t": key_values["t"], **({"group": key_values.get("group")} if "group" in key_values else {}), **row})
+    return out
+
+
+async def storage_stats(db) -> Dict[str, Any]:
+    """
+    Storage of each time-series collection next to the raw collection it
+    mirrors, for comparing footprint.
+    """
+    out = {}
+    for kind, name in COLLECTIONS.items():
+        names = [name] + [source for source, _, _ in BACKFILL_SOURCES.get(kind, [])]
+        for coll in names:
+            if coll in out:
+                continue
+            try:
+                stats = await db.command("collStats", coll)
+            except OperationFailure:
+                continue
+            out[coll] = {"count": stats.get("count"), "storage_bytes": stats.get("storageSize"), "index_bytes": stats.get("totalIndexSize")}
+    return out
+
+
+# -------------------------
+# Module-level singleton
+# -------------------------
+
+_store: Optional[EventStore] = None
+
+
+async def start_event_store(db, **kwargs) -> EventStore:
+    """
+    Creates the collections, records `live_since` (first start only) and
+    subscribes to the rollups' events. Start after the rollups.
+    """
+    global _store
+    if _store is None:
+        await ensure_collections(db)
+        await db.system_config.update_one({"_id": STATE_ID}, {"$setOnInsert": {"live_since": _utc_now()}}, upsert=True)
+        _store = EventStore(db, **kwargs)
+        analytics_rollup_service.get_rollups().subscribe_events(_store.record)
+        _store.start()
+    return _store
+
+
+async def stop_event_store() -> None:
+    global _store
+    if _store is not None:
+        analytics_rollup_service.get_rollups().unsubscribe_events(_store.record)
+        await _store.stop()
+        _store = None
+
+
+def get_event_store() -> Optional[EventStore]:
+    """
+    The running store, or None when EVENT_STORE is not "timeseries".
+    """
+    return _store
+
+
+async def _main(kinds: List[str]) -> None:
+    import json
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client[os.environ["DB_NAME"]]
+    try:
+        report = {"backfill": await backfill(db, kinds or None), "storage": await storage_stats(db)}
+        print(json.dumps(report, indent=2, default=str))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    asyncio.run(_main(sys.argv[1:]))
@@ -0,0 +1,416 @@
+"""
+Columnar analytics export: core collections -> day-partitioned Parquet.
+
+Layout under the export root (Hive-style, readable by pyarrow.dataset,
+DuckDB, Spark, pandas):
+
+    <root>/<collection>/day=YYYY-MM-DD/part-<run_id>-<n>.parquet
+    <root>/users/snapshot=YYYY-MM-DD/part-<run_id>-<n>.parquet
+
+Append-only collections are exported incrementally. The watermark is the
+last exported `_id` (ObjectIds increase with insert time), kept in
+`export_state`; each run reads `_id > watermark` up to EXPORT_LAG ago in
+batches, so writes still in flight are picked up by the next run. Rows go
+to the partition of their event time (the first time field present,
+else the ObjectId's timestamp). `users` is mutable and exported as a
+full snapshot per run instead.
+
+A run records itself as pending before writing; if it dies before moving
+the watermark, the next run deletes its files and starts from the old
+watermark, so rows are never exported twice. A snapshot run replaces the
+files of earlier runs on the same day once it has finished.
+
+Documents are schemaless, so each batch's Arrow schema is inferred:
+ObjectIds become strings, ISO time fields become timestamps, nested
+values become JSON strings. A batch whose schema differs from the open
+file's starts a new part file; readers unify schemas across files.
+
+pyarrow is optional and only imported when an export runs.
+"""
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import Decimal128, ObjectId
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+STATE_COLLECTION = "export_state"
+LOCK_ID = "export_lock"                  # system_config _id
+LOCK_TTL = timedelta(hours=1)
+DEFAULT_EXPORT_DIR = "exports"           # overridden by EXPORT_DIR
+BATCH_SIZE = 5000                        # documents per Arrow record batch
+EXPORT_LAG = timedelta(minutes=5)        # newest rows left for the next run
+COMPRESSION = "zstd"
+
+# collection -> time fields tried in order for the partition day
+INCREMENTAL: Dict[str, Tuple[str, ...]] = {
+    "rewards_ledger": ("timestamp",),
+    "purchases": ("purchased_at", "timestamp"),
+    "swaps": ("timestamp",),
+    "game_sessions": ("timestamp", "ended_at"),
+}
+SNAPSHOT: Dict[str, Dict[str, int]] = {
+    # collection -> projection
+    "users": {"search_username": 0, "search_grams": 0},
+}
+COLLECTIONS = tuple(INCREMENTAL) + tuple(SNAPSHOT)
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("Parquet export requires the 'pyarrow' package") from e
+    return pyarrow, pyarrow.parquet
+
+
+def export_root(root: Optional[str] = None) -> Path:
+    return Path(root or os.environ.get("EXPORT_DIR", DEFAULT_EXPORT_DIR))
+
+
+# -------------------------
+# Documents -> Arrow
+# -------------------------
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    return None
+
+
+def event_time(doc: Dict[str, Any], time_fields: Iterable[str]) -> datetime:
+    for field in time_fields:
+        parsed = _as_datetime(doc.get(field))
+        if parsed is not None:
+            return parsed
+    _id = doc.get("_id")
+    return _id.generation_time if isinstance(_id, ObjectId) else _utc_now()
+
+
+def _flatten(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return float(value.to_decimal())
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, default=str, sort_keys=True)
+    if isinstance(value, bytes):
+        return value.hex()
+    return value
+
+
+def _column_type(pa, values: List[Any]):
+    kinds = {type(v) for v in values if v is not None}
+    if not kinds:
+        return pa.string()
+    if kinds == {bool}:
+        return pa.bool_()
+    if kinds == {int}:
+        return pa.int64()
+    if kinds <= {int, float}:
+        return pa.float64()
+    if kinds == {datetime}:
+        return pa.timestamp("us", tz="UTC")
+    return pa.string()
+
+
+def to_table(pa, rows: List[Dict[str, Any]], time_fields: Iterable[str] = ()):
+    """
+    Arrow table for flattened rows, columns in sorted order so equal key
+    sets give equal schemas. ISO-string time fields become timestamps.
+    """
+    time_fields = set(time_fields)
+    names = sorted({k for row in rows for k in row})
+    arrays, fields = [], []
+    for name in names:
+        values = [row.get(name) for row in rows]
+        if name in time_fields:
+            values = [_as_datetime(v) if v is not None else None for v in values]
+        kind = _column_type(pa, values)
+        if kind == pa.string():
+            values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+        elif kind == pa.float64():
+            values = [float(v) if v is not None else None for v in values]
+        arrays.append(pa.array(values, type=kind))
+        fields.append(pa.field(name, kind))
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+
+class _PartitionWriter:
+    """
+    One open Parquet file per partition for the run; rolls to a new part
+    when a batch's schema can't be conformed to the open file's.
+    Files are written as .tmp and renamed on close.
+    """
+
+    def __init__(self, pa, pq, base: Path, run_id: str):
+        self.pa, self.pq = pa, pq
+        self.base = base
+        self.run_id = run_id
+        self._open: Dict[str, Tuple[Any, Path]] = {}
+        self._parts: Dict[str, int] = {}
+        self.files: List[str] = []
+        self.rows = 0
+
+    def _conform(self, table, schema):
+        if not set(table.column_names) <= set(schema.names):
+            return None
+        columns = []
+        for field in schema:
+            if field.name in table.column_names:
+                column = table.column(field.name)
+                if column.null_count == len(column):
+                    column = self.pa.nulls(table.num_rows, type=field.type)
+                elif column.type != field.type:
+                    # ints in a float column are safe to widen; anything else starts a new file
+                    if not (self.pa.types.is_integer(column.type) and self.pa.types.is_floating(field.type)):
+                        return None
+                    column = column.cast(field.type)
+                columns.append(column)
+            else:
+                columns.append(self.pa.nulls(table.num_rows, type=field.type))
+        return self.pa.Table.from_arrays(columns, schema=schema)
+
+    def write(self, partition: str, table) -> None:
+        current = self._open.get(partition)
+        if current is not None:
+            conformed = self._conform(table, current[0].schema)
+            if conformed is None:
+                self._close(partition)
+            else:
+                table = conformed
+        if partition not in self._open:
+            n = self._parts.get(partition, 0)
+            self._parts[partition] = n + 1
+            path = self.base / partition / f"part-{self.run_id}-{n}.parquet"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".parquet.tmp")
+            self._open[partition] = (self.pq.ParquetWriter(str(tmp), table.schema, compression=COMPRESSION), path)
+        self._open[partition][0].write_table(table)
+        self.rows += table.num_rows
+
+    def _close(self, partition: str) -> None:
+        writer, path = self._open.pop(partition)
+        writer.close()
+        os.replace(path.with_suffix(".parquet.tmp"), path)
+        self.files.append(str(path))
+
+    def close_idle(self, active: Iterable[str]) -> None:
+        # Rows arrive roughly in time order; don't hold a file per day of a backfill
+        for partition in set(self._open) - set(active):
+            self._close(partition)
+
+    def close(self) -> List[str]:
+        self.close_idle(())
+        return self.files
+
+    def abort(self) -> None:
+        for writer, path in self._open.values():
+            writer.close()
+            path.with_suffix(".parquet.tmp").unlink(missing_ok=True)
+        self._open.clear()
+
+
+def _write_by_day(pa, writer: _PartitionWriter, docs: List[Dict[str, Any]], time_fields: Tuple[str, ...]) -> None:
+    by_day: Dict[str, List[Dict[str, Any]]] = {}
+    for doc in docs:
+        day = event_time(doc, time_fields).date().isoformat()
+        by_day.setdefault(f"day={day}", []).append({k: _flatten(v) for k, v in doc.items()})
+    for partition, rows in by_day.items():
+        writer.write(partition, to_table(pa, rows, time_fields))
+    writer.close_idle(by_day)
+
+
+def _remove_run_files(base: Path, run_id: str) -> int:
+    removed = 0
+    for path in list(base.glob(f"*/part-{run_id}-*.parquet*")):
+        path.unlink(missing_ok=True)
+        removed += 1
+    return removed
+
+
+def _remove_other_runs(partition: Path, run_id: str) -> int:
+    removed = 0
+    for path in list(partition.glob("part-*.parquet*")):
+        if not path.name.startswith(f"part-{run_id}-"):
+            path.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+
+# -------------------------
+# Runs
+# -------------------------
+
+async def _export_incremental(db, pa, pq, root: Path, collection: str, batch_size: int) -> Dict[str, Any]:
+    time_fields = INCREMENTAL[collection]
+    base = root / collection
+    state = await db[STATE_COLLECTION].find_one({"_id": collection}) or {}
+    pending = state.get("pending")
+    if pending:
+        removed = await asyncio.to_thread(_remove_run_files, base, pending["run_id"])
+        logger.warning(f"Export of {collection}: discarded {removed} files of unfinished run {pending['run_id']}")
+
+    run_id = uuid.uuid4().hex[:12]
+    query: Dict[str, Any] = {"_id": {"$lt": ObjectId.from_datetime(_utc_now() - EXPORT_LAG)}}
+    if state.get("watermark") is not None:
+        query["_id"]["$gt"] = state["watermark"]
+    await db[STATE_COLLECTION].update_one(
+        {"_id": collection},
+        {"$set": {"pending": {"run_id": run_id, "started_at": _utc_now()}}},
+        upsert=True,
+    )
+
+    writer = _PartitionWriter(pa, pq, base, run_id)
+    last_id = state.get("watermark")
+    cursor = db[collection].find(query).sort("_id", 1).batch_size(batch_size)
+    try:
+        while True:
+            docs = await cursor.to_list(length=batch_size)
+            if not docs:
+                break
+            await asyncio.to_thread(_write_by_day, pa, writer, docs, time_fields)
+            last_id = docs[-1]["_id"]
+        files = await asyncio.to_thread(writer.close)
+    except BaseException:
+        writer.abort()
+        raise
+
+    await db[STATE_COLLECTION].update_one(
+        {"_id": collection},
+        {
+            "$set": {"watermark": last_id, "last_run": {"run_id": run_id, "at": _utc_now(), "rows": writer.rows, "files": len(files)}},
+            "$unset": {"pending": ""},
+        },
+    )
+    return {"collection": collection, "mode": "incremental", "rows": writer.rows, "files": files, "watermark": str(last_id) if last_id else None}
+
+
+async def _export_snapshot(db, pa, pq, root: Path, collection: str, batch_size: int) -> Dict[str, Any]:
+    base = root / collection
+    run_id = uuid.uuid4().hex[:12]
+    partition = f"snapshot={_utc_now().date().isoformat()}"
+    writer = _PartitionWriter(pa, pq, base, run_id)
+    cursor = db[collection].find({}, SNAPSHOT[collection]).sort("_id", 1).batch_size(batch_size)
+    try:
+        while True:
+            docs = await cursor.to_list(length=batch_size)
+            if not docs:
+                break
+            rows = [{k: _flatten(v) for k, v in d.items()} for d in docs]
+            await asyncio.to_thread(lambda: writer.write(partition, to_table(pa, rows, ("created_at",))))
+        files = await asyncio.to_thread(writer.close)
+    except BaseException:
+        writer.abort()
+        await asyncio.to_thread(_remove_run_files, base, run_id)
+        raise
+    # The latest run of the day replaces earlier ones
+    replaced = await asyncio.to_thread(_remove_other_runs, base / partition, run_id)
+    if replaced:
+        logger.info(f"Export of {collection}: replaced {replaced} files of earlier {partition} runs")
+
+    await db[STATE_COLLECTION].update_one(
+        {"_id": collection},
+        {"$set": {"last_run": {"run_id": run_id, "at": _utc_now(), "rows": writer.rows, "files": len(files)}}},
+        upsert=True,
+    )
+    return {"collection": collection, "mode": "snapshot", "rows": writer.rows, "files": files}
+
+
+async def _acquire_lock(db, owner: str) -> bool:
+    now = _utc_now()
+    try:
+        # Matches only an expired lock; otherwise the upsert collides on _id
+        await db.system_config.update_one(
+            {"_id": LOCK_ID, "expires_at": {"$lt": now}},
+            {"$set": {"owner": owner, "expires_at": now + LOCK_TTL}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def _release_lock(db, owner: str) -> None:
+    await db.system_config.delete_one({"_id": LOCK_ID, "owner": owner})
+
+
+async def run_export(
+    db,
+    collections: Optional[List[str]] = None,
+    root: Optional[str] = None,
+    batch_size: int = BATCH_SIZE,
+) -> Dict[str, Any]:
+    """
+    Exports the given collections (default: all) under the cross-worker
+    lock. Raises ValueError for unknown collections, PermissionError if
+    another export is running, RuntimeError if pyarrow is missing.
+    """
+    collections = list(collections or COLLECTIONS)
+    unknown = [c for c in collections if c not in COLLECTIONS]
+    if unknown:
+        raise ValueError(f"Unknown export collections: {unknown}; expected {list(COLLECTIONS)}")
+    pa, pq = _arrow()
+    out = export_root(root)
+
+    owner = uuid.uuid4().hex
+    if not await _acquire_lock(db, owner):
+        raise PermissionError("Another export is running")
+    try:
+        results = []
+        for collection in collections:
+            if collection in INCREMENTAL:
+                result = await _export_incremental(db, pa, pq, out, collection, batch_size)
+            else:
+                result = await _export_snapshot(db, pa, pq, out, collection, batch_size)
+            logger.info(f"Exported {result['rows']} {collection} rows to {len(result['files'])} files")
+            results.append(result)
+        return {"root": str(out), "exports": results}
+    finally:
+        await _release_lock(db, owner)
+
+
+async def get_export_state(db) -> List[Dict[str, Any]]:
+    docs = await db[STATE_COLLECTION].find({}).to_list(length=None)
+    for d in docs:
+        d["collection"] = d.pop("_id")
+        if isinstance(d.get("watermark"), ObjectId):
+            d["watermark"] = str(d["watermark"])
+    return docs
+
+
+async def _main(collections: List[str]) -> None:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client[os.environ["DB_NAME"]]
+    try:
+        print(json.dumps(await run_export(db, collections or None), indent=2, default=str))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    asyncio.run(_main(sys.argv[1:]))
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from services.reward_engine import (
+    DIFFICULTY_STEP,
+    GAME_REWARD_RULES,
+    TIERS,
+    calculate_game_rewards,
+    with_overrides,
+)
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "game_rules_version"   # system_config _id bumped on every game config edit
+REFRESH_INTERVAL = 30.0              # seconds; other workers pick up edits
+
+# game_configs fields an admin may set (see admin GameConfig)
+CONFIG_FIELDS = (
+    "enabled", "reward_rate", "difficulty_multiplier",
+    "cooldown_minutes", "daily_play_limit", "tier_required",
+    "zwap_cap", "zpts_cap",
+)
+
+
+class CompiledGameRules:
+    """
+    Immutable per-game rules built once from `game_configs` over the code
+    defaults in `reward_engine.GAME_REWARD_RULES`.
+
+    `rules` is a reward_engine rules table (term coefficients, caps,
+    reward_rate, difficulty_step) ready for the scalar and batch functions;
+    `policies` holds the non-reward fields: enabled, allowed tiers,
+    cooldown and daily play limit.
+    """
+
+    def __init__(self, configs: List[Dict[str, Any]], version: int = 0):
+        self.version = version
+        overrides: Dict[str, Dict[str, Any]] = {}
+        self.policies: Dict[str, Dict[str, Any]] = {}
+
+        for game_id in GAME_REWARD_RULES:
+            self.policies[game_id] = _policy(game_id, {})
+        for cfg in configs:
+            game_id = cfg.get("game_id")
+            if not game_id:
+                continue
+            overrides[game_id] = _reward_overrides(cfg)
+            self.policies[game_id] = _policy(game_id, cfg)
+
+        rules = with_overrides(GAME_REWARD_RULES, overrides)
+        # Games configured without reward terms have no formula to evaluate
+        self.rules = {g: r for g, r in rules.items() if "zwap_terms" in r and "zpts_terms" in r}
+
+    def policy(self, game_type: str) -> Dict[str, Any]:
+        return self.policies.get(game_type) or _policy(game_type, {})
+
+    def is_enabled(self, game_type: str) -> bool:
+        return self.policy(game_type)["enabled"]
+
+    def allowed_tiers(self, game_type: str) -> List[str]:
+        return self.policy(game_type)["tiers"]
+
+    def rewards_by_tier(self, game_type: str, score: int, level: int, blocks: int = 0) -> Dict[str, Dict[str, Any]]:
+        """
+        Rewards for one result at every tier multiplier.
+        """
+        return {
+            tier: calculate_game_rewards(game_type, score, level, blocks, cfg["zwap_multiplier"], rules=self.rules)
+            for tier, cfg in TIERS.items()
+        }
+
+
+def _reward_overrides(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    fields: Dict[str, Any] = {}
+    if cfg.get("reward_rate") is not None:
+        fields["reward_rate"] = float(cfg["reward_rate"])
+    multiplier = cfg.get("difficulty_multiplier")
+    if multiplier is not None and float(multiplier) != 1.0:
+        fields["difficulty_step"] = DIFFICULTY_STEP * float(multiplier)
+    for cap in ("zwap_cap", "zpts_cap"):
+        if cfg.get(cap) is not None:
+            fields[cap] = cfg[cap]
+    return fields
+
+
+def _policy(game_type: str, cfg: Dict[str, Any]) -> Dict[str, Any]:
+    tier_order = list(TIERS)
+    required = cfg.get("tier_required")
+    if required in TIERS:
+        # Tiers are ordered lowest first; a required tier unlocks it and everything above
+        tiers = tier_order[tier_order.index(required):]
+    else:
+        tiers = [t for t, c in TIERS.items() if game_type in c["games"]]
+    return {
+        "enabled": bool(cfg.get("enabled", True)),
+        "tiers": tiers,
+        "cooldown_minutes": max(0, int(cfg.get("cooldown_minutes") or 0)),
+        "daily_play_limit": max(0, int(cfg.get("daily_play_limit") or 0)),
+    }
+
+
+# Code defaults until load_rules() runs
+_table: CompiledGameRules = CompiledGameRules([])
+_refresher: Optional[asyncio.Task] = None
+
+
+# -------------------------
+# Hot path (no I/O)
+# -------------------------
+
+def get_rules() -> CompiledGameRules:
+    return _table
+
+
+# -------------------------
+# Loading / invalidation
+# -------------------------
+
+async def _current_version(db) -> int:
+    doc = await db.system_config.find_one({"_id": VERSION_KEY}, {"value": 1})
+    return int(doc.get("value", 0)) if doc else 0
+
+
+async def load_rules(db) -> CompiledGameRules:
+    """
+    (Re)compiles the rules table from `game_configs`.
+    """
+    global _table
+    version = await _current_version(db)
+    configs = await db.game_configs.find({}, {"_id": 0}).to_list(length=None)
+    _table = CompiledGameRules(configs, version=version)
+    logger.info(f"Compiled game rules v{version}: {len(configs)} game configs")
+    return _table
+
+
+async def _bump_and_reload(db) -> None:
+    await db.system_config.update_one({"_id": VERSION_KEY}, {"$inc": {"value": 1}}, upsert=True)
+    await load_rules(db)
+
+
+def start_refresher(db) -> None:
+    """
+    Polls the rules version so edits made through another worker invalidate
+    this worker's table.
+    """
+    global _refresher
+    if _refresher is None:
+        _refresher = asyncio.create_task(_refresh_loop(db))
+
+
+async def stop_refresher() -> None:
+    global _refresher
+    if _refresher is not None:
+        _refresher.cancel()
+        try:
+            await _refresher
+        except asyncio.CancelledError:
+            pass
+        _refresher = None
+
+
+async def _refresh_loop(db) -> None:
+    while True:
+        await asyncio.sleep(REFRESH_INTERVAL)
+        try:
+            if await _current_version(db) != _table.version:
+                await load_rules(db)
+        except Exception as e:
+            logger.warning(f"Game rules refresh failed: {e}")
+
+
+# -------------------------
+# Admin API
+# -------------------------
+
+async def update_game_config(db, game_id: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Stores a game's config and rebuilds the rules table on every worker.
+    """
+    fields = {k: v for k, v in config.items() if k in CONFIG_FIELDS and v is not None}
+    if "tier_required" in fields and fields["tier_required"] not in TIERS:
+        raise ValueError(f"Unknown tier: {fields['tier_required']}")
+    await db.game_configs.update_one(
+        {"game_id": game_id},
+        {"$set": {"game_id": game_id, **fields}},
+        upsert=True,
+    )
+    await _bump_and_reload(db)
+    return {"success": True, "game_id": game_id, "rules_version": _table.version}
@@ -0,0 +1,331 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import services.analytics_rollup_service as analytics_rollup_service
+import services.game_rules_service as game_rules_service
+import services.play_limit_service as play_limit_service
+import services.reward_service as reward_service
+from services.reward_engine import TIERS, get_user_tier_config
+
+logger = logging.getLogger(__name__)
+
+SESSION_TTL = timedelta(minutes=30)      # idle sessions are closed and credited
+MAX_ROUNDS_PER_SESSION = 500
+DURATION_SLACK_SECONDS = 5.0             # client clocks vs server wall time
+REAPER_INTERVAL = 30.0                   # seconds
+
+# Per-round plausibility limits; games not listed use the defaults
+DEFAULT_ROUND_LIMITS: Dict[str, float] = {
+    "max_score": 1_000_000,
+    "max_level": 100,
+    "max_blocks": 10_000,
+    "min_seconds": 1.0,
+}
+ROUND_LIMITS: Dict[str, Dict[str, float]] = {
+    "zbrickles": {"max_score": 200_000, "max_blocks": 2_000, "min_seconds": 5.0},
+    "ztetris": {"max_score": 1_000_000, "min_seconds": 10.0},
+    "ztrivia": {"max_score": 50, "max_blocks": 0, "min_seconds": 3.0},
+    "zslots": {"max_score": 1_000, "max_blocks": 0, "min_seconds": 1.0},
+}
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _limits(game_type: str) -> Dict[str, float]:
+    return {**DEFAULT_ROUND_LIMITS, **ROUND_LIMITS.get(game_type, {})}
+
+
+class GameSession:
+    """
+    In-memory state of one open play session. Rounds are keyed by the client's
+    round number so retried uploads are idempotent.
+    """
+    __slots__ = (
+        "session_id", "wallet_address", "game_type", "tier",
+        "started_at", "last_seen", "rounds", "rejected",
+    )
+
+    def __init__(self, wallet_address: str, game_type: str, tier: str):
+        now = _utc_now()
+        self.session_id = str(uuid.uuid4())
+        self.wallet_address = wallet_address
+        self.game_type = game_type
+        self.tier = tier
+        self.started_at = now
+        self.last_seen = now
+        self.rounds: Dict[int, Dict[str, Any]] = {}
+        self.rejected: List[Dict[str, Any]] = []
+
+    def played_seconds(self) -> float:
+        return sum(r["duration_seconds"] for r in self.rounds.values())
+
+
+# Sessions live in the worker that opened them; deployments with several
+# workers need sticky routing on the wallet, which also keeps the one open
+# session per (wallet, game) cap worker-wide.
+_sessions: Dict[str, GameSession] = {}
+_open: Dict[Tuple[str, str], str] = {}    # (wallet, game) -> open session id
+_reaper: Optional[asyncio.Task] = None
+
+
+# -------------------------
+# Public API
+# -------------------------
+
+async def open_session(db, wallet_address: str, game_type: str) -> Dict[str, Any]:
+    """
+    Starts a session after checking the game is enabled, the wallet exists
+    and its tier has the game. Opening counts as one play towards the
+    game's cooldown and daily play limit; every further round is counted
+    when the session closes.
+
+    A wallet has at most one open session per game: opening another closes
+    (and credits) the previous one as "superseded", so parallel sessions
+    cannot each claim the same wall time.
+    """
+    rules = game_rules_service.get_rules()
+    if not rules.is_enabled(game_type):
+        raise PermissionError(f"Game {game_type} is currently disabled")
+    wallet = wallet_address.lower()
+    user = await db.users.find_one({"wallet_address": wallet}, {"_id": 0, "tier": 1})
+    if not user:
+        raise LookupError("User not found")
+    tier = user.get("tier", "starter")
+    tier_config = get_user_tier_config(tier)
+    if (tier if tier in TIERS else "starter") not in rules.allowed_tiers(game_type):
+        raise PermissionError(f"Game not available in {tier_config['name']} tier")
+    await play_limit_service.get_limiter().acquire(wallet, game_type)
+
+    previous = _open.get((wallet, game_type))
+    if previous is not None:
+        await _close_quietly(db, previous, "superseded")
+
+    session = GameSession(wallet, game_type, tier if tier in TIERS else "starter")
+    _sessions[session.session_id] = session
+    _open[(wallet, game_type)] = session.session_id
+    return {
+        "session_id": session.session_id,
+        "game_type": game_type,
+        "started_at": session.started_at.isoformat(),
+        "expires_at": (session.started_at + SESSION_TTL).isoformat(),
+        "max_rounds": MAX_ROUNDS_PER_SESSION,
+    }
+
+
+def add_rounds(session_id: str, rounds: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Validates and buffers round results. No database access.
+
+    Each round: {"round": int, "score": int, "level": int,
+                 "blocks_destroyed": int, "duration_seconds": float}
+    """
+    session = _get_session(session_id)
+    limits = _limits(session.game_type)
+    now = _utc_now()
+    elapsed = (now - session.started_at).total_seconds() + DURATION_SLACK_SECONDS
+
+    accepted, duplicates, rejected = 0, 0, []
+    for r in rounds:
+        number = int(r["round"])
+        if number in session.rounds:
+            duplicates += 1
+            continue
+        reason = _validate_round(r, limits, session, elapsed)
+        if reason:
+            rejected.append({"round": number, "reason": reason})
+            continue
+        session.rounds[number] = {
+            "score": int(r["score"]),
+            "level": int(r.get("level", 1)),
+            "blocks_destroyed": int(r.get("blocks_destroyed", 0)),
+            "duration_seconds": float(r["duration_seconds"]),
+        }
+        accepted += 1
+
+    session.rejected.extend(rejected)
+    session.last_seen = now
+    return {
+        "session_id": session_id,
+        "accepted": accepted,
+        "duplicates": duplicates,
+        "rejected": rejected,
+        "rounds_total": len(session.rounds),
+    }
+
+
+async def close_session(db, session_id: str, status: str = "completed") -> Dict[str, Any]:
+    """
+    Aggregates the buffered rounds, credits them with one balance mutation
+    and writes one `game_sessions` document. Rounds after the first count as
+    plays towards the daily limit; those over it are rejected, not credited.
+    """
+    session = _sessions.pop(session_id, None)
+    if session is None:
+        raise LookupError("Session not found")
+    key = (session.wallet_address, session.game_type)
+    if _open.get(key) == session_id:
+        del _open[key]
+
+    ended_at = _utc_now()
+    numbers = sorted(session.rounds)
+    if len(numbers) > 1:
+        granted = await play_limit_service.get_limiter().consume(
+            session.wallet_address, session.game_type, len(numbers) - 1, now=ended_at,
+        )
+        for number in numbers[1 + granted:]:
+            del session.rounds[number]
+            session.rejected.append({"round": number, "reason": "daily_limit"})
+        numbers = numbers[:1 + granted]
+    rounds = [session.rounds[k] for k in numbers]
+    rules = game_rules_service.get_rules()
+    zwap_by_tier = {tier: 0.0 for tier in TIERS}
+    base_zpts = 0
+    for r in rounds:
+        rewards = rules.rewards_by_tier(session.game_type, r["score"], r["level"], r["blocks_destroyed"])
+        for tier, reward in rewards.items():
+            zwap_by_tier[tier] += reward["zwap"]
+        base_zpts += rewards["starter"]["zpts"]  # zPts do not scale with tier
+    zwap_by_tier = {tier: round(v, 2) for tier, v in zwap_by_tier.items()}
+
+    credited = {"zwap": 0.0, "zpts": 0}
+    new_balances: Dict[str, Any] = {}
+    if rounds:
+        try:
+            updated = await reward_service.credit_game_rewards(
+                db, session.wallet_address, session.game_type, zwap_by_tier, base_zpts,
+                games=len(rounds), now=ended_at,
+            )
+        except (LookupError, PermissionError) as e:
+            # Tier changed or user removed mid-session: record, credit nothing
+            status = "rejected"
+            session.rejected.append({"round": None, "reason": str(e)})
+        else:
+            credited = {"zwap": updated["last_game_reward"]["zwap"], "zpts": updated["last_game_reward"]["zpts"]}
+            new_balances = {
+                "new_zwap_balance": updated.get("zwap_balance"),
+                "new_zpts_balance": updated.get("zpts_balance"),
+            }
+
+    doc = {
+        "session_id": session.session_id,
+        "wallet_address": session.wallet_address,
+        "game_type": session.game_type,
+        "tier": session.tier,
+        "status": status,
+        "rounds": len(rounds),
+        "total_score": sum(r["score"] for r in rounds),
+        "max_level": max((r["level"] for r in rounds), default=0),
+        "blocks_destroyed": sum(r["blocks_destroyed"] for r in rounds),
+        "played_seconds": session.played_seconds(),
+        "round_scores": [r["score"] for r in rounds],
+        "rejected_rounds": session.rejected,
+        "zwap_earned": credited["zwap"],
+        "zpts_earned": credited["zpts"],
+        "zpts_capped": credited["zpts"] < base_zpts,
+        "started_at": session.started_at,
+        "ended_at": ended_at,
+        "timestamp": ended_at,
+    }
+    await db.game_sessions.insert_one(doc)
+    if status != "rejected" and rounds:
+        rollups = analytics_rollup_service.get_rollups()
+        rollups.record_game(session.wallet_address, session.game_type, origin="session", games=len(rounds), now=ended_at)
+        rollups.record_reward(session.wallet_address, "game_session", zwap=credited["zwap"], zpts=credited["zpts"], now=ended_at)
+
+    return {
+        "session_id": session.session_id,
+        "game": session.game_type,
+        "status": status,
+        "rounds": doc["rounds"],
+        "total_score": doc["total_score"],
+        "zwap_earned": credited["zwap"],
+        "zpts_earned": credited["zpts"],
+        "zpts_capped": doc["zpts_capped"],
+        "rejected_rounds": len(session.rejected),
+        **new_balances,
+    }
+
+
+# -------------------------
+# Reaper
+# -------------------------
+
+def start_reaper(db) -> None:
+    """
+    Closes idle sessions in the background so abandoned games still get credited.
+    """
+    global _reaper
+    if _reaper is None:
+        _reaper = asyncio.create_task(_reap_loop(db))
+
+
+async def stop_reaper(db) -> None:
+    """
+    Stops the reaper and closes every open session (used on shutdown).
+    """
+    global _reaper
+    if _reaper is not None:
+        _reaper.cancel()
+        try:
+            await _reaper
+        except asyncio.CancelledError:
+            pass
+        _reaper = None
+    for session_id in list(_sessions):
+        await _close_quietly(db, session_id, "interrupted")
+
+
+async def _reap_loop(db) -> None:
+    while True:
+        await asyncio.sleep(REAPER_INTERVAL)
+        cutoff = _utc_now() - SESSION_TTL
+        for session_id in [s.session_id for s in _sessions.values() if s.last_seen < cutoff]:
+            await _close_quietly(db, session_id, "expired")
+
+
+async def _close_quietly(db, session_id: str, status: str) -> None:
+    try:
+        await close_session(db, session_id, status=status)
+    except LookupError:
+        pass
+    except Exception as e:
+        logger.error(f"Failed to close game session {session_id}: {e}")
+
+
+# -------------------------
+# Internals
+# -------------------------
+
+def _get_session(session_id: str) -> GameSession:
+    session = _sessions.get(session_id)
+    if session is None:
+        raise LookupError("Session not found")
+    if _utc_now() - session.last_seen > SESSION_TTL:
+        raise LookupError("Session expired")
+    return session
+
+
+def _validate_round(r: Dict[str, Any], limits: Dict[str, float], session: GameSession, elapsed: float) -> Optional[str]:
+    if len(session.rounds) >= MAX_ROUNDS_PER_SESSION:
+        return "too_many_rounds"
+    score = int(r["score"])
+    level = int(r.get("level", 1))
+    blocks = int(r.get("blocks_destroyed", 0))
+    duration = float(r.get("duration_seconds", 0))
+    if score < 0 or score > limits["max_score"]:
+        return "score_out_of_range"
+    if level < 1 or level > limits["max_level"]:
+        return "level_out_of_range"
+    if blocks < 0 or blocks > limits["max_blocks"]:
+        return "blocks_out_of_range"
+    if duration < limits["min_seconds"]:
+        return "round_too_fast"
+    # Rounds cannot add up to more play time than has passed since the session opened
+    if session.played_seconds() + duration > elapsed:
+        return "duration_exceeds_session"
+    return None
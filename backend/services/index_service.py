@@ -0,0 +1,319 @@
+"""
+Declarative index registry, applied idempotently at startup.
+
+Run `python -m services.index_service --dry-run` from backend/ (with
+MONGO_URL and DB_NAME set) to print the diff without changing anything.
+"""
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure, PyMongoError
+
+import services.migration_service as migration_service
+
+logger = logging.getLogger(__name__)
+
+# Options compared against existing indexes; anything else is ignored
+OPTION_KEYS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+# -------------------------
+# Registry
+# -------------------------
+# collection -> [{"keys": [(field, direction)], **options}]. Names default to
+# Mongo's own naming so indexes created by hand with the same keys match.
+
+INDEXES: Dict[str, List[Dict[str, Any]]] = {
+    "users": [
+        {"keys": [("wallet_address", 1)], "name": "wallet_address_unique", "unique": True},
+        # Leaderboards and rank counts
+        {"keys": [("total_earned", -1)]},
+        {"keys": [("games_played", -1)]},
+        {"keys": [("total_steps", -1)]},
+        {"keys": [("zpts_balance", -1)]},
+        {"keys": [("zwap_balance", -1)]},
+        # Admin filters and dashboard counts
+        {"keys": [("tier", 1)]},
+        {"keys": [("status", 1)]},
+        {"keys": [("last_active", -1)]},
+        {"keys": [("fraud_flags", 1)], "sparse": True},
+        # Admin user search (user_search_service)
+        {"keys": [("search_username", 1), ("_id", 1)]},
+        {"keys": [("search_grams", 1)]},
+        # Cohort signups per day (cohort_service)
+        {"keys": [("created_at", 1)]},
+    ],
+    "rewards_ledger": [
+        {"keys": [("timestamp", -1)]},
+        {"keys": [("source", 1), ("timestamp", -1)]},
+        {"keys": [("user_id", 1), ("timestamp", -1)]},
+        {"keys": [("status", 1), ("timestamp", -1)]},
+    ],
+    "rewards": [
+        {"keys": [("user_id", 1), ("timestamp", -1)]},
+    ],
+    "payment_transactions": [
+        {"keys": [("session_id", 1)]},
+        {"keys": [("event_id", 1)], "sparse": True},
+    ],
+    "purchases": [
+        {"keys": [("user_wallet", 1), ("purchased_at", -1)]},
+        {"keys": [("timestamp", -1)]},
+        {"keys": [("purchased_at", -1)]},
+    ],
+    "swaps": [
+        {"keys": [("user_wallet", 1), ("timestamp", -1)]},
+        {"keys": [("timestamp", -1)]},
+    ],
+    "game_sessions": [
+        {"keys": [("timestamp", -1)]},
+        {"keys": [("wallet_address", 1), ("timestamp", -1)]},
+        {"keys": [("session_id", 1)], "unique": True, "sparse": True},
+    ],
+    "admin_logs": [
+        {"keys": [("timestamp", -1)]},
+    ],
+    "fraud_flags": [
+        {"keys": [("timestamp", -1)]},
+        {"keys": [("wallet_address", 1), ("timestamp", -1)]},
+    ],
+    "trivia_questions": [
+        {"keys": [("id", 1)], "unique": True},
+        {"keys": [("ordinal", 1)], "unique": True, "partialFilterExpression": {"ordinal": {"$exists": True}}},
+    ],
+    "trivia_seen": [
+        {"keys": [("wallet_address", 1)], "unique": True},
+    ],
+    "play_counters": [
+        {"keys": [("expires_at", 1)], "expireAfterSeconds": 0},
+    ],
+    "scratch_batches": [
+        {"keys": [("batch_id", 1)], "unique": True},
+    ],
+    "scratch_plays": [
+        {"keys": [("wallet_address", 1), ("timestamp", -1)]},
+        {"keys": [("batch_id", 1), ("index", 1)]},
+        {"keys": [("timestamp", -1)]},
+    ],
+    "analytics_active": [
+        {"keys": [("day", 1)]},
+        {"keys": [("expires_at", 1)], "expireAfterSeconds": 0},
+    ],
+    "cohort_matrix": [
+        {"keys": [("signup_week", 1)]},
+    ],
+    "activity_sketches": [
+        {"keys": [("kind", 1), ("day", -1)]},
+    ],
+    "game_configs": [
+        {"keys": [("game_id", 1)], "unique": True},
+    ],
+    "shop_items": [
+        {"keys": [("id", 1)], "unique": True},
+    ],
+    "news": [
+        {"keys": [("is_active", 1), ("priority", -1), ("created_at", -1)]},
+        {"keys": [("created_at", -1)]},
+    ],
+}
+
+# Representative shapes of the hottest queries; none may plan as a COLLSCAN
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+HOT_QUERIES: List[Dict[str, Any]] = [
+    {"collection": "users", "filter": {"wallet_address": "0x0"}},
+    {"collection": "users", "filter": {}, "sort": [("total_earned", -1)], "limit": 10},
+    {"collection": "users", "filter": {}, "sort": [("games_played", -1)], "limit": 10},
+    {"collection": "users", "filter": {}, "sort": [("total_steps", -1)], "limit": 10},
+    {"collection": "users", "filter": {}, "sort": [("zpts_balance", -1)], "limit": 10},
+    {"collection": "users", "filter": {"total_earned": {"$gt": 0}}},
+    {"collection": "users", "filter": {"search_grams": {"$all": ["abc", "bcd"]}}, "sort": [("_id", 1)], "limit": 51},
+    {"collection": "rewards_ledger", "filter": {"timestamp": {"$gte": _EPOCH}}, "sort": [("timestamp", -1)], "limit": 50},
+    {"collection": "rewards_ledger", "filter": {"user_id": "0x0"}, "sort": [("timestamp", -1)], "limit": 50},
+    {"collection": "payment_transactions", "filter": {"session_id": "cs_0"}},
+    {"collection": "game_sessions", "filter": {"wallet_address": "0x0"}, "sort": [("timestamp", -1)], "limit": 20},
+    {"collection": "trivia_seen", "filter": {"wallet_address": "0x0"}},
+]
+
+
+def index_name(spec: Dict[str, Any]) -> str:
+    return spec.get("name") or "_".join(f"{field}_{direction}" for field, direction in spec["keys"])
+
+
+def _key_tuple(keys) -> tuple:
+    # Live indexes may report directions as floats (1.0)
+    return tuple((f, int(d) if isinstance(d, (int, float)) else d) for f, d in keys)
+
+
+def _options(spec: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: spec[k] for k in OPTION_KEYS if k in spec}
+
+
+# -------------------------
+# Apply / diff
+# -------------------------
+
+async def plan_indexes(db) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Diffs the registry against the live indexes.
+
+    Returns {"create", "conflicts", "unmanaged"}: registry indexes to build,
+    indexes whose keys match but options differ (never changed
+    automatically), and live indexes the registry does not know about.
+    """
+    plan: Dict[str, List[Dict[str, Any]]] = {"create": [], "conflicts": [], "unmanaged": []}
+    for collection, specs in INDEXES.items():
+        live = await db[collection].index_information()
+        live_by_keys = {_key_tuple(info["key"]): (name, info) for name, info in live.items()}
+        wanted = set()
+        for spec in specs:
+            keys = _key_tuple(spec["keys"])
+            wanted.add(keys)
+            found = live_by_keys.get(keys)
+            entry = {"collection": collection, "name": index_name(spec), "keys": spec["keys"], "options": _options(spec)}
+            if found is None:
+                plan["create"].append(entry)
+                continue
+            live_options = {k: found[1][k] for k in OPTION_KEYS if k in found[1]}
+            if live_options.get("unique") is False:
+                live_options.pop("unique")
+            if live_options != entry["options"]:
+                plan["conflicts"].append({**entry, "live_name": found[0], "live_options": live_options})
+        for keys, (name, _) in live_by_keys.items():
+            if name != "_id_" and keys not in wanted:
+                plan["unmanaged"].append({"collection": collection, "name": name, "keys": [list(k) for k in keys]})
+    return plan
+
+
+async def apply_indexes(db, dry_run: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Builds missing registry indexes: one createIndexes per collection for
+    plain indexes, and one per unique index, since existing duplicates fail
+    the whole call. Conflicting and unmanaged indexes are only reported.
+    """
+    plan = await plan_indexes(db)
+    plan["created"], plan["failed"] = [], []
+    if dry_run:
+        return plan
+
+    builds: Dict[Any, List[Dict[str, Any]]] = {}
+    for entry in plan["create"]:
+        key = (entry["collection"], entry["name"]) if entry["options"].get("unique") else (entry["collection"], None)
+        builds.setdefault(key, []).append(entry)
+    for (collection, _), entries in builds.items():
+        models = [IndexModel(e["keys"], name=e["name"], background=True, **e["options"]) for e in entries]
+        try:
+            await db[collection].create_indexes(models)
+            plan["created"].extend(entries)
+        except OperationFailure as e:
+            # e.g. duplicates blocking a unique index; every other build still runs
+            logger.error(f"Index build failed on {collection} ({', '.join(e['name'] for e in entries)}): {e}")
+            plan["failed"].extend({**entry, "error": str(e)} for entry in entries)
+    for c in plan["conflicts"]:
+        logger.warning(f"Index {c['collection']}.{c['live_name']} options {c['live_options']} differ from registry {c['options']}")
+    return plan
+
+
+# -------------------------
+# COLLSCAN check
+# -------------------------
+
+def _plan_stages(node: Optional[Dict[str, Any]]) -> List[str]:
+    if not node:
+        return []
+    stages = [node["stage"]] if "stage" in node else []
+    for child in ("inputStage", "queryPlan", "outerStage", "innerStage"):
+        stages += _plan_stages(node.get(child))
+    for child in node.get("inputStages", []):
+        stages += _plan_stages(child)
+    return stages
+
+
+async def find_collscans(db, queries: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """
+    Explains each hot query and returns those whose winning plan scans the collection.
+    """
+    offenders = []
+    for q in queries or HOT_QUERIES:
+        cursor = db[q["collection"]].find(q["filter"])
+        if q.get("sort"):
+            cursor = cursor.sort(q["sort"])
+        if q.get("limit"):
+            cursor = cursor.limit(q["limit"])
+        explain = await cursor.explain()
+        stages = _plan_stages(explain.get("queryPlanner", {}).get("winningPlan"))
+        if "COLLSCAN" in stages:
+            offenders.append({**q, "stages": stages})
+    return offenders
+
+
+async def check_hot_queries(db, strict: bool = True) -> List[Dict[str, Any]]:
+    offenders = await find_collscans(db)
+    if offenders:
+        shapes = ", ".join(f"{o['collection']} {o['filter']} sort={o.get('sort')}" for o in offenders)
+        if strict:
+            raise RuntimeError(f"Hot queries would run as COLLSCAN: {shapes}")
+        logger.error(f"Hot queries would run as COLLSCAN: {shapes}")
+    return offenders
+
+
+# -------------------------
+# Startup
+# -------------------------
+
+async def bootstrap_database(db) -> Dict[str, Any]:
+    """
+    Runs pending migrations, builds missing indexes and checks hot query plans.
+
+    DB_BOOTSTRAP: "apply" (default), "dry_run" (log the diff only) or "off".
+    COLLSCAN_CHECK: "strict" (default, refuse to start), "warn" or "off".
+    While any index build fails on existing data, "strict" only warns:
+    the failure is logged and reported, and the app still starts.
+    """
+    mode = os.environ.get("DB_BOOTSTRAP", "apply").lower()
+    if mode == "off":
+        return {}
+    dry_run = mode == "dry_run"
+    try:
+        migrations = await migration_service.run_migrations(db, dry_run=dry_run)
+        indexes = await apply_indexes(db, dry_run=dry_run)
+    except PyMongoError as e:
+        logger.error(f"Database bootstrap failed: {e}")
+        raise
+    logger.info(
+        f"DB bootstrap ({mode}): {len(migrations)} migrations, "
+        f"{len(indexes['created'])} indexes built, {len(indexes['create'])} missing, "
+        f"{len(indexes['conflicts'])} conflicts, {len(indexes['unmanaged'])} unmanaged"
+    )
+
+    check = os.environ.get("COLLSCAN_CHECK", "strict").lower()
+    if check != "off" and not dry_run:
+        if indexes["failed"] and check == "strict":
+            logger.error(f"{len(indexes['failed'])} index builds failed; COLLSCAN check only warns until they succeed")
+        await check_hot_queries(db, strict=check == "strict" and not indexes["failed"])
+    return {"migrations": migrations, "indexes": indexes}
+
+
+async def _main(dry_run: bool) -> None:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client[os.environ["DB_NAME"]]
+    try:
+        report = {
+            "migrations": await migration_service.run_migrations(db, dry_run=dry_run),
+            "indexes": await apply_indexes(db, dry_run=dry_run),
+            "collscans": await find_collscans(db),
+        }
+        print(json.dumps(report, indent=2, default=str))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    asyncio.run(_main(dry_run="--dry-run" in sys.argv))
@@ -0,0 +1,208 @@
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+import services.user_search_service as user_search_service
+from services.user_service import SIGNUP_BONUS_ZWAP
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_COLLECTION = "schema_migrations"
+LOCK_ID = "migration_lock"               # system_config _id
+LOCK_TTL = timedelta(minutes=10)
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# -------------------------
+# Migrations
+# -------------------------
+# Append only: (version, name, fn). Each fn takes db and returns a summary
+# dict; it must be safe to re-run if a worker dies part-way through.
+
+async def _users_default_status(db) -> Dict[str, Any]:
+    result = await db.users.update_many({"status": {"$exists": False}}, {"$set": {"status": "active"}})
+    return {"updated": result.modified_count}
+
+
+async def _lowercase_wallet_addresses(db) -> Dict[str, Any]:
+    """
+    Every lookup lowercases the wallet; mixed-case rows are unreachable and
+    would collide with the unique wallet index once lowercased.
+    """
+    mixed = await db.users.find(
+        {"wallet_address": {"$regex": "[A-F]"}}, {"_id": 1, "wallet_address": 1}
+    ).to_list(length=None)
+    if not mixed:
+        return {"updated": 0, "conflicts": []}
+    lowered = {d["wallet_address"].lower() for d in mixed}
+    taken = {
+        d["wallet_address"]
+        for d in await db.users.find({"wallet_address": {"$in": list(lowered)}}, {"_id": 0, "wallet_address": 1}).to_list(length=None)
+    }
+    operations, conflicts = [], []
+    for d in mixed:
+        target = d["wallet_address"].lower()
+        if target in taken:
+            conflicts.append(d["wallet_address"])  # needs a manual merge
+            continue
+        taken.add(target)
+        operations.append(UpdateOne({"_id": d["_id"]}, {"$set": {"wallet_address": target}}))
+    if operations:
+        await db.users.bulk_write(operations, ordered=False)
+    if conflicts:
+        logger.error(f"{len(conflicts)} mixed-case wallets collide with existing users and were left as-is")
+    return {"updated": len(operations), "conflicts": conflicts}
+
+
+async def _user_search_fields(db, batch_size: int = 1000) -> Dict[str, Any]:
+    """
+    Backfills search_username/search_grams for admin user search. Walks
+    _id in order, so each batch resumes where the last one stopped instead
+    of rescanning users that already have the fields.
+    """
+    updated = 0
+    last = None
+    while True:
+        query: Dict[str, Any] = {"search_grams": {"$exists": False}}
+        if last is not None:
+            query["_id"] = {"$gt": last}
+        batch = await db.users.find(
+            query, {"_id": 1, "wallet_address": 1, "custom_username": 1}
+        ).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            return {"updated": updated}
+        last = batch[-1]["_id"]
+        await db.users.bulk_write([
+            UpdateOne({"_id": d["_id"]}, {"$set": user_search_service.search_fields(d.get("wallet_address", ""), d.get("custom_username"))})
+            for d in batch
+        ], ordered=False)
+        updated += len(batch)
+
+
+def _untouched(user: Dict[str, Any]) -> bool:
+    # A signup that never did anything: what a lost connect race leaves behind
+    return (
+        not user.get("total_steps")
+        and not user.get("games_played")
+        and not user.get("zpts_balance")
+        and (user.get("total_earned") or 0) <= SIGNUP_BONUS_ZWAP
+        and user.get("zwap_balance") == user.get("total_earned")
+    )
+
+
+async def _duplicate_wallets(db, report_limit: int = 1000) -> Dict[str, Any]:
+    """
+    Resolves wallets held by more than one user, which block the unique
+    wallet index. Untouched copies are deleted in favour of the active one
+    (or the oldest); wallets with several active copies are left as-is and
+    reported for a manual merge, and the index build then fails without
+    stopping startup.
+    """
+    groups = await db.users.aggregate([
+        {"$group": {"_id": "$wallet_address", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True).to_list(length=None)
+    if not groups:
+        return {"duplicates": 0, "removed": 0, "conflicts": []}
+
+    ids = [_id for g in groups for _id in g["ids"]]
+    users = await db.users.find(
+        {"_id": {"$in": ids}},
+        {"_id": 1, "wallet_address": 1, "total_steps": 1, "games_played": 1, "zpts_balance": 1, "zwap_balance": 1, "total_earned": 1},
+    ).to_list(length=None)
+    by_wallet: Dict[Any, List[Dict[str, Any]]] = {}
+    for user in sorted(users, key=lambda u: str(u["_id"])):   # ObjectIds sort by creation time
+        by_wallet.setdefault(user.get("wallet_address"), []).append(user)
+
+    removable, conflicts = [], []
+    for wallet, copies in by_wallet.items():
+        active = [u for u in copies if not _untouched(u)]
+        keep = active or copies[:1]
+        removable += [u["_id"] for u in copies if u not in keep]
+        if len(keep) > 1:
+            conflicts.append(wallet)
+    if removable:
+        await db.users.delete_many({"_id": {"$in": removable}})
+    if conflicts:
+        logger.error(f"{len(conflicts)} wallets have several active users and need a manual merge before the unique wallet index can build")
+    return {"duplicates": len(groups), "removed": len(removable), "conflicts": conflicts[:report_limit], "conflict_count": len(conflicts)}
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Any], Awaitable[Dict[str, Any]]]]] = [
+    (1, "users_default_status", _users_default_status),
+    (2, "lowercase_wallet_addresses", _lowercase_wallet_addresses),
+    (3, "user_search_fields", _user_search_fields),
+    (4, "duplicate_wallets", _duplicate_wallets),
+]
+
+
+# -------------------------
+# Runner
+# -------------------------
+
+async def _acquire_lock(db, owner: str) -> bool:
+    now = _utc_now()
+    try:
+        # Matches only an expired lock; otherwise the upsert collides on _id
+        await db.system_config.update_one(
+            {"_id": LOCK_ID, "expires_at": {"$lt": now}},
+            {"$set": {"owner": owner, "expires_at": now + LOCK_TTL}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def _release_lock(db, owner: str) -> None:
+    await db.system_config.delete_one({"_id": LOCK_ID, "owner": owner})
+
+
+async def pending_migrations(db) -> List[Tuple[int, str]]:
+    applied = {d["_id"] for d in await db[MIGRATIONS_COLLECTION].find({}, {"_id": 1}).to_list(length=None)}
+    return [(version, name) for version, name, _ in MIGRATIONS if version not in applied]
+
+
+async def run_migrations(db, dry_run: bool = False) -> List[Dict[str, Any]]:
+    """
+    Applies pending migrations in version order under a cross-worker lock.
+    Returns what ran (or, with dry_run, what would run). Workers that do not
+    get the lock skip; the holder applies everything.
+    """
+    pending = await pending_migrations(db)
+    if dry_run or not pending:
+        return [{"version": v, "name": n, "status": "pending"} for v, n in pending]
+
+    owner = uuid.uuid4().hex
+    if not await _acquire_lock(db, owner):
+        logger.info("Migrations are being applied by another worker")
+        return []
+
+    ran = []
+    try:
+        # Re-read under the lock: the previous holder may have finished some
+        pending = {v for v, _ in await pending_migrations(db)}
+        for version, name, fn in MIGRATIONS:
+            if version not in pending:
+                continue
+            started = _utc_now()
+            summary = await fn(db)
+            await db[MIGRATIONS_COLLECTION].insert_one({
+                "_id": version,
+                "name": name,
+                "summary": summary,
+                "started_at": started,
+                "applied_at": _utc_now(),
+            })
+            logger.info(f"Applied migration {version} {name}: {summary}")
+            ran.append({"version": version, "name": name, "status": "applied", "summary": summary})
+    finally:
+        await _release_lock(db, owner)
+    return ran
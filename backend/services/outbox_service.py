@@ -0,0 +1,247 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+AUDIT_COLLECTION = "admin_logs"
+OUTBOX_COLLECTION = "admin_outbox"
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 0.5   # seconds between drains when idle
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_RETRY_BASE_DELAY = 0.2  # seconds, doubled per attempt
+DEFAULT_QUEUE_SIZE = 10000
+
+DUPLICATE_KEY = 11000
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class AuditOutbox:
+    """
+    In-process outbox for admin audit events.
+
+    Admin endpoints enqueue events and return immediately; a background task
+    drains the queue and batch-inserts into `admin_logs`.
+
+    Modes:
+      - default: events live in memory until the drainer writes them. A crash
+        between the mutation and the next flush can lose queued events.
+      - durable: `run_with_audit` writes the event into `admin_outbox` inside
+        the same transaction as the mutation (requires a replica set). The
+        drainer relays committed outbox documents into `admin_logs`, reusing
+        the outbox `_id` so a relay retried after a crash is idempotent.
+    """
+
+    def __init__(
+        self,
+        db,
+        *,
+        durable: bool = False,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+    ):
+        self.db = db
+        self.durable = durable
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.max_retries = max(0, int(max_retries))
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._pending: List[Dict[str, Any]] = []
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    # -------------------------
+    # Lifecycle
+    # -------------------------
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._drain_loop())
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        Stops the drainer and flushes everything still queued.
+        """
+        self._stopping = True
+        self._wake.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=timeout)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+            self._task = None
+
+        # Final best-effort flush of anything the loop did not get to
+        await self._flush_memory()
+        if self.durable:
+            await self._relay_durable()
+
+        if self._pending:
+            logger.error(
+                "Audit outbox dropped %d events on shutdown: %s",
+                len(self._pending), self._pending,
+            )
+            self._pending = []
+
+    # -------------------------
+    # Producers
+    # -------------------------
+
+    def enqueue(self, event: Dict[str, Any]) -> None:
+        """
+        Queues an audit event without awaiting Mongo.
+        """
+        doc = dict(event)
+        doc.setdefault("timestamp", _utc_now())
+        try:
+            self._queue.put_nowait(doc)
+        except asyncio.QueueFull:
+            # Never block an admin write on audit backpressure
+            self._pending.append(doc)
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+
+    async def run_with_audit(
+        self,
+        mutation: Callable[[Any], Awaitable[Any]],
+        event: Dict[str, Any],
+    ) -> Any:
+        """
+        Runs `mutation(session)` and records `event`.
+
+        In durable mode the mutation and the outbox insert share one
+        transaction; otherwise the mutation runs without a session and the
+        event is queued in memory. If the mutation raises, no event is recorded.
+        """
+        if not self.durable:
+            result = await mutation(None)
+            self.enqueue(event)
+            return result
+
+        doc = dict(event)
+        doc.setdefault("timestamp", _utc_now())
+        async with await self.db.client.start_session() as session:
+            async with session.start_transaction():
+                result = await mutation(session)
+                await self.db[OUTBOX_COLLECTION].insert_one(doc, session=session)
+        self._wake.set()
+        return result
+
+    # -------------------------
+    # Internals
+    # -------------------------
+
+    async def _drain_loop(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            try:
+                await self._flush_memory()
+                if self.durable:
+                    await self._relay_durable()
+            except Exception as e:  # keep the drainer alive
+                logger.error(f"Audit outbox drain failed: {e}")
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        batch = self._pending[: self.batch_size]
+        self._pending = self._pending[self.batch_size:]
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _flush_memory(self) -> None:
+        while self._pending or not self._queue.empty():
+            batch = self._take_batch()
+            if not await self._insert_with_retry(batch):
+                # Keep them for the next drain cycle
+                self._pending = batch + self._pending
+                return
+
+    async def _insert_with_retry(self, batch: List[Dict[str, Any]]) -> bool:
+        delay = DEFAULT_RETRY_BASE_DELAY
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.db[AUDIT_COLLECTION].insert_many(batch, ordered=False)
+                return True
+            except BulkWriteError as e:
+                # Already-written docs (same _id) are fine; retry only the rest
+                errors = e.details.get("writeErrors", [])
+                failed = {err["index"] for err in errors if err.get("code") != DUPLICATE_KEY}
+                if not failed:
+                    return True
+                batch = [doc for i, doc in enumerate(batch) if i in failed]
+            except PyMongoError as e:
+                logger.warning(f"Audit outbox insert failed (attempt {attempt + 1}): {e}")
+            if attempt < self.max_retries:
+                await asyncio.sleep(delay)
+                delay *= 2
+        return False
+
+    async def _relay_durable(self) -> None:
+        outbox = self.db[OUTBOX_COLLECTION]
+        while True:
+            docs = await outbox.find({}).sort("_id", 1).limit(self.batch_size).to_list(self.batch_size)
+            if not docs:
+                return
+            if not await self._insert_with_retry(docs):
+                return
+            await outbox.delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+            if len(docs) < self.batch_size:
+                return
+
+
+# -------------------------
+# Module-level singleton
+# -------------------------
+
+_outbox: Optional[AuditOutbox] = None
+
+
+def start_outbox(db, **kwargs) -> AuditOutbox:
+    """
+    Creates and starts the process-wide outbox. Call from app startup.
+    """
+    global _outbox
+    if _outbox is None:
+        _outbox = AuditOutbox(db, **kwargs)
+        _outbox.start()
+    return _outbox
+
+
+async def stop_outbox() -> None:
+    """
+    Flushes and stops the outbox. Call from app shutdown.
+    """
+    global _outbox
+    if _outbox is not None:
+        await _outbox.stop()
+        _outbox = None
+
+
+def get_outbox() -> AuditOutbox:
+    if _outbox is None:
+        raise RuntimeError("Audit outbox not started")
+    return _outbox
+
+
+def log_admin_action(action: str, **fields: Any) -> None:
+    """
+    Convenience: queue an `admin_logs` entry for `action`.
+    """
+    get_outbox().enqueue({"action": action, **fields})
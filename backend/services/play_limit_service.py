@@ -0,0 +1,375 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+import services.game_rules_service as game_rules_service
+
+logger = logging.getLogger(__name__)
+
+COUNTERS_COLLECTION = "play_counters"
+DEFAULT_FLUSH_INTERVAL = 5.0     # seconds between write-backs of the in-process backend
+DEFAULT_SWEEP_INTERVAL = 60.0    # seconds between expiry sweeps
+REDIS_KEY_PREFIX = "zwap:play:"
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _next_midnight(now: datetime) -> datetime:
+    return datetime(now.year, now.month, now.day, tzinfo=timezone.utc) + timedelta(days=1)
+
+
+class PlayLimitExceeded(PermissionError):
+    """
+    Raised when a game's cooldown or daily play limit blocks a play.
+    Routes map it to 429 with Retry-After.
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# -------------------------
+# Backends
+# -------------------------
+# acquire() atomically checks and records one play and returns
+# (allowed, reason, retry_after_seconds, token); release(token) undoes an
+# acquired play whose reward could not be credited; consume() records up to
+# n further plays under the daily limit (no cooldown) and returns how many fit.
+
+class _Counter:
+    __slots__ = ("day", "plays", "last_play", "expires_at")
+
+    def __init__(self, day: str, plays: int, last_play: float, expires_at: float):
+        self.day = day
+        self.plays = plays
+        self.last_play = last_play
+        self.expires_at = expires_at
+
+
+class InProcessCounters:
+    """
+    Per-(wallet, game) counters in a dict, for single-worker deployments.
+
+    Counters expire at the later of the next UTC midnight and the end of the
+    cooldown. Changes are written behind to `play_counters` so a restart
+    keeps today's counts; nothing is read from Mongo after startup.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._counters: Dict[Tuple[str, str], _Counter] = {}
+        self._dirty: set = set()
+
+    async def acquire(self, wallet: str, game: str, cooldown: int, daily_limit: int, now: datetime):
+        key = (wallet, game)
+        day, ts = now.date().isoformat(), now.timestamp()
+        counter = self._counters.get(key)
+        if counter is None or counter.day != day:
+            plays, last_play = 0, (counter.last_play if counter else 0.0)
+        else:
+            plays, last_play = counter.plays, counter.last_play
+
+        if cooldown and last_play and ts - last_play < cooldown:
+            return False, "cooldown", int(cooldown - (ts - last_play)) + 1, None
+        if daily_limit and plays >= daily_limit:
+            return False, "daily_limit", int(_next_midnight(now).timestamp() - ts) + 1, None
+
+        token = (key, counter.day if counter else None, counter.plays if counter else 0, last_play)
+        expires_at = max(_next_midnight(now).timestamp(), ts + cooldown)
+        self._counters[key] = _Counter(day, plays + 1, ts, expires_at)
+        self._dirty.add(key)
+        return True, None, 0, token
+
+    async def consume(self, wallet: str, game: str, plays: int, daily_limit: int, now: datetime) -> int:
+        key = (wallet, game)
+        day = now.date().isoformat()
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters[key] = _Counter(day, 0, 0.0, _next_midnight(now).timestamp())
+        elif counter.day != day:
+            counter.day, counter.plays = day, 0
+            counter.expires_at = max(counter.expires_at, _next_midnight(now).timestamp())
+        granted = min(plays, max(0, daily_limit - counter.plays)) if daily_limit else plays
+        counter.plays += granted
+        self._dirty.add(key)
+        return granted
+
+    async def release(self, token) -> None:
+        key, day, plays, last_play = token
+        counter = self._counters.get(key)
+        if counter is None:
+            return
+        if day is None:
+            del self._counters[key]
+        else:
+            counter.day, counter.plays, counter.last_play = day, plays, last_play
+        self._dirty.add(key)
+
+    def sweep(self, now: datetime) -> int:
+        ts = now.timestamp()
+        expired = [k for k, c in self._counters.items() if c.expires_at <= ts]
+        for k in expired:
+            del self._counters[k]
+        return len(expired)
+
+    # Persistence
+
+    async def load(self) -> None:
+        now = _utc_now()
+        docs = await self.db[COUNTERS_COLLECTION].find({"expires_at": {"$gt": now}}).to_list(length=None)
+        for d in docs:
+            self._counters[(d["wallet_address"], d["game_type"])] = _Counter(
+                d["day"], int(d["plays"]), d["last_play_at"].replace(tzinfo=timezone.utc).timestamp(),
+                d["expires_at"].replace(tzinfo=timezone.utc).timestamp(),
+            )
+        logger.info(f"Loaded {len(docs)} play counters")
+
+    async def flush(self) -> None:
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        ops = []
+        for wallet, game in dirty:
+            counter = self._counters.get((wallet, game))
+            _id = f"{wallet}:{game}"
+            if counter is None:
+                ops.append(UpdateOne({"_id": _id}, {"$set": {"plays": 0, "expires_at": _utc_now()}}))
+                continue
+            ops.append(UpdateOne(
+                {"_id": _id},
+                {"$set": {
+                    "wallet_address": wallet,
+                    "game_type": game,
+                    "day": counter.day,
+                    "plays": counter.plays,
+                    "last_play_at": datetime.fromtimestamp(counter.last_play, timezone.utc),
+                    "expires_at": datetime.fromtimestamp(counter.expires_at, timezone.utc),
+                }},
+                upsert=True,
+            ))
+        try:
+            await self.db[COUNTERS_COLLECTION].bulk_write(ops, ordered=False)
+        except PyMongoError as e:
+            logger.warning(f"Play counter write-back failed for {len(ops)} counters, will retry: {e}")
+            self._dirty |= dirty
+
+    async def close(self) -> None:
+        await self.flush()
+
+
+# Atomic check-and-record for the shared backend. KEYS[1] is the counter hash;
+# ARGV: now, day, cooldown, daily_limit, ttl.
+_ACQUIRE_LUA = """
+local h = redis.call('HMGET', KEYS[1], 'day', 'plays', 'last')
+local now, day = tonumber(ARGV[1]), ARGV[2]
+local cooldown, limit = tonumber(ARGV[3]), tonumber(ARGV[4])
+local last = tonumber(h[3] or '0')
+local plays = 0
+if h[1] == day then plays = tonumber(h[2] or '0') end
+if cooldown > 0 and last > 0 and now - last < cooldown then
+  return {0, 'cooldown', math.floor(cooldown - (now - last)) + 1, h[1] or '', plays, tostring(last)}
+end
+if limit > 0 and plays >= limit then
+  return {0, 'daily_limit', 0, h[1] or '', plays, tostring(last)}
+end
+redis.call('HSET', KEYS[1], 'day', day, 'plays', plays + 1, 'last', ARGV[1])
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[5]))
+return {1, '', 0, h[1] or '', tonumber(h[2] or '0'), tostring(last)}
+"""
+
+# Records further plays under the daily limit. KEYS[1] is the counter hash;
+# ARGV: day, plays, daily_limit, ttl. Returns the plays granted.
+_CONSUME_LUA = """
+local h = redis.call('HMGET', KEYS[1], 'day', 'plays')
+local day, n, limit = ARGV[1], tonumber(ARGV[2]), tonumber(ARGV[3])
+local plays = 0
+if h[1] == day then plays = tonumber(h[2] or '0') end
+local granted = n
+if limit > 0 then granted = math.max(0, math.min(n, limit - plays)) end
+redis.call('HSET', KEYS[1], 'day', day, 'plays', plays + granted)
+if redis.call('TTL', KEYS[1]) < tonumber(ARGV[4]) then
+  redis.call('EXPIRE', KEYS[1], tonumber(ARGV[4]))
+end
+return granted
+"""
+
+
+class RedisCounters:
+    """
+    Counters in Redis for multi-worker deployments: one hash per
+    (wallet, game) with a TTL, checked and updated by a single script call.
+    Redis is the persistence, so there is no Mongo write-back.
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError("PLAY_LIMIT_BACKEND=redis requires the 'redis' package") from e
+        self._redis = aioredis.from_url(url, decode_responses=True)
+        self._acquire = self._redis.register_script(_ACQUIRE_LUA)
+        self._consume = self._redis.register_script(_CONSUME_LUA)
+
+    async def acquire(self, wallet: str, game: str, cooldown: int, daily_limit: int, now: datetime):
+        key = f"{REDIS_KEY_PREFIX}{game}:{wallet}"
+        ts = now.timestamp()
+        ttl = int(max(_next_midnight(now).timestamp() - ts, cooldown)) + 1
+        allowed, reason, retry_after, prev_day, prev_plays, prev_last = await self._acquire(
+            keys=[key], args=[ts, now.date().isoformat(), cooldown, daily_limit, ttl],
+        )
+        if not int(allowed):
+            if reason == "daily_limit":
+                retry_after = int(_next_midnight(now).timestamp() - ts) + 1
+            return False, reason, int(retry_after), None
+        return True, None, 0, (key, prev_day, int(prev_plays), float(prev_last))
+
+    async def consume(self, wallet: str, game: str, plays: int, daily_limit: int, now: datetime) -> int:
+        key = f"{REDIS_KEY_PREFIX}{game}:{wallet}"
+        ttl = int(_next_midnight(now).timestamp() - now.timestamp()) + 1
+        granted = await self._consume(keys=[key], args=[now.date().isoformat(), plays, daily_limit, ttl])
+        return int(granted)
+
+    async def release(self, token) -> None:
+        key, day, plays, last_play = token
+        if not day:
+            await self._redis.delete(key)
+        else:
+            await self._redis.hset(key, mapping={"day": day, "plays": plays, "last": last_play})
+
+    def sweep(self, now: datetime) -> int:
+        return 0  # Redis expires keys itself
+
+    async def load(self) -> None:
+        await self._redis.ping()
+
+    async def flush(self) -> None:
+        return None
+
+    async def close(self) -> None:
+        await self._redis.close()
+
+
+# -------------------------
+# Limiter
+# -------------------------
+
+class PlayLimiter:
+    """
+    Enforces `GameConfig.cooldown_minutes` and `daily_play_limit` per
+    (wallet, game). Limits come from the compiled game rules, so games
+    without limits skip the counters entirely.
+    """
+
+    def __init__(self, backend, *, flush_interval: float = DEFAULT_FLUSH_INTERVAL, sweep_interval: float = DEFAULT_SWEEP_INTERVAL):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def acquire(self, wallet: str, game_type: str, now: Optional[datetime] = None) -> Any:
+        """
+        Records one play or raises PlayLimitExceeded. Returns a token for
+        release(), or None when the game has no limits.
+        """
+        policy = game_rules_service.get_rules().policy(game_type)
+        cooldown = policy["cooldown_minutes"] * 60
+        daily_limit = policy["daily_play_limit"]
+        if not cooldown and not daily_limit:
+            return None
+        allowed, reason, retry_after, token = await self.backend.acquire(
+            wallet, game_type, cooldown, daily_limit, now or _utc_now()
+        )
+        if not allowed:
+            if reason == "cooldown":
+                raise PlayLimitExceeded(f"{game_type} is on cooldown, try again in {retry_after}s", retry_after)
+            raise PlayLimitExceeded(f"Daily play limit of {daily_limit} reached for {game_type}", retry_after)
+        return token
+
+    async def consume(self, wallet: str, game_type: str, plays: int, now: Optional[datetime] = None) -> int:
+        """
+        Counts `plays` further plays (session rounds after the first) against
+        the daily limit and returns how many fit. Cooldowns do not apply.
+        """
+        daily_limit = game_rules_service.get_rules().policy(game_type)["daily_play_limit"]
+        if plays <= 0 or not daily_limit:
+            return max(0, plays)
+        return await self.backend.consume(wallet, game_type, plays, daily_limit, now or _utc_now())
+
+    async def release(self, token: Any) -> None:
+        """
+        Gives back a play acquired for a result that was not credited.
+        """
+        if token is not None:
+            await self.backend.release(token)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.backend.close()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_sweep = loop.time() + self.sweep_interval
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.backend.flush()
+                if loop.time() >= next_sweep:
+                    self.backend.sweep(_utc_now())
+                    next_sweep = loop.time() + self.sweep_interval
+            except Exception as e:  # keep the task alive
+                logger.error(f"Play limiter background task failed: {e}")
+
+
+# -------------------------
+# Module-level singleton
+# -------------------------
+
+_limiter: Optional[PlayLimiter] = None
+
+
+async def start_limiter(db, **kwargs) -> PlayLimiter:
+    """
+    Creates the process-wide limiter. PLAY_LIMIT_BACKEND selects "memory"
+    (default) or "redis" (with PLAY_LIMIT_REDIS_URL).
+    """
+    global _limiter
+    if _limiter is None:
+        if os.environ.get("PLAY_LIMIT_BACKEND", "memory").lower() == "redis":
+            backend = RedisCounters(os.environ.get("PLAY_LIMIT_REDIS_URL", "redis://localhost:6379/0"))
+        else:
+            backend = InProcessCounters(db)
+        await backend.load()
+        _limiter = PlayLimiter(backend, **kwargs)
+        _limiter.start()
+    return _limiter
+
+
+async def stop_limiter() -> None:
+    global _limiter
+    if _limiter is not None:
+        await _limiter.stop()
+        _limiter = None
+
+
+def get_limiter() -> PlayLimiter:
+    if _limiter is None:
+        raise RuntimeError("Play limiter not started")
+    return _limiter
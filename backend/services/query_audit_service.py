@@ -0,0 +1,345 @@
+"""
+Dev/benchmark query plan auditor.
+
+`wrap(db)` returns a proxy of the Motor database that behaves exactly like
+it, but explains the first occurrence of every distinct query shape in the
+background (executionStats) and keeps the plan type, keys and documents
+examined per shape. `get_auditor().report()` lists COLLSCANs and shapes that
+examine far more documents than they return.
+
+Not for production: each new shape costs one extra explain command.
+"""
+import asyncio
+import logging
+import traceback
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATIO_THRESHOLD = 100.0     # docs examined per doc returned
+DEFAULT_MIN_EXAMINED = 1000         # ignore ratios on tiny collections
+
+WRITE_FILTER_OPS = (
+    "update_one", "update_many", "delete_one", "delete_many",
+    "find_one_and_update", "find_one_and_delete", "find_one_and_replace", "replace_one",
+)
+
+
+# -------------------------
+# Shapes
+# -------------------------
+
+# Sort and projection specs are structure, not parameters: their fields and
+# directions stay in the shape (top-level spec keys and pipeline stages)
+SPEC_LITERAL_KEYS = ("sort", "projection")
+STAGE_LITERAL_KEYS = ("$sort", "$project")
+
+
+def _literal(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _literal(v) for k, v in value.items()}   # key order is the sort order
+    if isinstance(value, (list, tuple)):
+        return [_literal(v) for v in value]
+    return value
+
+
+def _shape(value: Any) -> Any:
+    """
+    Replaces literal values with their type so queries that differ only in
+    parameters share a shape.
+    """
+    if isinstance(value, dict):
+        return {k: _literal(v) if k in STAGE_LITERAL_KEYS else _shape(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        if all(not isinstance(v, (dict, list, tuple)) for v in value):
+            return "<list>"  # $in lists of any length share a shape
+        return [_shape(v) for v in value]
+    if isinstance(value, datetime):
+        return "<date>"
+    return f"<{type(value).__name__}>"
+
+
+def _shape_spec(spec: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: _literal(v) if k in SPEC_LITERAL_KEYS else _shape(v) for k, v in sorted(spec.items())}
+
+
+def _shape_key(collection: str, op: str, spec: Dict[str, Any]) -> str:
+    return repr((collection, op, _shape_spec(spec)))
+
+
+def _caller() -> str:
+    """
+    First frame in services/ or routers/ (or the server module) that issued the query.
+    """
+    for frame in reversed(traceback.extract_stack(limit=25)):
+        name = frame.filename.replace("\\", "/")
+        if name.endswith("query_audit_service.py"):
+            continue
+        if "/services/" in name or "/routers/" in name or "/server/" in name:
+            return f"{name.rsplit('/', 2)[-2]}/{name.rsplit('/', 1)[-1]}:{frame.lineno} {frame.name}"
+    return "unknown"
+
+
+def _plan_stages(node: Optional[Dict[str, Any]]) -> List[str]:
+    if not node:
+        return []
+    stages = [node["stage"]] if "stage" in node else []
+    for child in ("inputStage", "queryPlan", "outerStage", "innerStage"):
+        stages += _plan_stages(node.get(child))
+    for child in node.get("inputStages", []):
+        stages += _plan_stages(child)
+    return stages
+
+
+def _first(explain: Dict[str, Any], key: str) -> Optional[Dict[str, Any]]:
+    """
+    Finds `key` in an explain document, which for aggregations is nested
+    inside the first $cursor stage (or per-shard entries).
+    """
+    if key in explain:
+        return explain[key]
+    for stage in explain.get("stages", []):
+        if "$cursor" in stage and key in stage["$cursor"]:
+            return stage["$cursor"][key]
+    for shard in (explain.get("shards") or {}).values():
+        found = _first(shard, key)
+        if found is not None:
+            return found
+    return None
+
+
+# -------------------------
+# Auditor
+# -------------------------
+
+class QueryAuditor:
+    def __init__(
+        self,
+        db,
+        *,
+        ratio_threshold: float = DEFAULT_RATIO_THRESHOLD,
+        min_examined: int = DEFAULT_MIN_EXAMINED,
+    ):
+        self.db = db   # the raw Motor database; explains never go through the proxy
+        self.ratio_threshold = ratio_threshold
+        self.min_examined = min_examined
+        self.shapes: Dict[str, Dict[str, Any]] = {}
+        self._tasks: set = set()
+
+    def observe(self, collection: str, op: str, spec: Dict[str, Any]) -> None:
+        key = _shape_key(collection, op, spec)
+        entry = self.shapes.get(key)
+        if entry is not None:
+            entry["calls"] += 1
+            return
+        self.shapes[key] = entry = {
+            "collection": collection,
+            "op": op,
+            "shape": _shape_spec(spec),
+            "source": _caller(),
+            "calls": 1,
+            "plan": None,
+        }
+        task = asyncio.create_task(self._explain(entry, collection, op, spec))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _explain(self, entry: Dict[str, Any], collection: str, op: str, spec: Dict[str, Any]) -> None:
+        command = _explain_command(collection, op, spec)
+        if command is None:
+            entry["plan"] = {"error": "not explainable"}
+            return
+        try:
+            explain = await self.db.command({"explain": command, "verbosity": "executionStats"})
+        except Exception as e:
+            entry["plan"] = {"error": str(e)}
+            return
+        planner = _first(explain, "queryPlanner") or {}
+        stats = _first(explain, "executionStats") or {}
+        stages = _plan_stages(planner.get("winningPlan"))
+        returned = stats.get("nReturned", 0)
+        examined = stats.get("totalDocsExamined", 0)
+        entry["plan"] = {
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+            "index": next((s for s in stages if s in ("IXSCAN", "IDHACK", "COUNT_SCAN", "DISTINCT_SCAN")), None),
+            "keys_examined": stats.get("totalKeysExamined", 0),
+            "docs_examined": examined,
+            "returned": returned,
+            "scan_ratio": round(examined / max(1, returned), 2),
+            "millis": stats.get("executionTimeMillis"),
+        }
+
+    async def drain(self) -> None:
+        """
+        Waits for pending explains (call before report() in benchmarks).
+        """
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def report(self) -> Dict[str, Any]:
+        explained = [s for s in self.shapes.values() if s["plan"] and "stages" in s["plan"]]
+        collscans = [s for s in explained if s["plan"]["collscan"]]
+        high_ratio = [
+            s for s in explained
+            if not s["plan"]["collscan"]
+            and s["plan"]["docs_examined"] >= self.min_examined
+            and s["plan"]["scan_ratio"] >= self.ratio_threshold
+        ]
+        by_ratio = lambda s: -s["plan"]["scan_ratio"]  # noqa: E731
+        return {
+            "shapes": len(self.shapes),
+            "explained": len(explained),
+            "pending": sum(1 for s in self.shapes.values() if s["plan"] is None),
+            "errors": [s for s in self.shapes.values() if s["plan"] and "error" in s["plan"]],
+            "collscans": sorted(collscans, key=by_ratio),
+            "high_scan_ratio": sorted(high_ratio, key=by_ratio),
+            "ratio_threshold": self.ratio_threshold,
+        }
+
+    def log_report(self) -> None:
+        report = self.report()
+        logger.info(f"Query audit: {report['shapes']} shapes, {len(report['collscans'])} COLLSCANs, "
+                    f"{len(report['high_scan_ratio'])} above {self.ratio_threshold}x scan ratio")
+        for s in report["collscans"]:
+            logger.warning(f"COLLSCAN {s['collection']}.{s['op']} {s['shape']} from {s['source']} ({s['calls']} calls)")
+        for s in report["high_scan_ratio"]:
+            logger.warning(f"Scan ratio {s['plan']['scan_ratio']} {s['collection']}.{s['op']} {s['shape']} from {s['source']}")
+
+
+def _explain_command(collection: str, op: str, spec: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    filt = spec.get("filter") or {}
+    if op in ("find", "find_one") or op in WRITE_FILTER_OPS:
+        command: Dict[str, Any] = {"find": collection, "filter": filt}
+        for key in ("sort", "skip", "limit", "projection"):
+            if spec.get(key):
+                command[key] = dict(spec[key]) if key == "sort" else spec[key]
+        if op == "find_one" or op.endswith("_one") or op.startswith("find_one"):
+            command["limit"] = 1
+        return command
+    if op == "count_documents":
+        return {"aggregate": collection, "pipeline": [{"$match": filt}, {"$group": {"_id": 1, "n": {"$sum": 1}}}], "cursor": {}}
+    if op == "aggregate":
+        return {"aggregate": collection, "pipeline": spec.get("pipeline", []), "cursor": {}}
+    if op == "distinct":
+        return {"distinct": collection, "key": spec.get("key"), "query": filt}
+    return None
+
+
+# -------------------------
+# Proxies
+# -------------------------
+
+class AuditedCursor:
+    """
+    Wraps a Motor cursor, collecting sort/skip/limit until it is consumed.
+    """
+
+    def __init__(self, cursor, auditor: QueryAuditor, collection: str, spec: Dict[str, Any]):
+        self._cursor = cursor
+        self._auditor = auditor
+        self._collection = collection
+        self._spec = spec
+        self._observed = False
+
+    def sort(self, key_or_list, direction=None):
+        self._cursor = self._cursor.sort(key_or_list, direction) if direction is not None else self._cursor.sort(key_or_list)
+        self._spec["sort"] = [(key_or_list, direction or 1)] if isinstance(key_or_list, str) else list(key_or_list)
+        return self
+
+    def skip(self, n: int):
+        self._cursor = self._cursor.skip(n)
+        self._spec["skip"] = n
+        return self
+
+    def limit(self, n: int):
+        self._cursor = self._cursor.limit(n)
+        self._spec["limit"] = n
+        return self
+
+    def _observe(self) -> None:
+        if not self._observed:
+            self._observed = True
+            self._auditor.observe(self._collection, "find", self._spec)
+
+    async def to_list(self, *args, **kwargs):
+        self._observe()
+        return await self._cursor.to_list(*args, **kwargs)
+
+    def __aiter__(self):
+        self._observe()
+        return self._cursor.__aiter__()
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+
+class AuditedCollection:
+    def __init__(self, collection, auditor: QueryAuditor):
+        self._collection = collection
+        self._auditor = auditor
+
+    def find(self, filter=None, projection=None, *args, **kwargs):
+        cursor = self._collection.find(filter, projection, *args, **kwargs)
+        spec = {"filter": filter or {}, "projection": projection}
+        if "sort" in kwargs:
+            spec["sort"] = kwargs["sort"]
+        return AuditedCursor(cursor, self._auditor, self._collection.name, spec)
+
+    def aggregate(self, pipeline, *args, **kwargs):
+        self._auditor.observe(self._collection.name, "aggregate", {"pipeline": pipeline})
+        return self._collection.aggregate(pipeline, *args, **kwargs)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._collection, name)
+        if name in ("find_one", "count_documents", "distinct") or name in WRITE_FILTER_OPS:
+            def audited(*args, **kwargs):
+                if name == "distinct":
+                    spec = {"key": args[0] if args else kwargs.get("key"), "filter": args[1] if len(args) > 1 else kwargs.get("filter")}
+                else:
+                    spec = {"filter": args[0] if args else kwargs.get("filter"), "sort": kwargs.get("sort")}
+                    if name == "find_one" and len(args) > 1:
+                        spec["projection"] = args[1]
+                self._auditor.observe(self._collection.name, name, spec)
+                return attr(*args, **kwargs)
+            return audited
+        return attr
+
+
+class AuditedDatabase:
+    def __init__(self, db, auditor: QueryAuditor):
+        self._db = db
+        self._auditor = auditor
+
+    def __getitem__(self, name: str) -> AuditedCollection:
+        return AuditedCollection(self._db[name], self._auditor)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._db, name)
+        if type(attr).__name__ == "AsyncIOMotorCollection":
+            return AuditedCollection(attr, self._auditor)
+        return attr
+
+
+# -------------------------
+# Module-level singleton
+# -------------------------
+
+_auditor: Optional[QueryAuditor] = None
+
+
+def wrap(db, **kwargs) -> AuditedDatabase:
+    """
+    Returns an auditing proxy for `db` and installs the process-wide auditor.
+    """
+    global _auditor
+    _auditor = QueryAuditor(db, **kwargs)
+    return AuditedDatabase(db, _auditor)
+
+
+def get_auditor() -> Optional[QueryAuditor]:
+    """
+    The installed auditor, or None when QUERY_AUDIT is off.
+    """
+    return _auditor
@@ -0,0 +1,350 @@
+"""
+Reward calculation for steps and games.
+
+The scalar functions are what the request path calls. The `batch_*` functions
+evaluate the same schedules over NumPy arrays for reprocessing jobs, economy
+simulations and admin "what-if" config changes, and are bit-for-bit equal to
+the scalar functions element by element (same IEEE operations in the same
+order, and Python's correctly-rounded `round` wherever NumPy's could differ).
+"""
+import copy
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+ArrayLike = Union[Sequence[Any], np.ndarray]
+
+# -------------------------
+# Rule tables
+# -------------------------
+
+TIERS = {
+    "starter": {
+        "name": "Starter",
+        "price": 0,
+        "zwap_multiplier": 1.0,
+        "daily_zpts_cap": 75,
+        "monthly_zwap_cap": 146250,
+        "games": ["zbrickles", "ztrivia"],
+        "features": ["zWALK", "ads"]
+    },
+    "plus": {
+        "name": "Plus",
+        "price": 12.99,
+        "zwap_multiplier": 1.5,
+        "daily_zpts_cap": 150,
+        "monthly_zwap_cap": 219375,
+        "games": ["zbrickles", "ztrivia", "ztetris", "zslots"],
+        "features": ["zWALK", "no_ads", "zDance", "zWorkout"]
+    }
+}
+
+
+def get_user_tier_config(tier: str) -> dict:
+    return TIERS.get(tier, TIERS["starter"])
+
+
+# Tiered step schedule: (start_steps, base_at_start, rate_per_step).
+# base_at_start of each tier is the accumulated reward of the tiers below it.
+STEP_SCHEDULE: List[Tuple[int, float, float]] = [
+    (0, 0, 0.01),
+    (1000, 10, 0.02),
+    (5000, 90, 0.03),
+    (10000, 240, 0.05),
+]
+
+# Each reward is a sum of terms evaluated left to right, then capped.
+# A term is (input, op, operand) with input in {"score", "level", "blocks"}
+# and op in {"mul", "div", "floordiv"}. zPts terms must stay integral.
+# Optional per-game "reward_rate" scales ZWAP and "difficulty_step" replaces
+# DIFFICULTY_STEP; both default to values that leave results unchanged.
+DIFFICULTY_STEP = 0.1
+
+GAME_REWARD_RULES: Dict[str, Dict[str, Any]] = {
+    "zbrickles": {
+        "zwap_terms": [("blocks", "mul", 0.5), ("score", "div", 100)],
+        "zwap_cap": 50,
+        "zpts_terms": [("blocks", "mul", 1), ("score", "floordiv", 50)],
+        "zpts_cap": 10,
+    },
+    "ztrivia": {
+        "zwap_terms": [("score", "mul", 0.5)],
+        "zwap_cap": 30,
+        "zpts_terms": [("score", "mul", 2)],
+        "zpts_cap": 8,
+    },
+    "ztetris": {
+        "zwap_terms": [("score", "div", 100), ("level", "mul", 2)],
+        "zwap_cap": 75,
+        "zpts_terms": [("score", "floordiv", 100), ("level", "mul", 1)],
+        "zpts_cap": 12,
+    },
+    "zslots": {
+        "zwap_terms": [("score", "mul", 0.3)],
+        "zwap_cap": 40,
+        "zpts_terms": [("score", "floordiv", 10)],
+        "zpts_cap": 8,
+    },
+}
+
+
+def with_overrides(
+    base: Dict[str, Dict[str, Any]],
+    overrides: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Returns a copy of a game rules table with per-game fields replaced.
+    Unknown games in `overrides` are added as-is.
+    """
+    rules = copy.deepcopy(base)
+    for game_id, fields in (overrides or {}).items():
+        rules.setdefault(game_id, {}).update(copy.deepcopy(fields))
+    return rules
+
+
+# -------------------------
+# Scalar (request path)
+# -------------------------
+
+def _apply_term(inputs: Dict[str, Any], term: Tuple[str, str, Any]):
+    name, op, operand = term
+    value = inputs[name]
+    if op == "mul":
+        return value * operand
+    if op == "div":
+        return value / operand
+    if op == "floordiv":
+        return value // operand
+    raise ValueError(f"Unsupported reward term op: {op}")
+
+
+def calculate_step_rewards(
+    steps: int,
+    multiplier: float = 1.0,
+    schedule: Optional[List[Tuple[int, float, float]]] = None,
+) -> float:
+    """Tiered earning system for steps"""
+    schedule = schedule or STEP_SCHEDULE
+    start, base_at_start, rate = schedule[0]
+    for tier in schedule[1:]:
+        if steps < tier[0]:
+            break
+        start, base_at_start, rate = tier
+    if start == 0 and base_at_start == 0:
+        base = steps * rate
+    else:
+        base = base_at_start + (steps - start) * rate
+    return base * multiplier
+
+
+def calculate_game_rewards(
+    game_type: str,
+    score: int,
+    level: int,
+    blocks: int = 0,
+    multiplier: float = 1.0,
+    rules: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> dict:
+    """Calculate ZWAP and Z Points rewards for games with progressive difficulty"""
+    rules = GAME_REWARD_RULES if rules is None else rules
+    rule = rules.get(game_type)
+
+    # Base rewards scale with level difficulty
+    step = rule.get("difficulty_step", DIFFICULTY_STEP) if rule else DIFFICULTY_STEP
+    difficulty_multiplier = 1 + (level - 1) * step  # Harder levels = slightly more reward
+
+    if rule:
+        inputs = {"score": score, "level": level, "blocks": blocks}
+        zwap_terms, zpts_terms = rule["zwap_terms"], rule["zpts_terms"]
+        base_zwap = _apply_term(inputs, zwap_terms[0])
+        for term in zwap_terms[1:]:
+            base_zwap = base_zwap + _apply_term(inputs, term)
+        base_zwap = min(base_zwap, rule["zwap_cap"])  # Cap per game
+        base_zpts = _apply_term(inputs, zpts_terms[0])
+        for term in zpts_terms[1:]:
+            base_zpts = base_zpts + _apply_term(inputs, term)
+        base_zpts = min(base_zpts, rule["zpts_cap"])  # Cap Z Points
+    else:
+        base_zwap = 0
+        base_zpts = 0
+
+    rate = rule.get("reward_rate", 1.0) if rule else 1.0
+    return {
+        "zwap": round(base_zwap * difficulty_multiplier * multiplier * rate, 2),
+        "zpts": int(base_zpts * difficulty_multiplier)
+    }
+
+
+# -------------------------
+# Vectorized (batch path)
+# -------------------------
+
+def _round2(values: np.ndarray) -> np.ndarray:
+    """
+    Python-compatible round(x, 2) over an array.
+
+    np.round scales by 100 and rounds half-to-even on the scaled double, which
+    can disagree with Python's correctly-rounded result only when the scaled
+    value lands within an ulp of a .5 tie. Those elements are recomputed with
+    Python's round so the output is bit-for-bit identical.
+    """
+    rounded = np.round(values, 2)
+    scaled = values * 100
+    distance = np.abs(scaled - np.floor(scaled) - 0.5)
+    near_tie = distance <= np.abs(scaled) * 1e-15 + 1e-12
+    if near_tie.any():
+        rounded[near_tie] = [round(v, 2) for v in values[near_tie].tolist()]
+    return rounded
+
+
+def _as_multipliers(multipliers: Union[float, ArrayLike], size: int) -> np.ndarray:
+    return np.broadcast_to(np.asarray(multipliers, dtype=np.float64), (size,))
+
+
+def tier_multipliers(
+    tiers: ArrayLike,
+    tiers_config: Dict[str, Dict[str, Any]],
+    overrides: Optional[Dict[str, float]] = None,
+    default_tier: str = "starter",
+) -> np.ndarray:
+    """
+    Maps an array of tier names to `zwap_multiplier`s, falling back to the
+    default tier like `get_user_tier_config`. `overrides` replaces multipliers
+    per tier name for what-if runs.
+    """
+    table = {name: cfg["zwap_multiplier"] for name, cfg in tiers_config.items()}
+    table.update(overrides or {})
+    names, inverse = np.unique(np.asarray(tiers, dtype=object).astype(str), return_inverse=True)
+    default = table[default_tier]
+    lookup = np.array([table.get(n, default) for n in names], dtype=np.float64)
+    return lookup[inverse.reshape(-1)]
+
+
+def batch_step_rewards(
+    steps: ArrayLike,
+    multipliers: Union[float, ArrayLike] = 1.0,
+    schedule: Optional[List[Tuple[int, float, float]]] = None,
+) -> np.ndarray:
+    """
+    Vectorized `calculate_step_rewards`.
+    """
+    schedule = schedule or STEP_SCHEDULE
+    steps = np.asarray(steps, dtype=np.int64)
+    mult = _as_multipliers(multipliers, steps.shape[0])
+
+    starts = np.array([t[0] for t in schedule], dtype=np.int64)
+    tier_idx = np.searchsorted(starts[1:], steps, side="right")
+
+    base = np.empty(steps.shape[0], dtype=np.float64)
+    for i, (start, base_at_start, rate) in enumerate(schedule):
+        mask = tier_idx == i
+        if not mask.any():
+            continue
+        s = steps[mask]
+        if start == 0 and base_at_start == 0:
+            base[mask] = s * rate
+        else:
+            base[mask] = base_at_start + (s - start) * rate
+    return base * mult
+
+
+def _eval_terms(terms, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+    acc = _apply_term(inputs, terms[0])
+    for term in terms[1:]:
+        acc = acc + _apply_term(inputs, term)
+    return acc
+
+
+def batch_game_rewards(
+    game_types: ArrayLike,
+    scores: ArrayLike,
+    levels: ArrayLike,
+    blocks: Optional[ArrayLike] = None,
+    multipliers: Union[float, ArrayLike] = 1.0,
+    rules: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Vectorized `calculate_game_rewards`.
+
+    Returns {"zwap": float64[n], "zpts": int64[n]}. Rows are grouped by game
+    type so each game's formula runs once over its slice.
+    """
+    rules = GAME_REWARD_RULES if rules is None else rules
+    scores = np.asarray(scores, dtype=np.int64)
+    n = scores.shape[0]
+    levels = np.asarray(levels, dtype=np.int64)
+    blocks = np.zeros(n, dtype=np.int64) if blocks is None else np.asarray(blocks, dtype=np.int64)
+    mult = _as_multipliers(multipliers, n)
+
+    names, codes = np.unique(np.asarray(game_types, dtype=object).astype(str), return_inverse=True)
+    codes = codes.reshape(-1)
+
+    zwap = np.zeros(n, dtype=np.float64)
+    zpts = np.zeros(n, dtype=np.int64)
+    for code, game_type in enumerate(names):
+        mask = codes == code
+        rule = rules.get(game_type)
+        step = rule.get("difficulty_step", DIFFICULTY_STEP) if rule else DIFFICULTY_STEP
+        difficulty = 1 + (levels[mask] - 1) * step
+
+        if not rule:
+            zwap[mask] = 0 * difficulty * mult[mask]
+            continue
+
+        inputs = {"score": scores[mask], "level": levels[mask], "blocks": blocks[mask]}
+        base_zwap = np.minimum(_eval_terms(rule["zwap_terms"], inputs), rule["zwap_cap"])
+        base_zpts = np.minimum(_eval_terms(rule["zpts_terms"], inputs), rule["zpts_cap"])
+        zwap[mask] = base_zwap * difficulty * mult[mask] * rule.get("reward_rate", 1.0)
+        # int() truncates toward zero, as does the float -> int64 cast
+        zpts[mask] = (base_zpts * difficulty).astype(np.int64)
+
+    return {"zwap": _round2(zwap), "zpts": zpts}
+
+
+def simulate_rewards(
+    step_events: Optional[Dict[str, ArrayLike]] = None,
+    game_events: Optional[Dict[str, ArrayLike]] = None,
+    tiers_config: Optional[Dict[str, Dict[str, Any]]] = None,
+    tier_overrides: Optional[Dict[str, float]] = None,
+    rules: Optional[Dict[str, Dict[str, Any]]] = None,
+    schedule: Optional[List[Tuple[int, float, float]]] = None,
+) -> Dict[str, Any]:
+    """
+    Totals for a set of historical or synthetic events under a given config.
+
+    step_events: {"steps": [...], "tiers": [...]}
+    game_events: {"game_types": [...], "scores": [...], "levels": [...],
+                  "blocks": [...] (optional), "tiers": [...]}
+
+    Daily zPts caps are not applied; zPts totals are the pre-cap amounts.
+    """
+    result: Dict[str, Any] = {"steps": None, "games": None}
+
+    def _mult(events: Dict[str, ArrayLike], size: int):
+        if tiers_config and "tiers" in events:
+            return tier_multipliers(events["tiers"], tiers_config, tier_overrides)
+        return np.ones(size, dtype=np.float64)
+
+    if step_events:
+        steps = np.asarray(step_events["steps"], dtype=np.int64)
+        zwap = batch_step_rewards(steps, _mult(step_events, steps.shape[0]), schedule)
+        result["steps"] = {"events": int(steps.shape[0]), "zwap_total": float(zwap.sum())}
+
+    if game_events:
+        scores = np.asarray(game_events["scores"], dtype=np.int64)
+        rewards = batch_game_rewards(
+            game_events["game_types"],
+            scores,
+            game_events["levels"],
+            game_events.get("blocks"),
+            _mult(game_events, scores.shape[0]),
+            rules,
+        )
+        result["games"] = {
+            "events": int(scores.shape[0]),
+            "zwap_total": float(rewards["zwap"].sum()),
+            "zpts_total": int(rewards["zpts"].sum()),
+        }
+
+    return result
+
@@ -1,4 +1,10 @@
-from typing import Dict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+import services.game_rules_service as game_rules_service
+from services.reward_engine import TIERS, get_user_tier_config
 
 async def adjust_reward(db, user_id: str, amount: float) -> Dict:
     """
@@ -29,3 +35,100 @@ async def get_reward_aggregates(db, user_id: str) -> Dict:
     ]
     result = await db.rewards.aggregate(pipeline).to_list(length=1)
     return result[0] if result else {"total_rewards": 0}
+
+
+def build_game_reward_pipeline(
+    game_type: str,
+    zwap_by_tier: Dict[str, float],
+    base_zpts: int,
+    now: datetime,
+    games: int = 1,
+) -> List[Dict]:
+    """
+    Update pipeline that resets the daily zPts counter on a new UTC day,
+    applies the tier's daily_zpts_cap and credits balances in one write.
+
+    The user's tier is only known server-side, so the ZWAP reward is
+    precomputed for every tier and selected with $switch. The credited amounts
+    are kept in `last_game_reward` so callers can read them from the returned
+    document.
+    """
+    today = now.date().isoformat()
+    same_day = {"$eq": [{"$substrCP": [{"$ifNull": ["$last_zpts_reset", ""]}, 0, 10]}, today]}
+
+    def by_tier(values: Dict):
+        return {"$switch": {
+            "branches": [{"case": {"$eq": ["$tier", tier]}, "then": value} for tier, value in values.items()],
+            "default": values["starter"],
+        }}
+
+    return [
+        {"$set": {
+            "_same_day": same_day,
+            "_zwap": by_tier(zwap_by_tier),
+            "_cap": by_tier({tier: cfg["daily_zpts_cap"] for tier, cfg in TIERS.items()}),
+        }},
+        {"$set": {
+            "_zpts_today": {"$cond": ["$_same_day", {"$ifNull": ["$daily_zpts_earned", 0]}, 0]},
+        }},
+        {"$set": {
+            "_zpts_add": {"$max": [0, {"$min": [base_zpts, {"$subtract": ["$_cap", "$_zpts_today"]}]}]},
+        }},
+        {"$set": {
+            "zwap_balance": {"$add": [{"$ifNull": ["$zwap_balance", 0]}, "$_zwap"]},
+            "total_earned": {"$add": [{"$ifNull": ["$total_earned", 0]}, "$_zwap"]},
+            "zpts_balance": {"$add": [{"$ifNull": ["$zpts_balance", 0]}, "$_zpts_add"]},
+            "games_played": {"$add": [{"$ifNull": ["$games_played", 0]}, games]},
+            "daily_zpts_earned": {"$add": ["$_zpts_today", "$_zpts_add"]},
+            "last_zpts_reset": {"$cond": ["$_same_day", "$last_zpts_reset", now.isoformat()]},
+            "last_game_reward": {"game": {"$literal": game_type}, "zwap": "$_zwap", "zpts": "$_zpts_add", "at": now},
+        }},
+        {"$unset": ["_same_day", "_zwap", "_cap", "_zpts_today", "_zpts_add"]},
+    ]
+
+
+def tiers_with_game(game_type: str) -> Dict:
+    """
+    Mongo filter matching users whose tier may play `game_type` per the
+    compiled game rules (unknown or missing tiers behave as starter).
+    """
+    allowed = game_rules_service.get_rules().allowed_tiers(game_type)
+    tier_filter: Dict = {"tier": {"$in": allowed}}
+    if "starter" in allowed:
+        tier_filter = {"$or": [tier_filter, {"tier": {"$nin": list(TIERS)}}]}
+    return tier_filter
+
+
+async def credit_game_rewards(
+    db,
+    wallet_address: str,
+    game_type: str,
+    zwap_by_tier: Dict[str, float],
+    base_zpts: int,
+    games: int = 1,
+    now: Optional[datetime] = None,
+) -> Dict:
+    """
+    Credits game rewards with a single find_one_and_update and returns the
+    full updated user. `last_game_reward` holds what was credited.
+
+    Raises LookupError for unknown wallets and PermissionError when the
+    game is disabled or not in the user's tier.
+    """
+    if not game_rules_service.get_rules().is_enabled(game_type):
+        raise PermissionError(f"Game {game_type} is currently disabled")
+    now = now or datetime.now(timezone.utc)
+    updated = await db.users.find_one_and_update(
+        {"wallet_address": wallet_address, **tiers_with_game(game_type)},
+        build_game_reward_pipeline(game_type, zwap_by_tier, base_zpts, now, games),
+        return_document=ReturnDocument.AFTER,
+    )
+    if updated:
+        return updated
+
+    # Miss path only: work out why
+    user = await db.users.find_one({"wallet_address": wallet_address}, {"_id": 0, "tier": 1})
+    if not user:
+        raise LookupError("User not found")
+    tier_config = get_user_tier_config(user.get("tier", "starter"))
+    raise PermissionError(f"Game not available in {tier_config['name']} tier")
@@ -0,0 +1,290 @@
+import asyncio
+import hashlib
+import logging
+import secrets
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+BATCHES_COLLECTION = "scratch_batches"
+PLAYS_COLLECTION = "scratch_plays"
+
+WIN_RATE = 0.3
+PRIZES: List[int] = [5, 10, 25, 50, 100]   # equally likely among winning cards
+DEFAULT_BATCH_SIZE = 10_000
+DEFAULT_FLUSH_INTERVAL = 5.0               # seconds between scratch_plays writes
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def commitment(seed: bytes) -> str:
+    return hashlib.sha256(seed).hexdigest()
+
+
+def prize_counts(size: int, win_rate: float = WIN_RATE, prizes: Sequence[int] = PRIZES) -> Dict[int, int]:
+    """
+    Exact number of cards per prize in a batch of `size`. Remainders go to
+    the smallest prizes.
+    """
+    wins = int(round(size * win_rate))
+    per, extra = divmod(wins, len(prizes))
+    counts = {int(p): per + (1 if i < extra else 0) for i, p in enumerate(sorted(prizes))}
+    counts[0] = size - wins
+    return counts
+
+
+def generate_outcomes(seed: bytes, size: int, win_rate: float = WIN_RATE, prizes: Sequence[int] = PRIZES) -> np.ndarray:
+    """
+    Deterministic card amounts for a batch: the exact prize distribution,
+    shuffled by PCG64 seeded from `seed`. Re-running this with a revealed
+    seed reproduces every card of the batch.
+    """
+    counts = prize_counts(size, win_rate, prizes)
+    amounts = np.repeat(
+        np.array(list(counts.keys()), dtype=np.int64),
+        np.array(list(counts.values()), dtype=np.int64),
+    )
+    rng = np.random.Generator(np.random.PCG64(np.random.SeedSequence(int.from_bytes(seed, "big"))))
+    return rng.permutation(amounts)
+
+
+class _Batch:
+    __slots__ = ("batch_id", "seed", "commit", "size", "issued", "voided")
+
+    def __init__(self, seed: bytes, size: int):
+        self.batch_id = str(uuid.uuid4())
+        self.seed = seed
+        self.commit = commitment(seed)
+        self.size = size
+        self.issued = 0
+        self.voided = 0     # issued cards whose credit failed; counted in issued
+
+
+class ScratchCardEngine:
+    """
+    Hands out pre-generated scratch cards from an in-memory queue.
+
+    Each batch is committed (sha256 of its seed stored in `scratch_batches`)
+    before any card is issued, and its seed is revealed once the batch is
+    used up or retired, so players can replay `generate_outcomes` and check
+    their card. Batches are per worker. Issued cards are recorded in
+    `scratch_plays` in the background.
+    """
+
+    def __init__(
+        self,
+        db,
+        *,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        win_rate: float = WIN_RATE,
+        prizes: Sequence[int] = PRIZES,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+    ):
+        self.db = db
+        self.batch_size = int(batch_size)
+        self.win_rate = win_rate
+        self.prizes = list(prizes)
+        self.flush_interval = flush_interval
+
+        self._queue: Deque[Tuple[_Batch, int, int]] = deque()
+        self._active: Dict[str, _Batch] = {}
+        self._refill_lock = asyncio.Lock()
+        self._pending_plays: List[Dict[str, Any]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    # -------------------------
+    # Batches
+    # -------------------------
+
+    async def _new_batch(self) -> None:
+        batch = _Batch(secrets.token_bytes(32), self.batch_size)
+        outcomes = generate_outcomes(batch.seed, batch.size, self.win_rate, self.prizes)
+        await self.db[BATCHES_COLLECTION].insert_one({
+            "batch_id": batch.batch_id,
+            "commit": batch.commit,
+            "size": batch.size,
+            "win_rate": self.win_rate,
+            "prizes": self.prizes,
+            "prize_counts": {str(k): v for k, v in prize_counts(batch.size, self.win_rate, self.prizes).items()},
+            "status": "active",
+            "created_at": _utc_now(),
+        })
+        self._active[batch.batch_id] = batch
+        self._queue.extend((batch, i, int(a)) for i, a in enumerate(outcomes.tolist()))
+        logger.info(f"Committed scratch batch {batch.batch_id} ({batch.size} cards)")
+
+    async def _reveal(self, batch: _Batch, status: str) -> None:
+        self._active.pop(batch.batch_id, None)
+        await self.db[BATCHES_COLLECTION].update_one(
+            {"batch_id": batch.batch_id},
+            {"$set": {
+                "seed": batch.seed.hex(),
+                "status": status,
+                "issued": batch.issued,
+                "voided": batch.voided,
+                "revealed_at": _utc_now(),
+            }},
+        )
+
+    async def _next_card(self) -> Tuple[_Batch, int, int]:
+        if not self._queue:
+            async with self._refill_lock:
+                if not self._queue:
+                    await self._new_batch()
+        return self._queue.popleft()
+
+    # -------------------------
+    # Hot path
+    # -------------------------
+
+    async def play(self, wallet: str) -> Dict[str, Any]:
+        """
+        Issues the next card to `wallet` and credits it with one
+        find_one_and_update. Raises LookupError for unknown wallets (the card
+        goes back to the front of the queue). If the write fails the credit
+        may or may not have applied, so the card is recorded as voided rather
+        than reissued and the PyMongoError is re-raised.
+        """
+        batch, index, amount = await self._next_card()
+        now = _utc_now()
+        update: Dict[str, Any] = {
+            "$set": {"last_scratch": {"batch_id": batch.batch_id, "index": index, "amount": amount, "at": now}},
+        }
+        if amount:
+            update["$inc"] = {"zwap_balance": amount, "total_earned": amount}
+        play = {
+            "wallet_address": wallet,
+            "batch_id": batch.batch_id,
+            "index": index,
+            "amount": amount,
+            "timestamp": now,
+        }
+        try:
+            user = await self.db.users.find_one_and_update(
+                {"wallet_address": wallet},
+                update,
+                projection={"_id": 0, "zwap_balance": 1},
+                return_document=ReturnDocument.AFTER,
+            )
+        except PyMongoError:
+            batch.voided += 1
+            self._issue(batch, {**play, "status": "voided"})
+            raise
+        if user is None:
+            self._queue.appendleft((batch, index, amount))
+            raise LookupError("User not found")
+
+        self._issue(batch, play)
+        return {
+            "won": amount > 0,
+            "amount": amount,
+            "new_balance": user.get("zwap_balance", 0),
+            "card": {"batch_id": batch.batch_id, "index": index, "commit": batch.commit},
+        }
+
+    def _issue(self, batch: _Batch, play: Dict[str, Any]) -> None:
+        batch.issued += 1
+        self._pending_plays.append(play)
+        if batch.issued == batch.size:
+            asyncio.create_task(self._reveal_quietly(batch, "revealed"))
+
+    async def _reveal_quietly(self, batch: _Batch, status: str) -> None:
+        try:
+            await self._reveal(batch, status)
+        except PyMongoError as e:
+            logger.error(f"Failed to reveal scratch batch {batch.batch_id}: {e}")
+
+    # -------------------------
+    # Background
+    # -------------------------
+
+    async def flush(self) -> None:
+        if not self._pending_plays:
+            return
+        plays, self._pending_plays = self._pending_plays, []
+        try:
+            await self.db[PLAYS_COLLECTION].insert_many(plays, ordered=False)
+        except PyMongoError as e:
+            logger.warning(f"Failed to record {len(plays)} scratch plays, will retry: {e}")
+            for p in plays:
+                p.pop("_id", None)
+            self._pending_plays = plays + self._pending_plays
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        # Unissued cards are discarded; revealing their seeds is harmless
+        for batch in list(self._active.values()):
+            await self._reveal_quietly(batch, "retired")
+        self._queue.clear()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                # Commit the next batch before the queue runs dry
+                if len(self._queue) < self.batch_size // 10 and not self._refill_lock.locked():
+                    async with self._refill_lock:
+                        await self._new_batch()
+            except Exception as e:  # keep the task alive
+                logger.error(f"Scratch card background task failed: {e}")
+
+
+async def get_batch(db, batch_id: str) -> Dict[str, Any]:
+    """
+    Public audit view of a batch: the commitment always, the seed once revealed.
+    """
+    batch = await db[BATCHES_COLLECTION].find_one({"batch_id": batch_id}, {"_id": 0})
+    if not batch:
+        raise LookupError("Batch not found")
+    if "seed" in batch:
+        batch["verified"] = commitment(bytes.fromhex(batch["seed"])) == batch["commit"]
+    return batch
+
+
+# -------------------------
+# Module-level singleton
+# -------------------------
+
+_engine: Optional[ScratchCardEngine] = None
+
+
+def start_engine(db, **kwargs) -> ScratchCardEngine:
+    global _engine
+    if _engine is None:
+        _engine = ScratchCardEngine(db, **kwargs)
+        _engine.start()
+    return _engine
+
+
+async def stop_engine() -> None:
+    global _engine
+    if _engine is not None:
+        await _engine.stop()
+        _engine = None
+
+
+def get_engine() -> ScratchCardEngine:
+    if _engine is None:
+        raise RuntimeError("Scratch card engine not started")
+    return _engine
@@ -0,0 +1,181 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pymongo import UpdateOne
+
+import services.analytics_rollup_service as analytics_rollup_service
+import services.anti_cheat_service as anti_cheat_service
+import services.user_cache_service as user_cache_service
+from services.reward_engine import calculate_step_rewards, get_user_tier_config
+
+MAX_STEP_SAMPLES_PER_SYNC = 50000
+STEP_SAMPLE_CLOCK_SKEW = timedelta(minutes=5)
+STEP_SYNC_IDS_KEPT = 8  # recent sync ids per user, to tell which wallets of a bulk_write matched
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(ts: datetime) -> datetime:
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+
+def aggregate_step_samples(wallet: str, samples: Sequence[Any], watermark: Optional[datetime], now: datetime) -> Dict[str, Any]:
+    """
+    Dedupes samples (anything with .timestamp and .steps) by timestamp,
+    drops ones already credited (at or before the watermark) and screens
+    spikes.
+    """
+    by_ts: Dict[datetime, int] = {}
+    for sample in samples:
+        ts = _as_utc(sample.timestamp)
+        if ts > now + STEP_SAMPLE_CLOCK_SKEW:
+            continue  # future-dated samples are never credited
+        if watermark is not None and ts <= watermark:
+            continue
+        by_ts.setdefault(ts, sample.steps)  # first occurrence of a timestamp wins
+
+    detector = anti_cheat_service.get_detector()
+    steps_by_day: Dict[str, int] = {}
+    flagged = 0
+    screens = []
+    for ts in sorted(by_ts):
+        screen = detector.check(wallet, by_ts[ts], ts)
+        screens.append(screen)
+        flagged += screen["flagged"]
+        day = ts.date().isoformat()
+        steps_by_day[day] = steps_by_day.get(day, 0) + screen["credited"]
+
+    return {
+        "accepted": len(by_ts),
+        "duplicates": len(samples) - len(by_ts),
+        "flagged": flagged,
+        "steps_by_day": steps_by_day,
+        "total_steps": sum(steps_by_day.values()),
+        "latest": max(by_ts) if by_ts else None,
+        "screens": screens,
+    }
+
+
+def build_step_sync_update(
+    user: Dict[str, Any], samples: Sequence[Any], now: datetime, sync_id: str
+) -> Tuple[Optional[UpdateOne], Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Returns (UpdateOne or None, per-wallet summary, spike screens) for one
+    wallet's samples.
+    """
+    prev_watermark = user.get("last_step_sample_at")
+    watermark = _as_utc(prev_watermark) if prev_watermark else None
+    agg = aggregate_step_samples(user["wallet_address"], samples, watermark, now)
+
+    summary = {
+        "wallet_address": user["wallet_address"],
+        "samples_accepted": agg["accepted"],
+        "samples_skipped": agg["duplicates"],
+        "samples_flagged": agg["flagged"],
+        "steps_counted": agg["total_steps"],
+        "rewards_earned": 0.0,
+    }
+    if not agg["latest"]:
+        return None, summary, agg["screens"]
+
+    # Tiers apply per day, so rewards are computed over each day's aggregated delta
+    tier_config = get_user_tier_config(user.get("tier", "starter"))
+    rewards = sum(
+        calculate_step_rewards(steps, tier_config["zwap_multiplier"])
+        for steps in agg["steps_by_day"].values()
+    )
+    summary["rewards_earned"] = rewards
+
+    today = now.date().isoformat()
+    today_steps = agg["steps_by_day"].get(today, 0)
+    inc = {"zwap_balance": rewards, "total_steps": agg["total_steps"], "total_earned": rewards}
+    set_fields = {"last_step_sample_at": agg["latest"]}
+    if user.get("daily_steps_date") == today:
+        inc["daily_steps"] = today_steps
+    else:
+        set_fields["daily_steps"] = today_steps
+        set_fields["daily_steps_date"] = today
+
+    # Filter on the watermark we read so a concurrent sync cannot double-credit
+    update = UpdateOne(
+        {"wallet_address": user["wallet_address"], "last_step_sample_at": prev_watermark},
+        {
+            "$inc": inc,
+            "$set": set_fields,
+            "$push": {"step_sync_ids": {"$each": [sync_id], "$slice": -STEP_SYNC_IDS_KEPT}},
+        },
+    )
+    return update, summary, agg["screens"]
+
+
+async def sync_step_samples(db, batches: Iterable[Tuple[str, Sequence[Any]]]) -> Dict[str, Any]:
+    """
+    Credits time-stamped step samples for many (wallet, samples) pairs with
+    one read and one bulk_write. Raises ValueError above
+    MAX_STEP_SAMPLES_PER_SYNC samples.
+    """
+    # Merge repeated wallets so each user gets exactly one update
+    merged: Dict[str, List[Any]] = {}
+    for wallet, samples in batches:
+        merged.setdefault(wallet.lower(), []).extend(samples)
+    if sum(len(samples) for samples in merged.values()) > MAX_STEP_SAMPLES_PER_SYNC:
+        raise ValueError(f"Maximum {MAX_STEP_SAMPLES_PER_SYNC} samples per sync")
+
+    users = await db.users.find(
+        {"wallet_address": {"$in": list(merged)}},
+        {"_id": 0, "wallet_address": 1, "tier": 1, "last_step_sample_at": 1, "daily_steps_date": 1}
+    ).to_list(len(merged))
+    users_by_wallet = {u["wallet_address"]: u for u in users}
+
+    now = _utc_now()
+    sync_id = uuid.uuid4().hex
+    operations, written, results, not_found, screens = [], [], [], [], {}
+    for wallet, samples in merged.items():
+        user = users_by_wallet.get(wallet)
+        if not user:
+            not_found.append(wallet)
+            continue
+        update, summary, screens[wallet] = build_step_sync_update(user, samples, now, sync_id)
+        if update is not None:
+            operations.append(update)
+            written.append(wallet)
+        results.append(summary)
+
+    conflicts = 0
+    if operations:
+        outcome = await db.users.bulk_write(operations, ordered=False)
+        conflicts = len(operations) - outcome.matched_count
+        applied = set(written)
+        if conflicts:
+            # Conflicting wallets are retried by the client; their screened steps were never credited
+            applied = {
+                u["wallet_address"]
+                for u in await db.users.find(
+                    {"wallet_address": {"$in": written}, "step_sync_ids": sync_id},
+                    {"_id": 0, "wallet_address": 1},
+                ).to_list(len(written))
+            }
+            detector = anti_cheat_service.get_detector()
+            for wallet, wallet_screens in screens.items():
+                if wallet not in applied:
+                    for screen in wallet_screens:
+                        detector.release(wallet, screen)
+        await user_cache_service.get_cache().invalidate_many(r["wallet_address"] for r in results)
+        rollups = analytics_rollup_service.get_rollups()
+        for r in results:
+            if r["wallet_address"] not in applied:
+                continue
+            if r["steps_counted"]:
+                rollups.record_steps(r["wallet_address"], r["steps_counted"])
+            if r["rewards_earned"]:
+                rollups.record_reward(r["wallet_address"], "steps", zwap=r["rewards_earned"])
+
+    return {
+        "results": results,
+        "not_found": not_found,
+        # Wallets that synced concurrently elsewhere; the client should retry them
+        "conflicts": conflicts,
+    }
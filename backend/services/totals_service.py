@@ -0,0 +1,122 @@
+"""
+Totals for paginated admin lists, without a second scan per page.
+
+  - Unfiltered lists use `estimated_document_count` (collection metadata,
+    O(1)); reported with exact=False.
+  - Filtered counts are cached per (collection, normalized query) and
+    reused while the collection's write counter is unchanged and the
+    entry is younger than `max_age`. A count served from the cache may be
+    up to `max_age` old, so it is reported with exact=False, cached=True;
+    only a fresh count_documents is exact. `load` does the same for
+    aggregates over a list's filters.
+  - exact=True on a request bypasses both and runs count_documents.
+
+The write counter of a collection is (local bumps, estimated count).
+Writers that change counted fields in place call `bump(collection)`;
+inserts and deletes by any worker move the estimated count. In-place
+updates made by other workers are picked up within `max_age`.
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+DEFAULT_MAX_AGE = 60.0        # seconds a cached count is trusted without a counter change
+MAX_ENTRIES = 1024
+
+
+def query_key(collection: str, query: Dict[str, Any]) -> str:
+    """
+    Stable key for a filter: key order and value types like datetimes do
+    not change the hash.
+    """
+    normalized = json.dumps(query, sort_keys=True, default=str, separators=(",", ":"))
+    return f"{collection}:{hashlib.sha1(normalized.encode()).hexdigest()}"
+
+
+class TotalsCache:
+    def __init__(self, *, max_age: float = DEFAULT_MAX_AGE, max_entries: int = MAX_ENTRIES):
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._bumps: Dict[str, int] = {}
+        # key -> (value, write counter, monotonic time)
+        self._entries: "OrderedDict[str, Tuple[Any, Tuple[int, int], float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def bump(self, collection: str) -> None:
+        self._bumps[collection] = self._bumps.get(collection, 0) + 1
+
+    async def load(
+        self,
+        db,
+        collection: str,
+        query: Dict[str, Any],
+        loader: Callable[[], Awaitable[Any]],
+        *,
+        exact: bool = False,
+        tag: str = "count",
+    ) -> Tuple[Any, bool]:
+        """
+        (`loader()` result, served from cache) for (collection, query, tag),
+        reused until the collection's write counter changes or the entry
+        expires. For aggregates over the same filters as a count.
+        """
+        key = query_key(collection, {"q": query, "tag": tag})
+        counter = (self._bumps.get(collection, 0), await db[collection].estimated_document_count())
+        now = time.monotonic()
+
+        entry = self._entries.get(key)
+        if not exact and entry is not None and entry[1] == counter and now - entry[2] < self.max_age:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], True
+
+        self.misses += 1
+        value = await loader()
+        self._entries[key] = (value, counter, now)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value, False
+
+    async def count(
+        self,
+        db,
+        collection: str,
+        query: Optional[Dict[str, Any]] = None,
+        *,
+        exact: bool = False,
+        limit: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Returns {"total", "exact", "cached"}. exact is True only for a fresh
+        count_documents that did not reach `limit` (counting stops there).
+        """
+        coll = db[collection]
+        if not query and not exact:
+            return {"total": await coll.estimated_document_count(), "exact": False, "cached": False}
+
+        kwargs = {"limit": limit} if limit else {}
+        total, hit = await self.load(
+            db, collection, query or {},
+            lambda: coll.count_documents(query or {}, **kwargs),
+            exact=exact, tag=f"count:{limit}",
+        )
+        return {"total": total, "exact": not hit and not (limit and total >= limit), "cached": hit}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# -------------------------
+# Module-level singleton
+# -------------------------
+# No background task of its own, so no start/stop.
+
+_totals = TotalsCache()
+
+
+def get_totals() -> TotalsCache:
+    return _totals
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from bson.binary import Binary
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+SEEN_COLLECTION = "trivia_seen"
+DEFAULT_CACHE_SIZE = 100_000     # wallets kept in memory per worker
+DEFAULT_FLUSH_INTERVAL = 10.0    # seconds between write-backs
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def encode_bits(bits: int) -> bytes:
+    """
+    Little-endian bytes of a bitset: bit n is question ordinal n.
+    """
+    return bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+
+
+def decode_bits(raw: Optional[bytes]) -> int:
+    return int.from_bytes(raw, "little") if raw else 0
+
+
+class SeenQuestionCache:
+    """
+    Per-wallet "already answered" trivia questions as bitsets over question
+    ordinals, held in an LRU cache with periodic write-back.
+
+    Stored one document per wallet in `trivia_seen` as
+    {"wallet_address", "bits": BinData, "count", "updated_at"}: 10k questions
+    cost at most 1.25 KB per wallet, and user documents are untouched.
+    """
+
+    def __init__(self, db, *, max_size: int = DEFAULT_CACHE_SIZE, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.db = db
+        self.max_size = max(1, int(max_size))
+        self.flush_interval = flush_interval
+        self._bits: "OrderedDict[str, int]" = OrderedDict()
+        self._dirty: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def get(self, wallet: str) -> int:
+        """
+        Returns the wallet's bitset, reading Mongo only on a cache miss.
+        """
+        bits = self._bits.get(wallet)
+        if bits is not None:
+            self._bits.move_to_end(wallet)
+            return bits
+        if wallet in self._dirty:
+            bits = self._dirty[wallet]
+        else:
+            doc = await self.db[SEEN_COLLECTION].find_one({"wallet_address": wallet}, {"_id": 0, "bits": 1})
+            bits = decode_bits(doc.get("bits") if doc else None)
+            # A concurrent mark_seen may have cached newer bits while we awaited
+            bits |= self._bits.get(wallet, 0)
+        self._put(wallet, bits)
+        return bits
+
+    async def mark_seen(self, wallet: str, ordinal: int) -> None:
+        bits = await self.get(wallet)
+        updated = bits | (1 << ordinal)
+        if updated != bits:
+            self._put(wallet, updated)
+            self._dirty[wallet] = updated
+
+    async def reset(self, wallet: str) -> None:
+        self._put(wallet, 0)
+        self._dirty[wallet] = 0
+
+    def _put(self, wallet: str, bits: int) -> None:
+        self._bits[wallet] = bits
+        self._bits.move_to_end(wallet)
+        while len(self._bits) > self.max_size:
+            # Evicted dirty entries stay in _dirty until the next flush
+            self._bits.popitem(last=False)
+
+    # -------------------------
+    # Write-back
+    # -------------------------
+
+    async def flush(self) -> None:
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        now = _utc_now()
+        try:
+            await self.db[SEEN_COLLECTION].bulk_write(
+                [
+                    UpdateOne(
+                        {"wallet_address": wallet},
+                        {"$set": {
+                            "bits": Binary(encode_bits(bits)),
+                            "count": bin(bits).count("1"),
+                            "updated_at": now,
+                        }},
+                        upsert=True,
+                    )
+                    for wallet, bits in dirty.items()
+                ],
+                ordered=False,
+            )
+        except PyMongoError as e:
+            logger.warning(f"Trivia seen write-back failed for {len(dirty)} wallets, will retry: {e}")
+            # Newer in-memory values win over the failed snapshot
+            self._dirty = {**dirty, **self._dirty}
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+
+# -------------------------
+# Module-level singleton
+# -------------------------
+
+_cache: Optional[SeenQuestionCache] = None
+
+
+def start_cache(db, **kwargs) -> SeenQuestionCache:
+    global _cache
+    if _cache is None:
+        _cache = SeenQuestionCache(db, **kwargs)
+        _cache.start()
+    return _cache
+
+
+async def stop_cache() -> None:
+    global _cache
+    if _cache is not None:
+        await _cache.stop()
+        _cache = None
+
+
+def get_cache() -> SeenQuestionCache:
+    if _cache is None:
+        raise RuntimeError("Trivia seen-question cache not started")
+    return _cache
@@ -0,0 +1,320 @@
+import asyncio
+import logging
+import random
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+MIN_DIFFICULTY = 1
+MAX_DIFFICULTY = 5
+VERSION_KEY = "trivia_bank_version"   # system_config _id bumped on every edit
+ORDINAL_SEQ_KEY = "trivia_ordinal_seq"  # system_config _id; ordinals are never reused
+MAX_SEEN_REJECTIONS = 4               # random draws per wanted question before scanning
+REFRESH_INTERVAL = 60.0               # seconds; other workers pick up edits
+
+DIFFICULTY_NAMES = {"easy": 1, "medium": 2, "hard": 3}
+
+# Seeded into `trivia_questions` when the collection is empty
+DEFAULT_QUESTIONS: List[Dict[str, Any]] = [
+    {"id": "q1", "question": "What is the largest cryptocurrency by market cap?", "options": ["Bitcoin", "Ethereum", "Solana", "Cardano"], "answer": "Bitcoin", "difficulty": 1},
+    {"id": "q2", "question": "Who created Bitcoin?", "options": ["Vitalik Buterin", "Satoshi Nakamoto", "Charles Hoskinson", "Gavin Wood"], "answer": "Satoshi Nakamoto", "difficulty": 1},
+    {"id": "q3", "question": "What does NFT stand for?", "options": ["New Financial Token", "Non-Fungible Token", "Network File Transfer", "Node Full Transaction"], "answer": "Non-Fungible Token", "difficulty": 1},
+    {"id": "q4", "question": "What blockchain does Ethereum use?", "options": ["Proof of Work", "Proof of Stake", "Delegated PoS", "Proof of Authority"], "answer": "Proof of Stake", "difficulty": 2},
+    {"id": "q5", "question": "What is a smart contract?", "options": ["Legal document", "Self-executing code", "Paper contract", "Bank agreement"], "answer": "Self-executing code", "difficulty": 2},
+    {"id": "q6", "question": "What year was Bitcoin created?", "options": ["2007", "2008", "2009", "2010"], "answer": "2009", "difficulty": 2},
+    {"id": "q7", "question": "What is DeFi short for?", "options": ["Decentralized Finance", "Digital Finance", "Distributed Files", "Default Interest"], "answer": "Decentralized Finance", "difficulty": 2},
+    {"id": "q8", "question": "What is gas in Ethereum?", "options": ["Fuel for cars", "Transaction fees", "Mining reward", "Token type"], "answer": "Transaction fees", "difficulty": 3},
+    {"id": "q9", "question": "What is a DAO?", "options": ["Digital Asset Order", "Decentralized Autonomous Organization", "Data Access Object", "Distributed App Operator"], "answer": "Decentralized Autonomous Organization", "difficulty": 3},
+    {"id": "q10", "question": "What is the max supply of Bitcoin?", "options": ["10 million", "21 million", "100 million", "Unlimited"], "answer": "21 million", "difficulty": 3},
+]
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _clamp_difficulty(d: Any) -> int:
+    try:
+        d = int(d)
+    except (TypeError, ValueError):
+        d = DIFFICULTY_NAMES.get(str(d).lower(), MIN_DIFFICULTY)
+    return max(MIN_DIFFICULTY, min(MAX_DIFFICULTY, d))
+
+
+class TriviaBank:
+    """
+    Immutable in-memory snapshot of the question bank.
+
+    Public questions are stored once, sorted by difficulty, so difficulty
+    bucket d is the slice [upto[d-1], upto[d]) and "difficulty <= d" is the
+    prefix [0, upto[d]). Sampling picks k indices from a range, so it is O(k)
+    and never copies the bank. Returned question dicts are shared; callers
+    must not mutate them.
+
+    Each question also has a stable integer `ordinal` used as its bit
+    position in per-wallet seen-question bitsets.
+    """
+    __slots__ = ("version", "ordered", "ordinals", "ordinal_by_id", "upto", "answers", "explanations")
+
+    def __init__(self, docs: List[Dict[str, Any]], version: int = 0):
+        docs = sorted(docs, key=lambda q: _clamp_difficulty(q.get("difficulty")))
+        self.version = version
+        self.ordered = [
+            {
+                "id": q["id"],
+                "question": q["question"],
+                "options": q["options"],
+                "difficulty": _clamp_difficulty(q.get("difficulty")),
+            }
+            for q in docs
+        ]
+        self.ordinals = [int(q.get("ordinal", -1)) for q in docs]
+        self.ordinal_by_id = {q["id"]: int(q["ordinal"]) for q in docs if q.get("ordinal") is not None}
+        self.answers = {q["id"]: q["answer"] for q in docs}
+        self.explanations = {q["id"]: q["explanation"] for q in docs if q.get("explanation")}
+
+        self.upto = [0] * (MAX_DIFFICULTY + 1)
+        for q in self.ordered:
+            self.upto[q["difficulty"]] += 1
+        for d in range(1, MAX_DIFFICULTY + 1):
+            self.upto[d] += self.upto[d - 1]
+
+    def bucket_range(self, difficulty: int, exact: bool = False) -> range:
+        d = _clamp_difficulty(difficulty)
+        start = self.upto[d - 1] if exact else 0
+        return range(start, self.upto[d])
+
+    def sample(self, count: int, difficulty: int, exact: bool = False, seen: int = 0) -> List[Dict[str, Any]]:
+        pool = self.bucket_range(difficulty, exact)
+        k = max(0, min(int(count), len(pool)))
+        if not seen:
+            return [self.ordered[i] for i in random.sample(pool, k)]
+        return [self.ordered[i] for i in self._sample_unseen(pool, k, seen)]
+
+    def _is_seen(self, i: int, seen: int) -> bool:
+        ordinal = self.ordinals[i]
+        return ordinal >= 0 and (seen >> ordinal) & 1 == 1
+
+    def _sample_unseen(self, pool: range, k: int, seen: int) -> List[int]:
+        """
+        Rejection-samples unseen questions; falls back to one scan of the pool
+        when most of it has been seen. Tops up with seen questions only when
+        fewer than k unseen ones remain.
+        """
+        picked: List[int] = []
+        chosen = set()
+        attempts = k * MAX_SEEN_REJECTIONS
+        while len(picked) < k and attempts > 0:
+            attempts -= 1
+            i = pool[random.randrange(len(pool))]
+            if i in chosen or self._is_seen(i, seen):
+                continue
+            chosen.add(i)
+            picked.append(i)
+        if len(picked) == k:
+            return picked
+
+        unseen = [i for i in pool if i not in chosen and not self._is_seen(i, seen)]
+        picked.extend(random.sample(unseen, min(k - len(picked), len(unseen))))
+        if len(picked) < k:
+            rest = [i for i in pool if i not in chosen and i not in picked]
+            picked.extend(random.sample(rest, k - len(picked)))
+        return picked
+
+
+_bank = TriviaBank([])
+_refresher: Optional[asyncio.Task] = None
+
+
+# -------------------------
+# Player API (no database access)
+# -------------------------
+
+def get_questions(count: int = 5, difficulty: Any = 1, exact: bool = False, seen: int = 0) -> List[Dict[str, Any]]:
+    """
+    Samples questions without replacement. By default includes everything up
+    to one level above `difficulty`, matching the original endpoint.
+    `seen` is a wallet's seen-question bitset; those are skipped while
+    unseen questions remain.
+    """
+    d = _clamp_difficulty(difficulty)
+    if exact:
+        return _bank.sample(count, d, exact=True, seen=seen)
+    return _bank.sample(count, min(d + 1, MAX_DIFFICULTY), seen=seen)
+
+
+def ordinal_of(question_id: str) -> Optional[int]:
+    return _bank.ordinal_by_id.get(question_id)
+
+
+def check_answer(question_id: str, answer: str, time_taken: float) -> Dict[str, Any]:
+    correct_answer = _bank.answers.get(question_id)
+    correct = correct_answer is not None and correct_answer == answer
+    # Bonus for fast answers
+    time_bonus = max(0, 1 - (time_taken / 30)) if correct else 0
+    return {
+        "correct": correct,
+        "correct_answer": correct_answer,
+        "time_bonus": round(time_bonus, 2),
+        "explanation": _bank.explanations.get(question_id),
+    }
+
+
+def bank_stats() -> Dict[str, Any]:
+    return {
+        "version": _bank.version,
+        "total": len(_bank.ordered),
+        "by_difficulty": {
+            d: _bank.upto[d] - _bank.upto[d - 1] for d in range(MIN_DIFFICULTY, MAX_DIFFICULTY + 1)
+        },
+    }
+
+
+# -------------------------
+# Loading / invalidation
+# -------------------------
+
+async def _current_version(db) -> int:
+    doc = await db.system_config.find_one({"_id": VERSION_KEY}, {"value": 1})
+    return int(doc.get("value", 0)) if doc else 0
+
+
+async def _reserve_ordinals(db, n: int) -> int:
+    """
+    Reserves n consecutive ordinals and returns the first one.
+    """
+    doc = await db.system_config.find_one_and_update(
+        {"_id": ORDINAL_SEQ_KEY},
+        {"$inc": {"value": n}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return int(doc["value"]) - n
+
+
+async def _assign_missing_ordinals(db) -> None:
+    missing = await db.trivia_questions.find({"ordinal": {"$exists": False}}, {"_id": 1}).to_list(length=None)
+    if not missing:
+        return
+    first = await _reserve_ordinals(db, len(missing))
+    await db.trivia_questions.bulk_write(
+        [UpdateOne({"_id": d["_id"]}, {"$set": {"ordinal": first + i}}) for i, d in enumerate(missing)],
+        ordered=False,
+    )
+
+
+async def load_bank(db, seed_defaults: bool = True) -> TriviaBank:
+    """
+    (Re)builds the in-memory bank from enabled questions in `trivia_questions`.
+    """
+    global _bank
+    if seed_defaults and await db.trivia_questions.estimated_document_count() == 0:
+        now = _utc_now()
+        await db.trivia_questions.insert_many(
+            [{**q, "enabled": True, "created_at": now} for q in DEFAULT_QUESTIONS]
+        )
+    await _assign_missing_ordinals(db)
+
+    version = await _current_version(db)
+    docs = await db.trivia_questions.find(
+        {"enabled": {"$ne": False}},
+        {"_id": 0, "id": 1, "question": 1, "options": 1, "answer": 1, "difficulty": 1, "explanation": 1, "ordinal": 1},
+    ).to_list(length=None)
+    _bank = TriviaBank(docs, version=version)
+    logger.info(f"Loaded trivia bank v{version}: {len(docs)} questions")
+    return _bank
+
+
+async def _bump_and_reload(db) -> None:
+    await db.system_config.update_one({"_id": VERSION_KEY}, {"$inc": {"value": 1}}, upsert=True)
+    await load_bank(db, seed_defaults=False)
+
+
+def start_refresher(db) -> None:
+    """
+    Polls the bank version so edits made through another worker invalidate
+    this worker's copy.
+    """
+    global _refresher
+    if _refresher is None:
+        _refresher = asyncio.create_task(_refresh_loop(db))
+
+
+async def stop_refresher() -> None:
+    global _refresher
+    if _refresher is not None:
+        _refresher.cancel()
+        try:
+            await _refresher
+        except asyncio.CancelledError:
+            pass
+        _refresher = None
+
+
+async def _refresh_loop(db) -> None:
+    while True:
+        await asyncio.sleep(REFRESH_INTERVAL)
+        try:
+            if await _current_version(db) != _bank.version:
+                await load_bank(db, seed_defaults=False)
+        except Exception as e:
+            logger.warning(f"Trivia bank refresh failed: {e}")
+
+
+# -------------------------
+# Admin API
+# -------------------------
+
+async def list_questions(db, skip: int = 0, limit: int = 100) -> Dict[str, Any]:
+    cursor = db.trivia_questions.find({}, {"_id": 0}).sort("id", 1).skip(max(0, int(skip))).limit(max(1, int(limit)))
+    return {"questions": [q async for q in cursor], **bank_stats()}
+
+
+async def create_question(db, item: Dict[str, Any]) -> Dict[str, Any]:
+    question, options, answer = item.get("question"), item.get("options"), item.get("answer")
+    if not question or not options or answer not in (options or []):
+        raise ValueError("question, options and an answer from options are required")
+
+    doc = {
+        "id": item.get("id") or str(uuid.uuid4()),
+        "question": question.strip(),
+        "options": list(options),
+        "answer": answer,
+        "difficulty": _clamp_difficulty(item.get("difficulty", MIN_DIFFICULTY)),
+        "explanation": item.get("explanation"),
+        "enabled": bool(item.get("enabled", True)),
+        "ordinal": await _reserve_ordinals(db, 1),
+        "created_at": _utc_now(),
+    }
+    await db.trivia_questions.insert_one(doc)
+    await _bump_and_reload(db)
+    doc.pop("_id", None)
+    return doc
+
+
+async def update_question(db, question_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
+    allowed = {"question", "options", "answer", "difficulty", "explanation", "enabled"}
+    safe_set = {k: v for k, v in updates.items() if k in allowed}
+    if not safe_set:
+        raise ValueError("no valid fields in updates")
+    if "difficulty" in safe_set:
+        safe_set["difficulty"] = _clamp_difficulty(safe_set["difficulty"])
+    safe_set["updated_at"] = _utc_now()
+
+    result = await db.trivia_questions.update_one({"id": question_id}, {"$set": safe_set})
+    if result.matched_count == 0:
+        raise LookupError("Question not found")
+    await _bump_and_reload(db)
+    return await db.trivia_questions.find_one({"id": question_id}, {"_id": 0})
+
+
+async def delete_question(db, question_id: str) -> Dict[str, Any]:
+    result = await db.trivia_questions.delete_one({"id": question_id})
+    if result.deleted_count == 0:
+        raise LookupError("Question not found")
+    await _bump_and_reload(db)
+    return {"id": question_id, "deleted": True}
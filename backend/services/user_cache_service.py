@@ -0,0 +1,351 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import CursorType, ReturnDocument
+from pymongo.errors import CollectionInvalid, OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+EVENTS_COLLECTION = "user_cache_events"   # capped; pub/sub fallback without a replica set
+EVENTS_COLLECTION_BYTES = 4 * 1024 * 1024
+DEFAULT_CACHE_SIZE = 50_000
+DEFAULT_TTL = 10.0            # seconds a user document is served from memory
+DEFAULT_NEGATIVE_TTL = 2.0    # seconds an unknown wallet stays unknown
+RECONNECT_DELAY = 5.0
+
+
+class UserCache:
+    """
+    Per-worker read-through cache of `users` documents keyed by lowercased
+    wallet, with LRU eviction, short TTLs and negative entries for unknown
+    wallets.
+
+    Writes that go through update() are cached from their
+    find_one_and_update result. Other workers' writes evict entries via a
+    change stream on `users` (any writer, including admin tools), or, when
+    the deployment has no replica set, via a capped `user_cache_events`
+    collection that invalidate() publishes to. The TTL bounds staleness
+    either way. Change events that the cached document already reflects
+    (typically this worker's own write, cached from its result) are skipped,
+    and a miss never caches a read that a newer put() or evict() overtook.
+    """
+
+    def __init__(
+        self,
+        db,
+        *,
+        max_size: int = DEFAULT_CACHE_SIZE,
+        ttl: float = DEFAULT_TTL,
+        negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+    ):
+        self.db = db
+        self.max_size = max(1, int(max_size))
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.worker_id = uuid.uuid4().hex
+        self.mode = "change_stream"
+
+        # wallet -> (doc or None for "no such user", expires_at monotonic)
+        self._entries: "OrderedDict[str, Tuple[Optional[Dict[str, Any]], float]]" = OrderedDict()
+        self._ids: Dict[Any, str] = {}   # users._id -> wallet, to evict on change events
+        self._loads: Dict[str, List[int]] = {}   # wallet -> [generation, reads in flight]
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+
+    # -------------------------
+    # Reads
+    # -------------------------
+
+    async def get(self, wallet: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the user (without _id) or None, reading Mongo only on a miss.
+        """
+        entry = self._entries.get(wallet)
+        if entry is not None and entry[1] > time.monotonic():
+            self._entries.move_to_end(wallet)
+            self.hits += 1
+            return _public(entry[0])
+        self.misses += 1
+        load = self._loads.setdefault(wallet, [0, 0])
+        generation = load[0]
+        load[1] += 1
+        try:
+            doc = await self.db.users.find_one({"wallet_address": wallet})
+        finally:
+            load[1] -= 1
+            if not load[1]:
+                self._loads.pop(wallet, None)
+        if load[0] != generation:
+            # A put() or evict() landed while reading; this read may be older
+            return _public(doc)
+        if doc is None:
+            self._store(wallet, None)
+            return None
+        self.put(doc)
+        return _public(doc)
+
+    def peek(self, wallet: str) -> Optional[Dict[str, Any]]:
+        """
+        The cached user (without _id) if fresh, else None. Never reads Mongo.
+        """
+        entry = self._entries.get(wallet)
+        if entry is None or entry[1] <= time.monotonic() or entry[0] is None:
+            return None
+        self._entries.move_to_end(wallet)
+        self.hits += 1
+        return _public(entry[0])
+
+    # -------------------------
+    # Writes
+    # -------------------------
+
+    async def update(self, wallet: str, update: Any, extra_filter: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        find_one_and_update on one wallet, caching and returning the updated
+        user (without _id). Returns None when nothing matched; the entry is
+        then dropped so the caller's follow-up get() sees Mongo's state.
+        """
+        doc = await self.db.users.find_one_and_update(
+            {"wallet_address": wallet, **(extra_filter or {})},
+            update,
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            self.evict(wallet)
+            return None
+        self.put(doc)
+        await self._publish(wallet)
+        return _public(doc)
+
+    def put(self, doc: Dict[str, Any]) -> None:
+        """
+        Caches a full user document, e.g. a find_one_and_update result.
+        """
+        wallet = doc.get("wallet_address")
+        if not wallet:
+            return
+        if "_id" in doc:
+            self._ids[doc["_id"]] = wallet
+        self._store(wallet, dict(doc))
+
+    def evict(self, wallet: str) -> None:
+        self._bump(wallet)
+        entry = self._entries.pop(wallet, None)
+        if entry is not None and entry[0] is not None:
+            self._ids.pop(entry[0].get("_id"), None)
+
+    async def invalidate(self, wallet: str) -> None:
+        """
+        Drops a wallet here and on every other worker. Call after writes
+        that do not go through update().
+        """
+        self.evict(wallet)
+        await self._publish(wallet)
+
+    async def invalidate_many(self, wallets) -> None:
+        wallets = list(wallets)
+        for wallet in wallets:
+            self.evict(wallet)
+        if self.mode != "pubsub" or not wallets:
+            return
+        now = time.time()
+        try:
+            await self.db[EVENTS_COLLECTION].insert_many(
+                [{"wallet_address": w, "worker": self.worker_id, "ts": now} for w in wallets],
+                ordered=False,
+            )
+        except PyMongoError as e:
+            logger.warning(f"User cache invalidation publish failed for {len(wallets)} wallets: {e}")
+
+    def _bump(self, wallet: str) -> None:
+        load = self._loads.get(wallet)
+        if load is not None:
+            load[0] += 1
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._ids.clear()
+        for load in self._loads.values():
+            load[0] += 1
+
+    def _store(self, wallet: str, doc: Optional[Dict[str, Any]]) -> None:
+        self._bump(wallet)
+        ttl = self.ttl if doc is not None else self.negative_ttl
+        self._entries[wallet] = (doc, time.monotonic() + ttl)
+        self._entries.move_to_end(wallet)
+        while len(self._entries) > self.max_size:
+            _, (old, _) = self._entries.popitem(last=False)
+            if old is not None:
+                self._ids.pop(old.get("_id"), None)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    # -------------------------
+    # Cross-worker invalidation
+    # -------------------------
+
+    async def _publish(self, wallet: str) -> None:
+        if self.mode != "pubsub":
+            return  # the change stream already carries every write
+        try:
+            await self.db[EVENTS_COLLECTION].insert_one(
+                {"wallet_address": wallet, "worker": self.worker_id, "ts": time.time()}
+            )
+        except PyMongoError as e:
+            logger.warning(f"User cache invalidation publish failed for {wallet}: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                if self.mode == "change_stream":
+                    await self._watch_changes()
+                else:
+                    await self._tail_events()
+            except OperationFailure as e:
+                if self.mode == "change_stream":
+                    # Standalone servers have no change streams
+                    logger.info(f"User cache falling back to pub/sub invalidation: {e}")
+                    self.mode = "pubsub"
+                    continue
+                logger.warning(f"User cache invalidation listener failed: {e}")
+            except PyMongoError as e:
+                logger.warning(f"User cache invalidation listener failed: {e}")
+            # Events may have been missed; start clean
+            self._clear()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _watch_changes(self) -> None:
+        pipeline = [{"$project": {
+            "operationType": 1, "documentKey": 1, "updateDescription": 1, "fullDocument.wallet_address": 1,
+        }}]
+        async with self.db.users.watch(pipeline) as stream:
+            async for change in stream:
+                self._on_change(change)
+
+    def _on_change(self, change: Dict[str, Any]) -> None:
+        wallet = self._ids.get(change.get("documentKey", {}).get("_id"))
+        if wallet is None:
+            # Inserts carry the wallet, which may be negatively cached
+            wallet = (change.get("fullDocument") or {}).get("wallet_address")
+            if wallet:
+                self.evict(wallet)
+            return
+        entry = self._entries.get(wallet)
+        if change.get("operationType") == "update" and entry is not None and _reflects(entry[0], change.get("updateDescription")):
+            return
+        self.evict(wallet)
+
+    async def _tail_events(self) -> None:
+        try:
+            await self.db.create_collection(EVENTS_COLLECTION, capped=True, size=EVENTS_COLLECTION_BYTES)
+        except CollectionInvalid:
+            pass
+        started = time.time()
+        # A tailable cursor on an empty capped collection dies immediately
+        await self.db[EVENTS_COLLECTION].insert_one({"wallet_address": None, "worker": self.worker_id, "ts": started})
+        cursor = self.db[EVENTS_COLLECTION].find({"ts": {"$gte": started}}, cursor_type=CursorType.TAILABLE_AWAIT)
+        while cursor.alive:
+            async for event in cursor:
+                if event.get("worker") != self.worker_id and event.get("wallet_address"):
+                    self.evict(event["wallet_address"])
+            await asyncio.sleep(0.1)
+
+
+# Internal fields never returned to API callers
+_HIDDEN_FIELDS = ("_id", "search_username", "search_grams", "step_sync_ids")
+
+
+_MISSING = object()
+
+
+def _path(doc: Any, path: str) -> Any:
+    for part in path.split("."):
+        if isinstance(doc, dict):
+            doc = doc.get(part, _MISSING)
+        elif isinstance(doc, list) and part.isdigit() and int(part) < len(doc):
+            doc = doc[int(part)]
+        else:
+            return _MISSING
+        if doc is _MISSING:
+            break
+    return doc
+
+
+def _reflects(doc: Optional[Dict[str, Any]], description: Optional[Dict[str, Any]]) -> bool:
+    """
+    True when `doc` already holds every change in an update event's
+    updateDescription, i.e. it was cached from this write or a later one.
+    """
+    if doc is None or not description:
+        return False
+    for path, value in (description.get("updatedFields") or {}).items():
+        if _path(doc, path) != value:
+            return False
+    for path in description.get("removedFields") or ():
+        if _path(doc, path) is not _MISSING:
+            return False
+    for truncated in description.get("truncatedArrays") or ():
+        array = _path(doc, truncated.get("field", ""))
+        if not isinstance(array, list) or len(array) != truncated.get("newSize"):
+            return False
+    return True
+
+
+def _public(doc: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if doc is None:
+        return None
+    return {k: v for k, v in doc.items() if k not in _HIDDEN_FIELDS}
+
+
+# -------------------------
+# Module-level singleton
+# -------------------------
+
+_cache: Optional[UserCache] = None
+
+
+def start_cache(db, **kwargs) -> UserCache:
+    global _cache
+    if _cache is None:
+        _cache = UserCache(db, **kwargs)
+        _cache.start()
+    return _cache
+
+
+async def stop_cache() -> None:
+    global _cache
+    if _cache is not None:
+        await _cache.stop()
+        _cache = None
+
+
+def get_cache() -> UserCache:
+    if _cache is None:
+        raise RuntimeError("User cache not started")
+    return _cache
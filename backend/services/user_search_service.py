@@ -0,0 +1,162 @@
+"""
+Admin user search.
+
+Users carry two derived fields, maintained wherever the username changes
+(`search_fields`) and backfilled by migration 3:
+
+  - search_username: lowercased, trimmed custom_username (prefix searches)
+  - search_grams:    trigrams of search_username and of the wallet's hex
+                     body (substring searches via a multikey index)
+
+Search picks one index-backed plan per term:
+
+  - "0x..."          range scan on the unique wallet_address index
+  - 1-2 characters   range scan on search_username
+  - 3+ characters    all of the term's trigrams on search_grams, then an
+                     exact substring check on the few candidates
+
+Pages use keyset cursors (opaque strings) instead of skip, and totals come
+from totals_service: the collection's metadata count when unfiltered,
+otherwise a cached count capped at COUNT_CAP (exact=True counts everything).
+"""
+import base64
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+import services.totals_service as totals_service
+
+NGRAM = 3
+COUNT_CAP = 10_000
+MAX_PAGE_SIZE = 200
+SEARCH_FIELDS = ("search_username", "search_grams")
+
+
+# -------------------------
+# Derived fields
+# -------------------------
+
+def normalize(text: Optional[str]) -> str:
+    return (text or "").strip().lower()
+
+
+def ngrams(text: str, n: int = NGRAM) -> List[str]:
+    return sorted({text[i:i + n] for i in range(len(text) - n + 1)})
+
+
+def search_fields(wallet_address: str, username: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Derived search fields for a user; $set them alongside any username change.
+    """
+    name = normalize(username)
+    wallet = normalize(wallet_address)
+    body = wallet[2:] if wallet.startswith("0x") else wallet
+    return {
+        "search_username": name or None,
+        "search_grams": sorted(set(ngrams(name)) | set(ngrams(body))),
+    }
+
+
+# -------------------------
+# Cursors
+# -------------------------
+
+def _encode_cursor(values: List[Any]) -> str:
+    raw = [{"$oid": str(v)} if isinstance(v, ObjectId) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(raw).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> List[Any]:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return [ObjectId(v["$oid"]) if isinstance(v, dict) else v for v in raw]
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def _prefix_range(prefix: str) -> Dict[str, str]:
+    # Every string starting with `prefix` sorts in [prefix, prefix + U+FFFF)
+    return {"$gte": prefix, "$lt": prefix + "\uffff"}
+
+
+# -------------------------
+# Search
+# -------------------------
+
+def build_plan(term: str) -> Tuple[Dict[str, Any], List[Tuple[str, int]]]:
+    """
+    (filter, sort keys) for a normalized search term. The last sort key is
+    always unique so keyset pagination is stable.
+    """
+    if not term:
+        return {}, [("_id", 1)]
+    if term.startswith("0x"):
+        return {"wallet_address": _prefix_range(term)}, [("wallet_address", 1)]
+    if len(term) < NGRAM:
+        return {"search_username": _prefix_range(term)}, [("search_username", 1), ("_id", 1)]
+    pattern = re.escape(term)
+    return {
+        "search_grams": {"$all": ngrams(term)},
+        # Trigrams can match out of order; confirm the substring on the candidates
+        "$or": [{"search_username": {"$regex": pattern}}, {"wallet_address": {"$regex": pattern}}],
+    }, [("_id", 1)]
+
+
+def _after(sort: List[Tuple[str, int]], values: List[Any]) -> Dict[str, Any]:
+    """
+    Keyset condition: rows strictly after `values` in (ascending) sort order.
+    """
+    if len(sort) == 1:
+        return {sort[0][0]: {"$gt": values[0]}}
+    (first, _), (second, _) = sort
+    return {"$or": [
+        {first: {"$gt": values[0]}},
+        {first: values[0], second: {"$gt": values[1]}},
+    ]}
+
+
+async def search_users(
+    db,
+    search: Optional[str] = None,
+    status: Optional[str] = None,
+    tier: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    projection: Optional[Dict[str, int]] = None,
+    exact: bool = False,
+) -> Dict[str, Any]:
+    """
+    Returns {"users", "next_cursor", "total", "exact", "cached"}.
+    Raises ValueError for a malformed cursor.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    term = normalize(search)
+    query, sort = build_plan(term)
+    if status:
+        query["status"] = status
+    if tier:
+        query["tier"] = tier
+
+    page_query = query
+    if cursor:
+        page_query = {"$and": [query, _after(sort, _decode_cursor(cursor))]}
+
+    fields = projection or {name: 0 for name in SEARCH_FIELDS}
+    if any(fields.values()):
+        fields = {**fields, **{key: 1 for key, _ in sort}}   # cursor values come from the sort keys
+    docs = await db.users.find(page_query, fields).sort(sort).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = _encode_cursor([docs[-1].get(key) for key, _ in sort])
+
+    totals = await totals_service.get_totals().count(db, "users", query, exact=exact, limit=None if exact else COUNT_CAP)
+
+    for doc in docs:
+        doc.pop("_id", None)
+        for name in SEARCH_FIELDS:
+            doc.pop(name, None)
+    return {"users": docs, "next_cursor": next_cursor, **totals}
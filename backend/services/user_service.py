@@ -0,0 +1,133 @@
+import logging
+import re
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+import services.user_search_service as user_search_service
+
+logger = logging.getLogger(__name__)
+
+ONBOARD_CHUNK_SIZE = 5000            # upserts per bulk_write
+MAX_ONBOARD_WALLETS = 100_000        # per request
+SIGNUP_BONUS_ZWAP = 100.0
+WALLET_PATTERN = re.compile(r"^0x[0-9a-f]{40}$")   # lowercased EVM address
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def new_user_fields(wallet: str, now: Optional[datetime] = None, bonus: float = SIGNUP_BONUS_ZWAP) -> Dict[str, Any]:
+    """
+    Fields of a freshly connected user (everything except wallet_address),
+    used as $setOnInsert so existing users are never touched. Callers that
+    pass a `bonus` record it as a "signup" reward.
+    """
+    now = now or _utc_now()
+    return {
+        "id": str(uuid.uuid4()),
+        "zwap_balance": bonus,
+        "zpts_balance": 0,
+        "tier": "starter",
+        "status": "active",
+        "subscription_id": None,
+        "subscription_status": None,
+        "total_steps": 0,
+        "daily_steps": 0,
+        "daily_zpts_earned": 0,
+        "last_zpts_reset": now.isoformat(),
+        "games_played": 0,
+        "total_earned": bonus,
+        "created_at": now.isoformat(),
+        **user_search_service.search_fields(wallet),
+    }
+
+
+async def connect_user(db, wallet_address: str) -> Tuple[Dict[str, Any], bool]:
+    """
+    Returns (user, created) for a wallet, creating it if needed with one
+    upserting find_one_and_update. The returned user includes _id. Relies on
+    the unique wallet_address index from index_service.
+    """
+    wallet = wallet_address.lower()
+    fields = new_user_fields(wallet)
+    for attempt in range(2):
+        try:
+            user = await db.users.find_one_and_update(
+                {"wallet_address": wallet},
+                {"$setOnInsert": fields},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            return user, user.get("id") == fields["id"]
+        except DuplicateKeyError:
+            # Lost an insert race to a concurrent connect; the next try matches it
+            if attempt:
+                raise
+    raise RuntimeError("unreachable")
+
+
+async def onboard_users(
+    db,
+    wallets: List[Dict[str, Any]],
+    source: str = "partner_import",
+    chunk_size: int = ONBOARD_CHUNK_SIZE,
+) -> Dict[str, Any]:
+    """
+    Bulk-creates users for a partner import. Each item is
+    {"wallet_address", "username"?}; wallets that already exist are left
+    unchanged, so re-running an import is safe. Addresses must be 0x plus
+    40 hex digits. Imported users start without the signup bonus, which is
+    only credited (and recorded) by a real connect.
+
+    Returns {"received", "created", "existing", "duplicates", "invalid"}.
+    """
+    if len(wallets) > MAX_ONBOARD_WALLETS:
+        raise ValueError(f"Maximum {MAX_ONBOARD_WALLETS} wallets per import")
+
+    now = _utc_now()
+    seen, invalid, operations = set(), [], []
+    duplicates = 0
+    for item in wallets:
+        wallet = str(item.get("wallet_address") or "").strip().lower()
+        if not WALLET_PATTERN.match(wallet):
+            invalid.append(item.get("wallet_address"))
+            continue
+        if wallet in seen:
+            duplicates += 1
+            continue
+        seen.add(wallet)
+        fields = {**new_user_fields(wallet, now, bonus=0.0), "onboarded_by": source}
+        if item.get("username"):
+            fields["custom_username"] = item["username"]
+            fields.update(user_search_service.search_fields(wallet, item["username"]))
+        operations.append(UpdateOne({"wallet_address": wallet}, {"$setOnInsert": fields}, upsert=True))
+
+    created = existing = 0
+    for start in range(0, len(operations), chunk_size):
+        chunk = operations[start:start + chunk_size]
+        try:
+            result = await db.users.bulk_write(chunk, ordered=False)
+            created += result.upserted_count
+            existing += result.matched_count
+        except BulkWriteError as e:
+            details = e.details
+            # Duplicate key = created concurrently by a connect; anything else is fatal
+            fatal = [err for err in details.get("writeErrors", []) if err.get("code") != 11000]
+            if fatal:
+                raise
+            created += details.get("nUpserted", 0)
+            existing += details.get("nMatched", 0) + len(details.get("writeErrors", []))
+
+    logger.info(f"Onboarded {created} new wallets from {source} ({existing} already existed)")
+    return {
+        "received": len(wallets),
+        "created": created,
+        "existing": existing,
+        "duplicates": duplicates,
+        "invalid": invalid,
+    }
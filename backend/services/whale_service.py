@@ -0,0 +1,273 @@
+"""
+Maintained top-K view of the largest ZWAP balances ("whales").
+
+Each worker keeps a bounded min-heap of the top `capacity` balances with a
+small projection per wallet, so top-earner lists and whale checks are
+memory reads. Balance mutations from any writer arrive through a change
+stream on `users` that only carries updates touching zwap_balance (the new
+value is in the update description; the document is fetched only when a
+wallet not on the board climbs above its floor).
+
+Wallets off the board are never above the highest floor the board has had
+since the last reconcile, so the top K it serves are exact while the K-th
+balance is at or above that mark. Members' balance drops can break this;
+the board holds K + slack entries to absorb them, and `exact` reports it.
+A periodic reconcile reloads the board with one indexed query (every few
+minutes, or every 30 s on deployments without change streams, where it is
+the only update path).
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOP_K = 100
+DEFAULT_SLACK = 100                       # extra entries kept to absorb members' balance drops
+DEFAULT_RECONCILE_INTERVAL = 300.0        # seconds, with a change stream
+POLL_RECONCILE_INTERVAL = 30.0            # seconds, without one
+RECONNECT_DELAY = 5.0
+FIELDS = ("wallet_address", "custom_username", "username", "zwap_balance", "total_earned", "tier", "status", "fraud_flags")
+CHANGE_STREAMS_UNSUPPORTED = 40573        # standalone server (no replica set / oplog)
+
+
+class WhaleBoard:
+    def __init__(self, db, *, top_k: int = DEFAULT_TOP_K, slack: int = DEFAULT_SLACK,
+                 reconcile_interval: float = DEFAULT_RECONCILE_INTERVAL):
+        self.db = db
+        self.top_k = top_k
+        self.capacity = top_k + slack
+        self.reconcile_interval = reconcile_interval
+        self.mode = "change_stream"
+        self._members: Dict[str, Dict[str, Any]] = {}     # wallet -> projection
+        self._entry: Dict[str, int] = {}                  # wallet -> seq of its live heap entry
+        self._ids: Dict[Any, str] = {}                    # users._id -> wallet, for change events
+        self._heap: List[Tuple[float, int, str]] = []     # (balance, seq, wallet); stale entries skipped lazily
+        self._seq = itertools.count()
+        self._high_floor = 0.0                            # every wallet off the board is at or below this
+        self._tasks: List[asyncio.Task] = []
+
+    # -------------------------
+    # Heap
+    # -------------------------
+
+    def _push(self, doc: Dict[str, Any], _id: Any = None) -> None:
+        wallet = doc["wallet_address"]
+        seq = next(self._seq)
+        self._members[wallet] = {k: doc.get(k) for k in FIELDS}
+        self._entry[wallet] = seq
+        if _id is not None:
+            self._ids[_id] = wallet
+        heapq.heappush(self._heap, (float(doc.get("zwap_balance") or 0), seq, wallet))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(float(m.get("zwap_balance") or 0), self._entry[w], w) for w, m in self._members.items()]
+            heapq.heapify(self._heap)
+
+    def _prune(self) -> None:
+        while self._heap and self._entry.get(self._heap[0][2]) != self._heap[0][1]:
+            heapq.heappop(self._heap)
+
+    def _evict_min(self) -> None:
+        self._prune()
+        _, _, wallet = heapq.heappop(self._heap)
+        del self._members[wallet]
+        del self._entry[wallet]
+        self._ids = {i: w for i, w in self._ids.items() if w != wallet}
+
+    def floor(self) -> float:
+        """
+        Smallest balance on the board (0 while it isn't full).
+        """
+        if len(self._members) < self.capacity:
+            return 0.0
+        self._prune()
+        return self._heap[0][0] if self._heap else 0.0
+
+    def observe(self, doc: Dict[str, Any], _id: Any = None) -> None:
+        """
+        Applies a user's current balance (doc holds at least wallet_address
+        and zwap_balance).
+        """
+        wallet = doc.get("wallet_address")
+        if not wallet:
+            return
+        balance = float(doc.get("zwap_balance") or 0)
+        member = self._members.get(wallet)
+        if member is not None:
+            self._push({**member, **doc}, _id)
+        elif len(self._members) < self.capacity:
+            self._push(doc, _id)
+        elif balance > self.floor():
+            self._high_floor = max(self._high_floor, self.floor())
+            self._evict_min()
+            self._push(doc, _id)
+
+    def observe_balance(self, _id: Any, balance: float) -> Optional[bool]:
+        """
+        Applies a balance from a change event. Returns None when the user
+        is not on the board and would enter it (caller must fetch the doc).
+        """
+        wallet = self._ids.get(_id)
+        if wallet is not None:
+            self.observe({"wallet_address": wallet, "zwap_balance": balance}, _id)
+            return True
+        if len(self._members) < self.capacity or balance > self.floor():
+            return None
+        return False
+
+    # -------------------------
+    # Reads (memory only)
+    # -------------------------
+
+    def top(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        limit = min(limit or self.top_k, self.top_k)
+        ranked = heapq.nlargest(limit, self._members.values(), key=lambda m: float(m.get("zwap_balance") or 0))
+        return [{"rank": n, **m} for n, m in enumerate(ranked, start=1)]
+
+    @property
+    def exact(self) -> bool:
+        """
+        Whether the served top K is guaranteed to match Mongo.
+        """
+        ranked = self.top()
+        if len(ranked) < self.top_k:
+            return self._high_floor == 0.0
+        return float(ranked[-1].get("zwap_balance") or 0) >= self._high_floor
+
+    def rank_of(self, wallet: str) -> Optional[int]:
+        """
+        1-based rank if the wallet is in the top K, else None.
+        """
+        member = self._members.get(wallet)
+        if member is None:
+            return None
+        balance = float(member.get("zwap_balance") or 0)
+        rank = 1 + sum(1 for m in self._members.values() if float(m.get("zwap_balance") or 0) > balance)
+        return rank if rank <= self.top_k else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "top_k": self.top_k,
+            "members": len(self._members),
+            "floor": self.floor(),
+            "exact": self.exact,
+        }
+
+    # -------------------------
+    # Reconcile and change feed
+    # -------------------------
+
+    async def reconcile(self) -> None:
+        projection = {k: 1 for k in FIELDS}
+        docs = await self.db.users.find({}, projection).sort("zwap_balance", -1).limit(self.capacity).to_list(self.capacity)
+        self._members.clear()
+        self._entry.clear()
+        self._ids.clear()
+        self._heap = []
+        for doc in docs:
+            self._push(doc, doc["_id"])
+        self._high_floor = self.floor()
+
+    async def _watch_balances(self) -> None:
+        pipeline = [
+            {"$match": {"$or": [
+                {"operationType": "update", "updateDescription.updatedFields.zwap_balance": {"$exists": True}},
+                {"operationType": {"$in": ["insert", "replace"]}},
+            ]}},
+            {"$project": {
+                "operationType": 1, "documentKey": 1,
+                "updateDescription.updatedFields.zwap_balance": 1,
+                **{f"fullDocument.{k}": 1 for k in FIELDS},
+            }},
+        ]
+        async with self.db.users.watch(pipeline) as stream:
+            async for change in stream:
+                _id = change.get("documentKey", {}).get("_id")
+                if change.get("operationType") != "update":
+                    self.observe(change.get("fullDocument") or {}, _id)
+                    continue
+                balance = change["updateDescription"]["updatedFields"]["zwap_balance"]
+                if self.observe_balance(_id, float(balance or 0)) is None:
+                    doc = await self.db.users.find_one({"_id": _id}, {k: 1 for k in FIELDS})
+                    if doc:
+                        self.observe(doc, _id)
+
+    async def _listen(self) -> None:
+        while self.mode == "change_stream":
+            try:
+                await self._watch_balances()
+            except OperationFailure as e:
+                if e.code != CHANGE_STREAMS_UNSUPPORTED:
+                    # e.g. ChangeStreamHistoryLost: reopen from now and reconcile
+                    logger.warning(f"Whale board change stream failed: {e}")
+                else:
+                    logger.info(f"Whale board falling back to periodic reconcile: {e}")
+                    self.mode = "poll"
+                    self.reconcile_interval = min(self.reconcile_interval, POLL_RECONCILE_INTERVAL)
+                    return
+            except PyMongoError as e:
+                logger.warning(f"Whale board change stream failed: {e}")
+            await asyncio.sleep(RECONNECT_DELAY)
+            try:
+                await self.reconcile()  # changes may have been missed
+            except PyMongoError as e:
+                logger.warning(f"Whale board reconcile failed: {e}")
+
+    async def _reconcile_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                await self.reconcile()
+            except Exception as e:  # keep the task alive
+                logger.error(f"Whale board reconcile failed: {e}")
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._reconcile_loop())]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+
+# -------------------------
+# Module-level singleton
+# -------------------------
+
+_board: Optional[WhaleBoard] = None
+
+
+async def start_whales(db, **kwargs) -> WhaleBoard:
+    global _board
+    if _board is None:
+        _board = WhaleBoard(db, **kwargs)
+        try:
+            await _board.reconcile()
+        except PyMongoError as e:
+            logger.warning(f"Initial whale board load failed, will retry: {e}")
+        _board.start()
+    return _board
+
+
+async def stop_whales() -> None:
+    global _board
+    if _board is not None:
+        await _board.stop()
+        _board = None
+
+
+def get_whales() -> WhaleBoard:
+    if _board is None:
+        raise RuntimeError("Whale board not started")
+    return _board
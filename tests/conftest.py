@@ -0,0 +1,10 @@
+"""
+Unit tests import backend modules the way the app does ("services.x"), so
+the backend directory goes on sys.path.
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
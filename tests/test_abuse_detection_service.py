@@ -0,0 +1,131 @@
+"""
+Unit tests for the sketches and volume check in
+services/abuse_detection_service.py.
+"""
+import asyncio
+import math
+import random
+
+import services.abuse_detection_service as abuse_detection_service
+from services.abuse_detection_service import (
+    CMS_MAX_WIDTH,
+    CMS_WIDTH,
+    REWARD_VOLUME_FLAG,
+    AbuseDetector,
+    CountMinSketch,
+    SpaceSaving,
+)
+from services.analytics_service import detect_abuse
+
+T0 = 1_800_000_000.0
+
+
+class TestCountMinSketch:
+    """Per-key estimates"""
+
+    def test_never_under_and_bounded_over(self):
+        """Estimates are >= the truth and within e/width of the total for almost all keys"""
+        rng = random.Random(43)
+        sketch = CountMinSketch()
+        truth = {}
+        for _ in range(50_000):
+            key = f"0x{int(rng.paretovariate(1.2)) % 20000}"
+            amount = rng.uniform(0, 10)
+            truth[key] = truth.get(key, 0) + amount
+            sketch.add(key, amount)
+        bound = math.e / sketch.width * sketch.total
+        over = [sketch.estimate(k) - v for k, v in truth.items()]
+        assert min(over) >= -1e-6
+        assert sum(1 for o in over if o > bound) <= 0.02 * len(over)
+        assert math.isclose(sketch.total, sum(truth.values()))
+
+    def test_width_for(self):
+        """Widths are powers of two that keep e/width * total under the budget, within the limits"""
+        assert CountMinSketch.width_for(0, 10) == CMS_WIDTH
+        assert CountMinSketch.width_for(1000, 10) == CMS_WIDTH
+        width = CountMinSketch.width_for(1_000_000, 100)
+        assert width & (width - 1) == 0
+        assert math.e / width * 1_000_000 <= 100 < math.e / (width // 2) * 1_000_000
+        assert CountMinSketch.width_for(1e12, 1) == CMS_MAX_WIDTH
+
+
+class TestSpaceSaving:
+    """Heavy hitters"""
+
+    def test_finds_heavy_hitters(self):
+        """Keys heavier than total/k are kept, and count - error never exceeds the truth"""
+        rng = random.Random(7)
+        summary = SpaceSaving(k=50)
+        truth = {}
+        stream = [f"heavy{i}" for i in range(5) for _ in range(2000)]
+        stream += [f"0x{rng.randrange(100_000)}" for _ in range(40_000)]
+        rng.shuffle(stream)
+        for key in stream:
+            summary.add(key, 1.0)
+            truth[key] = truth.get(key, 0) + 1
+        top = summary.top(5)
+        assert {key for key, _, _ in top} == {f"heavy{i}" for i in range(5)}
+        for key, count, error in summary.top(50):
+            assert count - error <= truth[key] <= count
+
+    def test_scale_keeps_order(self):
+        """Scaling (forward-decay landmark moves) scales counts and errors alike"""
+        summary = SpaceSaving(k=2)
+        for key, weight in (("a", 5.0), ("b", 3.0), ("c", 1.0)):
+            summary.add(key, weight)
+        summary.scale(0.5)
+        assert summary.top(2) == [("a", 2.5, 0.0), ("c", 2.0, 1.5)]
+
+
+class TestVolumeCheck:
+    """Daily volume flags"""
+
+    def test_steady_earner_is_flagged(self):
+        """A wallet earning evenly over 24h is flagged once it passes the daily threshold"""
+        detector = AbuseDetector(None, burst_zwap_per_hour=1e12, burst_events_per_minute=1e12, daily_zwap=10_000)
+        for minute in range(24 * 60):
+            detector.observe("0xsteady", "steps", zwap=10, now=T0 + minute * 60)
+        assert detector.daily_volume("0xsteady") >= 10 * 24 * 60 - 1e-6
+        assert REWARD_VOLUME_FLAG in {f["type"] for f in detector._pending_flags}
+
+    def test_ignored_sources(self):
+        """Admin adjustments and signup bonuses never count"""
+        detector = AbuseDetector(None, daily_zwap=10)
+        detector.observe("0xa", "admin_adjustment", zwap=1000, now=T0)
+        detector.observe("0xa", "signup", zwap=1000, now=T0)
+        assert detector.daily_volume("0xa") == 0
+
+    def test_many_small_wallets_are_not_flagged(self):
+        """Honest wallets far under the threshold are never flagged, however busy the hour"""
+        rng = random.Random(3)
+        detector = AbuseDetector(None, burst_zwap_per_hour=1e12, burst_events_per_minute=1e12, daily_zwap=1000)
+        wallets = [f"0x{i:040x}" for i in range(40_000)]
+        for hour in range(3):
+            rng.shuffle(wallets)
+            for i, wallet in enumerate(wallets):
+                detector.observe(wallet, "game", zwap=100, now=T0 + hour * 3600 + i * 0.05)
+        assert not [f for f in detector._pending_flags if f["type"] == REWARD_VOLUME_FLAG]
+        # The first hour sizes every later sketch wider
+        widths = [detector._hourly[h].width for h in sorted(detector._hourly)]
+        assert widths[0] == CMS_WIDTH and widths[1] > CMS_WIDTH
+
+        detector.observe("0xbad", "game", zwap=5000, now=T0 + 3 * 3600)
+        flags = [f for f in detector._pending_flags if f["type"] == REWARD_VOLUME_FLAG]
+        assert [f["wallet_address"] for f in flags] == ["0xbad"]
+        assert 1000 < flags[0]["zwap_24h_min"] <= 5000 <= flags[0]["zwap_24h"]
+
+    def test_detect_abuse_uses_lower_bound(self, monkeypatch):
+        """detect_abuse keeps suspects by the error-corrected volume, not the raw estimate"""
+        suspects = [
+            {"wallet_address": "0xa", "zwap_24h": 12_000, "zwap_24h_min": 9_000, "flags": []},
+            {"wallet_address": "0xb", "zwap_24h": 12_000, "zwap_24h_min": 11_000, "flags": []},
+            {"wallet_address": "0xc", "zwap_24h": 50, "zwap_24h_min": 0, "flags": ["reward_burst"]},
+        ]
+
+        class _Detector:
+            def top_suspects(self, limit):
+                return suspects[:limit]
+
+        monkeypatch.setattr(abuse_detection_service, "get_detector", lambda: _Detector())
+        found = asyncio.run(detect_abuse(None, threshold=10_000))
+        assert [s["wallet_address"] for s in found] == ["0xb", "0xc"]
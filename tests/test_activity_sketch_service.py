@@ -0,0 +1,92 @@
+"""
+Unit tests for the HyperLogLog used by services/activity_sketch_service.py.
+"""
+import pytest
+
+from services.activity_sketch_service import HyperLogLog
+
+
+def _sketch(wallets):
+    hll = HyperLogLog()
+    for wallet in wallets:
+        hll.add(wallet)
+    return hll
+
+
+class TestHyperLogLog:
+    """Count error, unions and serialization"""
+
+    @pytest.mark.parametrize("n", [10, 1000, 50_000, 200_000])
+    def test_count_within_error_bound(self, n):
+        """Estimates stay within 4 standard errors (1.04 / sqrt(m))"""
+        hll = _sketch(f"0x{i:040x}" for i in range(n))
+        assert abs(hll.count() - n) <= max(1, 4 * hll.relative_error * n)
+
+    def test_duplicates_do_not_count(self):
+        """Adding the same wallets again leaves the registers unchanged"""
+        hll = _sketch(f"0x{i}" for i in range(5000))
+        before = hll.registers.copy()
+        for i in range(5000):
+            hll.add(f"0x{i}")
+        assert (hll.registers == before).all()
+
+    def test_union_counts_distinct_across_days(self):
+        """A union of overlapping days counts each wallet once"""
+        day1 = _sketch(f"0x{i}" for i in range(0, 30000))
+        day2 = _sketch(f"0x{i}" for i in range(20000, 50000))
+        union = HyperLogLog.union([day1, day2])
+        assert abs(union.count() - 50000) <= 4 * union.relative_error * 50000
+
+    def test_bytes_round_trip(self):
+        """Compressed registers decode to the same sketch"""
+        hll = _sketch(f"0x{i}" for i in range(1234))
+        decoded = HyperLogLog.from_bytes(hll.to_bytes())
+        assert (decoded.registers == hll.registers).all()
+        assert HyperLogLog().is_empty()
+
+
+class TestActiveFeed:
+    """Sketches are fed from the rollups' activity, not from URLs"""
+
+    def test_listener_sees_each_wallet_once_per_day(self):
+        """record_* calls notify active listeners the first time a wallet is active that day"""
+        from services.analytics_rollup_service import DailyRollups
+
+        rollups = DailyRollups(None)
+        seen = []
+        rollups.subscribe_active(lambda wallet, now=None: seen.append(wallet))
+        rollups.record_reward("0xa", "steps", zwap=1)
+        rollups.record_game("0xa", "ztrivia")
+        rollups.record_swap("0xb", 0.5)
+        rollups.record_reward(None, "admin_adjustment", zwap=5)
+        assert seen == ["0xa", "0xb"]
+
+    def test_live_connect_goes_through_the_rollups(self, monkeypatch):
+        """The live connect route records signups and returning wallets in the rollups"""
+        import asyncio
+        from types import SimpleNamespace
+
+        import routers.user_routes as user_routes
+        import services.activity_sketch_service as activity_sketch_service
+        import services.analytics_rollup_service as analytics_rollup_service
+        from services.analytics_rollup_service import DailyRollups
+
+        rollups = DailyRollups(None)
+        seen = []
+        rollups.subscribe_active(lambda wallet, now=None: seen.append(("active", wallet)))
+        sketches = SimpleNamespace(record=lambda wallet, kind="active", now=None: seen.append((kind, wallet)))
+
+        async def connect_user(db, wallet):
+            return {"_id": 1, "wallet_address": wallet.lower()}, wallet == "0xNEW"
+
+        monkeypatch.setattr(analytics_rollup_service, "get_rollups", lambda: rollups)
+        monkeypatch.setattr(activity_sketch_service, "get_sketches", lambda: sketches)
+        monkeypatch.setattr(user_routes.user_service, "connect_user", connect_user)
+        request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(db=object())))
+
+        for wallet in ("0xNEW", "0xold"):
+            user = asyncio.run(user_routes.connect_wallet(user_routes.ConnectRequest(wallet_address=wallet), request))
+            assert "_id" not in user
+        assert seen == [("active", "0xnew"), ("new", "0xnew"), ("active", "0xold")]
+        day = next(iter(rollups._incs))
+        assert rollups._incs[day] == {"rewards.signup.zwap": user_routes.user_service.SIGNUP_BONUS_ZWAP, "rewards.signup.count": 1}
@@ -0,0 +1,210 @@
+"""
+Unit tests for daily analytics rollups (services/analytics_rollup_service.py).
+"""
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+
+from pymongo import UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+import services.analytics_rollup_service as analytics_rollup_service
+from services.analytics_rollup_service import ACTIVE_COLLECTION, DAILY_COLLECTION, DailyRollups, compact_day
+
+NOW = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+DAY = NOW.date().isoformat()
+
+
+def _get(doc, path):
+    for part in path.split("."):
+        doc = doc.get(part, {}) if isinstance(doc, dict) else {}
+    return doc
+
+
+def _set(doc, path, value):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+def _matches(doc, query):
+    for field, cond in query.items():
+        value = _get(doc, field)
+        if isinstance(cond, dict):
+            for op, operand in cond.items():
+                if op == "$gte" and not value >= operand:
+                    return False
+                if op == "$lt" and not value < operand:
+                    return False
+                if op == "$gt" and not value > operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+        elif value != cond:
+            return False
+    return True
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length=None):
+        return self.docs
+
+
+class _Collection:
+    def __init__(self):
+        self.docs = {}
+        self.failures = []   # exceptions raised by the next bulk_write calls
+
+    def _upsert(self, op):
+        doc = self.docs.get(op._filter["_id"])
+        if doc is None:
+            doc = self.docs[op._filter["_id"]] = {"_id": op._filter["_id"]}
+            for path, value in op._doc.get("$setOnInsert", {}).items():
+                _set(doc, path, value)
+            created = True
+        else:
+            created = False
+        for path, amount in op._doc.get("$inc", {}).items():
+            _set(doc, path, (_get(doc, path) or 0) + amount)
+        for path, value in op._doc.get("$set", {}).items():
+            _set(doc, path, value)
+        return created
+
+    async def bulk_write(self, ops, ordered=True):
+        if self.failures:
+            raise self.failures.pop(0)
+        upserted = sum(self._upsert(op) for op in ops)
+        return type("Result", (), {"upserted_count": upserted})()
+
+    async def update_one(self, query, update, upsert=False):
+        self._upsert(UpdateOne(query, update, upsert=upsert))
+
+    async def count_documents(self, query):
+        return sum(1 for d in self.docs.values() if _matches(d, query))
+
+    def aggregate(self, pipeline):
+        match, group = pipeline[0]["$match"], pipeline[1]["$group"]
+        groups = {}
+        for doc in self.docs.values():
+            if not _matches(doc, match):
+                continue
+            key = _get(doc, group["_id"][1:]) if group["_id"] else None
+            out = groups.setdefault(key, {"_id": key, **{f: 0 for f in group if f != "_id"}})
+            for field, spec in group.items():
+                if field != "_id":
+                    out[field] += 1 if spec["$sum"] == 1 else _get(doc, spec["$sum"][1:]) or 0
+        return _Cursor(list(groups.values()))
+
+    def insert(self, doc):
+        self.docs[doc.get("_id", len(self.docs))] = doc
+
+
+class _DB:
+    def __init__(self):
+        self.collections = {}
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, _Collection())
+
+
+class TestFlush:
+    """Buffered increments and activity markers"""
+
+    def test_failed_flush_is_retried_once(self):
+        """Increments survive a failed write and are applied exactly once"""
+        db = _DB()
+        rollups = DailyRollups(db)
+        rollups.record_reward("0xa", "scratch", zwap=25, now=NOW)
+        rollups.record_steps("0xa", 1000, now=NOW)
+        db[DAILY_COLLECTION].failures.append(AutoReconnect("down"))
+        asyncio.run(rollups.flush())
+        assert db[DAILY_COLLECTION].docs == {}
+
+        rollups.record_reward("0xb", "scratch", zwap=5, now=NOW)
+        asyncio.run(rollups.flush())
+        asyncio.run(rollups.flush())
+        doc = db[DAILY_COLLECTION].docs[DAY]
+        assert doc["rewards"]["scratch"] == {"zwap": 30, "count": 2}
+        assert doc["steps"]["total"] == 1000
+        assert doc["dau"] == 2
+
+    def test_dau_is_exact_across_workers(self):
+        """Only the first marker per (day, wallet) counts, whichever worker writes it"""
+        db = _DB()
+        workers = [DailyRollups(db), DailyRollups(db)]
+        for worker in workers:
+            worker.record_active("0xa", now=NOW)
+            worker.record_active("0xb", now=NOW)
+        workers[1].record_active("0xc", now=NOW)
+        for worker in workers:
+            asyncio.run(worker.flush())
+        assert db[DAILY_COLLECTION].docs[DAY]["dau"] == 3
+
+    def test_failed_markers_are_retried(self):
+        """Markers that failed for reasons other than a lost race go back into the buffer"""
+        db = _DB()
+        rollups = DailyRollups(db)
+        for wallet in ("0xa", "0xb", "0xc"):
+            rollups.record_active(wallet, now=NOW)
+        db[ACTIVE_COLLECTION].failures.append(BulkWriteError({
+            "writeErrors": [{"index": 0, "code": 11000}, {"index": 2, "code": 91}], "nUpserted": 1,
+        }))
+        asyncio.run(rollups.flush())
+        assert rollups._new_active == {DAY: {"0xc"}}
+        asyncio.run(rollups.flush())
+        assert db[DAILY_COLLECTION].docs[DAY]["dau"] == 2
+        assert not rollups._new_active
+
+
+class TestCompaction:
+    """Compaction versus incremental values"""
+
+    def _raw(self, db, sessions):
+        for i, (wallet, game, rounds, zwap) in enumerate(sessions):
+            db["game_sessions"].insert({
+                "_id": i, "wallet_address": wallet, "game_type": game, "status": "completed",
+                "rounds": rounds, "zwap_earned": zwap, "zpts_earned": rounds, "timestamp": NOW,
+            })
+
+    def test_compaction_matches_incremental(self, monkeypatch):
+        """With nothing lost, compaction rewrites the same values"""
+        monkeypatch.setattr(analytics_rollup_service, "_utc_now", lambda: NOW + timedelta(days=1))
+        db = _DB()
+        sessions = [("0xa", "zbrickles", 3, 12.5), ("0xb", "zbrickles", 2, 8.0), ("0xa", "ztrivia", 1, 4.0)]
+        self._raw(db, sessions)
+        rollups = DailyRollups(db)
+        for wallet, game, rounds, zwap in sessions:
+            rollups.record_game(wallet, game, origin="session", games=rounds, now=NOW)
+            rollups.record_reward(wallet, "game_session", zwap=zwap, zpts=rounds, now=NOW)
+        asyncio.run(rollups.flush())
+        incremental = db[DAILY_COLLECTION].docs[DAY]
+
+        before = {k: dict(v) for k, v in incremental["games"].items()}, dict(incremental["rewards"]["game_session"])
+        asyncio.run(compact_day(db, date.fromisoformat(DAY)))
+        compacted = db[DAILY_COLLECTION].docs[DAY]
+        assert (compacted["games"], compacted["rewards"]["game_session"]) == before
+        assert compacted["dau"] == 2
+
+    def test_compaction_repairs_lost_increments(self, monkeypatch):
+        """Rebuildable fields are corrected; incremental-only sources are kept"""
+        monkeypatch.setattr(analytics_rollup_service, "_utc_now", lambda: NOW + timedelta(days=1))
+        db = _DB()
+        self._raw(db, [("0xa", "zbrickles", 3, 12.5), ("0xb", "zbrickles", 2, 8.0)])
+        rollups = DailyRollups(db)
+        # Only the first session's increments reached Mongo before a crash
+        rollups.record_game("0xa", "zbrickles", origin="session", games=3, now=NOW)
+        rollups.record_reward("0xa", "game_session", zwap=12.5, zpts=3, now=NOW)
+        rollups.record_steps("0xa", 500, now=NOW)
+        rollups.record_reward("0xa", "signup", zwap=100, now=NOW)
+        asyncio.run(rollups.flush())
+
+        asyncio.run(compact_day(db, date.fromisoformat(DAY)))
+        doc = db[DAILY_COLLECTION].docs[DAY]
+        assert doc["games"]["session"] == {"zbrickles": 5}
+        assert doc["rewards"]["game_session"] == {"zwap": 20.5, "zpts": 5, "count": 2}
+        assert doc["rewards"]["signup"] == {"zwap": 100, "count": 1}
+        assert doc["steps"]["total"] == 500
+        assert "compacted_at" in doc
@@ -0,0 +1,109 @@
+"""
+Unit tests for the in-memory step spike window (services/anti_cheat_service.py).
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from services.anti_cheat_service import FRAUD_FLAGS_COLLECTION, StepSpikeDetector
+
+NOW = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+
+
+def _detector(**kwargs):
+    return StepSpikeDetector(None, threshold=5000, **kwargs)
+
+
+class TestStepSpikeDetector:
+    """Threshold enforcement, late samples and rollback"""
+
+    def test_clamps_to_remaining_allowance(self):
+        """Steps over the window threshold are clamped and flagged"""
+        d = _detector()
+        assert d.check("0xa", 4000, NOW)["credited"] == 4000
+        screen = d.check("0xa", 3000, NOW + timedelta(minutes=1))
+        assert screen["credited"] == 1000
+        assert screen["flagged"]
+
+    def test_window_slides(self):
+        """Steps older than the window stop counting"""
+        d = _detector()
+        d.check("0xa", 5000, NOW)
+        assert d.check("0xa", 5000, NOW + timedelta(minutes=5))["credited"] == 5000
+
+    def test_backdated_samples_are_screened(self):
+        """Samples older than the window share the current allowance"""
+        d = _detector()
+        d.check("0xa", 4000, NOW)
+        credited = [d.check("0xa", 3000, NOW - timedelta(hours=h))["credited"] for h in range(1, 6)]
+        assert credited == [1000, 0, 0, 0, 0]
+
+    def test_release_undoes_a_check(self):
+        """Released screens free their allowance for the retry"""
+        d = _detector()
+        screens = [d.check("0xa", 1500, NOW + timedelta(minutes=m)) for m in range(3)]
+        for screen in screens:
+            d.release("0xa", screen)
+        retried = [d.check("0xa", 1500, NOW + timedelta(minutes=m)) for m in range(3)]
+        assert not any(s["flagged"] for s in retried)
+
+    def test_own_enabled_switch(self):
+        """The walk feature flag does not disable the check"""
+        d = _detector()
+        d.configure({"enabled": False})
+        assert d.enabled
+        d.configure({"anti_cheat_enabled": False})
+        assert d.check("0xa", 99999, NOW)["credited"] == 99999
+
+
+class _FlagsCollection:
+    def __init__(self):
+        self.docs = {}
+
+    async def insert_many(self, docs, ordered=True):
+        errors = []
+        for i, doc in enumerate(docs):
+            if doc["_id"] in self.docs:
+                errors.append({"index": i, "code": 11000})
+            else:
+                self.docs[doc["_id"]] = dict(doc)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+class _UsersCollection:
+    def __init__(self, failures):
+        self.failures = failures
+        self.flags = {}
+
+    async def bulk_write(self, ops, ordered=True):
+        if self.failures:
+            self.failures -= 1
+            raise PyMongoError("users unavailable")
+        for op in ops:
+            wallet = op._filter["wallet_address"]
+            self.flags.setdefault(wallet, set()).update(op._doc["$addToSet"]["fraud_flags"]["$each"])
+
+
+class _FlagDB(dict):
+    def __init__(self, users_failures=0):
+        super().__init__({FRAUD_FLAGS_COLLECTION: _FlagsCollection()})
+        self.users = _UsersCollection(users_failures)
+
+
+class TestFlagFlush:
+    """Persisting flags"""
+
+    def test_retry_after_users_failure_does_not_duplicate(self):
+        """Flags inserted before the users update failed are not inserted twice"""
+        db = _FlagDB(users_failures=1)
+        d = StepSpikeDetector(db, threshold=100)
+        d.check("0xa", 500, NOW)
+        d.check("0xb", 500, NOW)
+        asyncio.run(d.flush())
+        assert len(d._pending_flags) == 2
+        asyncio.run(d.flush())
+        assert not d._pending_flags
+        assert len(db[FRAUD_FLAGS_COLLECTION].docs) == 2
+        assert db.users.flags == {"0xa": {"step_spike"}, "0xb": {"step_spike"}}
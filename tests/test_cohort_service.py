@@ -0,0 +1,111 @@
+"""
+Unit tests for retention queries over the cohort matrix
+(services/cohort_service.py).
+"""
+import asyncio
+from datetime import date, datetime, timezone
+
+import numpy as np
+
+from services.cohort_service import MATRIX_COLLECTION, MAX_WEEKS, retention, week_start
+
+NOW = datetime(2026, 10, 21, 12, 0, tzinfo=timezone.utc)     # a Wednesday
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length=None):
+        return self.docs
+
+
+class _Matrix:
+    """The find() subset retention() uses: $gte / $in filters and an $slice projection."""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection):
+        out = []
+        for doc in self.docs:
+            if doc["signup_week"] < query["signup_week"]["$gte"]:
+                continue
+            if any(key in query and doc[key] not in query[key]["$in"] for key in ("tier", "region")):
+                continue
+            out.append({
+                "signup_week": doc["signup_week"],
+                "size": doc["size"],
+                "active": doc["active"][:projection["active"]["$slice"]],
+            })
+        return _Cursor(out)
+
+
+def _row(signup_week, tier, region, size, active):
+    return {
+        "signup_week": signup_week, "tier": tier, "region": region, "size": size,
+        "active": active + [0] * (MAX_WEEKS + 1 - len(active)),
+    }
+
+
+def _db(rows):
+    return {MATRIX_COLLECTION: _Matrix(rows)}
+
+
+ROWS = [
+    _row("2026-10-05", "starter", "eu", 10, [8, 5, 3]),
+    _row("2026-10-05", "plus", "eu", 4, [4, 3, 2]),
+    _row("2026-10-05", "starter", "unknown", 6, [6, 1, 0]),
+    _row("2026-10-12", "starter", "eu", 5, [5, 2]),
+    _row("2026-10-19", "plus", "us", 2, [1]),
+    _row("2026-01-05", "starter", "eu", 99, [99]),       # older than the requested cohorts
+]
+
+
+class TestWeeks:
+    """Week keys"""
+
+    def test_week_start_is_monday(self):
+        """Every day maps to its ISO week's Monday"""
+        assert week_start(date(2026, 10, 21)) == date(2026, 10, 19)
+        assert week_start(date(2026, 10, 19)) == date(2026, 10, 19)
+        assert week_start(date(2026, 10, 25)) == date(2026, 10, 19)
+
+
+class TestRetention:
+    """Summing matrix rows"""
+
+    def test_sums_rows_per_signup_week(self):
+        """Sizes and active counts add up across tiers and regions, truncated to elapsed weeks"""
+        result = asyncio.run(retention(_db(ROWS), weeks=4, cohorts=3, now=NOW))
+        by_week = {row["signup_week"]: row for row in result["cohorts"]}
+        assert list(by_week) == ["2026-10-05", "2026-10-12", "2026-10-19"]
+        assert by_week["2026-10-05"]["size"] == 20
+        assert by_week["2026-10-05"]["active"] == [18, 9, 5]
+        assert by_week["2026-10-12"]["active"] == [5, 2]
+        assert by_week["2026-10-19"]["active"] == [1]
+        assert by_week["2026-10-05"]["rate"] == [0.9, 0.45, 0.25]
+
+    def test_filters(self):
+        """Tier and region filters select matrix rows before summing"""
+        result = asyncio.run(retention(_db(ROWS), weeks=4, cohorts=3, tiers=["starter"], regions=["eu"], now=NOW))
+        assert [(r["signup_week"], r["size"], r["active"]) for r in result["cohorts"]] == [
+            ("2026-10-05", 10, [8, 5, 3]),
+            ("2026-10-12", 5, [5, 2]),
+        ]
+
+    def test_matches_dense_sum(self):
+        """The result equals summing the full arrays with NumPy"""
+        rng = np.random.default_rng(50)
+        rows = []
+        for week in ("2026-09-28", "2026-10-05"):
+            for tier in ("starter", "plus"):
+                for region in ("eu", "us", "unknown"):
+                    size = int(rng.integers(1, 1000))
+                    rows.append(_row(week, tier, region, size, rng.integers(0, size, 4).tolist()))
+        result = asyncio.run(retention(_db(rows), weeks=3, cohorts=4, now=NOW))
+        for row in result["cohorts"]:
+            members = [r for r in rows if r["signup_week"] == row["signup_week"]]
+            dense = np.sum([r["active"] for r in members], axis=0)[:len(row["active"])]
+            assert row["size"] == sum(r["size"] for r in members)
+            assert row["active"] == dense.tolist()
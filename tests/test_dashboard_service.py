@@ -0,0 +1,106 @@
+"""
+Unit tests for concurrent, cached dashboard composition (services/dashboard_service.py).
+"""
+import asyncio
+
+import pytest
+
+from services.dashboard_service import DashboardComposer, Section
+
+
+class _Loader:
+    def __init__(self, value="v", delay=0.0, error=None):
+        self.value = value
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return f"{self.value}{self.calls}"
+
+
+class TestCompose:
+    """Section status, sharing and timeouts"""
+
+    def test_cached_within_ttl(self):
+        """A second request inside the TTL does not reload"""
+        async def run():
+            composer, loader = DashboardComposer(), _Loader()
+            sections = [Section("users", loader, ttl=60)]
+            first = await composer.compose(sections)
+            second = await composer.compose(sections)
+            forced = await composer.compose(sections, refresh=True)
+            return first, second, forced, loader.calls
+
+        first, second, forced, calls = asyncio.run(run())
+        assert (first["users"], first["meta"]["users"]["status"]) == ("v1", "loaded")
+        assert (second["users"], second["meta"]["users"]["status"]) == ("v1", "cached")
+        assert forced["users"] == "v2" and calls == 2
+
+    def test_concurrent_requests_share_a_load(self):
+        """Requests arriving during a load await the same task"""
+        async def run():
+            composer, loader = DashboardComposer(), _Loader(delay=0.01)
+            sections = [Section("users", loader, ttl=60)]
+            results = await asyncio.gather(*(composer.compose(sections) for _ in range(5)))
+            return results, loader.calls
+
+        results, calls = asyncio.run(run())
+        assert calls == 1
+        assert {r["users"] for r in results} == {"v1"}
+
+    def test_timeout_returns_partial_and_fills_cache(self):
+        """A slow section times out without holding the others; its load completes in the background"""
+        async def run():
+            composer = DashboardComposer()
+            sections = [Section("fast", _Loader("f"), ttl=60), Section("slow", _Loader("s", delay=0.05), ttl=60)]
+            first = await composer.compose(sections, timeout=0.01)
+            await asyncio.sleep(0.1)
+            second = await composer.compose(sections, timeout=0.01)
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert first["partial"] and first["slow"] is None
+        assert first["meta"]["slow"]["status"] == "timeout"
+        assert first["fast"] == "f1"
+        assert not second["partial"] and second["slow"] == "s1"
+
+    def test_stale_while_revalidate(self):
+        """swr serves an expired value at once and reloads it behind the request"""
+        async def run():
+            composer, loader = DashboardComposer(), _Loader()
+            sections = [Section("users", loader, ttl=0)]
+            await composer.compose(sections)
+            stale = await composer.compose(sections, mode="swr")
+            await asyncio.sleep(0.01)
+            fresh = await composer.compose(sections, mode="swr")
+            return stale, fresh
+
+        stale, fresh = asyncio.run(run())
+        assert (stale["users"], stale["meta"]["users"]["status"]) == ("v1", "stale")
+        assert fresh["users"] == "v2"
+
+    def test_failed_reload_serves_last_value(self):
+        """An error keeps the last good value and marks the response partial"""
+        async def run():
+            composer, loader = DashboardComposer(), _Loader()
+            sections = [Section("users", loader, ttl=0)]
+            await composer.compose(sections)
+            loader.error = RuntimeError("mongo down")
+            return await composer.compose(sections)
+
+        result = asyncio.run(run())
+        assert result["users"] == "v1"
+        assert result["partial"]
+        assert result["meta"]["users"]["status"] == "error"
+        assert result["meta"]["users"]["error"] == "mongo down"
+        assert "stale_age_s" in result["meta"]["users"]
+
+    def test_unknown_mode(self):
+        """Only the documented modes are accepted"""
+        with pytest.raises(ValueError):
+            asyncio.run(DashboardComposer().compose([], mode="eventual"))
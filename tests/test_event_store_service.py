@@ -0,0 +1,151 @@
+"""
+Unit tests for the time-series event store backfill (services/event_store_service.py).
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import services.event_store_service as event_store_service
+from services.event_store_service import COLLECTIONS, STATE_ID, backfill
+
+LIVE_SINCE = datetime(2026, 10, 19, tzinfo=timezone.utc)
+BEFORE = LIVE_SINCE - timedelta(days=1)
+
+
+def _matches(doc, query):
+    for field, cond in query.items():
+        value = doc.get(field)
+        if isinstance(cond, dict):
+            for op, operand in cond.items():
+                if op == "$lt" and not (value is not None and value < operand):
+                    return False
+                if op == "$gt" and not (value is not None and value > operand):
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+        elif value != cond:
+            return False
+    return True
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs.sort(key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length=None):
+        return self.docs
+
+
+class _Collection:
+    def __init__(self):
+        self.docs = []
+
+    def find(self, query):
+        return _Cursor([dict(d) for d in self.docs if _matches(d, query)])
+
+    async def insert_many(self, docs, ordered=True):
+        self.docs.extend(docs)
+
+
+class _SystemConfig:
+    def __init__(self, state):
+        self.state = state
+
+    async def find_one(self, query):
+        return self.state
+
+    async def update_one(self, query, update):
+        for path, value in update["$set"].items():
+            parent, key = path.split(".")
+            self.state.setdefault(parent, {})[key] = value
+
+
+class _DB:
+    def __init__(self, backfill_state=None):
+        self.collections = {}
+        self.system_config = _SystemConfig({"_id": STATE_ID, "live_since": LIVE_SINCE, "backfill": backfill_state or {}})
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, _Collection())
+
+    async def list_collection_names(self, filter=None):
+        return list(COLLECTIONS.values())
+
+
+def _seed(db):
+    db["game_sessions"].docs += [
+        {"_id": 1, "wallet_address": "0xa", "game_type": "zbrickles", "status": "completed", "rounds": 3,
+         "zwap_earned": 12.5, "zpts_earned": 3, "timestamp": BEFORE},
+        {"_id": 2, "wallet_address": "0xb", "game_type": "zbrickles", "status": "rejected", "rounds": 2,
+         "zwap_earned": 0, "zpts_earned": 0, "timestamp": BEFORE},
+        {"_id": 3, "wallet_address": "0xa", "game_type": "ztrivia", "status": "completed", "rounds": 1,
+         "zwap_earned": 4.0, "zpts_earned": 1, "timestamp": LIVE_SINCE},
+    ]
+    db["scratch_plays"].docs += [
+        {"_id": 1, "wallet_address": "0xa", "amount": 25, "timestamp": BEFORE},
+        {"_id": 2, "wallet_address": "0xb", "amount": 0, "timestamp": BEFORE},
+        {"_id": 3, "wallet_address": "0xb", "amount": 50, "status": "voided", "timestamp": BEFORE},
+    ]
+    db["rewards_ledger"].docs += [
+        {"_id": 1, "user_id": "0xa", "source": "admin_adjustment", "zwap_amount": -10, "zpts_amount": 0, "timestamp": BEFORE},
+    ]
+
+
+class TestBackfill:
+    """Rewards history from every live reward source"""
+
+    def test_rewards_match_live_events(self):
+        """Sessions, scratch plays and adjustments are copied the way they are recorded live"""
+        db = _DB()
+        _seed(db)
+        result = asyncio.run(backfill(db, ["rewards"]))
+        assert result["kinds"]["rewards"] == {"copied": 4, "skipped": 0}
+        events = sorted((e["source"], e["wallet"], e["zwap"]) for e in db[COLLECTIONS["rewards"]].docs)
+        assert events == [
+            ("admin_adjustment", None, -10),
+            ("game_session", "0xa", 12.5),
+            ("scratch", "0xa", 25),
+            ("scratch", "0xb", 0),
+        ]
+
+    def test_rerun_resumes_per_source(self):
+        """Each source keeps its own watermark, so a re-run copies only new history"""
+        db = _DB()
+        _seed(db)
+        asyncio.run(backfill(db, batch_size=1))
+        assert db.system_config.state["backfill"]["rewards"] == {"rewards_ledger": 1, "game_sessions": 1, "scratch_plays": 2}
+        db["scratch_plays"].docs.append({"_id": 4, "wallet_address": "0xc", "amount": 5, "timestamp": BEFORE})
+        result = asyncio.run(backfill(db))
+        assert result["kinds"] == {"games": {"copied": 0, "skipped": 0}, "rewards": {"copied": 1, "skipped": 0}}
+        assert len(db[COLLECTIONS["rewards"]].docs) == 5
+        assert len(db[COLLECTIONS["games"]].docs) == 1
+
+    def test_single_watermark_belongs_to_first_source(self):
+        """A watermark stored per kind resumes that kind's first source only"""
+        db = _DB(backfill_state={"rewards": 1})
+        _seed(db)
+        asyncio.run(backfill(db, ["rewards"]))
+        assert {e["source"] for e in db[COLLECTIONS["rewards"]].docs} == {"game_session", "scratch"}
+        assert db.system_config.state["backfill"]["rewards"]["rewards_ledger"] == 1
+
+    def test_storage_stats_lists_each_source_once(self):
+        """Shared source collections are reported once"""
+        class _StatsDB:
+            def __init__(self):
+                self.calls = []
+
+            async def command(self, name, coll):
+                self.calls.append(coll)
+                return {"count": 0, "storageSize": 0, "totalIndexSize": 0}
+
+        db = _StatsDB()
+        stats = asyncio.run(event_store_service.storage_stats(db))
+        assert sorted(db.calls) == sorted(set(db.calls))
+        assert {"game_sessions", "scratch_plays", "rewards_ledger"} <= set(stats)
@@ -0,0 +1,91 @@
+"""
+Unit tests for the document -> Arrow conversion and schema conforming in
+services/export_service.py (skipped without pyarrow, an optional dependency).
+"""
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+
+from services.export_service import _flatten, _PartitionWriter, _remove_other_runs, event_time, to_table
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def _table(rows, time_fields=()):
+    return to_table(pa, [{k: _flatten(v) for k, v in row.items()} for row in rows], time_fields)
+
+
+class TestToTable:
+    """Schema inference"""
+
+    def test_types(self):
+        """ObjectIds and nested values become strings, mixed numbers floats, ISO time fields timestamps"""
+        table = _table([
+            {"_id": ObjectId(), "amount": 1, "nested": {"a": 1}, "timestamp": "2026-10-19T10:00:00+00:00", "ok": True},
+            {"_id": ObjectId(), "amount": 2.5, "nested": [1, 2], "timestamp": None, "ok": False},
+        ], ("timestamp",))
+        schema = {f.name: f.type for f in table.schema}
+        assert table.column_names == sorted(table.column_names)
+        assert schema["_id"] == pa.string()
+        assert schema["amount"] == pa.float64()
+        assert schema["nested"] == pa.string()
+        assert schema["ok"] == pa.bool_()
+        assert schema["timestamp"] == pa.timestamp("us", tz="UTC")
+        assert table.column("nested").to_pylist() == ['{"a": 1}', "[1, 2]"]
+
+    def test_mixed_types_fall_back_to_string(self):
+        """A column mixing strings and numbers is written as strings"""
+        table = _table([{"v": "x"}, {"v": 3}])
+        assert table.column("v").to_pylist() == ["x", "3"]
+
+    def test_event_time_falls_back_to_object_id(self):
+        """Rows without a usable time field land on their ObjectId's day"""
+        oid = ObjectId.from_datetime(datetime(2026, 1, 2, tzinfo=timezone.utc))
+        assert event_time({"_id": oid, "timestamp": "garbage"}, ("timestamp",)).date().isoformat() == "2026-01-02"
+
+
+class TestConform:
+    """Appending batches to an open part file"""
+
+    def _writer(self, tmp_path):
+        return _PartitionWriter(pa, pq, tmp_path, "run")
+
+    def test_missing_and_all_null_columns_conform(self, tmp_path):
+        """Missing columns are null-filled and all-null columns take the file's type"""
+        schema = _table([{"a": 1, "b": "x"}]).schema
+        conformed = self._writer(tmp_path)._conform(_table([{"a": 2, "b": None}, {"a": 3}]), schema)
+        assert conformed.schema == schema
+        assert conformed.column("b").to_pylist() == [None, None]
+
+    def test_ints_widen_into_float_columns(self, tmp_path):
+        """Integer batches fit a float column"""
+        schema = _table([{"a": 1.5}]).schema
+        conformed = self._writer(tmp_path)._conform(_table([{"a": 2}]), schema)
+        assert conformed.column("a").to_pylist() == [2.0]
+
+    def test_incompatible_batches_roll_a_new_part(self, tmp_path):
+        """New columns or narrowing types start a new part file; every row is written"""
+        writer = self._writer(tmp_path)
+        writer.write("day=2026-10-19", _table([{"a": 1.5}]))
+        assert writer._conform(_table([{"a": "x"}]), _table([{"a": 1.5}]).schema) is None
+        writer.write("day=2026-10-19", _table([{"a": 2}]))
+        writer.write("day=2026-10-19", _table([{"a": 3, "b": "new"}]))
+        files = writer.close()
+        assert len(files) == 2
+        assert sum(pq.read_table(f).num_rows for f in files) == 3
+
+
+class TestSnapshotReplacement:
+    """Same-day snapshot runs"""
+
+    def test_latest_run_replaces_earlier_files(self, tmp_path):
+        """Only the finished run's files remain in the snapshot partition"""
+        for run_id in ("first", "second"):
+            writer = _PartitionWriter(pa, pq, tmp_path, run_id)
+            writer.write("snapshot=2026-10-19", _table([{"wallet_address": "0x1"}]))
+            writer.close()
+            _remove_other_runs(tmp_path / "snapshot=2026-10-19", run_id)
+        names = sorted(p.name for p in (tmp_path / "snapshot=2026-10-19").iterdir())
+        assert names == ["part-second-0.parquet"]
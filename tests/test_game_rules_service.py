@@ -0,0 +1,108 @@
+"""
+Unit tests for game reward rules compiled from game_configs (services/game_rules_service.py).
+"""
+import asyncio
+
+import pytest
+
+import services.game_rules_service as game_rules_service
+from services.game_rules_service import CompiledGameRules
+from services.reward_engine import GAME_REWARD_RULES, TIERS, calculate_game_rewards
+
+
+class TestCompile:
+    """Config overrides over the code defaults"""
+
+    def test_defaults_match_reward_engine(self):
+        """Without configs every game rewards exactly as the code table"""
+        rules = CompiledGameRules([])
+        assert rules.rules == GAME_REWARD_RULES
+        by_tier = rules.rewards_by_tier("zbrickles", score=800, level=3, blocks=20)
+        assert by_tier["plus"] == calculate_game_rewards("zbrickles", 800, 3, 20, TIERS["plus"]["zwap_multiplier"])
+
+    def test_reward_fields_override(self):
+        """reward_rate, difficulty_multiplier and caps change only that game"""
+        rules = CompiledGameRules([{"game_id": "ztrivia", "reward_rate": 2, "difficulty_multiplier": 2, "zpts_cap": 100}])
+        base = calculate_game_rewards("ztrivia", 10, 3)
+        tuned = rules.rewards_by_tier("ztrivia", score=10, level=3)["starter"]
+        assert tuned["zwap"] == round(5 * 1.4 * 2, 2)    # difficulty step 0.2 instead of 0.1
+        assert tuned["zpts"] == int(20 * 1.4) != base["zpts"]
+        assert rules.rules["zbrickles"] == GAME_REWARD_RULES["zbrickles"]
+
+    def test_policies(self):
+        """tier_required unlocks that tier and above; limits are non-negative"""
+        rules = CompiledGameRules([
+            {"game_id": "ztetris", "tier_required": "starter", "cooldown_minutes": 5},
+            {"game_id": "zslots", "enabled": False, "daily_play_limit": -3},
+        ])
+        assert rules.allowed_tiers("ztetris") == list(TIERS)
+        assert rules.policy("ztetris")["cooldown_minutes"] == 5
+        assert not rules.is_enabled("zslots")
+        assert rules.policy("zslots")["daily_play_limit"] == 0
+        assert rules.allowed_tiers("zbrickles") == ["starter", "plus"]
+
+    def test_games_without_terms_have_no_rules(self):
+        """A configured game with no reward formula gets a policy but no rules"""
+        rules = CompiledGameRules([{"game_id": "zdance", "reward_rate": 1.5}])
+        assert "zdance" not in rules.rules
+        assert rules.is_enabled("zdance")
+        assert rules.allowed_tiers("zdance") == []
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length=None):
+        return self.docs
+
+
+class _GameConfigs:
+    def __init__(self):
+        self.docs = {}
+
+    async def update_one(self, query, update, upsert=False):
+        self.docs.setdefault(query["game_id"], {}).update(update["$set"])
+
+    def find(self, query, projection=None):
+        return _Cursor([dict(d) for d in self.docs.values()])
+
+
+class _SystemConfig:
+    def __init__(self):
+        self.value = 0
+
+    async def update_one(self, query, update, upsert=False):
+        self.value += update["$inc"]["value"]
+
+    async def find_one(self, query, projection=None):
+        return {"value": self.value}
+
+
+class _DB:
+    def __init__(self):
+        self.game_configs = _GameConfigs()
+        self.system_config = _SystemConfig()
+
+
+class TestUpdate:
+    """Admin edits"""
+
+    @pytest.fixture(autouse=True)
+    def table(self, monkeypatch):
+        monkeypatch.setattr(game_rules_service, "_table", CompiledGameRules([]))
+
+    def test_edit_rebuilds_table(self):
+        """An edit bumps the version and takes effect on this worker at once"""
+        db = _DB()
+        result = asyncio.run(game_rules_service.update_game_config(db, "zbrickles", {"enabled": False, "bogus": 1, "zwap_cap": None}))
+        assert result["rules_version"] == 1
+        assert db.game_configs.docs["zbrickles"] == {"game_id": "zbrickles", "enabled": False}
+        assert not game_rules_service.get_rules().is_enabled("zbrickles")
+
+    def test_unknown_tier_is_rejected(self):
+        """tier_required must name a tier"""
+        db = _DB()
+        with pytest.raises(ValueError):
+            asyncio.run(game_rules_service.update_game_config(db, "zbrickles", {"tier_required": "gold"}))
+        assert db.game_configs.docs == {}
@@ -0,0 +1,134 @@
+"""
+Unit tests for in-memory game sessions (services/game_session_service.py).
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import services.analytics_rollup_service as analytics_rollup_service
+import services.game_rules_service as game_rules_service
+import services.game_session_service as game_session_service
+import services.play_limit_service as play_limit_service
+import services.reward_service as reward_service
+
+NOW = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = NOW
+
+    def __call__(self):
+        return self.now
+
+
+class _Users:
+    async def find_one(self, query, projection=None):
+        return {"tier": "starter"}
+
+
+class _GameSessions:
+    def __init__(self):
+        self.docs = []
+
+    async def insert_one(self, doc):
+        self.docs.append(doc)
+
+
+class _DB:
+    def __init__(self):
+        self.users = _Users()
+        self.game_sessions = _GameSessions()
+
+
+class _Rollups:
+    def record_game(self, *args, **kwargs):
+        pass
+
+    def record_reward(self, *args, **kwargs):
+        pass
+
+
+@pytest.fixture
+def env(monkeypatch):
+    clock = _Clock()
+    credited = []
+
+    async def credit(db, wallet, game_type, zwap_by_tier, base_zpts, games=1, now=None):
+        credited.append((wallet, games))
+        return {"last_game_reward": {"zwap": zwap_by_tier["starter"], "zpts": base_zpts}}
+
+    monkeypatch.setattr(game_session_service, "_utc_now", clock)
+    monkeypatch.setattr(game_session_service, "_sessions", {})
+    monkeypatch.setattr(game_session_service, "_open", {})
+    monkeypatch.setattr(reward_service, "credit_game_rewards", credit)
+    monkeypatch.setattr(play_limit_service, "_limiter", play_limit_service.PlayLimiter(None))
+    monkeypatch.setattr(analytics_rollup_service, "get_rollups", lambda: _Rollups())
+    return clock, credited, _DB()
+
+
+def _round(number, seconds=10.0):
+    return {"round": number, "score": 100, "level": 1, "blocks_destroyed": 10, "duration_seconds": seconds}
+
+
+class TestOpenSessions:
+    """One open session per (wallet, game)"""
+
+    def test_second_open_supersedes_the_first(self, env):
+        """Opening another session closes and credits the previous one"""
+        clock, credited, db = env
+        first = asyncio.run(game_session_service.open_session(db, "0xA", "zbrickles"))["session_id"]
+        clock.now += timedelta(minutes=1)
+        assert game_session_service.add_rounds(first, [_round(1), _round(2)])["accepted"] == 2
+
+        second = asyncio.run(game_session_service.open_session(db, "0xa", "zbrickles"))["session_id"]
+        assert [d["status"] for d in db.game_sessions.docs] == ["superseded"]
+        assert credited == [("0xa", 2)]
+        with pytest.raises(LookupError):
+            game_session_service.add_rounds(first, [_round(3)])
+        assert list(game_session_service._open.values()) == [second]
+
+    def test_parallel_sessions_cannot_share_wall_time(self, env):
+        """Played time across a wallet's sessions never exceeds the time that passed"""
+        clock, credited, db = env
+        for _ in range(5):
+            session_id = asyncio.run(game_session_service.open_session(db, "0xa", "zbrickles"))["session_id"]
+            game_session_service.add_rounds(session_id, [_round(i, 6.0) for i in range(10)])
+        clock.now += timedelta(seconds=60)
+        game_session_service.add_rounds(session_id, [_round(i, 6.0) for i in range(10, 20)])
+        asyncio.run(game_session_service.close_session(db, session_id))
+        played = sum(d["played_seconds"] for d in db.game_sessions.docs)
+        assert played <= 60 + game_session_service.DURATION_SLACK_SECONDS * 5
+
+    def test_other_games_and_wallets_stay_open(self, env):
+        """The cap is per wallet and game"""
+        clock, credited, db = env
+        for wallet, game in (("0xa", "zbrickles"), ("0xa", "ztrivia"), ("0xb", "zbrickles")):
+            asyncio.run(game_session_service.open_session(db, wallet, game))
+        assert len(game_session_service._sessions) == 3
+        assert not db.game_sessions.docs
+
+
+class TestDailyLimit:
+    """Session rounds count as plays"""
+
+    def test_rounds_over_the_limit_are_not_credited(self, env, monkeypatch):
+        """Opening takes one play, closing takes one per further round up to the daily limit"""
+        clock, credited, db = env
+        rules = game_rules_service.CompiledGameRules([{"game_id": "zbrickles", "daily_play_limit": 5}])
+        monkeypatch.setattr(game_rules_service, "_table", rules)
+        limiter = play_limit_service.PlayLimiter(play_limit_service.InProcessCounters(None))
+        monkeypatch.setattr(play_limit_service, "_limiter", limiter)
+
+        session_id = asyncio.run(game_session_service.open_session(db, "0xa", "zbrickles"))["session_id"]
+        clock.now += timedelta(minutes=10)
+        game_session_service.add_rounds(session_id, [_round(i) for i in range(20)])
+        closed = asyncio.run(game_session_service.close_session(db, session_id))
+        assert closed["rounds"] == 5
+        assert closed["rejected_rounds"] == 15
+        assert credited == [("0xa", 5)]
+        assert db.game_sessions.docs[0]["rejected_rounds"][0] == {"round": 5, "reason": "daily_limit"}
+
+        with pytest.raises(play_limit_service.PlayLimitExceeded):
+            asyncio.run(game_session_service.open_session(db, "0xa", "zbrickles"))
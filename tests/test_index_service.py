@@ -0,0 +1,136 @@
+"""
+Unit tests for the index registry and startup bootstrap
+(services/index_service.py, services/migration_service.py).
+"""
+import asyncio
+
+import pytest
+from pymongo.errors import OperationFailure
+
+import services.index_service as index_service
+import services.migration_service as migration_service
+
+
+class _Collection:
+    def __init__(self, name, fail_unique):
+        self.name = name
+        self.fail_unique = fail_unique
+        self.indexes = {"_id_": {"key": [("_id", 1)]}}
+        self.calls = []
+
+    async def index_information(self):
+        return dict(self.indexes)
+
+    async def create_indexes(self, models):
+        self.calls.append([m.document["name"] for m in models])
+        if any(m.document["name"] in self.fail_unique for m in models):
+            raise OperationFailure("E11000 duplicate key error", code=11000)
+        for m in models:
+            self.indexes[m.document["name"]] = {"key": list(m.document["key"].items())}
+
+
+class _IndexDB:
+    def __init__(self, fail_unique=()):
+        self.collections = {}
+        self.fail_unique = set(fail_unique)
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = _Collection(name, self.fail_unique)
+        return self.collections[name]
+
+
+class TestApplyIndexes:
+    """Index builds"""
+
+    def test_unique_failure_is_isolated(self):
+        """Duplicates blocking the unique wallet index leave every other users index built"""
+        db = _IndexDB(fail_unique={"wallet_address_unique"})
+        plan = asyncio.run(index_service.apply_indexes(db))
+        assert [f["name"] for f in plan["failed"]] == ["wallet_address_unique"]
+        users = db["users"]
+        assert ["wallet_address_unique"] in users.calls
+        built = set(users.indexes) - {"_id_"}
+        assert built == {index_service.index_name(s) for s in index_service.INDEXES["users"]} - {"wallet_address_unique"}
+
+        # The next run only retries what is missing
+        plan = asyncio.run(index_service.apply_indexes(db))
+        assert [e["name"] for e in plan["create"]] == ["wallet_address_unique"]
+
+    def test_bootstrap_survives_failed_builds(self, monkeypatch):
+        """A failed build downgrades the strict COLLSCAN check to a warning"""
+        async def no_migrations(db, dry_run=False):
+            return []
+
+        async def collscans(db, queries=None):
+            return [{"collection": "users", "filter": {"wallet_address": "0x0"}, "stages": ["COLLSCAN"]}]
+
+        monkeypatch.setattr(migration_service, "run_migrations", no_migrations)
+        monkeypatch.setattr(index_service, "find_collscans", collscans)
+        monkeypatch.delenv("COLLSCAN_CHECK", raising=False)
+        monkeypatch.delenv("DB_BOOTSTRAP", raising=False)
+
+        report = asyncio.run(index_service.bootstrap_database(_IndexDB(fail_unique={"wallet_address_unique"})))
+        assert [f["name"] for f in report["indexes"]["failed"]] == ["wallet_address_unique"]
+        with pytest.raises(RuntimeError):
+            asyncio.run(index_service.bootstrap_database(_IndexDB()))
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length=None):
+        return self.docs
+
+
+class _Users:
+    def __init__(self, docs):
+        self.docs = {d["_id"]: d for d in docs}
+
+    def aggregate(self, pipeline, allowDiskUse=False):
+        groups = {}
+        for d in self.docs.values():
+            groups.setdefault(d["wallet_address"], []).append(d["_id"])
+        return _Cursor([{"_id": w, "ids": ids, "count": len(ids)} for w, ids in groups.items() if len(ids) > 1])
+
+    def find(self, query, projection=None):
+        return _Cursor([dict(self.docs[i]) for i in query["_id"]["$in"]])
+
+    async def delete_many(self, query):
+        for _id in query["_id"]["$in"]:
+            del self.docs[_id]
+
+
+class _UsersDB:
+    def __init__(self, docs):
+        self.users = _Users(docs)
+
+
+def _user(_id, wallet, **fields):
+    return {"_id": _id, "wallet_address": wallet, "zwap_balance": 100.0, "total_earned": 100.0, **fields}
+
+
+class TestDuplicateWallets:
+    """Migration resolving duplicates before the unique wallet index"""
+
+    def test_untouched_copies_are_removed(self):
+        """Race leftovers go, active and oldest copies stay, real conflicts are reported"""
+        db = _UsersDB([
+            _user("01", "0xa"),
+            _user("02", "0xa"),
+            _user("03", "0xb"),
+            _user("04", "0xb", games_played=3, total_earned=140.0, zwap_balance=140.0),
+            _user("05", "0xc", total_steps=10),
+            _user("06", "0xc", zpts_balance=5),
+            _user("07", "0xd"),
+        ])
+        summary = asyncio.run(migration_service._duplicate_wallets(db))
+        assert sorted(db.users.docs) == ["01", "04", "05", "06", "07"]
+        assert summary == {"duplicates": 3, "removed": 2, "conflicts": ["0xc"], "conflict_count": 1}
+
+    def test_no_duplicates(self):
+        """Nothing to do on a clean collection"""
+        db = _UsersDB([_user("01", "0xa"), _user("02", "0xb")])
+        assert asyncio.run(migration_service._duplicate_wallets(db))["removed"] == 0
+        assert len(db.users.docs) == 2
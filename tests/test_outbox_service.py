@@ -0,0 +1,131 @@
+"""
+Unit tests for the admin audit outbox (services/outbox_service.py).
+"""
+import asyncio
+
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+import services.outbox_service as outbox_service
+from services.outbox_service import AUDIT_COLLECTION, DUPLICATE_KEY, OUTBOX_COLLECTION, AuditOutbox
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs.sort(key=lambda d: d[field])
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length=None):
+        return self.docs
+
+
+class _Collection:
+    def __init__(self):
+        self.docs = []
+        self.failures = []   # exceptions raised by the next insert_many calls
+
+    async def insert_many(self, docs, ordered=True):
+        if self.failures:
+            failure = self.failures.pop(0)
+            if isinstance(failure, BulkWriteError):
+                failed = {err["index"] for err in failure.details["writeErrors"]}
+                self.docs += [d for i, d in enumerate(docs) if i not in failed]
+            raise failure
+        self.docs += docs
+
+    def find(self, query):
+        return _Cursor(list(self.docs))
+
+    async def delete_many(self, query):
+        ids = set(query["_id"]["$in"])
+        self.docs = [d for d in self.docs if d["_id"] not in ids]
+
+
+class _DB:
+    def __init__(self):
+        self.collections = {}
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, _Collection())
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(outbox_service, "DEFAULT_RETRY_BASE_DELAY", 0)
+
+
+class TestMemoryMode:
+    """Queued events and the drainer"""
+
+    def test_stop_flushes_queued_events(self):
+        """Everything enqueued before stop() reaches admin_logs"""
+        async def run():
+            db = _DB()
+            outbox = AuditOutbox(db, batch_size=2, flush_interval=60)
+            outbox.start()
+            for i in range(5):
+                outbox.enqueue({"action": "ban", "target": i})
+            await outbox.stop()
+            return db
+
+        db = asyncio.run(run())
+        logs = db[AUDIT_COLLECTION].docs
+        assert [d["target"] for d in logs] == [0, 1, 2, 3, 4]
+        assert all("timestamp" in d for d in logs)
+
+    def test_only_failed_documents_are_retried(self):
+        """Duplicates count as written; other write errors are retried alone"""
+        db = _DB()
+        db[AUDIT_COLLECTION].failures.append(BulkWriteError({"writeErrors": [
+            {"index": 0, "code": DUPLICATE_KEY}, {"index": 2, "code": 91},
+        ]}))
+        outbox = AuditOutbox(db, max_retries=1)
+        batch = [{"_id": 1}, {"_id": 2}, {"_id": 3}]
+        assert asyncio.run(outbox._insert_with_retry(batch))
+        assert [d["_id"] for d in db[AUDIT_COLLECTION].docs] == [2, 3]
+
+    def test_failed_batch_is_kept(self):
+        """A batch that exhausts its retries stays pending for the next drain"""
+        db = _DB()
+        db[AUDIT_COLLECTION].failures += [AutoReconnect("down")] * 2
+        outbox = AuditOutbox(db, max_retries=1)
+
+        async def run():
+            outbox.enqueue({"action": "ban"})
+            await outbox._flush_memory()
+            assert len(outbox._pending) == 1
+            await outbox._flush_memory()
+
+        asyncio.run(run())
+        assert not outbox._pending
+        assert [d["action"] for d in db[AUDIT_COLLECTION].docs] == ["ban"]
+
+
+class TestDurableMode:
+    """Relay of committed outbox documents"""
+
+    def test_relay_moves_outbox_to_logs(self):
+        """Relayed documents keep their _id and leave the outbox"""
+        db = _DB()
+        db[OUTBOX_COLLECTION].docs += [{"_id": i, "action": "adjust"} for i in range(3)]
+        outbox = AuditOutbox(db, durable=True, batch_size=2)
+        asyncio.run(outbox._relay_durable())
+        assert [d["_id"] for d in db[AUDIT_COLLECTION].docs] == [0, 1, 2]
+        assert db[OUTBOX_COLLECTION].docs == []
+
+    def test_mutation_failure_records_nothing(self):
+        """A mutation that raises queues no event"""
+        async def mutation(session):
+            raise ValueError("bad amount")
+
+        outbox = AuditOutbox(_DB())
+        with pytest.raises(ValueError):
+            asyncio.run(outbox.run_with_audit(mutation, {"action": "adjust"}))
+        assert outbox._queue.empty() and not outbox._pending
@@ -0,0 +1,40 @@
+"""
+Unit tests for the in-process play counters (services/play_limit_service.py).
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from services.play_limit_service import InProcessCounters
+
+NOW = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+
+
+class TestInProcessCounters:
+    """Cooldown, daily limit, release and consume"""
+
+    def test_cooldown_and_daily_limit(self):
+        """A play inside the cooldown or past the daily limit is refused"""
+        counters = InProcessCounters(None)
+        assert asyncio.run(counters.acquire("0xa", "zbrickles", 60, 2, NOW))[0]
+        allowed, reason, retry_after, _ = asyncio.run(counters.acquire("0xa", "zbrickles", 60, 2, NOW + timedelta(seconds=30)))
+        assert (allowed, reason, retry_after) == (False, "cooldown", 31)
+        assert asyncio.run(counters.acquire("0xa", "zbrickles", 60, 2, NOW + timedelta(minutes=2)))[0]
+        allowed, reason, _, _ = asyncio.run(counters.acquire("0xa", "zbrickles", 60, 2, NOW + timedelta(minutes=4)))
+        assert (allowed, reason) == (False, "daily_limit")
+
+    def test_release_restores_the_counter(self):
+        """A released play can be retried straight away"""
+        counters = InProcessCounters(None)
+        token = asyncio.run(counters.acquire("0xa", "zbrickles", 60, 1, NOW))[3]
+        asyncio.run(counters.release(token))
+        assert asyncio.run(counters.acquire("0xa", "zbrickles", 60, 1, NOW))[0]
+
+    def test_consume_grants_up_to_the_daily_limit(self):
+        """consume() ignores the cooldown, stops at the limit and resets the next day"""
+        counters = InProcessCounters(None)
+        asyncio.run(counters.acquire("0xa", "zbrickles", 60, 10, NOW))
+        assert asyncio.run(counters.consume("0xa", "zbrickles", 6, 10, NOW)) == 6
+        assert asyncio.run(counters.consume("0xa", "zbrickles", 6, 10, NOW)) == 3
+        assert asyncio.run(counters.consume("0xa", "zbrickles", 6, 10, NOW)) == 0
+        assert asyncio.run(counters.consume("0xa", "zbrickles", 6, 10, NOW + timedelta(days=1))) == 6
+        assert asyncio.run(counters.consume("0xb", "zbrickles", 4, 0, NOW)) == 4
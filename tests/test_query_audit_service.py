@@ -0,0 +1,39 @@
+"""
+Unit tests for query shapes in the plan auditor (services/query_audit_service.py).
+"""
+from datetime import datetime, timezone
+
+from services.query_audit_service import _shape_key, _shape_spec
+
+
+class TestShapes:
+    """Which queries share a shape"""
+
+    def test_parameters_collapse(self):
+        """Literal values, dates and $in lists of any length share a shape"""
+        a = {"filter": {"wallet_address": {"$in": ["0xa"]}, "timestamp": {"$gte": datetime(2026, 1, 1, tzinfo=timezone.utc)}}}
+        b = {"filter": {"wallet_address": {"$in": ["0xb", "0xc"]}, "timestamp": {"$gte": datetime(2026, 2, 1, tzinfo=timezone.utc)}}}
+        assert _shape_key("users", "find", a) == _shape_key("users", "find", b)
+
+    def test_sort_keeps_fields_and_directions(self):
+        """Sorts on different fields or directions are different shapes"""
+        spec = {"filter": {}, "sort": [("total_earned", -1)], "limit": 10}
+        assert _shape_spec(spec)["sort"] == [["total_earned", -1]]
+        assert _shape_spec(spec)["limit"] == "<int>"
+        keys = {
+            _shape_key("users", "find", {**spec, "sort": sort})
+            for sort in ([("total_earned", -1)], [("total_earned", 1)], [("games_played", -1)], [("games_played", -1), ("_id", 1)])
+        }
+        assert len(keys) == 4
+
+    def test_projection_keeps_fields(self):
+        """Projection dicts and field lists stay in the shape"""
+        assert _shape_spec({"filter": {}, "projection": {"_id": 0, "tier": 1}})["projection"] == {"_id": 0, "tier": 1}
+        assert _shape_spec({"filter": {}, "projection": ["tier", "status"]})["projection"] == ["tier", "status"]
+        assert _shape_key("users", "find", {"filter": {}, "projection": ["tier"]}) != _shape_key("users", "find", {"filter": {}, "projection": ["status"]})
+
+    def test_pipeline_sort_and_project_stages(self):
+        """$sort and $project stages keep their fields; $match values still collapse"""
+        pipeline = [{"$match": {"day": "2026-10-19"}}, {"$sort": {"zwap": -1}}, {"$project": {"_id": 0, "zwap": 1}}]
+        shape = _shape_spec({"pipeline": pipeline})["pipeline"]
+        assert shape == [{"$match": {"day": "<str>"}}, {"$sort": {"zwap": -1}}, {"$project": {"_id": 0, "zwap": 1}}]
@@ -0,0 +1,54 @@
+"""
+Unit tests for services/reward_engine.py: the NumPy batch path must match the
+scalar functions the request path uses, bit for bit.
+"""
+import numpy as np
+
+from services.reward_engine import (
+    GAME_REWARD_RULES,
+    TIERS,
+    batch_game_rewards,
+    batch_step_rewards,
+    calculate_game_rewards,
+    calculate_step_rewards,
+    tier_multipliers,
+)
+
+
+class TestBatchStepRewards:
+    """batch_step_rewards vs calculate_step_rewards"""
+
+    def test_bit_exact_against_scalar(self):
+        """Every element equals the scalar result exactly, across tier boundaries"""
+        rng = np.random.default_rng(28)
+        steps = np.concatenate([np.arange(0, 30001), rng.integers(0, 200000, 20000)])
+        multipliers = rng.choice([1.0, 1.5, 1.25, 0.1], steps.shape[0])
+        batch = batch_step_rewards(steps, multipliers)
+        expected = [calculate_step_rewards(int(s), float(m)) for s, m in zip(steps, multipliers)]
+        assert batch.tolist() == expected
+
+    def test_tier_multipliers_fall_back_to_default(self):
+        """Unknown tiers use the starter multiplier, overrides replace per tier"""
+        mults = tier_multipliers(["plus", "starter", "bogus"], TIERS, overrides={"plus": 3.0})
+        assert mults.tolist() == [3.0, TIERS["starter"]["zwap_multiplier"], TIERS["starter"]["zwap_multiplier"]]
+
+
+class TestBatchGameRewards:
+    """batch_game_rewards vs calculate_game_rewards"""
+
+    def test_bit_exact_against_scalar(self):
+        """zwap (rounded) and zpts (truncated) match the scalar function, unknown games included"""
+        rng = np.random.default_rng(280)
+        n = 20000
+        games = rng.choice(list(GAME_REWARD_RULES) + ["unknown_game"], n)
+        scores = rng.integers(0, 50000, n)
+        levels = rng.integers(1, 40, n)
+        blocks = rng.integers(0, 500, n)
+        multipliers = rng.choice([1.0, 1.5, 1.37], n)
+        batch = batch_game_rewards(games, scores, levels, blocks, multipliers)
+        for i in range(n):
+            expected = calculate_game_rewards(
+                str(games[i]), int(scores[i]), int(levels[i]), int(blocks[i]), float(multipliers[i])
+            )
+            assert batch["zwap"][i] == expected["zwap"]
+            assert batch["zpts"][i] == expected["zpts"]
@@ -0,0 +1,161 @@
+"""
+Unit tests for the single-write game reward update (services/reward_service.py).
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import services.game_rules_service as game_rules_service
+from services.game_rules_service import CompiledGameRules
+from services.reward_service import build_game_reward_pipeline, credit_game_rewards
+
+NOW = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+ZWAP_BY_TIER = {"starter": 2.0, "plus": 3.0}
+
+
+def _get(doc, path):
+    for part in path.split("."):
+        doc = doc.get(part) if isinstance(doc, dict) else None
+    return doc
+
+
+_OPS = {
+    "$eq": lambda a, b: a == b,
+    "$ifNull": lambda a, b: b if a is None else a,
+    "$substrCP": lambda s, start, n: s[start:start + n],
+    "$cond": lambda c, a, b: a if c else b,
+    "$max": max,
+    "$min": min,
+    "$subtract": lambda a, b: a - b,
+    "$add": lambda *args: sum(args),
+}
+
+
+def _eval(expr, doc):
+    # The aggregation expressions build_game_reward_pipeline uses
+    if isinstance(expr, str) and expr.startswith("$"):
+        return _get(doc, expr[1:])
+    if isinstance(expr, list):
+        return [_eval(e, doc) for e in expr]
+    if not isinstance(expr, dict):
+        return expr
+    if len(expr) == 1 and next(iter(expr)).startswith("$"):
+        op, arg = next(iter(expr.items()))
+        if op == "$literal":
+            return arg
+        if op == "$switch":
+            for branch in arg["branches"]:
+                if _eval(branch["case"], doc):
+                    return _eval(branch["then"], doc)
+            return _eval(arg["default"], doc)
+        return _OPS[op](*_eval(arg, doc))
+    return {k: _eval(v, doc) for k, v in expr.items()}
+
+
+def _apply(pipeline, doc):
+    doc = dict(doc)
+    for stage in pipeline:
+        if "$set" in stage:
+            doc.update({field: _eval(expr, doc) for field, expr in stage["$set"].items()})
+        else:
+            for field in stage["$unset"]:
+                doc.pop(field, None)
+    return doc
+
+
+def _matches(doc, query):
+    for field, cond in query.items():
+        if field == "$or":
+            if not any(_matches(doc, q) for q in cond):
+                return False
+        elif isinstance(cond, dict):
+            if "$in" in cond and doc.get(field) not in cond["$in"]:
+                return False
+            if "$nin" in cond and doc.get(field) in cond["$nin"]:
+                return False
+        elif doc.get(field) != cond:
+            return False
+    return True
+
+
+class _Users:
+    def __init__(self, docs):
+        self.docs = {d["wallet_address"]: d for d in docs}
+
+    async def find_one_and_update(self, query, pipeline, return_document=None):
+        doc = self.docs.get(query["wallet_address"])
+        if doc is None or not _matches(doc, query):
+            return None
+        self.docs[doc["wallet_address"]] = _apply(pipeline, doc)
+        return dict(self.docs[doc["wallet_address"]])
+
+    async def find_one(self, query, projection=None):
+        return self.docs.get(query["wallet_address"])
+
+
+class _DB:
+    def __init__(self, *users):
+        self.users = _Users(users)
+
+
+def _user(**fields):
+    return {"wallet_address": "0xa", "tier": "starter", "zwap_balance": 10.0, "total_earned": 10.0, **fields}
+
+
+class TestPipeline:
+    """Daily reset and cap in one update"""
+
+    def test_same_day_is_capped(self):
+        """Only what is left of the tier's daily cap is credited"""
+        doc = _apply(build_game_reward_pipeline("zbrickles", ZWAP_BY_TIER, 10, NOW),
+                     _user(daily_zpts_earned=70, zpts_balance=70, last_zpts_reset=NOW.isoformat()))
+        assert (doc["daily_zpts_earned"], doc["zpts_balance"]) == (75, 75)
+        assert doc["last_game_reward"] == {"game": "zbrickles", "zwap": 2.0, "zpts": 5, "at": NOW}
+        assert doc["last_zpts_reset"] == NOW.isoformat()
+        assert not [f for f in doc if f.startswith("_")]
+
+    def test_new_day_resets_counter(self):
+        """Yesterday's counter is dropped before the cap applies"""
+        yesterday = (NOW - timedelta(days=1)).isoformat()
+        doc = _apply(build_game_reward_pipeline("zbrickles", ZWAP_BY_TIER, 10, NOW, games=3),
+                     _user(daily_zpts_earned=75, zpts_balance=75, games_played=1, last_zpts_reset=yesterday))
+        assert (doc["daily_zpts_earned"], doc["zpts_balance"], doc["games_played"]) == (10, 85, 4)
+        assert doc["last_zpts_reset"] == NOW.isoformat()
+
+    def test_first_game(self):
+        """Users without counters start from zero"""
+        doc = _apply(build_game_reward_pipeline("zbrickles", ZWAP_BY_TIER, 10, NOW), {"wallet_address": "0xa", "tier": "starter"})
+        assert (doc["zwap_balance"], doc["total_earned"], doc["zpts_balance"], doc["games_played"]) == (2.0, 2.0, 10, 1)
+
+    def test_tier_selects_reward_and_cap(self):
+        """The stored tier picks the ZWAP amount and cap; unknown tiers behave as starter"""
+        pipeline = build_game_reward_pipeline("zbrickles", ZWAP_BY_TIER, 100, NOW)
+        plus = _apply(pipeline, _user(tier="plus"))
+        assert (plus["zwap_balance"], plus["daily_zpts_earned"]) == (13.0, 100)
+        legacy = _apply(pipeline, _user(tier="gold"))
+        assert (legacy["zwap_balance"], legacy["daily_zpts_earned"]) == (12.0, 75)
+
+
+class TestCredit:
+    """credit_game_rewards errors"""
+
+    @pytest.fixture(autouse=True)
+    def rules(self, monkeypatch):
+        monkeypatch.setattr(game_rules_service, "_table", CompiledGameRules([{"game_id": "ztrivia", "enabled": False}]))
+
+    def test_credit_returns_updated_user(self):
+        """The returned user carries what was credited"""
+        user = asyncio.run(credit_game_rewards(_DB(_user()), "0xa", "zbrickles", ZWAP_BY_TIER, 10, now=NOW))
+        assert user["last_game_reward"]["zwap"] == 2.0
+
+    def test_misses_are_explained(self):
+        """Unknown wallets, locked tiers and disabled games raise distinct errors"""
+        db = _DB(_user())
+        with pytest.raises(LookupError):
+            asyncio.run(credit_game_rewards(db, "0xb", "zbrickles", ZWAP_BY_TIER, 10, now=NOW))
+        with pytest.raises(PermissionError, match="tier"):
+            asyncio.run(credit_game_rewards(db, "0xa", "ztetris", ZWAP_BY_TIER, 10, now=NOW))
+        with pytest.raises(PermissionError, match="disabled"):
+            asyncio.run(credit_game_rewards(db, "0xa", "ztrivia", ZWAP_BY_TIER, 10, now=NOW))
+        assert db.users.docs["0xa"]["zwap_balance"] == 10.0
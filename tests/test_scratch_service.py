@@ -0,0 +1,128 @@
+"""
+Unit tests for pre-generated scratch card batches (services/scratch_service.py).
+"""
+import asyncio
+from collections import Counter
+
+import pytest
+from pymongo.errors import AutoReconnect
+
+from services.scratch_service import (
+    BATCHES_COLLECTION,
+    PRIZES,
+    ScratchCardEngine,
+    generate_outcomes,
+    get_batch,
+    prize_counts,
+)
+
+
+class _Batches:
+    def __init__(self):
+        self.docs = {}
+
+    async def insert_one(self, doc):
+        self.docs[doc["batch_id"]] = dict(doc)
+
+    async def update_one(self, query, update):
+        self.docs[query["batch_id"]].update(update["$set"])
+
+    async def find_one(self, query, projection=None):
+        doc = self.docs.get(query["batch_id"])
+        return dict(doc) if doc else None
+
+
+class _Users:
+    def __init__(self, wallets):
+        self.balances = {w: 0 for w in wallets}
+        self.failures = 0
+
+    async def find_one_and_update(self, query, update, projection=None, return_document=None):
+        if self.failures:
+            self.failures -= 1
+            raise AutoReconnect("connection reset")
+        wallet = query["wallet_address"]
+        if wallet not in self.balances:
+            return None
+        self.balances[wallet] += update.get("$inc", {}).get("zwap_balance", 0)
+        return {"zwap_balance": self.balances[wallet]}
+
+
+class _DB:
+    def __init__(self, wallets=("0xa",)):
+        self.users = _Users(wallets)
+        self.collections = {BATCHES_COLLECTION: _Batches()}
+
+    def __getitem__(self, name):
+        return self.collections[name]
+
+
+class TestOutcomes:
+    """Batch prize distribution"""
+
+    def test_prize_counts_are_exact(self):
+        """Win rate and prizes are split exactly, remainders to the smallest prizes"""
+        counts = prize_counts(1003)
+        assert sum(counts.values()) == 1003
+        assert counts[0] == 1003 - 301
+        assert [counts[p] for p in sorted(PRIZES)] == [61, 60, 60, 60, 60]
+
+    def test_outcomes_match_counts_and_replay(self):
+        """A seed reproduces the same shuffled cards with the committed distribution"""
+        seed = bytes(range(32))
+        cards = generate_outcomes(seed, 1000)
+        assert Counter(cards.tolist()) == prize_counts(1000)
+        assert (generate_outcomes(seed, 1000) == cards).all()
+        assert not (generate_outcomes(bytes(32), 1000) == cards).all()
+
+
+class TestEngine:
+    """Issuing, voiding and revealing cards"""
+
+    def test_full_batch_is_revealed_and_verifies(self):
+        """Issuing every card reveals the seed, which reproduces every card played"""
+        async def run():
+            db = _DB()
+            engine = ScratchCardEngine(db, batch_size=50)
+            results = [await engine.play("0xa") for _ in range(50)]
+            await asyncio.sleep(0)
+            batch = await get_batch(db, results[0]["card"]["batch_id"])
+            return db, results, batch
+
+        db, results, batch = asyncio.run(run())
+        assert batch["status"] == "revealed"
+        assert batch["verified"]
+        assert batch["issued"] == 50
+        cards = generate_outcomes(bytes.fromhex(batch["seed"]), 50)
+        assert [r["amount"] for r in results] == [int(cards[r["card"]["index"]]) for r in results]
+        assert db.users.balances["0xa"] == sum(r["amount"] for r in results)
+
+    def test_unknown_wallet_requeues_the_card(self):
+        """A LookupError puts the card back for the next player"""
+        async def run():
+            engine = ScratchCardEngine(_DB(), batch_size=10)
+            with pytest.raises(LookupError):
+                await engine.play("0xmissing")
+            return await engine.play("0xa")
+
+        assert asyncio.run(run())["card"]["index"] == 0
+
+    def test_failed_write_voids_the_card(self):
+        """A PyMongoError voids the card and still counts it, so the batch can finish"""
+        async def run():
+            db = _DB()
+            engine = ScratchCardEngine(db, batch_size=10)
+            db.users.failures = 2
+            for _ in range(2):
+                with pytest.raises(AutoReconnect):
+                    await engine.play("0xa")
+            results = [await engine.play("0xa") for _ in range(8)]
+            await asyncio.sleep(0)
+            return db, engine, results
+
+        db, engine, results = asyncio.run(run())
+        batch = db[BATCHES_COLLECTION].docs[results[0]["card"]["batch_id"]]
+        assert (batch["status"], batch["issued"], batch["voided"]) == ("revealed", 10, 2)
+        assert [r["card"]["index"] for r in results] == list(range(2, 10))
+        statuses = [p.get("status") for p in engine._pending_plays]
+        assert statuses == ["voided"] * 2 + [None] * 8
@@ -0,0 +1,169 @@
+"""
+Unit tests for batched pedometer step sync (services/step_sync_service.py).
+"""
+import asyncio
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import services.analytics_rollup_service as analytics_rollup_service
+import services.anti_cheat_service as anti_cheat_service
+import services.step_sync_service as step_sync_service
+import services.user_cache_service as user_cache_service
+from services.anti_cheat_service import StepSpikeDetector
+from services.reward_engine import calculate_step_rewards
+from services.step_sync_service import aggregate_step_samples, build_step_sync_update, sync_step_samples
+
+NOW = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+WALLET = "0xa"
+
+Sample = namedtuple("Sample", "timestamp steps")
+
+
+@pytest.fixture(autouse=True)
+def detector(monkeypatch):
+    detector = StepSpikeDetector(None, threshold=1000, action="clamp")
+    monkeypatch.setattr(anti_cheat_service, "_detector", detector)
+    return detector
+
+
+class TestAggregate:
+    """Sample screening"""
+
+    def test_duplicates_future_and_credited_samples_are_skipped(self):
+        """First sample per timestamp wins; future and watermarked samples earn nothing"""
+        samples = [
+            Sample(NOW - timedelta(minutes=30), 100),
+            Sample(NOW - timedelta(minutes=30), 900),
+            Sample(NOW - timedelta(minutes=20), 200),
+            Sample(NOW - timedelta(hours=2), 50),
+            Sample(NOW + timedelta(hours=1), 400),
+        ]
+        agg = aggregate_step_samples(WALLET, samples, NOW - timedelta(hours=1), NOW)
+        assert (agg["accepted"], agg["duplicates"]) == (2, 3)
+        assert agg["steps_by_day"] == {NOW.date().isoformat(): 300}
+        assert agg["latest"] == NOW - timedelta(minutes=20)
+
+    def test_naive_timestamps_are_utc(self):
+        """Samples without a timezone compare as UTC"""
+        agg = aggregate_step_samples(WALLET, [Sample(NOW.replace(tzinfo=None), 100)], NOW - timedelta(minutes=1), NOW)
+        assert agg["latest"] == NOW
+
+    def test_spikes_are_clamped(self):
+        """Samples are screened in time order against the spike window"""
+        samples = [Sample(NOW - timedelta(minutes=1), 800), Sample(NOW - timedelta(minutes=2), 800)]
+        agg = aggregate_step_samples(WALLET, samples, None, NOW)
+        assert agg["total_steps"] == 1000
+        assert agg["flagged"] == 1
+        assert [s["credited"] for s in agg["screens"]] == [800, 200]
+
+
+class TestUpdate:
+    """Per-wallet update documents"""
+
+    def test_rewards_are_computed_per_day(self):
+        """Steps on different days earn each day's tiered reward"""
+        samples = [Sample(NOW - timedelta(days=1), 600), Sample(NOW, 700)]
+        user = {"wallet_address": WALLET, "tier": "starter", "daily_steps_date": NOW.date().isoformat()}
+        update, summary, _ = build_step_sync_update(user, samples, NOW, "sync-1")
+        assert summary["rewards_earned"] == calculate_step_rewards(600) + calculate_step_rewards(700)
+        assert update._filter == {"wallet_address": WALLET, "last_step_sample_at": None}
+        assert update._doc["$inc"]["daily_steps"] == 700
+        assert update._doc["$set"] == {"last_step_sample_at": NOW}
+
+    def test_new_day_resets_daily_steps(self):
+        """The first sync of a day sets daily_steps instead of adding to it"""
+        user = {"wallet_address": WALLET, "daily_steps_date": "2026-10-18"}
+        update, _, _ = build_step_sync_update(user, [Sample(NOW, 700)], NOW, "sync-1")
+        assert "daily_steps" not in update._doc["$inc"]
+        assert update._doc["$set"]["daily_steps"] == 700
+        assert update._doc["$set"]["daily_steps_date"] == NOW.date().isoformat()
+
+    def test_nothing_new_writes_nothing(self):
+        """A resent batch yields no update"""
+        update, summary, _ = build_step_sync_update({"wallet_address": WALLET, "last_step_sample_at": NOW}, [Sample(NOW, 700)], NOW, "sync-1")
+        assert update is None
+        assert summary["samples_skipped"] == 1
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length=None):
+        return self.docs
+
+
+class _Users:
+    def __init__(self, wallets, conflicting=()):
+        self.wallets = wallets
+        self.conflicting = set(conflicting)   # wallets another sync wrote first
+        self.synced = set()
+        self.writes = []
+
+    def find(self, query, projection=None):
+        if "step_sync_ids" in query:
+            return _Cursor([{"wallet_address": w} for w in self.synced])
+        return _Cursor([{"wallet_address": w} for w in self.wallets if w in query["wallet_address"]["$in"]])
+
+    async def bulk_write(self, ops, ordered=True):
+        self.writes.append(ops)
+        matched = [op for op in ops if op._filter["wallet_address"] not in self.conflicting]
+        self.synced |= {op._filter["wallet_address"] for op in matched}
+        return type("Result", (), {"matched_count": len(matched)})()
+
+
+class _DB:
+    def __init__(self, users):
+        self.users = users
+
+
+class _Cache:
+    def __init__(self):
+        self.invalidated = []
+
+    async def invalidate_many(self, wallets):
+        self.invalidated += list(wallets)
+
+
+class TestSync:
+    """One read and one bulk_write per sync"""
+
+    @pytest.fixture
+    def rollups(self, monkeypatch):
+        monkeypatch.setattr(step_sync_service, "_utc_now", lambda: NOW)
+        monkeypatch.setattr(user_cache_service, "_cache", _Cache())
+        rollups = analytics_rollup_service.DailyRollups(None)
+        monkeypatch.setattr(analytics_rollup_service, "_rollups", rollups)
+        return rollups
+
+    def test_repeated_wallets_are_merged(self, rollups):
+        """Batches for the same wallet in any case become one update; unknown wallets are reported"""
+        users = _Users(["0xa"])
+        result = asyncio.run(sync_step_samples(_DB(users), [
+            ("0xA", [Sample(NOW - timedelta(minutes=2), 100)]),
+            ("0xa", [Sample(NOW - timedelta(minutes=1), 200)]),
+            ("0xc", [Sample(NOW, 50)]),
+        ]))
+        assert [len(ops) for ops in users.writes] == [1]
+        assert result["results"][0]["steps_counted"] == 300
+        assert result["not_found"] == ["0xc"]
+
+    def test_conflicting_wallets_are_not_credited(self, rollups, detector):
+        """Conflicting wallets get their screened steps back and no rollup events"""
+        users = _Users(["0xa", "0xb"], conflicting={"0xb"})
+        result = asyncio.run(sync_step_samples(_DB(users), [
+            (w, [Sample(NOW - timedelta(minutes=1), 500)]) for w in ("0xa", "0xb")
+        ]))
+        assert result["conflicts"] == 1
+        assert detector._windows["0xa"].total == 500
+        assert detector._windows["0xb"].total == 0
+        assert sum(incs.get("steps.total", 0) for incs in rollups._incs.values()) == 500
+        assert set().union(*rollups._marked.values()) == {"0xa"}
+
+    def test_sample_limit(self, monkeypatch):
+        """Oversized syncs are refused before any read"""
+        monkeypatch.setattr(step_sync_service, "MAX_STEP_SAMPLES_PER_SYNC", 2)
+        with pytest.raises(ValueError):
+            asyncio.run(sync_step_samples(_DB(None), [("0xa", [Sample(NOW, 1)] * 3)]))
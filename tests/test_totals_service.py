@@ -0,0 +1,87 @@
+"""
+Unit tests for cached admin list totals (services/totals_service.py).
+"""
+import asyncio
+
+import services.totals_service as totals_service
+from services.totals_service import TotalsCache
+
+
+class _Collection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.counts = 0
+
+    async def estimated_document_count(self):
+        return len(self.docs)
+
+    async def count_documents(self, query, limit=None):
+        self.counts += 1
+        n = sum(1 for d in self.docs if all(d.get(k) == v for k, v in query.items()))
+        return min(n, limit) if limit else n
+
+
+class _DB:
+    def __init__(self, docs):
+        self.users = _Collection(docs)
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+
+def _users(plus, starter):
+    return [{"tier": "plus"}] * plus + [{"tier": "starter"}] * starter
+
+
+class TestCount:
+    """exact is only reported for fresh counts"""
+
+    def test_cache_hit_is_not_exact(self):
+        """The first count is fresh and exact; a cache hit says cached and not exact"""
+        db, totals = _DB(_users(3, 5)), TotalsCache()
+        assert asyncio.run(totals.count(db, "users", {"tier": "plus"})) == {"total": 3, "exact": True, "cached": False}
+        assert asyncio.run(totals.count(db, "users", {"tier": "plus"})) == {"total": 3, "exact": False, "cached": True}
+        assert db.users.counts == 1
+
+    def test_invalidation(self, monkeypatch):
+        """Bumps, inserts/deletes and age each force a fresh count"""
+        db, totals = _DB(_users(3, 5)), TotalsCache(max_age=60)
+        clock = [1000.0]
+        monkeypatch.setattr(totals_service.time, "monotonic", lambda: clock[0])
+
+        def count():
+            return asyncio.run(totals.count(db, "users", {"tier": "plus"}))
+
+        count()
+        db.users.docs[0] = {"tier": "starter"}   # in-place update: invisible until bumped
+        assert count()["total"] == 3
+        totals.bump("users")
+        assert count() == {"total": 2, "exact": True, "cached": False}
+
+        db.users.docs.append({"tier": "plus"})   # insert moves the estimated count
+        assert count() == {"total": 3, "exact": True, "cached": False}
+
+        clock[0] += 61
+        assert count()["cached"] is False
+        assert db.users.counts == 4
+
+    def test_exact_request_and_estimates(self):
+        """exact=True bypasses the cache; unfiltered totals are estimates; a capped count is not exact"""
+        db, totals = _DB(_users(3, 5)), TotalsCache()
+        asyncio.run(totals.count(db, "users", {"tier": "plus"}))
+        assert asyncio.run(totals.count(db, "users", {"tier": "plus"}, exact=True)) == {"total": 3, "exact": True, "cached": False}
+        assert asyncio.run(totals.count(db, "users")) == {"total": 8, "exact": False, "cached": False}
+        assert asyncio.run(totals.count(db, "users", {"tier": "starter"}, limit=5))["exact"] is False
+
+    def test_load_reports_hits(self):
+        """Aggregates cached through load() say whether they came from the cache"""
+        db, totals = _DB(_users(1, 1)), TotalsCache()
+        calls = []
+
+        async def summarize():
+            calls.append(1)
+            return {"entries": 2}
+
+        first = asyncio.run(totals.load(db, "users", {}, summarize, tag="summary"))
+        second = asyncio.run(totals.load(db, "users", {}, summarize, tag="summary"))
+        assert (first, second, len(calls)) == (({"entries": 2}, False), ({"entries": 2}, True), 1)
@@ -0,0 +1,112 @@
+"""
+Unit tests for per-wallet seen-question bitsets (services/trivia_seen_service.py).
+"""
+import asyncio
+
+from pymongo.errors import AutoReconnect
+
+from services.trivia_seen_service import SEEN_COLLECTION, SeenQuestionCache, decode_bits, encode_bits
+
+
+class _Seen:
+    def __init__(self):
+        self.docs = {}
+        self.reads = 0
+        self.failures = []   # exceptions raised by the next bulk_write calls
+
+    async def find_one(self, query, projection=None):
+        self.reads += 1
+        return self.docs.get(query["wallet_address"])
+
+    async def bulk_write(self, ops, ordered=True):
+        if self.failures:
+            raise self.failures.pop(0)
+        for op in ops:
+            self.docs.setdefault(op._filter["wallet_address"], {}).update(op._doc["$set"])
+
+
+class _DB:
+    def __init__(self):
+        self.collections = {SEEN_COLLECTION: _Seen()}
+
+    def __getitem__(self, name):
+        return self.collections[name]
+
+
+class TestBits:
+    """Bitset encoding"""
+
+    def test_round_trip(self):
+        """Bit n is ordinal n, little-endian, in as few bytes as needed"""
+        bits = (1 << 0) | (1 << 9) | (1 << 10_000)
+        raw = encode_bits(bits)
+        assert len(raw) == 10_000 // 8 + 1
+        assert raw[:2] == b"\x01\x02"
+        assert decode_bits(raw) == bits
+        assert (encode_bits(0), decode_bits(None)) == (b"", 0)
+
+
+class TestCache:
+    """LRU cache with write-back"""
+
+    def test_write_back(self):
+        """Marks are cached, flushed once and read back by a fresh worker"""
+        db = _DB()
+        cache = SeenQuestionCache(db)
+
+        async def run():
+            await cache.mark_seen("0xa", 3)
+            await cache.mark_seen("0xa", 3)
+            await cache.mark_seen("0xa", 12)
+            await cache.flush()
+            return await SeenQuestionCache(db).get("0xa")
+
+        assert asyncio.run(run()) == (1 << 3) | (1 << 12)
+        assert db[SEEN_COLLECTION].docs["0xa"]["count"] == 2
+        assert db[SEEN_COLLECTION].reads == 2
+
+    def test_evicted_dirty_entries_are_kept(self):
+        """A wallet evicted before the flush keeps its unsaved bits"""
+        db = _DB()
+        cache = SeenQuestionCache(db, max_size=1)
+
+        async def run():
+            await cache.mark_seen("0xa", 1)
+            await cache.mark_seen("0xb", 2)
+            assert "0xa" not in cache._bits
+            return await cache.get("0xa")
+
+        assert asyncio.run(run()) == 1 << 1
+        asyncio.run(cache.flush())
+        assert decode_bits(db[SEEN_COLLECTION].docs["0xa"]["bits"]) == 1 << 1
+
+    def test_failed_flush_keeps_newer_bits(self):
+        """A failed write-back is retried without overwriting later marks"""
+        db = _DB()
+        db[SEEN_COLLECTION].failures.append(AutoReconnect("down"))
+        cache = SeenQuestionCache(db)
+
+        async def run():
+            await cache.mark_seen("0xa", 1)
+            await cache.flush()
+            await cache.mark_seen("0xa", 2)
+            await cache.flush()
+
+        asyncio.run(run())
+        assert decode_bits(db[SEEN_COLLECTION].docs["0xa"]["bits"]) == (1 << 1) | (1 << 2)
+        assert not cache._dirty
+
+    def test_reset(self):
+        """Reset clears the wallet's bits and persists the empty set"""
+        db = _DB()
+        cache = SeenQuestionCache(db)
+
+        async def run():
+            await cache.mark_seen("0xa", 5)
+            await cache.flush()
+            await cache.reset("0xa")
+            await cache.flush()
+            return await cache.get("0xa")
+
+        assert asyncio.run(run()) == 0
+        assert db[SEEN_COLLECTION].docs["0xa"]["count"] == 0
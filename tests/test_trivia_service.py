@@ -0,0 +1,135 @@
+"""
+Unit tests for the in-memory trivia question bank (services/trivia_service.py).
+"""
+import asyncio
+
+import pytest
+from pymongo import ReturnDocument
+
+import services.trivia_service as trivia_service
+from services.trivia_service import DEFAULT_QUESTIONS, TriviaBank
+
+
+def _question(i, difficulty, **fields):
+    return {"id": f"q{i}", "question": f"Q{i}?", "options": ["a", "b"], "answer": "a", "difficulty": difficulty, "ordinal": i, **fields}
+
+
+@pytest.fixture
+def bank(monkeypatch):
+    bank = TriviaBank([_question(i, d) for i, d in enumerate([3, 1, 2, 1, 5, 2, 1])])
+    monkeypatch.setattr(trivia_service, "_bank", bank)
+    return bank
+
+
+class TestBank:
+    """Difficulty buckets and sampling"""
+
+    def test_buckets_are_contiguous(self, bank):
+        """Questions are ordered by difficulty so each bucket is a slice"""
+        assert [q["difficulty"] for q in bank.ordered] == [1, 1, 1, 2, 2, 3, 5]
+        assert bank.bucket_range(2, exact=True) == range(3, 5)
+        assert bank.bucket_range(2) == range(0, 5)
+        assert bank.bucket_range(4, exact=True) == range(6, 6)
+
+    def test_difficulty_is_clamped(self):
+        """Names and out-of-range values map onto 1..5"""
+        bank = TriviaBank([_question(0, "hard"), _question(1, 9), _question(2, None)])
+        assert sorted(q["difficulty"] for q in bank.ordered) == [1, 3, 5]
+
+    def test_answers_stay_private(self, bank):
+        """Sampled questions never carry the answer"""
+        assert all("answer" not in q for q in bank.sample(10, 5))
+
+    def test_get_questions_includes_one_level_up(self, bank):
+        """The default pool is everything up to difficulty + 1, without repeats"""
+        questions = trivia_service.get_questions(count=10, difficulty=1)
+        assert sorted(q["id"] for q in questions) == ["q1", "q2", "q3", "q5", "q6"]
+        assert {q["difficulty"] for q in trivia_service.get_questions(count=10, difficulty=2, exact=True)} == {2}
+
+    def test_unseen_questions_first(self, bank):
+        """Seen questions are skipped while unseen ones remain, then used to top up"""
+        seen = (1 << 1) | (1 << 3)   # two of the three difficulty-1 questions
+        for _ in range(20):
+            assert [q["id"] for q in trivia_service.get_questions(count=1, difficulty=1, exact=True, seen=seen)] == ["q6"]
+        ids = [q["id"] for q in trivia_service.get_questions(count=3, difficulty=1, exact=True, seen=seen)]
+        assert ids[0] == "q6" and sorted(ids) == ["q1", "q3", "q6"]
+
+    def test_check_answer(self, bank):
+        """Only correct answers earn a time bonus; unknown ids are wrong"""
+        assert trivia_service.check_answer("q1", "a", 15) == {"correct": True, "correct_answer": "a", "time_bonus": 0.5, "explanation": None}
+        assert trivia_service.check_answer("q1", "b", 1)["time_bonus"] == 0
+        assert trivia_service.check_answer("nope", "a", 1)["correct"] is False
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length=None):
+        return self.docs
+
+
+class _Questions:
+    def __init__(self):
+        self.docs = []
+
+    async def estimated_document_count(self):
+        return len(self.docs)
+
+    async def insert_many(self, docs):
+        self.docs += [{"_id": i + len(self.docs), **d} for i, d in enumerate(docs)]
+
+    def find(self, query, projection=None):
+        if "ordinal" in query:
+            return _Cursor([d for d in self.docs if "ordinal" not in d])
+        return _Cursor([d for d in self.docs if d.get("enabled") is not False])
+
+    async def bulk_write(self, ops, ordered=True):
+        by_id = {d["_id"]: d for d in self.docs}
+        for op in ops:
+            by_id[op._filter["_id"]].update(op._doc["$set"])
+
+
+class _SystemConfig:
+    def __init__(self):
+        self.docs = {}
+
+    async def find_one(self, query, projection=None):
+        return self.docs.get(query["_id"])
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        assert return_document == ReturnDocument.AFTER
+        doc = self.docs.setdefault(query["_id"], {"_id": query["_id"], "value": 0})
+        doc["value"] += update["$inc"]["value"]
+        return dict(doc)
+
+
+class _DB:
+    def __init__(self):
+        self.trivia_questions = _Questions()
+        self.system_config = _SystemConfig()
+
+
+class TestLoad:
+    """Loading the bank from Mongo"""
+
+    def test_seeds_and_assigns_ordinals(self, monkeypatch):
+        """An empty collection is seeded; ordinals are unique and never reused"""
+        monkeypatch.setattr(trivia_service, "_bank", TriviaBank([]))
+        db = _DB()
+        bank = asyncio.run(trivia_service.load_bank(db))
+        assert len(bank.ordered) == len(DEFAULT_QUESTIONS)
+        assert sorted(bank.ordinal_by_id.values()) == list(range(len(DEFAULT_QUESTIONS)))
+
+        db.trivia_questions.docs[0]["enabled"] = False
+        db.trivia_questions.docs.append({"_id": "new", **_question(99, 1)})
+        del db.trivia_questions.docs[-1]["ordinal"]
+        bank = asyncio.run(trivia_service.load_bank(db))
+        assert len(bank.ordered) == len(DEFAULT_QUESTIONS)
+        assert bank.ordinal_by_id["q99"] == len(DEFAULT_QUESTIONS)
+        assert trivia_service.ordinal_of("q99") == len(DEFAULT_QUESTIONS)
+
+    def test_create_rejects_answer_outside_options(self):
+        """The answer must be one of the options"""
+        with pytest.raises(ValueError):
+            asyncio.run(trivia_service.create_question(_DB(), {"question": "Q?", "options": ["a"], "answer": "b"}))
@@ -0,0 +1,129 @@
+"""
+Unit tests for the per-worker user cache (services/user_cache_service.py).
+"""
+import asyncio
+
+from services.user_cache_service import UserCache
+
+
+class _Users:
+    def __init__(self):
+        self.docs = {}
+        self.gate = None   # asyncio.Event that holds find_one, to interleave writes
+
+    async def find_one(self, query):
+        doc = self.docs.get(query["wallet_address"])
+        doc = dict(doc) if doc else None
+        if self.gate is not None:
+            await self.gate.wait()
+        return doc
+
+    async def find_one_and_update(self, query, update, return_document=None):
+        doc = self.docs.get(query["wallet_address"])
+        if doc is None:
+            return None
+        for field, amount in update.get("$inc", {}).items():
+            doc[field] = doc.get(field, 0) + amount
+        doc.update(update.get("$set", {}))
+        return dict(doc)
+
+
+class _DB:
+    def __init__(self):
+        self.users = _Users()
+        self.users.docs["0xa"] = {"_id": 1, "wallet_address": "0xa", "zwap_balance": 10, "step_sync_ids": ["s1"]}
+
+
+def _change(description, _id=1):
+    return {"operationType": "update", "documentKey": {"_id": _id}, "updateDescription": description}
+
+
+class TestChangeEvents:
+    """Which change events evict"""
+
+    def test_own_write_is_not_evicted(self):
+        """The event for a write already cached from its result keeps the entry"""
+        cache = UserCache(_DB())
+        asyncio.run(cache.update("0xa", {"$inc": {"zwap_balance": 5}}))
+        cache._on_change(_change({"updatedFields": {"zwap_balance": 15}, "removedFields": []}))
+        assert "0xa" in cache._entries
+
+    def test_other_writes_evict(self):
+        """Events the cached doc does not reflect evict the wallet"""
+        for description in (
+            {"updatedFields": {"zwap_balance": 99}},
+            {"updatedFields": {}, "removedFields": ["zwap_balance"]},
+            {"updatedFields": {"step_sync_ids.1": "s2"}},
+            {"updatedFields": {}, "truncatedArrays": [{"field": "step_sync_ids", "newSize": 0}]},
+        ):
+            cache = UserCache(_DB())
+            asyncio.run(cache.get("0xa"))
+            cache._on_change(_change(description))
+            assert "0xa" not in cache._entries, description
+
+    def test_nested_fields_and_inserts(self):
+        """Dotted paths are compared inside the cached doc; inserts drop negative entries"""
+        db = _DB()
+        cache = UserCache(db)
+        asyncio.run(cache.get("0xa"))
+        cache._on_change(_change({"updatedFields": {"step_sync_ids.0": "s1"}}))
+        assert "0xa" in cache._entries
+
+        assert asyncio.run(cache.get("0xb")) is None
+        assert "0xb" in cache._entries
+        cache._on_change({"operationType": "insert", "documentKey": {"_id": 2}, "fullDocument": {"wallet_address": "0xb"}})
+        assert "0xb" not in cache._entries
+
+
+class TestMissPath:
+    """In-flight reads never overwrite newer entries"""
+
+    def test_put_during_read_wins(self):
+        """A read that started before a put() does not replace the put() result"""
+        async def run():
+            db = _DB()
+            cache = UserCache(db)
+            gate = db.users.gate = asyncio.Event()
+            read = asyncio.create_task(cache.get("0xa"))
+            await asyncio.sleep(0)
+            await cache.update("0xa", {"$inc": {"zwap_balance": 5}})
+            gate.set()
+            stale = await read
+            return cache, stale
+
+        cache, stale = asyncio.run(run())
+        assert stale["zwap_balance"] == 10
+        assert cache._entries["0xa"][0]["zwap_balance"] == 15
+        assert not cache._loads
+
+    def test_evict_during_read_skips_caching(self):
+        """A read overtaken by an eviction is returned but not cached"""
+        async def run():
+            db = _DB()
+            cache = UserCache(db)
+            gate = db.users.gate = asyncio.Event()
+            read = asyncio.create_task(cache.get("0xa"))
+            await asyncio.sleep(0)
+            cache.evict("0xa")
+            gate.set()
+            return cache, await read
+
+        cache, doc = asyncio.run(run())
+        assert doc["zwap_balance"] == 10
+        assert "_id" not in doc and "step_sync_ids" not in doc
+        assert "0xa" not in cache._entries
+
+
+class TestPeek:
+    """Cache-only reads"""
+
+    def test_peek_never_reads_mongo(self):
+        """peek() returns fresh positive entries only"""
+        db = _DB()
+        cache = UserCache(db)
+        assert cache.peek("0xa") is None
+        assert cache.misses == 0
+        asyncio.run(cache.get("0xa"))
+        assert cache.peek("0xa")["zwap_balance"] == 10
+        asyncio.run(cache.get("0xb"))
+        assert cache.peek("0xb") is None
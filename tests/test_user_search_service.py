@@ -0,0 +1,180 @@
+"""
+Unit tests for the query plans and keyset cursors in
+services/user_search_service.py, and the search field backfill.
+"""
+import asyncio
+import random
+import re
+
+import pytest
+from bson import ObjectId
+
+from services.migration_service import _user_search_fields
+
+from services.user_search_service import (
+    _after,
+    _decode_cursor,
+    _encode_cursor,
+    build_plan,
+    normalize,
+    search_fields,
+)
+
+
+def _matches(doc, query):
+    """Evaluates the filter operators the plans use against a plain dict."""
+    for key, cond in query.items():
+        if key == "$and":
+            if not all(_matches(doc, q) for q in cond):
+                return False
+            continue
+        if key == "$or":
+            if not any(_matches(doc, q) for q in cond):
+                return False
+            continue
+        value = doc.get(key)
+        if not isinstance(cond, dict):
+            if value != cond:
+                return False
+            continue
+        for op, arg in cond.items():
+            if op == "$all" and not set(arg) <= set(value or []):
+                return False
+            if op == "$regex" and not (isinstance(value, str) and re.search(arg, value)):
+                return False
+            if op in ("$gt", "$gte", "$lt") and value is None:
+                return False
+            if op == "$gt" and not value > arg:
+                return False
+            if op == "$gte" and not value >= arg:
+                return False
+            if op == "$lt" and not value < arg:
+                return False
+    return True
+
+
+def _users(n=400):
+    rng = random.Random(45)
+    users = []
+    for i in range(n):
+        wallet = "0x" + "".join(rng.choice("0123456789abcdef") for _ in range(40))
+        name = rng.choice(["alice", "alina", "bob", "al", None, "Zed Walker", "a.b+c"])
+        user = {"_id": ObjectId(), "wallet_address": wallet, "custom_username": name}
+        user.update(search_fields(wallet, name))
+        users.append(user)
+    return users
+
+
+def _paginate(users, term, limit=7):
+    query, sort = build_plan(normalize(term))
+    key = lambda u: tuple(u[k] for k, _ in sort)
+    pages, values = [], None
+    while True:
+        page_query = {"$and": [query, _after(sort, values)]} if values else query
+        page = sorted((u for u in users if _matches(u, page_query)), key=key)[:limit]
+        if not page:
+            return pages, sort
+        pages.extend(page)
+        values = _decode_cursor(_encode_cursor([page[-1][k] for k, _ in sort]))
+
+
+class TestBuildPlan:
+    """One index-backed plan per term shape"""
+
+    def test_plan_shapes(self):
+        """Wallet prefix, short prefix and trigram plans"""
+        assert list(build_plan("0xab")[0]) == ["wallet_address"]
+        assert build_plan("al")[1] == [("search_username", 1), ("_id", 1)]
+        query, sort = build_plan("alin")
+        assert query["search_grams"] == {"$all": ["ali", "lin"]}
+        assert sort == [("_id", 1)]
+
+    @pytest.mark.parametrize("term", ["", "0x1", "al", "ALI", "lin", "a.b", "zed w", "bob"])
+    def test_pages_return_every_match_once(self, term):
+        """Walking the keyset pages yields exactly the substring matches, in order, without repeats"""
+        users = _users()
+        pages, sort = _paginate(users, term)
+        t = normalize(term)
+        if t.startswith("0x"):
+            expected = {u["_id"] for u in users if u["wallet_address"].startswith(t)}
+        elif len(t) < 3:
+            expected = {u["_id"] for u in users if (u["search_username"] or "").startswith(t)} if t else {u["_id"] for u in users}
+        else:
+            expected = {u["_id"] for u in users if t in (u["search_username"] or "") or t in u["wallet_address"]}
+        ids = [u["_id"] for u in pages]
+        keys = [tuple(u[k] for k, _ in sort) for u in pages]
+        assert keys == sorted(keys)
+        assert len(ids) == len(set(ids))
+        assert set(ids) == expected
+
+    def test_regex_is_escaped(self):
+        """Regex metacharacters in the term are matched literally"""
+        query, _ = build_plan("a.b")
+        assert query["$or"][0]["search_username"]["$regex"] == re.escape("a.b")
+
+
+class TestCursors:
+    """Opaque cursor encoding"""
+
+    def test_round_trip_with_object_ids(self):
+        """ObjectIds and strings survive encode/decode"""
+        values = ["alice", ObjectId()]
+        assert _decode_cursor(_encode_cursor(values)) == values
+
+    def test_malformed_cursor(self):
+        """Garbage cursors raise ValueError (mapped to 400 by the routes)"""
+        with pytest.raises(ValueError):
+            _decode_cursor("not-a-cursor")
+
+
+class _BackfillCursor:
+    def __init__(self, users, query):
+        self.users, self.query, self.n = users, query, None
+
+    def sort(self, key, direction):
+        assert (key, direction) == ("_id", 1)
+        return self
+
+    def limit(self, n):
+        self.n = n
+        return self
+
+    async def to_list(self, length=None):
+        after = self.query.get("_id", {}).get("$gt")
+        out = []
+        # Walks the _id index like Mongo would, counting every document it looks at
+        for _id in sorted(self.users.docs):
+            if after is not None and _id <= after:
+                continue
+            self.users.examined += 1
+            if "search_grams" not in self.users.docs[_id]:
+                out.append({"_id": _id, **self.users.docs[_id]})
+                if len(out) == self.n:
+                    break
+        return out
+
+
+class _BackfillUsers:
+    def __init__(self, n):
+        self.docs = {ObjectId(): {"wallet_address": f"0x{i:040x}"} for i in range(n)}
+        self.examined = 0
+
+    def find(self, query, projection=None):
+        return _BackfillCursor(self, query)
+
+    async def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            self.docs[op._filter["_id"]].update(op._doc["$set"])
+
+
+class TestSearchFieldBackfill:
+    """Migration 3"""
+
+    def test_backfill_is_linear(self):
+        """Every user is filled once and each document is examined once"""
+        db = type("DB", (), {})()
+        db.users = _BackfillUsers(2500)
+        summary = asyncio.run(_user_search_fields(db, batch_size=100))
+        assert summary == {"updated": 2500}
+        assert all("search_grams" in d for d in db.users.docs.values())
+        assert db.users.examined == 2500
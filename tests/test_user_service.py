@@ -0,0 +1,81 @@
+"""
+Unit tests for user creation and partner imports (services/user_service.py).
+"""
+import asyncio
+
+from services.user_service import SIGNUP_BONUS_ZWAP, connect_user, onboard_users
+
+WALLET = "0x" + "ab" * 20
+
+
+class _Result:
+    def __init__(self, upserted, matched):
+        self.upserted_count = upserted
+        self.matched_count = matched
+
+
+class _Users:
+    def __init__(self):
+        self.docs = {}
+
+    async def bulk_write(self, ops, ordered=True):
+        upserted = matched = 0
+        for op in ops:
+            wallet = op._filter["wallet_address"]
+            if wallet in self.docs:
+                matched += 1
+            else:
+                self.docs[wallet] = {"wallet_address": wallet, **op._doc["$setOnInsert"]}
+                upserted += 1
+        return _Result(upserted, matched)
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        wallet = query["wallet_address"]
+        if wallet not in self.docs:
+            self.docs[wallet] = {"_id": len(self.docs), "wallet_address": wallet, **update["$setOnInsert"]}
+        return dict(self.docs[wallet])
+
+
+class _DB:
+    def __init__(self):
+        self.users = _Users()
+
+
+class TestOnboardUsers:
+    """Partner imports"""
+
+    def test_invalid_addresses_are_reported(self):
+        """Only 0x + 40 hex digits are imported; case and whitespace are normalised"""
+        db = _DB()
+        wallets = [
+            {"wallet_address": "  0x" + "AB" * 20 + " "},
+            {"wallet_address": WALLET},
+            {"wallet_address": "0x1234"},
+            {"wallet_address": "0x" + "g" * 40},
+            {"wallet_address": "ab" * 21},
+            {"wallet_address": None},
+        ]
+        result = asyncio.run(onboard_users(db, wallets))
+        assert (result["created"], result["duplicates"]) == (1, 1)
+        assert result["invalid"] == ["0x1234", "0x" + "g" * 40, "ab" * 21, None]
+        assert list(db.users.docs) == [WALLET]
+
+    def test_imports_get_no_signup_bonus(self):
+        """Imported users start at zero; a real connect still gets the bonus"""
+        db = _DB()
+        asyncio.run(onboard_users(db, [{"wallet_address": WALLET, "username": "partner"}], source="acme"))
+        imported = db.users.docs[WALLET]
+        assert (imported["zwap_balance"], imported["total_earned"]) == (0.0, 0.0)
+        assert (imported["onboarded_by"], imported["custom_username"]) == ("acme", "partner")
+
+        user, created = asyncio.run(connect_user(db, "0x" + "cd" * 20))
+        assert created
+        assert user["zwap_balance"] == user["total_earned"] == SIGNUP_BONUS_ZWAP
+
+    def test_rerun_is_a_no_op(self):
+        """Re-importing existing wallets leaves them unchanged"""
+        db = _DB()
+        asyncio.run(onboard_users(db, [{"wallet_address": WALLET}]))
+        result = asyncio.run(onboard_users(db, [{"wallet_address": WALLET, "username": "late"}]))
+        assert (result["created"], result["existing"]) == (0, 1)
+        assert "custom_username" not in db.users.docs[WALLET]
@@ -0,0 +1,99 @@
+"""
+Unit tests for the in-memory top-K board in services/whale_service.py.
+"""
+import random
+
+from services.whale_service import WhaleBoard
+
+
+def _loaded_board(balances, top_k=20, slack=20):
+    """A board as reconcile() leaves it: the top K + slack, floor marked."""
+    board = WhaleBoard(None, top_k=top_k, slack=slack)
+    ranked = sorted(balances.items(), key=lambda kv: -kv[1])[:board.capacity]
+    for wallet, balance in ranked:
+        board._push({"wallet_address": wallet, "zwap_balance": balance}, wallet)
+    board._high_floor = board.floor()
+    return board
+
+
+def _truth(balances, k):
+    return [w for w, _ in sorted(balances.items(), key=lambda kv: -kv[1])[:k]]
+
+
+class TestWhaleBoard:
+    """observe / observe_balance / exact"""
+
+    def test_fills_then_keeps_largest(self):
+        """The board keeps the largest balances it has seen"""
+        board = WhaleBoard(None, top_k=3, slack=2)
+        for i, balance in enumerate([5, 1, 9, 7, 3, 8, 2]):
+            board.observe({"wallet_address": f"0x{i}", "zwap_balance": balance, "custom_username": f"u{i}"})
+        assert [m["zwap_balance"] for m in board.top()] == [9, 8, 7]
+        assert board.top()[0]["custom_username"] == "u2"
+        assert board.rank_of("0x3") == 3
+        assert board.rank_of("0x4") is None
+
+    def test_exact_whenever_it_claims_to_be(self):
+        """Under random balance changes, top() matches brute force whenever exact is True"""
+        rng = random.Random(49)
+        balances = {f"0x{i}": rng.uniform(0, 1000) for i in range(2000)}
+        board = _loaded_board(balances)
+        wrong_but_exact = 0
+        for _ in range(5000):
+            wallet = rng.choice(list(balances))
+            balances[wallet] = max(0.0, balances[wallet] + rng.uniform(-320, 300))
+            if board.observe_balance(wallet, balances[wallet]) is None:
+                board.observe({"wallet_address": wallet, "zwap_balance": balances[wallet]}, wallet)
+            if board.exact and [m["wallet_address"] for m in board.top()] != _truth(balances, 20):
+                wrong_but_exact += 1
+        assert wrong_but_exact == 0
+
+    def test_member_drops_clear_exact(self):
+        """When members fall below the floor of wallets off the board, exact turns False"""
+        rng = random.Random(4)
+        balances = {f"0x{i}": rng.uniform(0, 1000) for i in range(500)}
+        board = _loaded_board(balances)
+        assert board.exact
+        for wallet in list(board._members):
+            board.observe_balance(wallet, 0.0)
+        assert not board.exact
+
+    def test_observe_balance_asks_for_unknown_climbers(self):
+        """An unseen wallet above the floor needs its document fetched"""
+        board = _loaded_board({f"0x{i}": float(i) for i in range(100)}, top_k=5, slack=5)
+        assert board.observe_balance("0xnew", 1000.0) is None
+        assert board.observe_balance("0xnew", 0.5) is False
+
+
+class TestChangeStreamFallback:
+    """Only an unsupported deployment switches to polling"""
+
+    def test_history_lost_reconnects(self, monkeypatch):
+        """A lost resume token reopens the stream; a standalone server falls back to polling"""
+        import asyncio
+
+        from pymongo.errors import OperationFailure
+
+        import services.whale_service as whale_service
+
+        class Users:
+            calls = 0
+
+            def watch(self, pipeline):
+                Users.calls += 1
+                if Users.calls < 3:
+                    raise OperationFailure("resume point lost", code=286)
+                raise OperationFailure("only supported on replica sets", code=40573)
+
+        class DB:
+            users = Users()
+
+        async def reconcile():
+            pass
+
+        monkeypatch.setattr(whale_service, "RECONNECT_DELAY", 0)
+        board = WhaleBoard(DB())
+        board.reconcile = reconcile
+        asyncio.run(board._listen())
+        assert Users.calls == 3
+        assert board.mode == "poll"